@@ -3,28 +3,35 @@ Auth module for Google OAuth authentication and session management.
 """
 
 from .routes import router
-from .oauth_config import oauth, fernet, GOOGLE_CLIENT_ID, GOOGLE_CLIENT_SECRET, BASE_URL, FRONTEND_URL
+from .oauth_config import get_oauth, get_fernet, GOOGLE_CLIENT_ID, GOOGLE_CLIENT_SECRET, BASE_URL, FRONTEND_URL
+from .mime_builder import build_raw_message, html_to_text
 from .session_manager import (
-    USER_SESSIONS,
+    load_sessions,
     create_session,
     get_session,
     delete_session,
+    sweep_expired_sessions,
+    run_session_sweeper,
     decrypt_token,
     refresh_access_token
 )
 
 __all__ = [
     "router",
-    "oauth",
-    "fernet",
+    "get_oauth",
+    "get_fernet",
     "GOOGLE_CLIENT_ID",
     "GOOGLE_CLIENT_SECRET",
     "BASE_URL",
     "FRONTEND_URL",
-    "USER_SESSIONS",
+    "build_raw_message",
+    "html_to_text",
+    "load_sessions",
     "create_session",
     "get_session",
     "delete_session",
+    "sweep_expired_sessions",
+    "run_session_sweeper",
     "decrypt_token",
     "refresh_access_token",
 ]
@@ -0,0 +1,206 @@
+"""
+MIME message assembly for the Gmail API.
+The multipart/alternative body (plaintext derived from the HTML, plus the
+HTML itself) is encoded once per distinct HTML and cached by content hash;
+each send only adds its own headers (To, Cc, Subject, Message-ID, ...).
+"""
+
+import os
+import re
+import base64
+import hashlib
+import threading
+from collections import OrderedDict
+from email import policy
+from email.mime.text import MIMEText
+from email.utils import formatdate, make_msgid
+from html import unescape
+from html.parser import HTMLParser
+from typing import List, NamedTuple, Optional
+from dotenv import load_dotenv
+
+from core.metrics import record_cache
+
+# Load environment variables
+load_dotenv()
+
+# Number of encoded bodies kept (each is about 1.4x the HTML plus its plaintext)
+MIME_BODY_CACHE_SIZE = int(os.getenv("MIME_BODY_CACHE_SIZE", "32"))
+
+_SMTP = policy.SMTP
+
+
+# ==================================================================
+# PLAINTEXT ALTERNATIVE
+# ==================================================================
+class _TextExtractor(HTMLParser):
+    """Collects readable text from an HTML email (links as "text (url)")."""
+
+    BLOCK_TAGS = {"p", "div", "tr", "table", "h1", "h2", "h3", "h4", "h5", "h6", "ul", "ol", "section"}
+    SKIP_TAGS = {"script", "style", "head", "title"}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts: List[str] = []
+        self._skip = 0
+        self._href: Optional[str] = None
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.SKIP_TAGS:
+            self._skip += 1
+        elif tag == "br":
+            self.parts.append("\n")
+        elif tag == "li":
+            self.parts.append("\n- ")
+        elif tag in self.BLOCK_TAGS:
+            self.parts.append("\n\n")
+        elif tag == "a":
+            self._href = dict(attrs).get("href")
+        elif tag == "img":
+            alt = dict(attrs).get("alt")
+            if alt:
+                self.parts.append(alt)
+
+    def handle_endtag(self, tag):
+        if tag in self.SKIP_TAGS:
+            self._skip = max(0, self._skip - 1)
+        elif tag in self.BLOCK_TAGS:
+            self.parts.append("\n\n")
+        elif tag == "a" and self._href:
+            if self._href.startswith(("http://", "https://", "mailto:")):
+                self.parts.append(f" ({self._href})")
+            self._href = None
+
+    def handle_data(self, data):
+        if not self._skip:
+            self.parts.append(re.sub(r"\s+", " ", data))
+
+
+def html_to_text(html: str) -> str:
+    """
+    Derive a plaintext alternative from an HTML email.
+
+    Args:
+        html: HTML email body
+
+    Returns:
+        Readable text with paragraphs separated by blank lines
+    """
+    parser = _TextExtractor()
+    parser.feed(html)
+    parser.close()
+    text = unescape("".join(parser.parts))
+    lines = [line.strip() for line in text.splitlines()]
+    return re.sub(r"\n{3,}", "\n\n", "\n".join(lines)).strip() + "\n"
+
+
+# ==================================================================
+# ENCODED BODY CACHE
+# ==================================================================
+class EncodedBody(NamedTuple):
+    """A multipart/alternative body, encoded once and shared between sends."""
+    boundary: str
+    body: bytes       # Starts with CRLF + first boundary delimiter
+    body_b64: str     # urlsafe base64 of body (valid to append after 3-byte-aligned bytes)
+
+
+_bodies: "OrderedDict[str, EncodedBody]" = OrderedDict()
+_bodies_lock = threading.Lock()
+
+
+def _part_bytes(content: str, subtype: str) -> bytes:
+    part = MIMEText(content, subtype, "utf-8")
+    del part["MIME-Version"]
+    return part.as_bytes(policy=_SMTP)
+
+
+def _encode_body(html_body: str, digest: str) -> EncodedBody:
+    boundary = f"=_alt_{digest[:32]}"
+    delimiter = f"\r\n--{boundary}\r\n".encode()
+    body = b"".join([
+        delimiter, _part_bytes(html_to_text(html_body), "plain"),
+        delimiter, _part_bytes(html_body, "html"),
+        f"\r\n--{boundary}--\r\n".encode(),
+    ])
+    return EncodedBody(boundary, body, base64.urlsafe_b64encode(body).decode())
+
+
+def get_encoded_body(html_body: str) -> EncodedBody:
+    """
+    Encoded multipart/alternative body for an HTML email (cached by content hash).
+
+    Args:
+        html_body: HTML email body
+
+    Returns:
+        EncodedBody shared by every send of the same HTML
+    """
+    digest = hashlib.sha256(html_body.encode("utf-8")).hexdigest()
+    with _bodies_lock:
+        cached = _bodies.get(digest)
+        if cached is not None:
+            _bodies.move_to_end(digest)
+    record_cache("mime_body", cached is not None)
+    if cached is not None:
+        return cached
+
+    encoded = _encode_body(html_body, digest)
+    with _bodies_lock:
+        _bodies[digest] = encoded
+        while len(_bodies) > MIME_BODY_CACHE_SIZE:
+            _bodies.popitem(last=False)
+    return encoded
+
+
+# ==================================================================
+# MESSAGE ASSEMBLY
+# ==================================================================
+def _header(name: str, value: str) -> bytes:
+    # header_store_parse rejects CR/LF (header injection); fold applies RFC 2047 encoding
+    name, value = _SMTP.header_store_parse(name, value)
+    return _SMTP.fold(name, value).encode("ascii")
+
+
+def build_raw_message(
+    html_body: str,
+    to: str,
+    sender: str,
+    subject: str,
+    cc: Optional[str] = None
+) -> str:
+    """
+    Build the base64url "raw" message for the Gmail API send endpoint.
+
+    The header block is padded to a multiple of 3 bytes (inside the MIME
+    preamble, which readers ignore), so the cached base64 of the body can be
+    appended to the base64 of the headers without re-encoding it.
+
+    Args:
+        html_body: HTML email body
+        to: Recipient address(es)
+        sender: From address
+        subject: Subject line
+        cc: Comma-separated CC addresses
+
+    Returns:
+        urlsafe base64 of the complete RFC 5322 message
+
+    Raises:
+        ValueError: If a header value contains line breaks
+    """
+    encoded = get_encoded_body(html_body)
+    domain = sender.rpartition("@")[2] or None
+
+    head = b"".join([
+        _header("From", sender),
+        _header("To", to),
+        _header("Cc", cc) if cc else b"",
+        _header("Subject", subject),
+        _header("Date", formatdate(localtime=False)),
+        _header("Message-ID", make_msgid(domain=domain)),
+        b"MIME-Version: 1.0\r\n",
+        f'Content-Type: multipart/alternative; boundary="{encoded.boundary}"\r\n'.encode(),
+        b"\r\n",
+    ])
+    head += b" " * (-len(head) % 3)
+    return base64.urlsafe_b64encode(head).decode() + encoded.body_b64
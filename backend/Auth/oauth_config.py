@@ -3,10 +3,15 @@ OAuth configuration and setup for Google authentication.
 """
 
 import os
-from authlib.integrations.starlette_client import OAuth
+import threading
+from typing import TYPE_CHECKING, Optional
 from cryptography.fernet import Fernet
+from fastapi import HTTPException
 from dotenv import load_dotenv
 
+if TYPE_CHECKING:
+    from authlib.integrations.starlette_client import OAuth
+
 # Load environment variables
 load_dotenv()
 
@@ -17,26 +22,59 @@ BASE_URL = os.getenv("BASE_URL", "http://127.0.0.1:8000").rstrip("/")
 FERNET_KEY = os.getenv("FERNET_KEY")
 FRONTEND_URL = os.getenv("FRONTEND_URL", "http://localhost:5173").rstrip("/")
 
-# Validate required environment variables
-if not all([GOOGLE_CLIENT_ID, GOOGLE_CLIENT_SECRET, FERNET_KEY]):
-    raise ValueError("Missing required auth environment variables: GOOGLE_CLIENT_ID, GOOGLE_CLIENT_SECRET, FERNET_KEY")
-
-# Initialize Fernet encryption
-fernet = Fernet(FERNET_KEY.encode())
-
-# Initialize OAuth
-oauth = OAuth()
-
-# Register Google OAuth provider with hardcoded endpoints (faster than metadata fetch)
-oauth.register(
-    name="google",
-    client_id=GOOGLE_CLIENT_ID,
-    client_secret=GOOGLE_CLIENT_SECRET,
-    authorize_url="https://accounts.google.com/o/oauth2/v2/auth",
-    access_token_url="https://oauth2.googleapis.com/token",
-    api_base_url="https://www.googleapis.com/",
-    jwks_uri="https://www.googleapis.com/oauth2/v3/certs",
-    client_kwargs={
-        "scope": "openid email profile https://www.googleapis.com/auth/gmail.send",
-    },
-)
+# Google API endpoints (overridable to point at local stand-ins, e.g. for benchmarks)
+GOOGLE_TOKEN_URL = os.getenv("GOOGLE_TOKEN_URL", "https://oauth2.googleapis.com/token")
+GMAIL_API_BASE_URL = os.getenv("GMAIL_API_BASE_URL", "https://gmail.googleapis.com").rstrip("/")
+
+# Fernet key and OAuth registry are created on first use
+_fernet: Optional[Fernet] = None
+_oauth: Optional["OAuth"] = None
+_init_lock = threading.Lock()
+
+
+def _require_auth_config():
+    """Validate required environment variables."""
+    if not all([GOOGLE_CLIENT_ID, GOOGLE_CLIENT_SECRET, FERNET_KEY]):
+        raise HTTPException(
+            500,
+            "Missing required auth environment variables: GOOGLE_CLIENT_ID, GOOGLE_CLIENT_SECRET, FERNET_KEY"
+        )
+
+
+def get_fernet() -> Fernet:
+    """Get the Fernet instance used for token encryption (created on first use)."""
+    global _fernet
+    if _fernet is None:
+        _require_auth_config()
+        with _init_lock:
+            if _fernet is None:
+                _fernet = Fernet(FERNET_KEY.encode())
+    return _fernet
+
+
+def get_oauth() -> "OAuth":
+    """Get the OAuth registry with the Google provider (created on first use)."""
+    global _oauth
+    if _oauth is None:
+        _require_auth_config()
+        with _init_lock:
+            if _oauth is None:
+                from authlib.integrations.starlette_client import OAuth
+                
+                oauth = OAuth()
+                
+                # Register Google OAuth provider with hardcoded endpoints (faster than metadata fetch)
+                oauth.register(
+                    name="google",
+                    client_id=GOOGLE_CLIENT_ID,
+                    client_secret=GOOGLE_CLIENT_SECRET,
+                    authorize_url="https://accounts.google.com/o/oauth2/v2/auth",
+                    access_token_url=GOOGLE_TOKEN_URL,
+                    api_base_url="https://www.googleapis.com/",
+                    jwks_uri="https://www.googleapis.com/oauth2/v3/certs",
+                    client_kwargs={
+                        "scope": "openid email profile https://www.googleapis.com/auth/gmail.send",
+                    },
+                )
+                _oauth = oauth
+    return _oauth
@@ -2,14 +2,15 @@
 Authentication routes for Google OAuth and email sending.
 """
 
-import base64
 import httpx
 from typing import Optional
 from fastapi import APIRouter, Request, HTTPException, Form, BackgroundTasks
 from fastapi.responses import RedirectResponse, JSONResponse
-from email.mime.text import MIMEText
 
-from .oauth_config import oauth, BASE_URL, FRONTEND_URL
+from core.metrics import track_stage
+from core.logger import get_logger
+from .oauth_config import get_oauth, BASE_URL, FRONTEND_URL, GMAIL_API_BASE_URL
+from .mime_builder import build_raw_message
 from model.template_manager import auto_save_template_from_email
 from .session_manager import (
     create_session,
@@ -23,6 +24,8 @@ from schema.auth import ConnectionStatus, DisconnectResponse
 
 router = APIRouter()
 
+logger = get_logger(__name__)
+
 
 # ==================================================================
 # 1️⃣ CONNECT GOOGLE – START OAUTH LOGIN
@@ -31,9 +34,9 @@ router = APIRouter()
 async def connect_google(request: Request):
     """Initiates OAuth flow - redirects user to Google login"""
     redirect_uri = f"{BASE_URL}/auth/google/callback"
-    print(f"DEBUG: Redirecting to Google with redirect_uri={redirect_uri}")
+    logger.debug("Redirecting to Google", extra={"redirect_uri": redirect_uri})
     
-    return await oauth.google.authorize_redirect(
+    return await get_oauth().google.authorize_redirect(
         request, 
         redirect_uri, 
         access_type="offline", 
@@ -49,12 +52,12 @@ async def google_callback(request: Request):
     """Callback from Google - Exchanges code for tokens and creates session"""
     try:
         # 1. Exchange auth code for token
-        token = await oauth.google.authorize_access_token(request)
+        token = await get_oauth().google.authorize_access_token(request)
         
         # 2. Get user info (email)
         user_info = token.get("userinfo")
         if not user_info:
-            resp = await oauth.google.get("https://www.googleapis.com/oauth2/v1/userinfo", token=token)
+            resp = await get_oauth().google.get("https://www.googleapis.com/oauth2/v1/userinfo", token=token)
             user_info = resp.json()
             
         email = user_info.get("email")
@@ -69,12 +72,9 @@ async def google_callback(request: Request):
             encrypted_token = find_session_by_email(email)
             if encrypted_token:
                 # Create session with existing token
-                session_id = create_session(email, None)
-                # Manually set the token
-                from .session_manager import USER_SESSIONS
-                USER_SESSIONS[session_id]["token"] = encrypted_token
+                session_id = create_session(email, encrypted_token=encrypted_token)
             else:
-                print("WARNING: No refresh token available. Offline access will fail.")
+                logger.warning("No refresh token available, offline access will fail")
                 session_id = create_session(email, None)
         else:
             # Create session with new refresh token
@@ -87,14 +87,13 @@ async def google_callback(request: Request):
         
     except Exception as e:
         error_msg = str(e)
-        print(f"CALLBACK ERROR: {error_msg}")
+        logger.error("OAuth callback error", extra={"error": error_msg})
         
         # Provide more helpful error messages for common issues
         if "state" in error_msg.lower():
-            print("⚠️ OAuth state mismatch - this usually means:")
-            print("   1. Session cookies aren't being maintained")
-            print("   2. You may be accessing via different domains/ports")
-            print("   3. Browser is blocking third-party cookies")
+            # Usually: session cookies not maintained, different domains/ports,
+            # or the browser blocking third-party cookies
+            logger.warning("OAuth state mismatch")
             return JSONResponse(
                 {
                     "error": "OAuth session error",
@@ -142,25 +141,21 @@ async def send_email(
     # Get fresh access token
     access_token = await refresh_access_token(refresh_token)
     
-    # Build MIME email
-    msg = MIMEText(html_body, "html")
-    msg["To"] = to
-    msg["From"] = email
-    msg["Subject"] = subject
-    
-    if cc:
-        msg["Cc"] = cc
-    
-    raw = base64.urlsafe_b64encode(msg.as_bytes()).decode()
+    # Build MIME email (multipart/alternative body is encoded once per HTML and cached)
+    try:
+        raw = build_raw_message(html_body, to=to, sender=email, subject=subject, cc=cc)
+    except ValueError as e:
+        raise HTTPException(400, f"Invalid email header: {str(e)}")
     
     # Send email via Gmail API
     try:
         async with httpx.AsyncClient() as client:
-            send_response = await client.post(
-                "https://gmail.googleapis.com/gmail/v1/users/me/messages/send",
-                headers={"Authorization": f"Bearer {access_token}"},
-                json={"raw": raw},
-            )
+            with track_stage("gmail_send"):
+                send_response = await client.post(
+                    f"{GMAIL_API_BASE_URL}/gmail/v1/users/me/messages/send",
+                    headers={"Authorization": f"Bearer {access_token}"},
+                    json={"raw": raw},
+                )
             
             if send_response.status_code != 200:
                 raise HTTPException(500, f"Failed to send email: {send_response.text}")
@@ -3,52 +3,51 @@ Session management for user authentication.
 Handles session storage, token encryption, and refresh operations.
 """
 
+import os
+import time
 import uuid
+import asyncio
 import httpx
-import json
-import os
-from typing import Dict, Optional
+from typing import Any, Dict, Optional
 from fastapi import HTTPException
+from dotenv import load_dotenv
 
-from .oauth_config import fernet, GOOGLE_CLIENT_ID, GOOGLE_CLIENT_SECRET
+from core.metrics import track_stage, ACTIVE_SESSIONS, SESSIONS_EXPIRED
+from core.logger import get_logger
+from core.backends import get_session_backend
+from .oauth_config import get_fernet, GOOGLE_CLIENT_ID, GOOGLE_CLIENT_SECRET, GOOGLE_TOKEN_URL
 
-# File to store sessions
-SESSIONS_FILE = "sessions.json"
+# Load environment variables
+load_dotenv()
 
-# In-memory session storage
-# Key: session_id -> Value: { "email": str, "token": encrypted_str }
-USER_SESSIONS: Dict[str, Dict[str, str]] = {}
+logger = get_logger(__name__)
 
-def load_sessions():
-    """Load sessions from JSON file."""
-    global USER_SESSIONS
-    if os.path.exists(SESSIONS_FILE):
-        try:
-            with open(SESSIONS_FILE, "r") as f:
-                USER_SESSIONS = json.load(f)
-            print(f"✅ Loaded {len(USER_SESSIONS)} sessions from disk")
-        except Exception as e:
-            print(f"⚠️ Failed to load sessions: {e}")
-            USER_SESSIONS = {}
+# Session lifetime (seconds): absolute since login, and since last use (sliding)
+SESSION_ABSOLUTE_TTL = int(os.getenv("SESSION_ABSOLUTE_TTL", str(30 * 24 * 60 * 60)))
+SESSION_IDLE_TTL = int(os.getenv("SESSION_IDLE_TTL", str(7 * 24 * 60 * 60)))
+# `last_used` is persisted at most this often per session, to avoid a write per request
+SESSION_TOUCH_INTERVAL = int(os.getenv("SESSION_TOUCH_INTERVAL", "300"))
+SESSION_SWEEP_INTERVAL = int(os.getenv("SESSION_SWEEP_INTERVAL", "600"))
 
-def save_sessions():
-    """Save sessions to JSON file."""
-    try:
-        with open(SESSIONS_FILE, "w") as f:
-            json.dump(USER_SESSIONS, f, indent=2)
-    except Exception as e:
-        print(f"⚠️ Failed to save sessions: {e}")
+# Sessions live in the configured state backend (STATE_BACKEND: file, sqlite or redis)
+# Key: session_id -> Value: { "email": str, "token": encrypted_str, "created_at": float, "last_used": float }
 
-# Load sessions on startup
-load_sessions()
+def load_sessions():
+    """Warm up the session backend (reads sessions.json for the file backend)."""
+    get_session_backend().load()
 
-def create_session(email: str, refresh_token: Optional[str] = None) -> str:
+def create_session(
+    email: str,
+    refresh_token: Optional[str] = None,
+    encrypted_token: Optional[str] = None
+) -> str:
     """
     Create a new user session.
     
     Args:
         email: User's email address
         refresh_token: OAuth refresh token (if available)
+        encrypted_token: Already encrypted refresh token (e.g. reused from an older session)
         
     Returns:
         session_id: Unique session identifier
@@ -56,33 +55,62 @@ def create_session(email: str, refresh_token: Optional[str] = None) -> str:
     session_id = str(uuid.uuid4())
     
     # Encrypt token if provided
-    encrypted_token = None
     if refresh_token:
-        encrypted_token = fernet.encrypt(refresh_token.encode()).decode()
+        encrypted_token = get_fernet().encrypt(refresh_token.encode()).decode()
     
     # Store session
-    USER_SESSIONS[session_id] = {
+    now = time.time()
+    get_session_backend().put(session_id, {
         "email": email,
-        "token": encrypted_token
-    }
-    
-    save_sessions() # Persist to disk
+        "token": encrypted_token,
+        "created_at": now,
+        "last_used": now
+    })
     
-    print(f"✅ Created session {session_id} for {email}")
+    logger.info("Created session", extra={"session_id": session_id})
     return session_id
 
 
+def _expiry_reason(data: Dict[str, Any], now: float) -> Optional[str]:
+    """Return "absolute" or "idle" if the session has expired, else None."""
+    # Sessions saved before timestamps existed count from when they are first seen
+    created_at = data.get("created_at", now)
+    last_used = data.get("last_used", created_at)
+    if SESSION_ABSOLUTE_TTL > 0 and now - created_at >= SESSION_ABSOLUTE_TTL:
+        return "absolute"
+    if SESSION_IDLE_TTL > 0 and now - last_used >= SESSION_IDLE_TTL:
+        return "idle"
+    return None
+
+
 def get_session(session_id: str) -> Optional[Dict[str, str]]:
     """
-    Get session data by session ID.
+    Get session data by session ID and extend its idle expiry.
     
     Args:
         session_id: Session identifier
         
     Returns:
-        Session data or None if not found
+        Session data or None if not found or expired
     """
-    return USER_SESSIONS.get(session_id)
+    backend = get_session_backend()
+    data = backend.get(session_id)
+    if data is None:
+        return None
+
+    now = time.time()
+    reason = _expiry_reason(data, now)
+    if reason:
+        if backend.delete(session_id):
+            SESSIONS_EXPIRED.inc(reason=reason)
+            logger.info("Session expired", extra={"session_id": session_id, "reason": reason})
+        return None
+
+    # Sliding expiry: persist last_used, throttled to SESSION_TOUCH_INTERVAL
+    if now - data.get("last_used", 0) >= SESSION_TOUCH_INTERVAL:
+        data = {**data, "created_at": data.get("created_at", now), "last_used": now}
+        backend.put(session_id, data)
+    return data
 
 
 def delete_session(session_id: str) -> bool:
@@ -95,10 +123,8 @@ def delete_session(session_id: str) -> bool:
     Returns:
         True if deleted, False if not found
     """
-    if session_id in USER_SESSIONS:
-        del USER_SESSIONS[session_id]
-        save_sessions() # Persist to disk
-        print(f"🗑️ Deleted session {session_id}")
+    if get_session_backend().delete(session_id):
+        logger.info("Deleted session", extra={"session_id": session_id})
         return True
     return False
 
@@ -114,10 +140,60 @@ def find_session_by_email(email: str) -> Optional[str]:
     Returns:
         Encrypted token if found, None otherwise
     """
-    for sid, data in USER_SESSIONS.items():
-        if data["email"] == email and data.get("token"):
-            return data["token"]
-    return None
+    data = get_session_backend().find_by_email(email)
+    if data is None or _expiry_reason(data, time.time()):
+        return None
+    return data["token"]
+
+
+def sweep_expired_sessions() -> int:
+    """
+    Evict all expired sessions in one bulk delete.
+    Sessions without timestamps (created before expiry existed) are stamped
+    with the current time so they expire on the normal schedule.
+    
+    Returns:
+        Number of sessions evicted
+    """
+    backend = get_session_backend()
+    now = time.time()
+    expired: Dict[str, str] = {}
+    unstamped: Dict[str, Dict[str, Any]] = {}
+    active = 0
+
+    for session_id, data in backend.items():
+        reason = _expiry_reason(data, now)
+        if reason:
+            expired[session_id] = reason
+            continue
+        active += 1
+        if "created_at" not in data or "last_used" not in data:
+            unstamped[session_id] = {
+                **data,
+                "created_at": data.get("created_at", now),
+                "last_used": data.get("last_used", now)
+            }
+
+    if unstamped:
+        backend.put_many(unstamped)
+    removed = backend.delete_many(list(expired)) if expired else 0
+    for reason in expired.values():
+        SESSIONS_EXPIRED.inc(reason=reason)
+    ACTIVE_SESSIONS.set(active)
+
+    if removed or unstamped:
+        logger.info("Swept sessions", extra={"evicted": removed, "stamped": len(unstamped), "active": active})
+    return removed
+
+
+async def run_session_sweeper(interval: float = SESSION_SWEEP_INTERVAL):
+    """Periodically evict expired sessions (runs for the lifetime of the app)."""
+    while True:
+        try:
+            await asyncio.to_thread(sweep_expired_sessions)
+        except Exception as e:
+            logger.warning("Session sweep failed", extra={"error": str(e)})
+        await asyncio.sleep(interval)
 
 
 def decrypt_token(encrypted_token: str) -> str:
@@ -134,7 +210,7 @@ def decrypt_token(encrypted_token: str) -> str:
         HTTPException: If decryption fails
     """
     try:
-        return fernet.decrypt(encrypted_token.encode()).decode()
+        return get_fernet().decrypt(encrypted_token.encode()).decode()
     except Exception as e:
         raise HTTPException(500, f"Failed to decrypt token: {str(e)}")
 
@@ -154,15 +230,16 @@ async def refresh_access_token(refresh_token: str) -> str:
     """
     try:
         async with httpx.AsyncClient() as client:
-            token_response = await client.post(
-                "https://oauth2.googleapis.com/token",
-                data={
-                    "client_id": GOOGLE_CLIENT_ID,
-                    "client_secret": GOOGLE_CLIENT_SECRET,
-                    "refresh_token": refresh_token,
-                    "grant_type": "refresh_token",
-                }
-            )
+            with track_stage("token_refresh"):
+                token_response = await client.post(
+                    GOOGLE_TOKEN_URL,
+                    data={
+                        "client_id": GOOGLE_CLIENT_ID,
+                        "client_secret": GOOGLE_CLIENT_SECRET,
+                        "refresh_token": refresh_token,
+                        "grant_type": "refresh_token",
+                    }
+                )
             
             data = token_response.json()
             if token_response.status_code != 200:
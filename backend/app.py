@@ -10,7 +10,10 @@ A modular FastAPI application for:
 """
 
 import os
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from starlette.middleware.sessions import SessionMiddleware
 from dotenv import load_dotenv
@@ -18,8 +21,14 @@ from dotenv import load_dotenv
 # Import routers from organized modules
 from Auth.routes import router as auth_router
 from model.routes import router as model_router
-from model.rag_service import supabase
-from model.embeddings import openai_client
+from model.rag_service import is_supabase_configured
+from model.embeddings import is_openai_configured
+from Auth.session_manager import load_sessions, run_session_sweeper
+from model.image_optimizer import shutdown_image_optimizer
+from model.repository import shutdown_repository
+from model.embeddings import get_openai_scheduler
+from core.metrics import REGISTRY, MetricsMiddleware
+from core.logger import get_logger, shutdown_logging, RequestIdMiddleware
 
 # Load environment variables
 load_dotenv()
@@ -27,16 +36,43 @@ load_dotenv()
 SESSION_SECRET = os.getenv("SESSION_SECRET")
 FRONTEND_URL = os.getenv("FRONTEND_URL", "http://localhost:5173").rstrip("/")
 
+logger = get_logger(__name__)
+
 if not SESSION_SECRET:
     raise ValueError("Missing required environment variable: SESSION_SECRET")
 
 # ==================================================================
 # APP INITIALIZATION
 # ==================================================================
+async def _sweep_after_load(sessions_loading: asyncio.Task):
+    await sessions_loading
+    await run_session_sweeper()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Startup/shutdown hooks for shared resources"""
+    # Load persisted sessions in the background so the first request is not delayed
+    app.state.sessions_loading = asyncio.create_task(asyncio.to_thread(load_sessions))
+    # Evict expired sessions periodically (first sweep runs once sessions are loaded)
+    app.state.session_sweeper = asyncio.create_task(_sweep_after_load(app.state.sessions_loading))
+    yield
+    app.state.session_sweeper.cancel()
+    # Stop image optimization worker processes
+    shutdown_image_optimizer()
+    # Stop the Supabase thread pool
+    shutdown_repository()
+    # Stop the OpenAI call threads
+    get_openai_scheduler().shutdown()
+    # Flush queued log records
+    shutdown_logging()
+
+
 app = FastAPI(
     title="Gmail OAuth Sender & AI Email Generator",
     description="AI-powered email generation with RAG and Google OAuth",
-    version="2.0.0"
+    version="2.0.0",
+    lifespan=lifespan
 )
 
 # ==================================================================
@@ -44,9 +80,10 @@ app = FastAPI(
 # ==================================================================
 
 # 1. CORS Middleware (CRITICAL for frontend communication)
-print(f"🔧 CORS Configuration:")
-print(f"   FRONTEND_URL: {FRONTEND_URL}")
-print(f"   Allowed Origins: {[FRONTEND_URL, 'http://localhost:5173', 'http://localhost:3000']}")
+logger.info(
+    "CORS configuration",
+    extra={"allowed_origins": [FRONTEND_URL, "http://localhost:5173", "http://localhost:3000"]}
+)
 
 app.add_middleware(
     CORSMiddleware,
@@ -56,7 +93,13 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# 2. Session Middleware (Required for OAuth)
+# 2. Metrics Middleware (per-route latency histograms, exposed at /metrics)
+app.add_middleware(MetricsMiddleware)
+
+# 3. Request ID Middleware (correlates log lines of one request)
+app.add_middleware(RequestIdMiddleware)
+
+# 4. Session Middleware (Required for OAuth)
 # Configure with proper cookie settings for OAuth to work across different ports
 app.add_middleware(
     SessionMiddleware, 
@@ -113,11 +156,12 @@ async def root():
             }
         },
         "features": {
-            "supabase_configured": supabase is not None,
-            "rag_enabled": supabase is not None and openai_client is not None,
-            "ai_enabled": openai_client is not None,
+            "supabase_configured": is_supabase_configured(),
+            "rag_enabled": is_supabase_configured() and is_openai_configured(),
+            "ai_enabled": is_openai_configured(),
         },
-        "documentation": "/docs"
+        "documentation": "/docs",
+        "metrics": "/metrics"
     }
 
 
@@ -126,9 +170,18 @@ async def root():
 # ==================================================================
 @app.get("/health")
 async def health_check():
-    """Health check endpoint for monitoring"""
+    """Health check endpoint for monitoring (reports configured services; does not call them)"""
     return {
         "status": "healthy",
-        "supabase": "connected" if supabase else "not configured",
-        "openai": "connected" if openai_client else "not configured"
+        "supabase": "configured" if is_supabase_configured() else "not configured",
+        "openai": "configured" if is_openai_configured() else "not configured"
     }
+
+
+# ==================================================================
+# METRICS
+# ==================================================================
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus-style metrics (per-process; scrape each worker)"""
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
@@ -0,0 +1,3 @@
+"""
+Offline benchmark harness with local stand-ins for OpenAI, Google and Supabase.
+"""
@@ -0,0 +1,101 @@
+"""
+Event loop responsiveness under slow database calls.
+Fires N concurrent /list-templates requests against a Supabase stub with a
+large per-call latency while pinging /health, and reports /health latency.
+With Supabase calls off the event loop, /health stays fast and the list
+requests overlap (bounded by SUPABASE_MAX_WORKERS) instead of running one
+after another.
+
+Usage (from backend/):
+    python -m benchmarks.concurrency --requests 16 --supabase-latency-ms 1500
+"""
+
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+from typing import Any, Dict
+import httpx
+from cryptography.fernet import Fernet
+
+from .run import _free_port, _git_commit, _percentile, start_app, start_stubs, write_sessions
+
+
+async def _ping(client: httpx.AsyncClient, stop: asyncio.Event, interval: float) -> list:
+    latencies = []
+    while not stop.is_set():
+        started = time.perf_counter()
+        await client.get("/health")
+        latencies.append(time.perf_counter() - started)
+        await asyncio.sleep(interval)
+    return latencies
+
+
+async def measure(base_url: str, requests: int, ping_interval: float) -> Dict[str, Any]:
+    async with httpx.AsyncClient(base_url=base_url, timeout=120.0) as client:
+        # Warm up the Supabase client so its creation is not measured
+        await client.get("/list-templates", params={"limit": 5})
+
+        stop = asyncio.Event()
+        pinger = asyncio.create_task(_ping(client, stop, ping_interval))
+        started = time.perf_counter()
+        responses = await asyncio.gather(*(
+            client.get("/list-templates", params={"limit": 5}) for _ in range(requests)
+        ))
+        elapsed = time.perf_counter() - started
+        stop.set()
+        health = await pinger
+
+    return {
+        "list_templates": {
+            "requests": requests,
+            "ok": sum(1 for r in responses if r.status_code == 200),
+            "status_codes": sorted({r.status_code for r in responses}),
+            "wall_ms": round(elapsed * 1000, 1),
+        },
+        "health": {
+            "pings": len(health),
+            "p50_ms": round(_percentile(health, 50) * 1000, 1),
+            "p95_ms": round(_percentile(health, 95) * 1000, 1),
+            "max_ms": round(max(health) * 1000, 1) if health else None,
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure /health latency while Supabase calls are slow")
+    parser.add_argument("--requests", type=int, default=16, help="Concurrent /list-templates requests")
+    parser.add_argument("--supabase-latency-ms", type=float, default=1500.0)
+    parser.add_argument("--ping-interval-ms", type=float, default=50.0)
+    cli = parser.parse_args()
+
+    args = argparse.Namespace(
+        openai_latency_ms=10.0, openai_token_ms=0.1, google_latency_ms=0.0,
+        supabase_latency_ms=cli.supabase_latency_ms, seed_templates=20, no_hybrid=False, workers=1,
+        log_level="WARNING",
+    )
+    ports = {"openai": _free_port(), "google": _free_port(), "supabase": _free_port(), "app": _free_port()}
+    fernet_key = Fernet.generate_key().decode()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        write_sessions(workdir, fernet_key)
+        stubs = start_stubs(args, ports)
+        app = None
+        try:
+            app = start_app(args, ports, workdir, fernet_key)
+            results = asyncio.run(measure(
+                f"http://127.0.0.1:{ports['app']}", cli.requests, cli.ping_interval_ms / 1000
+            ))
+        finally:
+            for process in (app, stubs):
+                if process is not None:
+                    process.terminate()
+                    process.wait(timeout=10)
+
+    meta = {"commit": _git_commit(), "requests": cli.requests, "supabase_latency_ms": cli.supabase_latency_ms}
+    print(json.dumps({"meta": meta, **results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
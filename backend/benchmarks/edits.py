@@ -0,0 +1,108 @@
+"""
+Template edit benchmark.
+Runs the same small edits ("change the button color") with EMAIL_EDIT_MODE=full
+and EMAIL_EDIT_MODE=patch against the local stubs, and compares latency and
+completion tokens.
+
+Usage (from backend/):
+    python -m benchmarks.edits --edits 20 --openai-token-ms 10
+"""
+
+import os
+import re
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+from typing import Any, Dict
+import httpx
+from cryptography.fernet import Fernet
+
+from .run import _free_port, _git_commit, _percentile, start_app, start_stubs, write_sessions
+
+COMPLETION_TOKENS_PATTERN = re.compile(r'^llm_tokens_total\{model="[^"]*",kind="completion"\} ([\d.]+)', re.MULTILINE)
+EDITS_PATTERN = re.compile(r'^template_edits_total\{mode="patch",outcome="(\w+)"\} ([\d.]+)', re.MULTILINE)
+
+
+async def _metrics(client: httpx.AsyncClient) -> Dict[str, Any]:
+    text = (await client.get("/metrics")).text
+    return {
+        "completion_tokens": sum(float(v) for v in COMPLETION_TOKENS_PATTERN.findall(text)),
+        "patch_outcomes": {outcome: int(float(count)) for outcome, count in EDITS_PATTERN.findall(text)},
+    }
+
+
+async def measure(base_url: str, edits: int) -> Dict[str, Any]:
+    async with httpx.AsyncClient(base_url=base_url, timeout=120.0) as client:
+        generated = await client.post("/generate-email-rag", data={"prompt": "product launch email", "use_rag": "false"})
+        current_html = generated.json()["html"]
+
+        before = await _metrics(client)
+        latencies = []
+        for _ in range(edits):
+            started = time.perf_counter()
+            response = await client.post("/generate-email-rag", data={
+                "prompt": "Change the button color to green",
+                "current_html": current_html,
+                "use_rag": "false",
+            })
+            response.raise_for_status()
+            latencies.append(time.perf_counter() - started)
+            current_html = response.json()["html"]
+        after = await _metrics(client)
+
+    return {
+        "edits": edits,
+        "mean_ms": round(sum(latencies) / len(latencies) * 1000, 1),
+        "p50_ms": round(_percentile(latencies, 50) * 1000, 1),
+        "p95_ms": round(_percentile(latencies, 95) * 1000, 1),
+        "completion_tokens_per_edit": round((after["completion_tokens"] - before["completion_tokens"]) / edits, 1),
+        "patch_outcomes": {
+            outcome: count - before["patch_outcomes"].get(outcome, 0)
+            for outcome, count in after["patch_outcomes"].items()
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare patch edits with full regeneration")
+    parser.add_argument("--edits", type=int, default=20, help="Sequential edits per mode")
+    parser.add_argument("--openai-latency-ms", type=float, default=300.0)
+    parser.add_argument("--openai-token-ms", type=float, default=10.0, help="Per output token (drives edit cost)")
+    cli = parser.parse_args()
+
+    args = argparse.Namespace(
+        openai_latency_ms=cli.openai_latency_ms, openai_token_ms=cli.openai_token_ms, google_latency_ms=0.0,
+        supabase_latency_ms=5.0, seed_templates=20, no_hybrid=False, workers=1, log_level="WARNING",
+    )
+    ports = {"openai": _free_port(), "google": _free_port(), "supabase": _free_port()}
+    fernet_key = Fernet.generate_key().decode()
+    results = {}
+
+    with tempfile.TemporaryDirectory() as workdir:
+        write_sessions(workdir, fernet_key)
+        stubs = start_stubs(args, ports)
+        try:
+            for mode in ("full", "patch"):
+                os.environ["EMAIL_EDIT_MODE"] = mode
+                ports["app"] = _free_port()
+                app = start_app(args, ports, workdir, fernet_key)
+                try:
+                    results[mode] = asyncio.run(measure(f"http://127.0.0.1:{ports['app']}", cli.edits))
+                finally:
+                    app.terminate()
+                    app.wait(timeout=10)
+        finally:
+            stubs.terminate()
+            stubs.wait(timeout=10)
+
+    report = {
+        "meta": {"commit": _git_commit(), "openai_latency_ms": cli.openai_latency_ms, "openai_token_ms": cli.openai_token_ms},
+        **results,
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
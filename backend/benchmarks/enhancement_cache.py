@@ -0,0 +1,125 @@
+"""
+Prompt enhancement cache.
+Sends /generate-email-rag requests whose prompts are paraphrases of a small
+set of briefs (reordered words, filler words, case and punctuation changes)
+and compares the semantic enhancement cache off (ENHANCEMENT_CACHE_SIZE=0)
+and on: enhancement completions, cache hit ratio, enhancement stage time and
+request latency. The OpenAI stub runs with bag-of-words embeddings so
+paraphrases are close, like with a real embedding model.
+
+Usage (from backend/):
+    python -m benchmarks.enhancement_cache --requests 60 --briefs 10
+"""
+
+import os
+import re
+import json
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+from typing import Any, Dict, List
+import httpx
+from cryptography.fernet import Fernet
+
+from .run import _free_port, _git_commit, _percentile, start_app, start_stubs, write_sessions
+
+PRODUCTS = ["shoes", "coffee", "laptops", "yoga classes", "concert tickets", "garden tools",
+            "winter jackets", "cooking course", "phone plans", "board games", "skincare", "bicycles"]
+OCCASIONS = ["summer sale", "product launch", "holiday discount", "loyalty reward", "back in stock"]
+FILLERS = ["please", "a", "an", "some", "the"]
+
+ENHANCEMENT_CALLS = re.compile(r'^llm_route_duration_seconds_count\{task="enhancement",[^}]*\} ([0-9.e+-]+)', re.MULTILINE)
+STAGE = re.compile(r'^stage_duration_seconds_(sum|count)\{stage="prompt_enhancement"\} ([0-9.e+-]+)', re.MULTILINE)
+CACHE = re.compile(r'^cache_requests_total\{cache="prompt_enhancement",result="(hit|miss)"\} ([0-9.e+-]+)', re.MULTILINE)
+
+
+def paraphrase(words: List[str], rng: random.Random) -> str:
+    """Reorder, pad and re-case a brief without changing its content words."""
+    words = list(words)
+    rng.shuffle(words)
+    for _ in range(rng.randint(0, 2)):
+        words.insert(rng.randint(0, len(words)), rng.choice(FILLERS))
+    text = " ".join(words)
+    if rng.random() < 0.5:
+        text = text.capitalize()
+    return text + rng.choice(["", ".", "!", " please"])
+
+
+def workload(requests: int, briefs: int, seed: int) -> List[str]:
+    rng = random.Random(seed)
+    bases = [
+        f"{occasion} marketing email for {product}".split()
+        for occasion, product in rng.sample([(o, p) for o in OCCASIONS for p in PRODUCTS], briefs)
+    ]
+    return [paraphrase(rng.choice(bases), rng) for _ in range(requests)]
+
+
+async def measure(base_url: str, prompts: List[str]) -> Dict[str, Any]:
+    latencies = []
+    async with httpx.AsyncClient(base_url=base_url, timeout=120.0) as client:
+        for prompt in prompts:
+            started = time.perf_counter()
+            response = await client.post("/generate-email-rag", data={"prompt": prompt})
+            response.raise_for_status()
+            latencies.append(time.perf_counter() - started)
+        metrics = (await client.get("/metrics")).text
+
+    stage = {kind: float(value) for kind, value in STAGE.findall(metrics)}
+    cache = {result: float(value) for result, value in CACHE.findall(metrics)}
+    lookups = sum(cache.values())
+    return {
+        "requests": len(prompts),
+        "enhancement_completions": int(sum(float(v) for v in ENHANCEMENT_CALLS.findall(metrics))),
+        "cache_hit_ratio": round(cache.get("hit", 0) / lookups, 3) if lookups else None,
+        "enhancement_stage_mean_ms": round(stage.get("sum", 0) / max(stage.get("count", 1), 1) * 1000, 1),
+        "request_p50_ms": round(_percentile(latencies, 50) * 1000, 1),
+        "request_p95_ms": round(_percentile(latencies, 95) * 1000, 1),
+    }
+
+
+def run_case(cli: argparse.Namespace, prompts: List[str], cache_size: int) -> Dict[str, Any]:
+    args = argparse.Namespace(
+        openai_latency_ms=cli.openai_latency_ms, openai_token_ms=1.0, google_latency_ms=0.0,
+        supabase_latency_ms=5.0, seed_templates=20, no_hybrid=False, workers=1, log_level="WARNING",
+        word_embeddings=True,
+    )
+    ports = {"openai": _free_port(), "google": _free_port(), "supabase": _free_port(), "app": _free_port()}
+    fernet_key = Fernet.generate_key().decode()
+    os.environ["ENHANCEMENT_CACHE_SIZE"] = str(cache_size)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        write_sessions(workdir, fernet_key)
+        stubs = start_stubs(args, ports)
+        app = None
+        try:
+            app = start_app(args, ports, workdir, fernet_key)
+            return asyncio.run(measure(f"http://127.0.0.1:{ports['app']}", prompts))
+        finally:
+            for process in (app, stubs):
+                if process is not None:
+                    process.terminate()
+                    process.wait(timeout=10)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Semantic cache for prompt enhancement on paraphrased prompts")
+    parser.add_argument("--requests", type=int, default=60)
+    parser.add_argument("--briefs", type=int, default=10, help="Distinct briefs the prompts paraphrase")
+    parser.add_argument("--openai-latency-ms", type=float, default=300.0)
+    parser.add_argument("--seed", type=int, default=7)
+    cli = parser.parse_args()
+
+    prompts = workload(cli.requests, cli.briefs, cli.seed)
+    report = {
+        "meta": {"commit": _git_commit(), "requests": cli.requests, "briefs": cli.briefs,
+                 "distinct_prompts": len(set(prompts)), "openai_latency_ms": cli.openai_latency_ms},
+        "cache_off": run_case(cli, prompts, cache_size=0),
+        "cache_on": run_case(cli, prompts, cache_size=1000),
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
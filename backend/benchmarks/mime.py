@@ -0,0 +1,82 @@
+"""
+MIME assembly throughput.
+Compares the previous per-send encoding (MIMEText + as_bytes + base64 of the
+whole message) with Auth.mime_builder.build_raw_message for the same HTML
+body sent to many recipients, and checks that every built message parses
+back to the original HTML.
+
+Usage (from backend/):
+    python -m benchmarks.mime --body-kb 100 --sends 500
+"""
+
+import json
+import time
+import base64
+import argparse
+from email import message_from_bytes, policy
+from email.mime.text import MIMEText
+from typing import Any, Callable, Dict
+
+from Auth.mime_builder import build_raw_message
+from .run import _git_commit, _percentile
+
+ROW = '<tr><td style="padding:12px;font-family:Arial;color:#333">Item {i}: caf&eacute; special &mdash; <a href="https://example.com/p/{i}">view</a></td></tr>\n'
+
+
+def fixture_html(size_kb: int) -> str:
+    rows, i = [], 0
+    while sum(len(r) for r in rows) < size_kb * 1024:
+        rows.append(ROW.format(i=i))
+        i += 1
+    return f"<html><body><table>{''.join(rows)}</table></body></html>"
+
+
+def legacy_raw_message(html_body: str, to: str, sender: str, subject: str) -> str:
+    msg = MIMEText(html_body, "html")
+    msg["To"] = to
+    msg["From"] = sender
+    msg["Subject"] = subject
+    return base64.urlsafe_b64encode(msg.as_bytes()).decode()
+
+
+def measure(build: Callable[..., str], html_body: str, sends: int) -> Dict[str, Any]:
+    latencies = []
+    started = time.perf_counter()
+    for i in range(sends):
+        send_started = time.perf_counter()
+        build(html_body, to=f"user{i}@example.com", sender="sender@example.com", subject="Weekly specials")
+        latencies.append(time.perf_counter() - send_started)
+    elapsed = time.perf_counter() - started
+    return {
+        "sends_per_s": round(sends / elapsed, 1),
+        "first_send_ms": round(latencies[0] * 1000, 3),
+        "p50_ms": round(_percentile(latencies, 50) * 1000, 3),
+        "p95_ms": round(_percentile(latencies, 95) * 1000, 3),
+    }
+
+
+def verify(html_body: str) -> bool:
+    raw = build_raw_message(html_body, to="check@example.com", sender="sender@example.com", subject="Check")
+    msg = message_from_bytes(base64.urlsafe_b64decode(raw), policy=policy.default)
+    return not msg.defects and msg.get_body(("html",)).get_content() == html_body
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Throughput of MIME assembly for repeated sends of one body")
+    parser.add_argument("--body-kb", type=int, default=100)
+    parser.add_argument("--sends", type=int, default=500)
+    args = parser.parse_args()
+
+    html_body = fixture_html(args.body_kb)
+    report = {
+        "meta": {"commit": _git_commit(), "body_bytes": len(html_body), "sends": args.sends},
+        "legacy_mimetext": measure(legacy_raw_message, html_body, args.sends),
+        # Same body each send: encoded once, then only headers are built
+        "mime_builder": measure(build_raw_message, html_body, args.sends),
+        "round_trip_ok": verify(html_body),
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
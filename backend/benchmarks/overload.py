@@ -0,0 +1,110 @@
+"""
+Overload behaviour against a slow upstream.
+Runs the app against an OpenAI stub with a large per-call latency and scarce
+concurrency, fires a burst of concurrent /generate-email requests, and
+compares admission control on (ADMISSION_QUEUE_BUDGET) and off: how many
+requests succeed, how fast rejected ones return, and the Retry-After hints.
+
+Usage (from backend/):
+    python -m benchmarks.overload --requests 40 --openai-latency-ms 3000
+"""
+
+import os
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+from typing import Any, Dict, List
+import httpx
+from cryptography.fernet import Fernet
+
+from .run import _free_port, _git_commit, _percentile, start_app, start_stubs, write_sessions
+
+
+def _latency_summary(latencies: List[float]) -> Dict[str, Any]:
+    if not latencies:
+        return {"count": 0}
+    return {
+        "count": len(latencies),
+        "p50_ms": round(_percentile(latencies, 50) * 1000, 1),
+        "max_ms": round(max(latencies) * 1000, 1),
+    }
+
+
+async def _timed_post(client: httpx.AsyncClient, i: int):
+    started = time.perf_counter()
+    try:
+        response = await client.post("/generate-email", data={"prompt": f"overload test email {i}"})
+        return response.status_code, response.headers.get("retry-after"), time.perf_counter() - started
+    except httpx.TimeoutException:
+        return "timeout", None, time.perf_counter() - started
+
+
+async def burst(base_url: str, requests: int, client_timeout: float) -> Dict[str, Any]:
+    async with httpx.AsyncClient(base_url=base_url, timeout=client_timeout) as client:
+        # One request first so the admission controller has a measured duration
+        await client.post("/generate-email", data={"prompt": "warm up"})
+        results = await asyncio.gather(*(_timed_post(client, i) for i in range(requests)))
+
+    by_status: Dict[str, List[float]] = {}
+    for status, _, latency in results:
+        by_status.setdefault(str(status), []).append(latency)
+    retry_after = sorted({int(r) for status, r, _ in results if status == 503 and r})
+    return {
+        "by_status": {status: _latency_summary(latencies) for status, latencies in sorted(by_status.items())},
+        "retry_after_s": retry_after,
+    }
+
+
+def run_case(cli: argparse.Namespace, budget: float) -> Dict[str, Any]:
+    args = argparse.Namespace(
+        openai_latency_ms=cli.openai_latency_ms, openai_token_ms=0.5, google_latency_ms=0.0,
+        supabase_latency_ms=5.0, seed_templates=5, no_hybrid=False, workers=1, log_level="ERROR",
+    )
+    ports = {"openai": _free_port(), "google": _free_port(), "supabase": _free_port(), "app": _free_port()}
+    fernet_key = Fernet.generate_key().decode()
+    os.environ.update({
+        "OPENAI_MAX_CONCURRENCY": str(cli.upstream_concurrency),
+        "ADMISSION_QUEUE_BUDGET": str(budget),
+    })
+
+    with tempfile.TemporaryDirectory() as workdir:
+        write_sessions(workdir, fernet_key)
+        stubs = start_stubs(args, ports)
+        app = None
+        try:
+            app = start_app(args, ports, workdir, fernet_key)
+            return asyncio.run(burst(f"http://127.0.0.1:{ports['app']}", cli.requests, cli.client_timeout))
+        finally:
+            for process in (app, stubs):
+                if process is not None:
+                    process.terminate()
+                    process.wait(timeout=10)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Burst of generations against a slow upstream, with and without admission control")
+    parser.add_argument("--requests", type=int, default=40)
+    parser.add_argument("--openai-latency-ms", type=float, default=3000.0)
+    parser.add_argument("--upstream-concurrency", type=int, default=4, help="OPENAI_MAX_CONCURRENCY for the app")
+    parser.add_argument("--budget", type=float, default=5.0, help="ADMISSION_QUEUE_BUDGET in seconds")
+    parser.add_argument("--client-timeout", type=float, default=30.0, help="Client timeout (like a proxy's)")
+    cli = parser.parse_args()
+
+    report = {
+        "meta": {
+            "commit": _git_commit(),
+            "requests": cli.requests,
+            "openai_latency_ms": cli.openai_latency_ms,
+            "upstream_concurrency": cli.upstream_concurrency,
+            "client_timeout_s": cli.client_timeout,
+        },
+        "admission_off": run_case(cli, budget=0),
+        f"admission_budget_{cli.budget:g}s": run_case(cli, budget=cli.budget),
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
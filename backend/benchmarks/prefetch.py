@@ -0,0 +1,129 @@
+"""
+Speculative RAG prefetch.
+Simulates users typing a brief in the generator: while typing, the debounced
+draft is sent to /prefetch-rag; after a pause the user clicks Generate and
+/generate-email-rag is called with the final prompt and the same draft ID.
+Some users change the brief after the last prefetch (a miss). Compares
+prefetch off (no /prefetch-rag calls) and on: time from the click to the
+generated email, enhancement completions made (the cost of speculation),
+and the share of generations that found their prefetch.
+
+Usage (from backend/):
+    python -m benchmarks.prefetch --users 12 --think-ms 1500
+"""
+
+import os
+import re
+import json
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+from typing import Any, Dict, List
+import httpx
+from cryptography.fernet import Fernet
+
+from .run import _free_port, _git_commit, _percentile, start_app, start_stubs, write_sessions
+
+TOPICS = ["running shoes", "coffee beans", "yoga retreat", "concert tickets", "garden tools", "winter jackets",
+          "cooking course", "phone plans", "board games", "skincare", "bicycles", "camping gear",
+          "language lessons", "pet food", "home insurance", "art supplies"]
+OCCASIONS = ["spring sale", "product launch", "holiday discount", "loyalty reward", "back in stock"]
+
+ENHANCEMENT_CALLS = re.compile(r'^llm_route_duration_seconds_count\{task="enhancement",[^}]*\} ([0-9.e+-]+)', re.MULTILINE)
+PREFETCH = re.compile(r'^cache_requests_total\{cache="rag_prefetch",result="(hit|miss)"\} ([0-9.e+-]+)', re.MULTILINE)
+
+
+def workload(users: int, changed_share: float, seed: int) -> List[Dict[str, Any]]:
+    rng = random.Random(seed)
+    sessions = []
+    for i in range(users):
+        brief = f"{rng.choice(OCCASIONS)} email for our {TOPICS[i % len(TOPICS)]} customers with a bold call to action"
+        words = brief.split()
+        drafts = [" ".join(words[:n]) for n in (len(words) // 3, 2 * len(words) // 3, len(words))]
+        final = brief + (" and a discount code" if rng.random() < changed_share else "")
+        sessions.append({"draft_id": f"bench-{seed}-{i}", "drafts": drafts, "final": final})
+    return sessions
+
+
+async def user(client: httpx.AsyncClient, session: Dict[str, Any], prefetch: bool, cli: argparse.Namespace) -> float:
+    for draft in session["drafts"]:
+        if prefetch:
+            (await client.post("/prefetch-rag", data={"prompt": draft, "draft_id": session["draft_id"]})).raise_for_status()
+        await asyncio.sleep(cli.typing_ms / 1000)
+    await asyncio.sleep(cli.think_ms / 1000)
+
+    started = time.perf_counter()
+    response = await client.post("/generate-email-rag", data={"prompt": session["final"], "draft_id": session["draft_id"]})
+    response.raise_for_status()
+    return time.perf_counter() - started
+
+
+async def measure(base_url: str, sessions: List[Dict[str, Any]], prefetch: bool, cli: argparse.Namespace) -> Dict[str, Any]:
+    async with httpx.AsyncClient(base_url=base_url, timeout=120.0) as client:
+        latencies: List[float] = []
+        for start in range(0, len(sessions), cli.concurrency):
+            batch = sessions[start:start + cli.concurrency]
+            latencies.extend(await asyncio.gather(*(user(client, s, prefetch, cli) for s in batch)))
+        metrics = (await client.get("/metrics")).text
+
+    lookups = {result: float(value) for result, value in PREFETCH.findall(metrics)}
+    return {
+        "generations": len(sessions),
+        "enhancement_completions": int(sum(float(v) for v in ENHANCEMENT_CALLS.findall(metrics))),
+        "prefetch_used_ratio": round(lookups.get("hit", 0) / len(sessions), 3) if prefetch else None,
+        "click_to_email_p50_ms": round(_percentile(latencies, 50) * 1000, 1),
+        "click_to_email_p95_ms": round(_percentile(latencies, 95) * 1000, 1),
+    }
+
+
+def run_case(cli: argparse.Namespace, sessions: List[Dict[str, Any]], prefetch: bool) -> Dict[str, Any]:
+    args = argparse.Namespace(
+        openai_latency_ms=cli.openai_latency_ms, openai_token_ms=1.0, google_latency_ms=0.0,
+        supabase_latency_ms=cli.supabase_latency_ms, seed_templates=50, no_hybrid=False, workers=1,
+        log_level="WARNING",
+    )
+    ports = {"openai": _free_port(), "google": _free_port(), "supabase": _free_port(), "app": _free_port()}
+    fernet_key = Fernet.generate_key().decode()
+    # Every simulated user connects from the same address
+    os.environ["RAG_PREFETCH_PER_MINUTE"] = "0"
+
+    with tempfile.TemporaryDirectory() as workdir:
+        write_sessions(workdir, fernet_key)
+        stubs = start_stubs(args, ports)
+        app = None
+        try:
+            app = start_app(args, ports, workdir, fernet_key)
+            return asyncio.run(measure(f"http://127.0.0.1:{ports['app']}", sessions, prefetch, cli))
+        finally:
+            for process in (app, stubs):
+                if process is not None:
+                    process.terminate()
+                    process.wait(timeout=10)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Speculative RAG prefetch while the brief is typed")
+    parser.add_argument("--users", type=int, default=12)
+    parser.add_argument("--concurrency", type=int, default=4, help="Users typing at the same time")
+    parser.add_argument("--typing-ms", type=float, default=800.0, help="Time between debounced drafts")
+    parser.add_argument("--think-ms", type=float, default=1500.0, help="Pause between the last draft and Generate")
+    parser.add_argument("--changed-share", type=float, default=0.25, help="Users who change the brief after the last draft")
+    parser.add_argument("--openai-latency-ms", type=float, default=300.0)
+    parser.add_argument("--supabase-latency-ms", type=float, default=60.0)
+    parser.add_argument("--seed", type=int, default=13)
+    cli = parser.parse_args()
+
+    # Distinct briefs per case, so the caches filled by one case do not help the other
+    report = {
+        "meta": {"commit": _git_commit(), "users": cli.users, "think_ms": cli.think_ms,
+                 "changed_share": cli.changed_share, "openai_latency_ms": cli.openai_latency_ms},
+        "prefetch_off": run_case(cli, workload(cli.users, cli.changed_share, cli.seed), prefetch=False),
+        "prefetch_on": run_case(cli, workload(cli.users, cli.changed_share, cli.seed), prefetch=True),
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
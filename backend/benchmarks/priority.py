@@ -0,0 +1,127 @@
+"""
+Interactive latency during background work.
+Inserts templates without embeddings into the Supabase stub, then measures
+/generate-email-rag latency while idle and while /generate-embeddings
+backfills them, and reads per-class scheduler queue waits from /metrics.
+
+Usage (from backend/):
+    python -m benchmarks.priority --backfill 300 --generations 10
+    OPENAI_MAX_CONCURRENCY=4 python -m benchmarks.priority   # scarce upstream capacity
+"""
+
+import re
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+from typing import Any, Dict, List
+import httpx
+from cryptography.fernet import Fernet
+
+from .run import _free_port, _git_commit, _percentile, start_app, start_stubs, write_sessions
+
+WAIT_PATTERN = re.compile(
+    r'^scheduler_queue_wait_seconds_(sum|count)\{scheduler="openai",priority="(\w+)"\} ([0-9.e+-]+)', re.MULTILINE
+)
+
+
+async def _insert_unembedded(supabase_url: str, count: int):
+    rows = [
+        {"subject": f"Backfill template {i}", "description": f"Imported via SQL, row {i}",
+         "template_code": "<html><body>Imported</body></html>", "category": "General", "visibility": "public"}
+        for i in range(count)
+    ]
+    async with httpx.AsyncClient(timeout=30.0) as client:
+        response = await client.post(f"{supabase_url}/rest/v1/email_templates", json=rows)
+        response.raise_for_status()
+
+
+async def _generations(client: httpx.AsyncClient, count: int, label: str) -> List[float]:
+    latencies = []
+    for i in range(count):
+        started = time.perf_counter()
+        response = await client.post("/generate-email-rag", data={"prompt": f"{label} promo email {i}", "use_rag": "true"})
+        response.raise_for_status()
+        latencies.append(time.perf_counter() - started)
+    return latencies
+
+
+def _summary(latencies: List[float]) -> Dict[str, Any]:
+    return {
+        "requests": len(latencies),
+        "p50_ms": round(_percentile(latencies, 50) * 1000, 1),
+        "p95_ms": round(_percentile(latencies, 95) * 1000, 1),
+    }
+
+
+async def _queue_waits(client: httpx.AsyncClient) -> Dict[str, Any]:
+    values: Dict[str, Dict[str, float]] = {}
+    for kind, priority, value in WAIT_PATTERN.findall((await client.get("/metrics")).text):
+        values.setdefault(priority, {})[kind] = float(value)
+    return {
+        priority: {"calls": int(v.get("count", 0)), "mean_wait_ms": round(v.get("sum", 0) / max(v.get("count", 1), 1) * 1000, 1)}
+        for priority, v in values.items()
+    }
+
+
+async def measure(base_url: str, supabase_url: str, backfill: int, generations: int) -> Dict[str, Any]:
+    async with httpx.AsyncClient(base_url=base_url, timeout=300.0) as client:
+        await client.post("/generate-email-rag", data={"prompt": "warm up", "use_rag": "true"})
+        idle = await _generations(client, generations, "idle")
+
+        await _insert_unembedded(supabase_url, backfill)
+        started = time.perf_counter()
+        backfill_task = asyncio.create_task(client.post("/generate-embeddings"))
+        await asyncio.sleep(0.2)
+        during = await _generations(client, generations, "busy")
+        backfill_response = await backfill_task
+        backfill_s = time.perf_counter() - started
+
+        return {
+            "idle": _summary(idle),
+            "during_backfill": _summary(during),
+            "backfill": {
+                "templates": backfill,
+                "updated": backfill_response.json().get("updated"),
+                "wall_s": round(backfill_s, 2),
+            },
+            "scheduler_queue_wait": await _queue_waits(client),
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Interactive generation latency during an embedding backfill")
+    parser.add_argument("--backfill", type=int, default=300, help="Templates to backfill")
+    parser.add_argument("--generations", type=int, default=10, help="Interactive requests per phase")
+    parser.add_argument("--openai-latency-ms", type=float, default=400.0)
+    cli = parser.parse_args()
+
+    args = argparse.Namespace(
+        openai_latency_ms=cli.openai_latency_ms, openai_token_ms=0.5, google_latency_ms=0.0,
+        supabase_latency_ms=5.0, seed_templates=20, no_hybrid=False, workers=1, log_level="WARNING",
+    )
+    ports = {"openai": _free_port(), "google": _free_port(), "supabase": _free_port(), "app": _free_port()}
+    fernet_key = Fernet.generate_key().decode()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        write_sessions(workdir, fernet_key)
+        stubs = start_stubs(args, ports)
+        app = None
+        try:
+            app = start_app(args, ports, workdir, fernet_key)
+            results = asyncio.run(measure(
+                f"http://127.0.0.1:{ports['app']}", f"http://127.0.0.1:{ports['supabase']}",
+                cli.backfill, cli.generations
+            ))
+        finally:
+            for process in (app, stubs):
+                if process is not None:
+                    process.terminate()
+                    process.wait(timeout=10)
+
+    print(json.dumps({"meta": {"commit": _git_commit()}, **results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
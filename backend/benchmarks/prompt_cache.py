@@ -0,0 +1,96 @@
+"""
+Provider prompt cache reuse.
+Runs new generations (with RAG context) and a multi-turn conversation against
+the OpenAI stub, which emulates OpenAI's automatic prefix caching, and reports
+how many prompt tokens were served from the cache and the resulting input cost.
+
+Usage (from backend/):
+    python -m benchmarks.prompt_cache --generations 20 --turns 6
+"""
+
+import json
+import asyncio
+import argparse
+import tempfile
+from typing import Any, Dict
+import httpx
+from cryptography.fernet import Fernet
+
+from .run import _free_port, _git_commit, start_app, start_stubs, write_sessions
+
+# gpt-4o-mini input price per 1M tokens; cached input tokens are billed at half
+INPUT_COST = 0.15
+CACHED_DISCOUNT = 0.5
+
+
+def _usage(before: Dict[str, int], after: Dict[str, int]) -> Dict[str, Any]:
+    prompt = after["prompt_tokens"] - before["prompt_tokens"]
+    cached = after["cached_tokens"] - before["cached_tokens"]
+    cost = ((prompt - cached) + cached * CACHED_DISCOUNT) * INPUT_COST / 1_000_000
+    return {
+        "prompt_tokens": prompt,
+        "cached_tokens": cached,
+        "cached_share": round(cached / prompt, 3) if prompt else 0.0,
+        "input_cost_usd": round(cost, 6),
+        "input_cost_uncached_usd": round(prompt * INPUT_COST / 1_000_000, 6),
+    }
+
+
+async def measure(base_url: str, openai_url: str, generations: int, turns: int) -> Dict[str, Any]:
+    async with httpx.AsyncClient(base_url=base_url, timeout=120.0) as client, httpx.AsyncClient(base_url=openai_url) as stub:
+        before = (await stub.get("/stub/stats")).json()
+        for i in range(generations):
+            response = await client.post("/generate-email-rag", data={"prompt": f"promo email for product line {i}"})
+            response.raise_for_status()
+        after_generations = (await stub.get("/stub/stats")).json()
+
+        history = []
+        for turn in range(turns):
+            prompt = f"Make it more playful, round {turn}"
+            response = await client.post("/generate-email", data={"prompt": prompt, "history": json.dumps(history)})
+            response.raise_for_status()
+            history.extend([
+                {"role": "user", "content": prompt},
+                {"role": "assistant", "content": response.json()["html"]},
+            ])
+        after_conversation = (await stub.get("/stub/stats")).json()
+
+    return {
+        "new_generations": {"requests": generations, **_usage(before, after_generations)},
+        "conversation": {"turns": turns, **_usage(after_generations, after_conversation)},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prompt tokens served from the provider prompt cache")
+    parser.add_argument("--generations", type=int, default=20, help="Distinct /generate-email-rag requests")
+    parser.add_argument("--turns", type=int, default=6, help="Turns of a /generate-email conversation")
+    cli = parser.parse_args()
+
+    args = argparse.Namespace(
+        openai_latency_ms=20.0, openai_token_ms=0.05, google_latency_ms=0.0,
+        supabase_latency_ms=5.0, seed_templates=20, no_hybrid=False, workers=1, log_level="WARNING",
+    )
+    ports = {"openai": _free_port(), "google": _free_port(), "supabase": _free_port(), "app": _free_port()}
+    fernet_key = Fernet.generate_key().decode()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        write_sessions(workdir, fernet_key)
+        stubs = start_stubs(args, ports)
+        app = None
+        try:
+            app = start_app(args, ports, workdir, fernet_key)
+            results = asyncio.run(measure(
+                f"http://127.0.0.1:{ports['app']}", f"http://127.0.0.1:{ports['openai']}", cli.generations, cli.turns
+            ))
+        finally:
+            for process in (app, stubs):
+                if process is not None:
+                    process.terminate()
+                    process.wait(timeout=10)
+
+    print(json.dumps({"meta": {"commit": _git_commit()}, **results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""
+RAG context cache.
+Sends /generate-email-rag requests drawn from a few popular briefs and
+compares the RAG cache off (RAG_CACHE_TTL=0) and on: retrieval RPCs and
+embedding calls made, hit ratio and request latency. With the cache on it
+then saves a template and checks that the next request for a cached brief
+misses (the write bumped the corpus version).
+
+Usage (from backend/):
+    python -m benchmarks.rag_cache --requests 60 --briefs 5
+"""
+
+import os
+import re
+import json
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+from typing import Any, Dict, List
+import httpx
+from cryptography.fernet import Fernet
+
+from .run import _free_port, _git_commit, _percentile, start_app, start_stubs, write_sessions
+
+STAGE_COUNT = re.compile(r'^stage_duration_seconds_count\{stage="(rag_rpc|embedding)"\} ([0-9.e+-]+)', re.MULTILINE)
+CACHE = re.compile(r'^cache_requests_total\{cache="rag_context",result="(hit|miss)"\} ([0-9.e+-]+)', re.MULTILINE)
+
+
+async def _counters(client: httpx.AsyncClient) -> Dict[str, float]:
+    text = (await client.get("/metrics")).text
+    counters = {stage: float(value) for stage, value in STAGE_COUNT.findall(text)}
+    counters.update({f"cache_{result}": float(value) for result, value in CACHE.findall(text)})
+    return counters
+
+
+async def measure(base_url: str, prompts: List[str], check_invalidation: bool) -> Dict[str, Any]:
+    latencies = []
+    async with httpx.AsyncClient(base_url=base_url, timeout=120.0) as client:
+        before = await _counters(client)
+        for prompt in prompts:
+            started = time.perf_counter()
+            response = await client.post("/generate-email-rag", data={"prompt": prompt})
+            response.raise_for_status()
+            latencies.append(time.perf_counter() - started)
+        after = await _counters(client)
+
+        delta = {name: int(after.get(name, 0) - before.get(name, 0)) for name in after}
+        lookups = delta.get("cache_hit", 0) + delta.get("cache_miss", 0)
+        result: Dict[str, Any] = {
+            "requests": len(prompts),
+            "retrieval_rpcs": delta.get("rag_rpc", 0),
+            "embedding_calls": delta.get("embedding", 0),
+            "cache_hit_ratio": round(delta.get("cache_hit", 0) / lookups, 3) if lookups else None,
+            "request_p50_ms": round(_percentile(latencies, 50) * 1000, 1),
+            "request_p95_ms": round(_percentile(latencies, 95) * 1000, 1),
+        }
+
+        if check_invalidation:
+            response = await client.post("/save-template", data={
+                "subject": prompts[0], "description": "Saved during the benchmark", "template_code": "<html></html>",
+            })
+            response.raise_for_status()
+            before = await _counters(client)
+            (await client.post("/generate-email-rag", data={"prompt": prompts[0]})).raise_for_status()
+            after = await _counters(client)
+            result["miss_after_save"] = after.get("cache_miss", 0) - before.get("cache_miss", 0) == 1
+        return result
+
+
+def run_case(cli: argparse.Namespace, prompts: List[str], ttl: float) -> Dict[str, Any]:
+    args = argparse.Namespace(
+        openai_latency_ms=cli.openai_latency_ms, openai_token_ms=0.2, google_latency_ms=0.0,
+        supabase_latency_ms=cli.supabase_latency_ms, seed_templates=200, no_hybrid=False, workers=1,
+        log_level="WARNING",
+    )
+    ports = {"openai": _free_port(), "google": _free_port(), "supabase": _free_port(), "app": _free_port()}
+    fernet_key = Fernet.generate_key().decode()
+    os.environ["RAG_CACHE_TTL"] = str(ttl)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        write_sessions(workdir, fernet_key)
+        stubs = start_stubs(args, ports)
+        app = None
+        try:
+            app = start_app(args, ports, workdir, fernet_key)
+            return asyncio.run(measure(f"http://127.0.0.1:{ports['app']}", prompts, check_invalidation=ttl > 0))
+        finally:
+            for process in (app, stubs):
+                if process is not None:
+                    process.terminate()
+                    process.wait(timeout=10)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="RAG context cache on repeated briefs")
+    parser.add_argument("--requests", type=int, default=60)
+    parser.add_argument("--briefs", type=int, default=5, help="Distinct popular briefs")
+    parser.add_argument("--openai-latency-ms", type=float, default=200.0)
+    parser.add_argument("--supabase-latency-ms", type=float, default=60.0)
+    parser.add_argument("--seed", type=int, default=11)
+    cli = parser.parse_args()
+
+    rng = random.Random(cli.seed)
+    briefs = [f"Newsletter for our {topic} subscribers" for topic in
+              ["running", "cooking", "travel", "gaming", "gardening", "photography", "music", "finance"][:cli.briefs]]
+    prompts = [rng.choice(briefs) for _ in range(cli.requests)]
+
+    report = {
+        "meta": {"commit": _git_commit(), "requests": cli.requests, "briefs": len(briefs),
+                 "supabase_latency_ms": cli.supabase_latency_ms},
+        "cache_off": run_case(cli, prompts, ttl=0),
+        "cache_on": run_case(cli, prompts, ttl=3600),
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+Recall vs. memory of the local vector index.
+Builds model.vector_index.VectorIndex over a fixture corpus for each
+combination of dimensions, quantization and re-ranking, and reports
+recall@k against exact full-precision search, memory per vector (and
+extrapolated to 100k templates) and query latency.
+
+The default fixture is synthetic: topic clusters with energy concentrated in
+the leading dimensions, like text-embedding-3 outputs. Real embeddings can be
+used instead with --corpus (a .npy array of shape [n, dimensions]); queries
+are then held-out rows with a little noise.
+
+Usage (from backend/):
+    python -m benchmarks.recall --templates 20000 --queries 200
+    python -m benchmarks.recall --corpus embeddings.npy --dims 1536,512,256
+"""
+
+import json
+import time
+import argparse
+from typing import Any, Dict, List
+import numpy as np
+
+from model.vector_index import VectorIndex, shorten
+from .run import _git_commit, _percentile
+
+EXTRAPOLATE_TO = 100_000
+
+
+def synthetic_corpus(templates: int, queries: int, dimensions: int, seed: int):
+    rng = np.random.default_rng(seed)
+    # Leading dimensions carry most of the signal (shortened embeddings keep it)
+    spectrum = (np.arange(dimensions) + 1.0) ** -0.5
+    topics = rng.normal(size=(max(templates // 100, 10), dimensions)) * spectrum
+    assignments = rng.integers(0, len(topics), templates)
+    corpus = topics[assignments] + 0.8 * rng.normal(size=(templates, dimensions)) * spectrum
+    picks = rng.integers(0, templates, queries)
+    query_vectors = corpus[picks] + 0.6 * rng.normal(size=(queries, dimensions)) * spectrum
+    return shorten(corpus), shorten(query_vectors)
+
+
+def file_corpus(path: str, queries: int, seed: int):
+    vectors = shorten(np.load(path))
+    rng = np.random.default_rng(seed)
+    held_out = rng.choice(len(vectors), size=min(queries, len(vectors) // 10), replace=False)
+    mask = np.ones(len(vectors), dtype=bool)
+    mask[held_out] = False
+    noisy = vectors[held_out] + 0.01 * rng.normal(size=vectors[held_out].shape)
+    return vectors[mask], shorten(noisy)
+
+
+def evaluate(corpus: np.ndarray, queries: np.ndarray, truth: List[set], k: int,
+             dimensions: int, quantization: str, rerank_factor: int) -> Dict[str, Any]:
+    index = VectorIndex(dimensions, quantization, keep_full=rerank_factor > 0)
+    index.add_many(list(range(len(corpus))), corpus)
+
+    hits, latencies = 0, []
+    for query, expected in zip(queries, truth):
+        started = time.perf_counter()
+        results = index.search(query, k, rerank_factor=rerank_factor)
+        latencies.append(time.perf_counter() - started)
+        hits += len(expected & {key for key, _ in results})
+
+    memory = index.memory_bytes()
+    codes_per_vector = memory["codes"] / len(corpus)
+    return {
+        "dimensions": dimensions,
+        "quantization": quantization,
+        "rerank_factor": rerank_factor,
+        f"recall@{k}": round(hits / (k * len(queries)), 4),
+        "code_bytes_per_vector": round(codes_per_vector, 1),
+        "code_mb_at_100k": round(codes_per_vector * EXTRAPOLATE_TO / 1e6, 1),
+        "query_p50_ms": round(_percentile(latencies, 50) * 1000, 2),
+        "query_p95_ms": round(_percentile(latencies, 95) * 1000, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recall vs. memory of quantized, shortened embeddings")
+    parser.add_argument("--corpus", help=".npy file of real embeddings (default: synthetic fixture)")
+    parser.add_argument("--templates", type=int, default=20000, help="Synthetic corpus size")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--dims", default="1536,512,256,128", help="Index dimensions to compare")
+    parser.add_argument("--quantizations", default="float32,int8,binary")
+    parser.add_argument("--rerank", default="0,4", help="Re-rank factors to compare (0 = none)")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    if args.corpus:
+        corpus, queries = file_corpus(args.corpus, args.queries, args.seed)
+    else:
+        corpus, queries = synthetic_corpus(args.templates, args.queries, 1536, args.seed)
+
+    # Ground truth: exact search over the full-precision vectors
+    truth = [set(np.argsort(-(corpus @ query))[:args.k].tolist()) for query in queries]
+
+    results = []
+    for dimensions in (int(d) for d in args.dims.split(",")):
+        for quantization in args.quantizations.split(","):
+            for rerank_factor in (int(r) for r in args.rerank.split(",")):
+                results.append(evaluate(corpus, queries, truth, args.k, dimensions, quantization, rerank_factor))
+
+    report = {
+        "meta": {
+            "commit": _git_commit(),
+            "corpus": args.corpus or "synthetic",
+            "templates": len(corpus),
+            "queries": len(queries),
+            "full_float32_mb_at_100k": round(corpus.shape[1] * 4 * EXTRAPOLATE_TO / 1e6, 1),
+        },
+        "results": results,
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
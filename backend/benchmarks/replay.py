@@ -0,0 +1,183 @@
+"""
+Offline replay of LLM calls through the model router.
+Replays a trace of (task, input size) entries against the OpenAI stub twice:
+once with the fixed pre-routing settings (gpt-4o-mini, fixed max_tokens) and
+once through model_router.route_for(), and compares latency, tokens and
+estimated cost per task.
+
+Trace format (JSONL), e.g. extracted from "LLM call routed" debug logs:
+    {"task": "subject", "input_tokens": 40}
+    {"task": "edit_full", "input_chars": 18000}
+
+Usage (from backend/):
+    python -m benchmarks.replay --entries 200
+    python -m benchmarks.replay --trace calls.jsonl --model-speedups gpt-4.1-nano=2
+"""
+
+import os
+import json
+import time
+import asyncio
+import random
+import argparse
+import threading
+from collections import defaultdict
+from typing import Any, Dict, List
+import uvicorn
+
+from .run import _free_port, _git_commit, _percentile, _wait_for
+from .stubs import create_openai_stub, parse_speedups
+
+# Settings every call used before routing existed
+BASELINE_SETTINGS = {
+    "subject": {"max_tokens": 60, "temperature": 0.7},
+    "metadata": {"max_tokens": 4000, "temperature": 0.3},
+    "enhancement": {"max_tokens": 300, "temperature": 0.7},
+    "generation": {"max_tokens": 4000, "temperature": 0.3},
+    "edit_patch": {"max_tokens": 1500, "temperature": 0.2},
+    "edit_full": {"max_tokens": 4000, "temperature": 0.3},
+}
+
+# Synthetic trace: task -> (weight, min input tokens, max input tokens)
+SYNTHETIC_MIX = {
+    "enhancement": (30, 10, 60),
+    "generation": (25, 1500, 4000),
+    "edit_patch": (20, 1500, 6000),
+    "edit_full": (5, 1500, 6000),
+    "metadata": (15, 2600, 2800),
+    "subject": (5, 10, 60),
+}
+
+# Candidate models used for the replay unless LLM_MODELS_<TASK> is already set
+DEMO_ROUTES = {
+    "LLM_MODELS_SUBJECT": "gpt-4.1-nano,gpt-4o-mini",
+    "LLM_MODELS_METADATA": "gpt-4.1-nano,gpt-4o-mini",
+    "LLM_MODELS_ENHANCEMENT": "gpt-4.1-nano,gpt-4o-mini",
+    "LLM_MODELS_GENERATION": "gpt-4o,gpt-4o-mini",
+}
+
+# System prompts selecting the stub's canned output for each task
+STUB_SYSTEM = {
+    "subject": "Generate a short, catchy email subject line.",
+    "metadata": "You are a helpful assistant that analyzes emails. Output JSON only.",
+    "enhancement": "You are an expert prompt engineer.",
+    "generation": "You are an expert HTML email template generator.",
+    "edit_patch": "You edit existing HTML email templates by returning a JSON patch.",
+    "edit_full": "You are an expert HTML email template generator.",
+}
+
+
+def load_trace(path: str) -> List[Dict[str, Any]]:
+    entries = []
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                entry = json.loads(line)
+                entry.setdefault("input_tokens", entry.get("input_chars", 4) // 4)
+                entries.append(entry)
+    return entries
+
+
+def synthetic_trace(entries: int, seed: int) -> List[Dict[str, Any]]:
+    rng = random.Random(seed)
+    tasks = list(SYNTHETIC_MIX)
+    weights = [SYNTHETIC_MIX[t][0] for t in tasks]
+    trace = []
+    for _ in range(entries):
+        task = rng.choices(tasks, weights)[0]
+        _, low, high = SYNTHETIC_MIX[task]
+        trace.append({"task": task, "input_tokens": rng.randint(low, high)})
+    return trace
+
+
+def _messages(task: str, input_tokens: int) -> List[Dict[str, str]]:
+    filler = "background:#4f46e5; " if task == "edit_patch" else "lorem "
+    body = (filler * (input_tokens * 4 // len(filler) + 1))[:input_tokens * 4]
+    return [{"role": "system", "content": STUB_SYSTEM[task]}, {"role": "user", "content": body}]
+
+
+async def replay(trace: List[Dict[str, Any]], routed: bool) -> Dict[str, Any]:
+    # Imported here so OPENAI_BASE_URL / LLM_* variables set in main() are picked up
+    from model.model_router import ModelRoute, route_for, chat_completion, _estimate
+
+    stats: Dict[str, Dict[str, Any]] = defaultdict(lambda: {
+        "latencies": [], "completion_tokens": 0, "cost_usd": 0.0, "truncated": 0, "models": defaultdict(int)
+    })
+    for entry in trace:
+        task, input_tokens = entry["task"], entry["input_tokens"]
+        if routed:
+            route = route_for(task, input_tokens=input_tokens)
+        else:
+            settings = BASELINE_SETTINGS[task]
+            route = ModelRoute(task, "gpt-4o-mini", settings["max_tokens"], settings["temperature"], input_tokens, 0, 0.0, 0.0)
+        kwargs = {"response_format": {"type": "json_object"}} if task in ("metadata", "edit_patch") else {}
+
+        started = time.perf_counter()
+        response = await chat_completion(route, _messages(task, input_tokens), **kwargs)
+        task_stats = stats[task]
+        task_stats["latencies"].append(time.perf_counter() - started)
+        completion_tokens = response.usage.completion_tokens
+        task_stats["completion_tokens"] += completion_tokens
+        task_stats["cost_usd"] += _estimate(route.model, response.usage.prompt_tokens, completion_tokens)[1]
+        task_stats["truncated"] += response.choices[0].finish_reason == "length"
+        task_stats["models"][route.model] += 1
+
+    report = {}
+    for task, task_stats in sorted(stats.items()):
+        latencies = task_stats["latencies"]
+        report[task] = {
+            "calls": len(latencies),
+            "models": dict(task_stats["models"]),
+            "p50_ms": round(_percentile(latencies, 50) * 1000, 1),
+            "p95_ms": round(_percentile(latencies, 95) * 1000, 1),
+            "mean_completion_tokens": round(task_stats["completion_tokens"] / len(latencies), 1),
+            "truncated": task_stats["truncated"],
+            "est_cost_usd": round(task_stats["cost_usd"], 5),
+        }
+    all_latencies = [value for s in stats.values() for value in s["latencies"]]
+    report["total"] = {
+        "calls": len(all_latencies),
+        "wall_s": round(sum(all_latencies), 2),
+        "est_cost_usd": round(sum(s["cost_usd"] for s in stats.values()), 5),
+    }
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay LLM calls with fixed settings vs. the model router")
+    parser.add_argument("--trace", help="JSONL trace of {task, input_tokens|input_chars}")
+    parser.add_argument("--entries", type=int, default=200, help="Synthetic trace length (without --trace)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--openai-latency-ms", type=float, default=100.0)
+    parser.add_argument("--openai-token-ms", type=float, default=1.0)
+    parser.add_argument("--model-speedups", default="gpt-4.1-nano=2,gpt-4o=0.75",
+                        help="Per-model latency divisors for the stub")
+    args = parser.parse_args()
+
+    port = _free_port()
+    stub = create_openai_stub(args.openai_latency_ms, args.openai_token_ms, parse_speedups(args.model_speedups))
+    server = uvicorn.Server(uvicorn.Config(stub, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    _wait_for(f"http://127.0.0.1:{port}/docs")
+
+    os.environ.update({"OPENAI_API_KEY": "sk-benchmark-stub-key", "OPENAI_BASE_URL": f"http://127.0.0.1:{port}/v1"})
+    for name, value in DEMO_ROUTES.items():
+        os.environ.setdefault(name, value)
+
+    trace = load_trace(args.trace) if args.trace else synthetic_trace(args.entries, args.seed)
+    report = {
+        "meta": {
+            "commit": _git_commit(),
+            "entries": len(trace),
+            "routes": {name: os.environ[name] for name in sorted(os.environ) if name.startswith("LLM_MODELS_")},
+            "model_speedups": args.model_speedups,
+        },
+        "baseline": asyncio.run(replay(trace, routed=False)),
+        "routed": asyncio.run(replay(trace, routed=True)),
+    }
+    server.should_exit = True
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+"""
+Behaviour against an unreliable upstream.
+Runs the app against an OpenAI stub that injects failures and slow calls and
+compares the client settings in model/llm_client.py:
+- flaky: a fraction of calls fail with 429/500; /generate-email success rate
+  with retries off (LLM_MAX_RETRIES=0) and on
+- tail: a fraction of calls take 10x as long; mean prompt enhancement time
+  with hedging off and on (LLM_HEDGE_AFTER)
+- outage: every call fails for a while; /generate-email-rag latency and the
+  number of upstream calls with the circuit breaker effectively off and on
+
+Usage (from backend/):
+    python -m benchmarks.resilience --requests 40
+"""
+
+import os
+import re
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+from typing import Any, Dict, List
+import httpx
+from cryptography.fernet import Fernet
+
+from .run import _free_port, _git_commit, _percentile, start_app, start_stubs, write_sessions
+
+STAGE_PATTERN = re.compile(r'^stage_duration_seconds_(sum|count)\{stage="prompt_enhancement"\} ([0-9.e+-]+)', re.MULTILINE)
+COUNTER_PATTERN = re.compile(r'^(llm_retries_total|llm_hedges_total|optional_stage_skips_total)\{[^}]*\} ([0-9.e+-]+)', re.MULTILINE)
+
+
+def _summary(results: List[Any]) -> Dict[str, Any]:
+    by_status: Dict[str, List[float]] = {}
+    for status, latency in results:
+        by_status.setdefault(str(status), []).append(latency)
+    return {
+        status: {
+            "count": len(latencies),
+            "p50_ms": round(_percentile(latencies, 50) * 1000, 1),
+            "p95_ms": round(_percentile(latencies, 95) * 1000, 1),
+        }
+        for status, latencies in sorted(by_status.items())
+    }
+
+
+async def _timed_post(client: httpx.AsyncClient, path: str, prompt: str, semaphore: asyncio.Semaphore):
+    async with semaphore:
+        started = time.perf_counter()
+        response = await client.post(path, data={"prompt": prompt})
+        return response.status_code, time.perf_counter() - started
+
+
+async def _scrape(client: httpx.AsyncClient) -> Dict[str, Any]:
+    text = (await client.get("/metrics")).text
+    counters: Dict[str, float] = {}
+    for name, value in COUNTER_PATTERN.findall(text):
+        counters[name] = counters.get(name, 0) + float(value)
+    stage = {kind: float(value) for kind, value in STAGE_PATTERN.findall(text)}
+    if stage.get("count"):
+        counters["prompt_enhancement_mean_ms"] = round(stage["sum"] / stage["count"] * 1000, 1)
+    return counters
+
+
+async def _burst(base_url: str, openai_url: str, path: str, requests: int, concurrency: int, outage_s: float):
+    semaphore = asyncio.Semaphore(concurrency)
+    async with httpx.AsyncClient(base_url=base_url, timeout=120.0) as client, httpx.AsyncClient(base_url=openai_url) as stub:
+        await client.post("/generate-email", data={"prompt": "warm up"})
+        before = (await stub.get("/stub/stats")).json()
+        if outage_s:
+            await stub.post("/stub/outage", params={"seconds": outage_s})
+        results = await asyncio.gather(*(
+            _timed_post(client, path, f"resilience test email {i}", semaphore) for i in range(requests)
+        ))
+        after = (await stub.get("/stub/stats")).json()
+        return {
+            "responses": _summary(results),
+            "upstream_calls": after["requests"] - before["requests"],
+            "upstream_failures": after["failures"] - before["failures"],
+            "metrics": await _scrape(client),
+        }
+
+
+def run_case(cli: argparse.Namespace, env: Dict[str, str], path: str, error_rate: float = 0.0,
+             slow_rate: float = 0.0, outage_s: float = 0.0) -> Dict[str, Any]:
+    args = argparse.Namespace(
+        openai_latency_ms=cli.openai_latency_ms, openai_token_ms=0.2, google_latency_ms=0.0,
+        supabase_latency_ms=5.0, seed_templates=10, no_hybrid=False, workers=1, log_level="ERROR",
+        openai_error_rate=error_rate, openai_slow_rate=slow_rate,
+    )
+    ports = {"openai": _free_port(), "google": _free_port(), "supabase": _free_port(), "app": _free_port()}
+    fernet_key = Fernet.generate_key().decode()
+    saved = {key: os.environ.get(key) for key in env}
+    os.environ.update(env)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        write_sessions(workdir, fernet_key)
+        stubs = start_stubs(args, ports)
+        app = None
+        try:
+            app = start_app(args, ports, workdir, fernet_key)
+            return asyncio.run(_burst(
+                f"http://127.0.0.1:{ports['app']}", f"http://127.0.0.1:{ports['openai']}",
+                path, cli.requests, cli.concurrency, outage_s
+            ))
+        finally:
+            for key, value in saved.items():
+                if value is None:
+                    os.environ.pop(key, None)
+                else:
+                    os.environ[key] = value
+            for process in (app, stubs):
+                if process is not None:
+                    process.terminate()
+                    process.wait(timeout=10)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Retries, hedging and circuit breaking against a faulty OpenAI stub")
+    parser.add_argument("--requests", type=int, default=40)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--openai-latency-ms", type=float, default=200.0)
+    parser.add_argument("--error-rate", type=float, default=0.2, help="Failing fraction of calls (flaky case)")
+    parser.add_argument("--slow-rate", type=float, default=0.1, help="10x slow fraction of calls (tail case)")
+    parser.add_argument("--hedge-after", type=float, default=0.5, help="LLM_HEDGE_AFTER for the tail case")
+    parser.add_argument("--outage-s", type=float, default=30.0, help="Outage length (outage case)")
+    parser.add_argument("--cases", default="flaky,tail,outage")
+    cli = parser.parse_args()
+    cases = {c.strip() for c in cli.cases.split(",")}
+
+    report: Dict[str, Any] = {"meta": {
+        "commit": _git_commit(), "requests": cli.requests, "concurrency": cli.concurrency,
+        "openai_latency_ms": cli.openai_latency_ms,
+    }}
+    if "flaky" in cases:
+        report["flaky"] = {
+            "error_rate": cli.error_rate,
+            "retries_off": run_case(cli, {"LLM_MAX_RETRIES": "0"}, "/generate-email", error_rate=cli.error_rate),
+            "retries_on": run_case(cli, {"LLM_MAX_RETRIES": "2"}, "/generate-email", error_rate=cli.error_rate),
+        }
+    if "tail" in cases:
+        report["tail"] = {
+            "slow_rate": cli.slow_rate,
+            "hedge_off": run_case(cli, {"LLM_HEDGE_AFTER": "0"}, "/generate-email-rag", slow_rate=cli.slow_rate),
+            f"hedge_after_{cli.hedge_after:g}s": run_case(
+                cli, {"LLM_HEDGE_AFTER": str(cli.hedge_after)}, "/generate-email-rag", slow_rate=cli.slow_rate
+            ),
+        }
+    if "outage" in cases:
+        report["outage"] = {
+            "outage_s": cli.outage_s,
+            "breaker_off": run_case(
+                cli, {"LLM_BREAKER_FAILURES": "1000000"}, "/generate-email-rag", outage_s=cli.outage_s
+            ),
+            "breaker_on": run_case(cli, {"LLM_BREAKER_FAILURES": "5"}, "/generate-email-rag", outage_s=cli.outage_s),
+        }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,309 @@
+"""
+Offline end-to-end benchmark.
+Starts the local service stubs and the FastAPI app, drives a weighted mix of
+generate / search / send / upload traffic and reports latency percentiles and
+throughput as JSON (diff the output between commits).
+
+Usage (from backend/):
+    python -m benchmarks.run --duration 30 --concurrency 16 --output bench.json
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import socket
+import asyncio
+import argparse
+import tempfile
+import subprocess
+from io import BytesIO
+from pathlib import Path
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Tuple
+import httpx
+from cryptography.fernet import Fernet
+from PIL import Image
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+DEFAULT_MIX = "generate=4,search=3,send=2,upload=1"
+
+BRIEFS = [
+    "marketing email for shoes",
+    "welcome email for new SaaS users",
+    "monthly newsletter for a coffee shop",
+    "event invitation for a product launch",
+    "order confirmation for an online store",
+    "re-engagement email for inactive customers",
+]
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def _summarize(latencies: List[float], errors: int, elapsed: float) -> Dict[str, Any]:
+    return {
+        "count": len(latencies),
+        "errors": errors,
+        "throughput_rps": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "mean_ms": round(sum(latencies) / len(latencies) * 1000, 2) if latencies else 0.0,
+        "p50_ms": round(_percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(_percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(_percentile(latencies, 99) * 1000, 2),
+    }
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except Exception:
+        return "unknown"
+
+
+def _sample_png() -> bytes:
+    image = Image.new("RGB", (1600, 900), (79, 70, 229))
+    buffer = BytesIO()
+    image.save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+# ==================================================================
+# PROCESS MANAGEMENT
+# ==================================================================
+def _wait_for(url: str, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            httpx.get(url, timeout=1.0)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.1)
+    raise RuntimeError(f"Timed out waiting for {url}")
+
+
+def start_stubs(args: argparse.Namespace, ports: Dict[str, int]) -> subprocess.Popen:
+    cmd = [
+        sys.executable, "-m", "benchmarks.stubs",
+        "--openai-port", str(ports["openai"]),
+        "--google-port", str(ports["google"]),
+        "--supabase-port", str(ports["supabase"]),
+        "--openai-latency-ms", str(args.openai_latency_ms),
+        "--openai-token-ms", str(args.openai_token_ms),
+        "--google-latency-ms", str(args.google_latency_ms),
+        "--supabase-latency-ms", str(args.supabase_latency_ms),
+        "--seed-templates", str(args.seed_templates),
+    ]
+    if args.no_hybrid:
+        cmd.append("--no-hybrid")
+    if getattr(args, "model_speedups", ""):
+        cmd.extend(["--model-speedups", args.model_speedups])
+    if getattr(args, "openai_error_rate", 0):
+        cmd.extend(["--openai-error-rate", str(args.openai_error_rate)])
+    if getattr(args, "openai_slow_rate", 0):
+        cmd.extend(["--openai-slow-rate", str(args.openai_slow_rate)])
+    if getattr(args, "word_embeddings", False):
+        cmd.append("--word-embeddings")
+    process = subprocess.Popen(cmd, cwd=BACKEND_DIR)
+    for name in ("openai", "google", "supabase"):
+        _wait_for(f"http://127.0.0.1:{ports[name]}/docs")
+    return process
+
+
+def start_app(args: argparse.Namespace, ports: Dict[str, int], workdir: str, fernet_key: str) -> subprocess.Popen:
+    env = {
+        **os.environ,
+        "OPENAI_API_KEY": "sk-benchmark-stub-key",
+        "OPENAI_BASE_URL": f"http://127.0.0.1:{ports['openai']}/v1",
+        "SUPABASE_URL": f"http://127.0.0.1:{ports['supabase']}",
+        "SUPABASE_KEY": "benchmark-stub-key",
+        "GOOGLE_CLIENT_ID": "benchmark-client-id",
+        "GOOGLE_CLIENT_SECRET": "benchmark-client-secret",
+        "GOOGLE_TOKEN_URL": f"http://127.0.0.1:{ports['google']}/token",
+        "GMAIL_API_BASE_URL": f"http://127.0.0.1:{ports['google']}",
+        "FERNET_KEY": fernet_key,
+        "SESSION_SECRET": "benchmark-session-secret",
+        "LOG_LEVEL": args.log_level,
+    }
+    cmd = [
+        sys.executable, "-m", "uvicorn", "app:app",
+        "--app-dir", str(BACKEND_DIR),
+        "--host", "127.0.0.1", "--port", str(ports["app"]),
+        "--workers", str(args.workers),
+        "--log-level", "warning", "--no-access-log",
+    ]
+    # App logs go to stderr, so stdout carries only the JSON report
+    process = subprocess.Popen(cmd, cwd=workdir, env=env, stdout=sys.stderr)
+    _wait_for(f"http://127.0.0.1:{ports['app']}/health")
+    return process
+
+
+def write_sessions(workdir: str, fernet_key: str) -> str:
+    """Create a sessions.json with one connected benchmark user."""
+    session_id = "benchmark-session"
+    token = Fernet(fernet_key.encode()).encrypt(b"benchmark-refresh-token").decode()
+    with open(os.path.join(workdir, "sessions.json"), "w") as f:
+        json.dump({session_id: {"email": "bench@example.com", "token": token}}, f)
+    return session_id
+
+
+# ==================================================================
+# SCENARIOS
+# ==================================================================
+def build_scenarios(session_id: str, image: bytes) -> Dict[str, Callable[[httpx.AsyncClient, random.Random], Any]]:
+    """Map scenario name -> coroutine function issuing one request."""
+
+    async def generate(client: httpx.AsyncClient, rng: random.Random):
+        return await client.post("/generate-email-rag", data={"prompt": rng.choice(BRIEFS), "use_rag": "true"})
+
+    async def search(client: httpx.AsyncClient, rng: random.Random):
+        return await client.post("/search-templates", data={"query": rng.choice(BRIEFS), "limit": "5"})
+
+    async def send(client: httpx.AsyncClient, rng: random.Random):
+        return await client.post("/send-email", data={
+            "session_id": session_id,
+            "to": f"user{rng.randint(1, 10000)}@example.com",
+            "subject": "Benchmark",
+            "html_body": "<html><body>" + "<p>Hello benchmark</p>" * 200 + "</body></html>",
+        })
+
+    async def upload(client: httpx.AsyncClient, rng: random.Random):
+        return await client.post("/upload-image", files={"file": ("bench.png", image, "image/png")})
+
+    return {"generate": generate, "search": search, "send": send, "upload": upload}
+
+
+def parse_mix(mix: str) -> List[Tuple[str, float]]:
+    weights = []
+    for part in mix.split(","):
+        name, _, weight = part.partition("=")
+        weights.append((name.strip(), float(weight or 1)))
+    return weights
+
+
+async def drive_load(args: argparse.Namespace, base_url: str, session_id: str) -> Dict[str, Any]:
+    scenarios = build_scenarios(session_id, _sample_png())
+    mix = [(name, weight) for name, weight in parse_mix(args.mix) if name in scenarios]
+    names = [name for name, _ in mix]
+    weights = [weight for _, weight in mix]
+
+    latencies: Dict[str, List[float]] = {name: [] for name in names}
+    errors: Dict[str, int] = {name: 0 for name in names}
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=120.0, limits=limits) as client:
+        # Warm up every scenario once (imports, pools, caches)
+        warmup_failures = {}
+        for name in names:
+            try:
+                response = await scenarios[name](client, random.Random(0))
+                if response.status_code >= 400:
+                    warmup_failures[name] = response.status_code
+            except httpx.HTTPError as e:
+                warmup_failures[name] = type(e).__name__
+
+        deadline = time.perf_counter() + args.duration
+
+        async def worker(worker_id: int):
+            rng = random.Random(args.seed + worker_id)
+            while time.perf_counter() < deadline:
+                name = rng.choices(names, weights)[0]
+                start = time.perf_counter()
+                try:
+                    response = await scenarios[name](client, rng)
+                    ok = response.status_code < 400
+                except httpx.HTTPError:
+                    ok = False
+                if ok:
+                    latencies[name].append(time.perf_counter() - start)
+                else:
+                    errors[name] += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(i) for i in range(args.concurrency)))
+        elapsed = time.perf_counter() - started
+
+    all_latencies = [value for values in latencies.values() for value in values]
+    return {
+        "meta": {
+            "commit": _git_commit(),
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "duration_s": round(elapsed, 2),
+            "concurrency": args.concurrency,
+            "workers": args.workers,
+            "mix": args.mix,
+            "openai_latency_ms": args.openai_latency_ms,
+            "openai_token_ms": args.openai_token_ms,
+            "google_latency_ms": args.google_latency_ms,
+            "supabase_latency_ms": args.supabase_latency_ms,
+            "hybrid_available": not args.no_hybrid,
+        },
+        "scenarios": {name: _summarize(latencies[name], errors[name], elapsed) for name in names},
+        "total": _summarize(all_latencies, sum(errors.values()), elapsed),
+        # A run with failing requests does not measure the intended workload
+        "valid": not warmup_failures and not any(errors.values()),
+        "failed_scenarios": sorted(set(warmup_failures) | {name for name in names if errors[name]}),
+        "warmup_failures": warmup_failures,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline end-to-end API benchmark")
+    parser.add_argument("--duration", type=float, default=20.0, help="Seconds of measured load")
+    parser.add_argument("--concurrency", type=int, default=8, help="Concurrent client workers")
+    parser.add_argument("--workers", type=int, default=1, help="Uvicorn worker processes")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="Weighted scenario mix, e.g. generate=4,search=3")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--openai-latency-ms", type=float, default=300.0)
+    parser.add_argument("--openai-token-ms", type=float, default=2.0)
+    parser.add_argument("--google-latency-ms", type=float, default=80.0)
+    parser.add_argument("--supabase-latency-ms", type=float, default=20.0)
+    parser.add_argument("--seed-templates", type=int, default=50)
+    parser.add_argument("--no-hybrid", action="store_true", help="Stub database without hybrid_search_templates")
+    parser.add_argument("--log-level", default="INFO", help="App LOG_LEVEL during the run (INFO as in production)")
+    parser.add_argument("--allow-errors", action="store_true", help="Exit 0 even if requests failed")
+    parser.add_argument("--output", help="Write the JSON report to this file (default: stdout)")
+    args = parser.parse_args()
+
+    ports = {"openai": _free_port(), "google": _free_port(), "supabase": _free_port(), "app": _free_port()}
+    fernet_key = Fernet.generate_key().decode()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        session_id = write_sessions(workdir, fernet_key)
+        stubs = start_stubs(args, ports)
+        app = None
+        try:
+            app = start_app(args, ports, workdir, fernet_key)
+            report = asyncio.run(drive_load(args, f"http://127.0.0.1:{ports['app']}", session_id))
+        finally:
+            for process in (app, stubs):
+                if process is not None:
+                    process.terminate()
+                    process.wait(timeout=10)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(output + "\n")
+    print(output)
+    if not report["valid"]:
+        print(f"Benchmark invalid: requests failed in {', '.join(report['failed_scenarios'])}", file=sys.stderr)
+        if not args.allow_errors:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
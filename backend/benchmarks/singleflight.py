@@ -0,0 +1,90 @@
+"""
+Request coalescing check.
+Fires N concurrent identical /generate-email-rag requests (and, for contrast,
+N distinct ones) against the app running on the local stubs, and counts the
+upstream LLM completions from the app's /metrics.
+
+Usage (from backend/):
+    python -m benchmarks.singleflight --requests 8
+"""
+
+import re
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+from typing import Any, Dict
+import httpx
+from cryptography.fernet import Fernet
+
+from .run import _free_port, _git_commit, start_app, start_stubs, write_sessions
+
+COMPLETIONS_PATTERN = re.compile(r'^stage_duration_seconds_count\{stage="llm_completion"\} (\d+)', re.MULTILINE)
+
+
+async def _completions(client: httpx.AsyncClient) -> int:
+    match = COMPLETIONS_PATTERN.search((await client.get("/metrics")).text)
+    return int(match.group(1)) if match else 0
+
+
+async def _burst(client: httpx.AsyncClient, prompts: list) -> Dict[str, Any]:
+    before = await _completions(client)
+    started = time.perf_counter()
+    responses = await asyncio.gather(*(
+        client.post("/generate-email-rag", data={"prompt": prompt, "use_rag": "true"}) for prompt in prompts
+    ))
+    elapsed = time.perf_counter() - started
+    return {
+        "requests": len(prompts),
+        "ok": sum(1 for r in responses if r.status_code == 200),
+        "identical_bodies": len({r.text for r in responses}) == 1,
+        "llm_completions": await _completions(client) - before,
+        "wall_ms": round(elapsed * 1000, 1),
+    }
+
+
+async def measure(base_url: str, requests: int) -> Dict[str, Any]:
+    async with httpx.AsyncClient(base_url=base_url, timeout=120.0) as client:
+        # Warm up clients and pools so the first burst is not skewed
+        await client.post("/generate-email-rag", data={"prompt": "warm up", "use_rag": "true"})
+        duplicates = await _burst(client, ["welcome email for new SaaS users"] * requests)
+        # Whitespace differences normalize to the same request
+        duplicates_ws = await _burst(client, [
+            "re-engagement email " + " " * i + "for inactive customers" for i in range(requests)
+        ])
+        distinct = await _burst(client, [f"newsletter issue {i} for a coffee shop" for i in range(requests)])
+    return {"identical": duplicates, "whitespace_variants": duplicates_ws, "distinct": distinct}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check coalescing of identical generation requests")
+    parser.add_argument("--requests", type=int, default=8, help="Concurrent requests per burst")
+    parser.add_argument("--openai-latency-ms", type=float, default=300.0)
+    cli = parser.parse_args()
+
+    args = argparse.Namespace(
+        openai_latency_ms=cli.openai_latency_ms, openai_token_ms=1.0, google_latency_ms=0.0,
+        supabase_latency_ms=5.0, seed_templates=20, no_hybrid=False, workers=1, log_level="WARNING",
+    )
+    ports = {"openai": _free_port(), "google": _free_port(), "supabase": _free_port(), "app": _free_port()}
+    fernet_key = Fernet.generate_key().decode()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        write_sessions(workdir, fernet_key)
+        stubs = start_stubs(args, ports)
+        app = None
+        try:
+            app = start_app(args, ports, workdir, fernet_key)
+            results = asyncio.run(measure(f"http://127.0.0.1:{ports['app']}", cli.requests))
+        finally:
+            for process in (app, stubs):
+                if process is not None:
+                    process.terminate()
+                    process.wait(timeout=10)
+
+    print(json.dumps({"meta": {"commit": _git_commit(), "requests": cli.requests}, **results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
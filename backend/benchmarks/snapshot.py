@@ -0,0 +1,129 @@
+"""
+Corpus snapshot warm start.
+Starts the Supabase stub with a seeded corpus and compares how long the
+local search index (SEARCH_MODE=local) takes to become ready when built by
+paging every embedding out of the database and when loaded from a corpus
+snapshot (model/corpus_snapshot.py). It then adds and deletes templates and
+compares a full rebuild with the snapshot's catch-up (ID scan + added rows),
+writes a delta, and checks that every variant returns the same top results.
+
+Usage (from backend/):
+    python -m benchmarks.snapshot --templates 3000 --changes 50
+"""
+
+import os
+import json
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+from typing import Any, Dict, List
+import httpx
+
+from .run import _free_port, _git_commit, start_stubs
+
+
+def _dir_bytes(path: str) -> int:
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names)
+
+
+def _random_vector(rng: random.Random, dimensions: int = 1536) -> List[float]:
+    return [rng.gauss(0, 1) for _ in range(dimensions)]
+
+
+async def _timed(coro) -> Any:
+    started = time.perf_counter()
+    result = await coro
+    return result, round((time.perf_counter() - started) * 1000, 1)
+
+
+async def measure(supabase_url: str, cli: argparse.Namespace, workdir: str) -> Dict[str, Any]:
+    # Settings are read at import time
+    os.environ.update({"SUPABASE_URL": supabase_url, "SUPABASE_KEY": "benchmark-stub-key",
+                       "OPENAI_API_KEY": "sk-benchmark-stub-key", "LOG_LEVEL": "WARNING"})
+    from model.corpus_snapshot import CorpusSnapshot, export_delta, export_snapshot
+    from model.search_backend import LocalTemplateIndex
+
+    rng = random.Random(cli.seed)
+    queries = [_random_vector(rng) for _ in range(cli.queries)]
+    path = os.path.join(workdir, "snapshot")
+
+    async def top_ids(index: LocalTemplateIndex) -> List[List[str]]:
+        return [[row["id"] for row in await index.search(query, 5)] for query in queries]
+
+    result: Dict[str, Any] = {}
+    database = LocalTemplateIndex(snapshot_path="")
+    _, result["database_build_ms"] = await _timed(database.get_index())
+    expected = await top_ids(database)
+
+    manifest, result["export_ms"] = await _timed(export_snapshot(path))
+    result["snapshot_bytes"] = _dir_bytes(path)
+
+    started = time.perf_counter()
+    snapshot = CorpusSnapshot(path)
+    snapshot.index(database.dimensions, database.quantization)
+    result["snapshot_map_ms"] = round((time.perf_counter() - started) * 1000, 1)
+
+    warm = LocalTemplateIndex(snapshot_path=path)
+    _, result["snapshot_warm_start_ms"] = await _timed(warm.get_index())
+    result["snapshot_results_match"] = await top_ids(warm) == expected
+
+    # Changes since the snapshot
+    async with httpx.AsyncClient(base_url=supabase_url, timeout=60.0) as client:
+        added = [{
+            "subject": f"Added template {i}", "description": "Added after the snapshot",
+            "template_code": "<html><body>added</body></html>", "category": "Other",
+            "visibility": "public", "embedding": _random_vector(rng),
+        } for i in range(cli.changes)]
+        (await client.post("/rest/v1/email_templates", json=added)).raise_for_status()
+        ids = sorted(snapshot.ids())
+        for template_id in rng.sample(ids, min(cli.changes, len(ids))):
+            (await client.delete("/rest/v1/email_templates", params={"id": f"eq.{template_id}"})).raise_for_status()
+
+    _, result["database_rebuild_ms"] = await _timed(database.refresh())
+    _, result["snapshot_catch_up_ms"] = await _timed(warm.refresh())
+    expected = await top_ids(database)
+    result["catch_up_results_match"] = await top_ids(warm) == expected
+
+    delta, result["delta_export_ms"] = await _timed(export_delta(path))
+    reloaded = LocalTemplateIndex(snapshot_path=path)
+    _, result["delta_warm_start_ms"] = await _timed(reloaded.get_index())
+    result["delta_results_match"] = await top_ids(reloaded) == expected
+    result["delta"] = {"added": delta["added"], "removed": len(delta["removed_ids"])}
+    result["templates"] = manifest["templates"]
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local index warm start from a corpus snapshot")
+    parser.add_argument("--templates", type=int, default=3000)
+    parser.add_argument("--changes", type=int, default=50, help="Templates added and deleted after the snapshot")
+    parser.add_argument("--queries", type=int, default=20)
+    parser.add_argument("--supabase-latency-ms", type=float, default=20.0)
+    parser.add_argument("--seed", type=int, default=5)
+    cli = parser.parse_args()
+
+    args = argparse.Namespace(
+        openai_latency_ms=0.0, openai_token_ms=0.0, google_latency_ms=0.0,
+        supabase_latency_ms=cli.supabase_latency_ms, seed_templates=cli.templates, no_hybrid=False,
+    )
+    ports = {"openai": _free_port(), "google": _free_port(), "supabase": _free_port()}
+    stubs = start_stubs(args, ports)
+    try:
+        with tempfile.TemporaryDirectory() as workdir:
+            result = asyncio.run(measure(f"http://127.0.0.1:{ports['supabase']}", cli, workdir))
+    finally:
+        stubs.terminate()
+        stubs.wait(timeout=10)
+
+    report = {
+        "meta": {"commit": _git_commit(), "templates": cli.templates, "changes": cli.changes,
+                 "supabase_latency_ms": cli.supabase_latency_ms},
+        "result": result,
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
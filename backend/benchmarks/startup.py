@@ -0,0 +1,109 @@
+"""
+Cold-start profile.
+Reports the import-time breakdown of app.py (python -X importtime) and the time
+from process start to the first successful /health response with many
+sessions on disk.
+
+Usage (from backend/):
+    python -m benchmarks.startup --sessions 50000 --top 15
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import subprocess
+from typing import Any, Dict, List
+import httpx
+from cryptography.fernet import Fernet
+
+from .run import BACKEND_DIR, _free_port, _git_commit
+
+
+def _base_env(fernet_key: str) -> Dict[str, str]:
+    return {
+        **os.environ,
+        "GOOGLE_CLIENT_ID": "benchmark-client-id",
+        "GOOGLE_CLIENT_SECRET": "benchmark-client-secret",
+        "FERNET_KEY": fernet_key,
+        "SESSION_SECRET": "benchmark-session-secret",
+        "LOG_LEVEL": "WARNING",
+    }
+
+
+def profile_imports(env: Dict[str, str], top: int) -> Dict[str, Any]:
+    """Run `import app` under -X importtime and return the slowest modules."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app"],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True
+    )
+    modules: List[Dict[str, Any]] = []
+    total_us = 0
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = [part.strip() for part in line[len("import time:"):].split("|")]
+        modules.append({"module": name, "self_ms": int(self_us) / 1000, "cumulative_ms": int(cumulative_us) / 1000})
+        if name == "app":
+            total_us = int(cumulative_us)
+    modules.sort(key=lambda m: m["cumulative_ms"], reverse=True)
+    return {"app_import_ms": total_us / 1000, "slowest_modules": modules[:top]}
+
+
+def time_to_first_health(env: Dict[str, str], fernet_key: str, sessions: int) -> float:
+    """Start uvicorn with `sessions` sessions on disk and time the first /health response."""
+    fernet = Fernet(fernet_key.encode())
+    token = fernet.encrypt(b"benchmark-refresh-token").decode()
+    port = _free_port()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        with open(os.path.join(workdir, "sessions.json"), "w") as f:
+            json.dump({f"session-{i}": {"email": f"user{i}@example.com", "token": token} for i in range(sessions)}, f)
+
+        started = time.perf_counter()
+        process = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "app:app", "--app-dir", str(BACKEND_DIR),
+             "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+            cwd=workdir, env=env
+        )
+        try:
+            while True:
+                try:
+                    if httpx.get(f"http://127.0.0.1:{port}/health", timeout=1.0).status_code == 200:
+                        return time.perf_counter() - started
+                except httpx.HTTPError:
+                    pass
+                if process.poll() is not None:
+                    raise RuntimeError("App exited before becoming healthy")
+                time.sleep(0.01)
+        finally:
+            process.terminate()
+            process.wait(timeout=10)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Profile app import time and time to first /health")
+    parser.add_argument("--sessions", type=int, default=20000, help="Sessions written to sessions.json")
+    parser.add_argument("--runs", type=int, default=3, help="Cold starts to measure")
+    parser.add_argument("--top", type=int, default=15, help="Slowest modules to report")
+    args = parser.parse_args()
+
+    fernet_key = Fernet.generate_key().decode()
+    env = _base_env(fernet_key)
+
+    health_times = [time_to_first_health(env, fernet_key, args.sessions) for _ in range(args.runs)]
+    report = {
+        "meta": {"commit": _git_commit(), "sessions": args.sessions, "runs": args.runs},
+        "time_to_first_health_ms": {
+            "min": round(min(health_times) * 1000, 1),
+            "median": round(sorted(health_times)[len(health_times) // 2] * 1000, 1),
+        },
+        **profile_imports(env, args.top),
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
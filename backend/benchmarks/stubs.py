@@ -0,0 +1,743 @@
+"""
+Local stand-ins for OpenAI, Google (OAuth token + Gmail), Supabase and Redis.
+Used by the benchmark runner so the API can be exercised without live services.
+
+Run standalone:
+    python -m benchmarks.stubs --openai-port 9101 --google-port 9102 --supabase-port 9103 --redis-port 9104
+"""
+
+import re
+import json
+import time
+import uuid
+import random
+import asyncio
+import hashlib
+import argparse
+from math import sqrt
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+import uvicorn
+from fastapi import FastAPI, Request, Response
+from fastapi.responses import JSONResponse, StreamingResponse
+
+# ==================================================================
+# CANNED CONTENT
+# ==================================================================
+STUB_HTML = """<!-- SUBJECT: 🚀 Benchmark Launch Alert -->
+<!DOCTYPE html>
+<html><body style="margin:0;padding:0;background:#f4f4f4;">
+<table width="100%" cellpadding="0" cellspacing="0"><tr><td align="center">
+<table width="600" cellpadding="0" cellspacing="0" style="background:#ffffff;">
+<tr><td style="padding:32px;font-family:Arial,sans-serif;">
+<h1 style="color:#1a1a1a;">Big news inside</h1>
+<p style="color:#444444;">{body}</p>
+<a href="https://example.com" style="background:#4f46e5;color:#ffffff;padding:12px 24px;">Shop Now</a>
+</td></tr></table>
+</td></tr></table>
+</body></html>"""
+
+CATEGORIES = ["Marketing", "Newsletter", "Transactional", "Onboarding", "Event"]
+# Emulated prompt caching: minimum cacheable prompt and cache granularity (tokens)
+PROMPT_CACHE_MIN_TOKENS = 1024
+PROMPT_CACHE_STEP_TOKENS = 128
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _fake_embedding(text: str, dimensions: int) -> List[float]:
+    """Deterministic unit vector derived from the text (similar texts share words, not vectors)."""
+    rng = random.Random(hashlib.sha256(text.encode()).digest())
+    vector = [rng.gauss(0, 1) for _ in range(dimensions)]
+    norm = sqrt(sum(v * v for v in vector)) or 1.0
+    return [v / norm for v in vector]
+
+
+# Words ignored by the bag-of-words embeddings
+STOP_WORDS = {"a", "an", "the", "for", "to", "of", "and", "our", "my", "please", "some", "with", "about", "me"}
+
+
+def _word_embedding(text: str, dimensions: int) -> List[float]:
+    """Bag-of-words unit vector: texts with the same content words get similar vectors."""
+    vector = [0.0] * dimensions
+    for word in re.findall(r"[a-z0-9]+", text.lower()):
+        if word in STOP_WORDS:
+            continue
+        # Crude stemming so "shoes" matches "shoe"
+        for i, value in enumerate(_fake_embedding(word.rstrip("s") or word, dimensions)):
+            vector[i] += value
+    norm = sqrt(sum(v * v for v in vector)) or 1.0
+    return [v / norm for v in vector]
+
+
+def _count_tokens(text: str) -> int:
+    """Rough token estimate (4 chars per token)."""
+    return max(1, len(text) // 4)
+
+
+def _message_text(messages: List[Dict[str, Any]]) -> str:
+    parts = []
+    for msg in messages:
+        content = msg.get("content", "")
+        if isinstance(content, list):
+            parts.extend(c.get("text", "") for c in content if c.get("type") == "text")
+        else:
+            parts.append(str(content))
+    return "\n".join(parts)
+
+
+def _patch_text(prompt: str) -> str:
+    """Patch edit recoloring the first background color found in the current template."""
+    match = re.search(r"background:#[0-9a-fA-F]{6}", prompt)
+    if not match:
+        return json.dumps({"full_rewrite": True})
+    color = "#%06x" % random.randrange(0x1000000)
+    return json.dumps({
+        "subject": "🎨 Fresh New Look",
+        "changes": [f"Changed {match.group(0)} to {color}"],
+        "edits": [{"find": match.group(0), "replace": f"background:{color}", "all": True}],
+    })
+
+
+# ==================================================================
+# OPENAI STUB
+# ==================================================================
+def create_openai_stub(
+    latency_ms: float = 300.0,
+    token_ms: float = 2.0,
+    model_speedups: Optional[Dict[str, float]] = None,
+    error_rate: float = 0.0,
+    slow_rate: float = 0.0,
+    word_embeddings: bool = False
+) -> FastAPI:
+    """
+    OpenAI-compatible chat completions and embeddings.
+    Completions honor max_tokens (truncated output, finish_reason "length").
+    Prompt caching is emulated like OpenAI's: prompts of 1024+ tokens report the
+    longest previously seen prefix (in 128-token steps) as cached_tokens.
+    POST /stub/outage?seconds=N makes every call fail with 503 for N seconds.
+
+    Args:
+        latency_ms: Time to first token
+        token_ms: Additional time per output token
+        model_speedups: Per-model divisor of both latencies (e.g. {"gpt-4.1-nano": 2.0})
+        error_rate: Fraction of calls answered with 429 (Retry-After: 1) or 500
+        slow_rate: Fraction of calls that take 10x as long (tail latency)
+        word_embeddings: Bag-of-words embeddings (paraphrases are similar) instead of per-text random ones
+    """
+    model_speedups = model_speedups or {}
+    app = FastAPI()
+    app.state.requests = 0
+    app.state.failures = 0
+    app.state.prompt_tokens = 0
+    app.state.cached_tokens = 0
+    app.state.outage_until = 0.0
+
+    def _fault() -> Optional[Response]:
+        """Injected failure for this call, if any."""
+        if time.monotonic() < app.state.outage_until:
+            app.state.failures += 1
+            return JSONResponse({"error": {"message": "Service unavailable", "type": "server_error"}}, status_code=503)
+        if random.random() < error_rate:
+            app.state.failures += 1
+            if random.random() < 0.5:
+                return JSONResponse(
+                    {"error": {"message": "Rate limit reached", "type": "rate_limit_error"}},
+                    status_code=429, headers={"retry-after": "1"}
+                )
+            return JSONResponse({"error": {"message": "Internal error", "type": "server_error"}}, status_code=500)
+        return None
+
+    cached_prefixes = set()
+
+    def _cached_tokens(model: str, messages: List[Dict[str, Any]]) -> int:
+        """Emulated prompt cache: longest seen prefix of the serialized messages."""
+        serialized = "\n".join(_message_text([m]) for m in messages)
+        serialized = f"{model}\n{serialized}"
+        cached, hit = 0, True
+        for end in range(PROMPT_CACHE_MIN_TOKENS * 4, len(serialized) + 1, PROMPT_CACHE_STEP_TOKENS * 4):
+            digest = hashlib.sha256(serialized[:end].encode()).digest()
+            hit = hit and digest in cached_prefixes
+            if hit:
+                cached = end
+            cached_prefixes.add(digest)
+        return cached // 4
+
+    def _slowdown() -> float:
+        return 10.0 if random.random() < slow_rate else 1.0
+
+    @app.post("/stub/outage")
+    async def outage(seconds: float):
+        app.state.outage_until = time.monotonic() + seconds
+        return {"outage_s": seconds}
+
+    @app.get("/stub/stats")
+    async def stats():
+        return {
+            "requests": app.state.requests,
+            "failures": app.state.failures,
+            "prompt_tokens": app.state.prompt_tokens,
+            "cached_tokens": app.state.cached_tokens,
+        }
+
+    def _completion_text(body: Dict[str, Any]) -> str:
+        messages = body.get("messages", [])
+        system = str(messages[0].get("content", "")) if messages else ""
+        if (body.get("response_format") or {}).get("type") == "json_object":
+            if "JSON patch" in system:
+                return _patch_text(_message_text(messages[1:]))
+            return json.dumps({"description": "Benchmark template description", "category": random.choice(CATEGORIES)})
+        if "HTML email" in system:
+            return STUB_HTML.format(body="Lorem ipsum dolor sit amet. " * 40)
+        if "subject line" in system:
+            return "🚀 Benchmark Subject"
+        # Enhanced prompt: keeps the brief, so different briefs retrieve different templates
+        brief = _message_text(messages[1:])[:200]
+        return f"Create a vibrant marketing email with a hero section, product grid and a clear call-to-action. Brief: {brief}"
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        app.state.requests += 1
+        fault = _fault()
+        if fault is not None:
+            return fault
+        body = await request.json()
+        text = _completion_text(body)
+        model = body.get("model", "gpt-4o-mini")
+        finish_reason = "stop"
+        max_tokens = body.get("max_tokens") or body.get("max_completion_tokens")
+        if max_tokens and _count_tokens(text) > max_tokens:
+            text, finish_reason = text[:max_tokens * 4], "length"
+        speedup = model_speedups.get(model, 1.0) / _slowdown()
+        first_token_ms, per_token_ms = latency_ms / speedup, token_ms / speedup
+        prompt_tokens = _count_tokens(_message_text(body.get("messages", [])))
+        completion_tokens = _count_tokens(text)
+        cached_tokens = min(_cached_tokens(model, body.get("messages", [])), prompt_tokens)
+        app.state.prompt_tokens += prompt_tokens
+        app.state.cached_tokens += cached_tokens
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+            "prompt_tokens_details": {"cached_tokens": cached_tokens},
+        }
+
+        if body.get("stream"):
+            async def events():
+                await asyncio.sleep(first_token_ms / 1000)
+                chunk_size = 16
+                for i in range(0, len(text), chunk_size):
+                    chunk = {
+                        "id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()),
+                        "model": model,
+                        "choices": [{"index": 0, "delta": {"content": text[i:i + chunk_size]}, "finish_reason": None}],
+                    }
+                    yield f"data: {json.dumps(chunk)}\n\n"
+                    await asyncio.sleep(per_token_ms * _count_tokens(text[i:i + chunk_size]) / 1000)
+                final = {
+                    "id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()),
+                    "model": model, "choices": [{"index": 0, "delta": {}, "finish_reason": finish_reason}],
+                    "usage": usage,
+                }
+                yield f"data: {json.dumps(final)}\n\n"
+                yield "data: [DONE]\n\n"
+            return StreamingResponse(events(), media_type="text/event-stream")
+
+        await asyncio.sleep((first_token_ms + per_token_ms * completion_tokens) / 1000)
+        return {
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": text},
+                "finish_reason": finish_reason,
+            }],
+            "usage": usage,
+        }
+
+    @app.post("/v1/embeddings")
+    async def embeddings(request: Request):
+        app.state.requests += 1
+        fault = _fault()
+        if fault is not None:
+            return fault
+        body = await request.json()
+        inputs = body.get("input", "")
+        inputs = inputs if isinstance(inputs, list) else [inputs]
+        dimensions = body.get("dimensions") or 1536
+        embed = _word_embedding if word_embeddings else _fake_embedding
+        await asyncio.sleep(latency_ms * _slowdown() / 4000)
+        return {
+            "object": "list",
+            "model": body.get("model", "text-embedding-3-small"),
+            "data": [
+                {"object": "embedding", "index": i, "embedding": embed(str(text), dimensions)}
+                for i, text in enumerate(inputs)
+            ],
+            "usage": {"prompt_tokens": sum(_count_tokens(str(t)) for t in inputs), "total_tokens": 0},
+        }
+
+    return app
+
+
+# ==================================================================
+# GOOGLE STUB (OAuth token + Gmail send)
+# ==================================================================
+def create_google_stub(latency_ms: float = 80.0) -> FastAPI:
+    """OAuth token refresh and Gmail send endpoints."""
+    app = FastAPI()
+    app.state.sent = 0
+
+    @app.post("/token")
+    async def token():
+        await asyncio.sleep(latency_ms / 1000)
+        return {"access_token": f"ya29.{uuid.uuid4().hex}", "expires_in": 3599, "token_type": "Bearer"}
+
+    @app.post("/gmail/v1/users/me/messages/send")
+    async def send(request: Request):
+        body = await request.json()
+        if not body.get("raw"):
+            return JSONResponse({"error": {"code": 400, "message": "Missing raw"}}, status_code=400)
+        await asyncio.sleep(latency_ms / 1000)
+        app.state.sent += 1
+        return {"id": uuid.uuid4().hex[:16], "threadId": uuid.uuid4().hex[:16], "labelIds": ["SENT"]}
+
+    return app
+
+
+# ==================================================================
+# SUPABASE STUB (PostgREST, RPC, Storage)
+# ==================================================================
+def _matches(row: Dict[str, Any], params: Dict[str, str]) -> bool:
+    """Apply PostgREST filters such as id=eq.5 or embedding=is.null."""
+    for column, expression in params.items():
+        if column in ("select", "order", "limit", "offset", "on_conflict", "columns"):
+            continue
+        op, _, arg = expression.partition(".")
+        value = row.get(column)
+        if op == "not":
+            if _matches(row, {column: arg}):
+                return False
+            continue
+        if op == "eq" and str(value) != arg:
+            return False
+        if op == "is" and arg == "null" and value is not None:
+            return False
+        if op == "in" and str(value) not in arg.strip("()").split(","):
+            return False
+    return True
+
+
+def _project(row: Dict[str, Any], select: Optional[str]) -> Dict[str, Any]:
+    if not select or select.strip() == "*":
+        return dict(row)
+    columns = [c.strip() for c in select.split(",")]
+    return {c: row.get(c) for c in columns}
+
+
+def _cosine(a: List[float], b: List[float]) -> float:
+    return sum(x * y for x, y in zip(a, b))
+
+
+def create_supabase_stub(
+    latency_ms: float = 20.0,
+    seed_templates: int = 50,
+    hybrid_available: bool = True
+) -> FastAPI:
+    """
+    In-memory PostgREST table `email_templates`, search RPCs and a storage bucket.
+
+    Args:
+        latency_ms: Added latency per request
+        seed_templates: Number of fixture templates created at startup
+        hybrid_available: Whether hybrid_search_templates exists (404 otherwise)
+    """
+    app = FastAPI()
+    templates: List[Dict[str, Any]] = []
+    objects: Dict[str, Dict[str, Any]] = {}
+    app.state.templates = templates
+    app.state.objects = objects
+
+    for i in range(seed_templates):
+        subject = f"Fixture template {i}"
+        description = f"Seeded {CATEGORIES[i % len(CATEGORIES)].lower()} email number {i}"
+        templates.append({
+            "id": str(uuid.uuid4()),
+            "subject": subject,
+            "description": description,
+            "template_code": STUB_HTML.format(body=description),
+            "category": CATEGORIES[i % len(CATEGORIES)],
+            "visibility": "public",
+            "embedding": _fake_embedding(f"{subject} {description}", 1536),
+            "created_at": _now(),
+        })
+
+    async def _delay():
+        await asyncio.sleep(latency_ms / 1000)
+
+    def _respond(rows: List[Dict[str, Any]], request: Request, status_code: int = 200) -> Response:
+        if "vnd.pgrst.object" in request.headers.get("accept", ""):
+            if len(rows) != 1:
+                return JSONResponse(
+                    {"code": "PGRST116", "message": "JSON object requested, multiple (or no) rows returned"},
+                    status_code=406
+                )
+            return JSONResponse(rows[0], status_code=status_code)
+        return JSONResponse(rows, status_code=status_code)
+
+    # ---------------- PostgREST ----------------
+    @app.get("/rest/v1/email_templates")
+    async def select_templates(request: Request):
+        await _delay()
+        params = dict(request.query_params)
+        rows = [r for r in templates if _matches(r, params)]
+        if params.get("order"):
+            column, _, direction = params["order"].partition(".")
+            rows.sort(key=lambda r: str(r.get(column) or ""), reverse=direction.startswith("desc"))
+        offset = int(params.get("offset", 0))
+        if params.get("limit"):
+            rows = rows[offset:offset + int(params["limit"])]
+        return _respond([_project(r, params.get("select")) for r in rows], request)
+
+    @app.post("/rest/v1/email_templates")
+    async def insert_templates(request: Request):
+        await _delay()
+        body = await request.json()
+        rows = body if isinstance(body, list) else [body]
+        inserted = []
+        for row in rows:
+            row = {"id": str(uuid.uuid4()), "created_at": _now(), **row}
+            templates.append(row)
+            inserted.append(row)
+        return _respond(inserted, request, status_code=201)
+
+    @app.patch("/rest/v1/email_templates")
+    async def update_templates(request: Request):
+        await _delay()
+        body = await request.json()
+        params = dict(request.query_params)
+        updated = []
+        for row in templates:
+            if _matches(row, params):
+                row.update(body)
+                updated.append(row)
+        return _respond(updated, request)
+
+    @app.delete("/rest/v1/email_templates")
+    async def delete_templates(request: Request):
+        await _delay()
+        params = dict(request.query_params)
+        removed = [r for r in templates if _matches(r, params)]
+        templates[:] = [r for r in templates if not _matches(r, params)]
+        return _respond(removed, request)
+
+    # ---------------- RPC ----------------
+    def _search(query_embedding: List[float], match_count: int) -> List[Dict[str, Any]]:
+        scored = [
+            (_cosine(query_embedding, r["embedding"]), r)
+            for r in templates if r.get("embedding")
+        ]
+        scored.sort(key=lambda item: item[0], reverse=True)
+        results = []
+        for score, row in scored[:match_count]:
+            result = {k: v for k, v in row.items() if k != "embedding"}
+            result["similarity"] = score
+            results.append(result)
+        return results
+
+    @app.post("/rest/v1/rpc/{function}")
+    async def rpc(function: str, request: Request):
+        await _delay()
+        body = await request.json()
+        if function == "hybrid_search_templates" and not hybrid_available:
+            return JSONResponse(
+                {"code": "PGRST202", "message": f"Could not find the function public.{function}"},
+                status_code=404
+            )
+        if function in ("hybrid_search_templates", "semantic_search_templates"):
+            embedding = body.get("query_embedding")
+            if isinstance(embedding, str):
+                embedding = json.loads(embedding)
+            return _search(embedding, int(body.get("match_count", 5)))
+        return JSONResponse({"code": "PGRST202", "message": f"Unknown function {function}"}, status_code=404)
+
+    # ---------------- Storage ----------------
+    @app.post("/storage/v1/object/list/{bucket}")
+    async def list_objects(bucket: str, request: Request):
+        await _delay()
+        body = await request.json()
+        search = body.get("search", "") or ""
+        limit = int(body.get("limit", 100))
+        offset = int(body.get("offset", 0))
+        items = [o for o in objects.values() if o["bucket"] == bucket and o["name"].startswith(search)]
+        items.sort(key=lambda o: o["created_at"], reverse=True)
+        return [
+            {"name": o["name"], "id": o["id"], "created_at": o["created_at"],
+             "metadata": {"size": len(o["data"]), "mimetype": o["content_type"]}}
+            for o in items[offset:offset + limit]
+        ]
+
+    @app.post("/storage/v1/object/{bucket}/{path:path}")
+    async def upload_object(bucket: str, path: str, request: Request):
+        await _delay()
+        key = f"{bucket}/{path}"
+        objects[key] = {
+            "id": str(uuid.uuid4()),
+            "bucket": bucket,
+            "name": path,
+            "data": await request.body(),
+            "content_type": request.headers.get("content-type", "application/octet-stream"),
+            "created_at": _now(),
+        }
+        return {"Key": key, "Id": objects[key]["id"]}
+
+    @app.delete("/storage/v1/object/{bucket}")
+    async def remove_objects(bucket: str, request: Request):
+        await _delay()
+        body = await request.json()
+        removed = []
+        for name in body.get("prefixes", []):
+            obj = objects.pop(f"{bucket}/{name}", None)
+            if obj:
+                removed.append({"name": name, "id": obj["id"]})
+        return removed
+
+    @app.get("/storage/v1/object/public/{bucket}/{path:path}")
+    async def get_object(bucket: str, path: str):
+        obj = objects.get(f"{bucket}/{path}")
+        if not obj:
+            return JSONResponse({"error": "not_found"}, status_code=404)
+        return Response(obj["data"], media_type=obj["content_type"])
+
+    return app
+
+
+# ==================================================================
+# REDIS STUB (RESP2 subset used by the state backends)
+# ==================================================================
+class RedisStub:
+    """
+    Minimal in-memory server speaking the Redis protocol.
+    Supports the commands used by core.backends: GET, SET (EX/PX/NX), DEL, EXISTS,
+    INCR/INCRBY, EXPIRE, MGET, SADD/SREM/SMEMBERS, SCAN, KEYS, FLUSHDB, PING,
+    MULTI/EXEC and connection handshakes.
+    """
+
+    def __init__(self):
+        # Strings as bytes, sets as Python sets of bytes
+        self.data: Dict[bytes, Any] = {}
+        self.expiry: Dict[bytes, float] = {}
+
+    def _alive(self, key: bytes) -> bool:
+        expires_at = self.expiry.get(key)
+        if expires_at is not None and expires_at <= time.time():
+            self.data.pop(key, None)
+            self.expiry.pop(key, None)
+        return key in self.data
+
+    @staticmethod
+    def _encode(value: Any, resp3: bool = False) -> bytes:
+        if value is None:
+            return b"_\r\n" if resp3 else b"$-1\r\n"
+        if isinstance(value, bool):
+            return b":1\r\n" if value else b":0\r\n"
+        if isinstance(value, int):
+            return f":{value}\r\n".encode()
+        if isinstance(value, Exception):
+            return f"-ERR {value}\r\n".encode()
+        if isinstance(value, str):
+            return f"+{value}\r\n".encode()
+        if isinstance(value, dict):
+            return f"%{len(value)}\r\n".encode() + b"".join(
+                RedisStub._encode(k, resp3) + RedisStub._encode(v, resp3) for k, v in value.items()
+            )
+        if isinstance(value, list):
+            return f"*{len(value)}\r\n".encode() + b"".join(RedisStub._encode(v, resp3) for v in value)
+        if isinstance(value, set):
+            return (f"~{len(value)}\r\n" if resp3 else f"*{len(value)}\r\n").encode() + b"".join(
+                RedisStub._encode(v, resp3) for v in value
+            )
+        return b"$" + str(len(value)).encode() + b"\r\n" + value + b"\r\n"
+
+    def execute(self, args: List[bytes]) -> Any:
+        command = args[0].upper().decode()
+        if command == "PING":
+            return "PONG"
+        if command in ("CLIENT", "SELECT"):
+            return "OK"
+        if command == "HELLO":
+            # Acknowledge the requested protocol (the connection handler switches its null encoding)
+            proto = int(args[1]) if len(args) > 1 else 2
+            return {b"server": b"redis", b"version": b"7.2.0", b"proto": proto, b"mode": b"standalone"}
+        if command == "GET":
+            return self.data[args[1]] if self._alive(args[1]) else None
+        if command == "MGET":
+            return [self.data[k] if self._alive(k) else None for k in args[1:]]
+        if command == "SET":
+            key, value, options = args[1], args[2], [a.upper() for a in args[3:]]
+            if b"NX" in options and self._alive(key):
+                return None
+            self.data[key] = value
+            self.expiry.pop(key, None)
+            for flag, scale in ((b"EX", 1.0), (b"PX", 0.001)):
+                if flag in options:
+                    self.expiry[key] = time.time() + int(args[3 + options.index(flag) + 1]) * scale
+            return "OK"
+        if command == "DEL":
+            removed = 0
+            for key in args[1:]:
+                if self._alive(key):
+                    removed += 1
+                self.data.pop(key, None)
+                self.expiry.pop(key, None)
+            return removed
+        if command == "EXISTS":
+            return sum(1 for key in args[1:] if self._alive(key))
+        if command in ("INCR", "INCRBY"):
+            key = args[1]
+            amount = int(args[2]) if command == "INCRBY" else 1
+            value = int(self.data[key]) + amount if self._alive(key) else amount
+            self.data[key] = str(value).encode()
+            return value
+        if command == "SADD":
+            members = self.data[args[1]] if self._alive(args[1]) else set()
+            added = len(set(args[2:]) - members)
+            self.data[args[1]] = members | set(args[2:])
+            return added
+        if command == "SREM":
+            if not self._alive(args[1]):
+                return 0
+            members = self.data[args[1]]
+            removed = len(members & set(args[2:]))
+            members.difference_update(args[2:])
+            if not members:
+                self.data.pop(args[1], None)
+                self.expiry.pop(args[1], None)
+            return removed
+        if command == "SMEMBERS":
+            return set(self.data[args[1]]) if self._alive(args[1]) else set()
+        if command == "EXPIRE":
+            if not self._alive(args[1]):
+                return 0
+            self.expiry[args[1]] = time.time() + int(args[2])
+            return 1
+        if command in ("SCAN", "KEYS"):
+            pattern = b"*"
+            if command == "KEYS":
+                pattern = args[1]
+            elif b"MATCH" in [a.upper() for a in args]:
+                pattern = args[[a.upper() for a in args].index(b"MATCH") + 1]
+            prefix = pattern.rstrip(b"*")
+            keys = [k for k in list(self.data) if k.startswith(prefix) and self._alive(k)]
+            return keys if command == "KEYS" else [b"0", keys]
+        if command == "FLUSHDB":
+            self.data.clear()
+            self.expiry.clear()
+            return "OK"
+        return ValueError(f"unknown command '{command}'")
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        transaction: Optional[List[List[bytes]]] = None  # commands queued after MULTI
+        resp3 = False
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                if not line.startswith(b"*"):
+                    args = line.strip().split()
+                else:
+                    args = []
+                    for _ in range(int(line[1:])):
+                        size = int((await reader.readline())[1:])
+                        args.append((await reader.readexactly(size + 2))[:-2])
+                if not args:
+                    continue
+                command = args[0].upper()
+                if command == b"MULTI":
+                    transaction, reply = [], "OK"
+                elif command == b"EXEC" and transaction is not None:
+                    reply = [self.execute(queued) for queued in transaction]
+                    transaction = None
+                elif command == b"DISCARD" and transaction is not None:
+                    transaction, reply = None, "OK"
+                elif transaction is not None:
+                    transaction.append(args)
+                    reply = "QUEUED"
+                else:
+                    reply = self.execute(args)
+                    if command == b"HELLO":
+                        resp3 = reply[b"proto"] == 3
+                writer.write(self._encode(reply, resp3))
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+
+async def serve_redis_stub(port: int):
+    """Serve the Redis stand-in until cancelled."""
+    stub = RedisStub()
+    server = await asyncio.start_server(stub.handle, "127.0.0.1", port)
+    async with server:
+        await server.serve_forever()
+
+
+# ==================================================================
+# ENTRY POINT
+# ==================================================================
+def parse_speedups(value: str) -> Dict[str, float]:
+    """Parse "model=factor,model=factor" into a dict."""
+    speedups = {}
+    for part in filter(None, (p.strip() for p in (value or "").split(","))):
+        model, _, factor = part.partition("=")
+        speedups[model.strip()] = float(factor or 1)
+    return speedups
+
+
+async def serve_stubs(args: argparse.Namespace):
+    """Serve all stubs on their ports in one event loop."""
+    apps = [
+        (create_openai_stub(args.openai_latency_ms, args.openai_token_ms, parse_speedups(args.model_speedups),
+                            args.openai_error_rate, args.openai_slow_rate, args.word_embeddings),
+         args.openai_port),
+        (create_google_stub(args.google_latency_ms), args.google_port),
+        (create_supabase_stub(args.supabase_latency_ms, args.seed_templates, not args.no_hybrid), args.supabase_port),
+    ]
+    servers = [
+        uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning", access_log=False))
+        for app, port in apps
+    ]
+    tasks = [server.serve() for server in servers]
+    if args.redis_port:
+        tasks.append(serve_redis_stub(args.redis_port))
+    await asyncio.gather(*tasks)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-ins for OpenAI, Google and Supabase")
+    parser.add_argument("--openai-port", type=int, default=9101)
+    parser.add_argument("--google-port", type=int, default=9102)
+    parser.add_argument("--supabase-port", type=int, default=9103)
+    parser.add_argument("--redis-port", type=int, default=0, help="Also serve a Redis stand-in (0 = disabled)")
+    parser.add_argument("--openai-latency-ms", type=float, default=300.0)
+    parser.add_argument("--openai-token-ms", type=float, default=2.0)
+    parser.add_argument("--model-speedups", default="", help="Per-model latency divisors, e.g. gpt-4.1-nano=2")
+    parser.add_argument("--openai-error-rate", type=float, default=0.0, help="Fraction of OpenAI calls failing with 429/500")
+    parser.add_argument("--openai-slow-rate", type=float, default=0.0, help="Fraction of OpenAI calls taking 10x as long")
+    parser.add_argument("--word-embeddings", action="store_true", help="Bag-of-words embeddings (paraphrases are similar)")
+    parser.add_argument("--google-latency-ms", type=float, default=80.0)
+    parser.add_argument("--supabase-latency-ms", type=float, default=20.0)
+    parser.add_argument("--seed-templates", type=int, default=50)
+    parser.add_argument("--no-hybrid", action="store_true", help="Emulate a database without hybrid_search_templates")
+    asyncio.run(serve_stubs(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+"""
+Template version storage.
+Simulates an edit-heavy user: one generated email, then a chain of small
+edits (copy changes, a colour change, an added or removed block), each saved
+with /save-template as a new version of the previous one. Compares
+TEMPLATE_VERSIONING off (full copies), on (deltas) and on without the
+materialized HTML cache: bytes of HTML stored in the Supabase stub, list
+latency, and that every version reads back byte-identical, also after
+deleting the first version.
+
+Usage (from backend/):
+    python -m benchmarks.versions --edits 30 --sections 12
+"""
+
+import os
+import json
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+from typing import Any, Dict, List
+import httpx
+from cryptography.fernet import Fernet
+
+from .run import _free_port, _git_commit, _percentile, start_app, start_stubs, write_sessions
+
+COLORS = ["#1a73e8", "#e8711a", "#188038", "#d93025", "#9334e6"]
+WORDS = ("fresh new deals arrive weekly for loyal members who shop early and save more on every "
+         "order with free shipping exclusive offers and seasonal picks").split()
+
+
+def _sentence(rng: random.Random, words: int = 14) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize() + "."
+
+
+def _section(rng: random.Random, i: int, color: str) -> str:
+    return (
+        f'<tr><td style="padding:24px 32px;font-family:Arial,sans-serif;">\n'
+        f'  <h2 style="margin:0 0 12px;color:{color};font-size:22px;">Section {i}: {_sentence(rng, 4)}</h2>\n'
+        f'  <p style="margin:0 0 12px;color:#333333;font-size:15px;line-height:22px;">{_sentence(rng)} {_sentence(rng)}</p>\n'
+        f'  <a href="https://example.com/offer/{i}" style="display:inline-block;padding:12px 20px;background:{color};'
+        f'color:#ffffff;text-decoration:none;border-radius:4px;">{_sentence(rng, 3)}</a>\n'
+        f'</td></tr>\n'
+    )
+
+
+def _render(sections: List[str]) -> str:
+    return (
+        '<!DOCTYPE html>\n<html><head><meta charset="utf-8"><title>Newsletter</title></head>\n'
+        '<body style="margin:0;padding:0;background:#f4f4f4;">\n'
+        '<table width="100%" cellpadding="0" cellspacing="0"><tr><td align="center">\n'
+        '<table width="600" cellpadding="0" cellspacing="0" style="background:#ffffff;">\n'
+        + "".join(sections) +
+        '</table>\n</td></tr></table>\n</body></html>\n'
+    )
+
+
+def edit_chain(edits: int, sections: int, seed: int) -> List[str]:
+    """The generated email followed by one HTML per edit."""
+    rng = random.Random(seed)
+    color = rng.choice(COLORS)
+    blocks = [_section(rng, i, color) for i in range(sections)]
+    versions = [_render(blocks)]
+    for _ in range(edits):
+        kind = rng.choice(["copy", "copy", "copy", "color", "add", "remove"])
+        if kind == "copy":
+            i = rng.randrange(len(blocks))
+            blocks[i] = _section(random.Random(rng.random()), i, color)
+        elif kind == "color":
+            new_color = rng.choice(COLORS)
+            blocks = [block.replace(color, new_color) for block in blocks]
+            color = new_color
+        elif kind == "add":
+            blocks.insert(rng.randrange(len(blocks) + 1), _section(rng, len(blocks), color))
+        elif len(blocks) > 2:
+            blocks.pop(rng.randrange(len(blocks)))
+        versions.append(_render(blocks))
+    return versions
+
+
+async def measure(base_url: str, supabase_url: str, versions: List[str]) -> Dict[str, Any]:
+    async with httpx.AsyncClient(base_url=base_url, timeout=120.0) as client:
+        ids: List[str] = []
+        for i, html in enumerate(versions):
+            form = {"subject": "Weekly newsletter", "description": f"Edit {i}", "template_code": html}
+            if ids:
+                form["parent_id"] = ids[-1]
+            response = await client.post("/save-template", data=form)
+            response.raise_for_status()
+            ids.append(response.json()["id"])
+
+        async with httpx.AsyncClient(base_url=supabase_url, timeout=60.0) as supabase:
+            rows = (await supabase.get("/rest/v1/email_templates", params={"select": "*"})).json()
+        stored = sum(len(row.get("template_code") or "") + len(row.get("template_delta") or "") for row in rows)
+        deltas = sum(1 for row in rows if row.get("template_delta"))
+
+        latencies = []
+        for _ in range(10):
+            started = time.perf_counter()
+            listed = (await client.get("/list-templates", params={"limit": 100})).json()["templates"]
+            latencies.append(time.perf_counter() - started)
+        by_id = {row["id"]: row["template_code"] for row in listed}
+        identical = all(by_id.get(template_id) == html for template_id, html in zip(ids, versions))
+
+        (await client.delete(f"/delete-template/{ids[0]}")).raise_for_status()
+        after_delete = [(await client.get(f"/get-template/{template_id}")).json()["template"]["template_code"]
+                        for template_id in ids[1:4]]
+        lineage = (await client.get(f"/template-versions/{ids[-1]}")).json()
+
+    return {
+        "versions": len(versions),
+        "html_bytes_saved": sum(len(html) for html in versions),
+        "html_bytes_stored": stored,
+        "rows_stored_as_delta": deltas,
+        "list_p50_ms": round(_percentile(latencies, 50) * 1000, 1),
+        "reads_identical": identical,
+        "identical_after_base_delete": after_delete == versions[1:4],
+        "lineage_versions_listed": lineage.get("count"),
+    }
+
+
+def run_case(cli: argparse.Namespace, versions: List[str], versioning: bool, cache_size: int = 256) -> Dict[str, Any]:
+    args = argparse.Namespace(
+        openai_latency_ms=5.0, openai_token_ms=0.0, google_latency_ms=0.0,
+        supabase_latency_ms=cli.supabase_latency_ms, seed_templates=0, no_hybrid=False, workers=1,
+        log_level="WARNING",
+    )
+    ports = {"openai": _free_port(), "google": _free_port(), "supabase": _free_port(), "app": _free_port()}
+    fernet_key = Fernet.generate_key().decode()
+    os.environ["TEMPLATE_VERSIONING"] = "true" if versioning else "false"
+    os.environ["TEMPLATE_CACHE_SIZE"] = str(cache_size)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        write_sessions(workdir, fernet_key)
+        stubs = start_stubs(args, ports)
+        app = None
+        try:
+            app = start_app(args, ports, workdir, fernet_key)
+            return asyncio.run(measure(
+                f"http://127.0.0.1:{ports['app']}", f"http://127.0.0.1:{ports['supabase']}", versions
+            ))
+        finally:
+            for process in (app, stubs):
+                if process is not None:
+                    process.terminate()
+                    process.wait(timeout=10)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Delta-compressed template versions")
+    parser.add_argument("--edits", type=int, default=30)
+    parser.add_argument("--sections", type=int, default=12, help="Content blocks in the generated email")
+    parser.add_argument("--supabase-latency-ms", type=float, default=10.0)
+    parser.add_argument("--seed", type=int, default=3)
+    cli = parser.parse_args()
+
+    versions = edit_chain(cli.edits, cli.sections, cli.seed)
+    report = {
+        "meta": {"commit": _git_commit(), "edits": cli.edits, "sections": cli.sections,
+                 "mean_html_bytes": sum(len(html) for html in versions) // len(versions)},
+        "versioning_off": run_case(cli, versions, versioning=False),
+        "versioning_on": run_case(cli, versions, versioning=True),
+        # Every read rebuilds the delta chains from the database
+        "versioning_on_no_cache": run_case(cli, versions, versioning=True, cache_size=0),
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+"""
+Core module for cross-cutting infrastructure (metrics, logging and shared state).
+"""
+
+from .metrics import (
+    REGISTRY,
+    MetricsMiddleware,
+    track_stage,
+    record_llm_usage,
+    record_cache,
+    QUEUE_DEPTH
+)
+from .logger import get_logger, RequestIdMiddleware, request_id_var
+from .backends import SessionBackend, CacheBackend, get_session_backend, get_cache_backend
+from .scheduler import PriorityScheduler, call_priority, current_priority
+from .admission import AdmissionController
+from .resilience import RateBudget, CircuitBreaker, backoff_delay, is_retryable
+
+__all__ = [
+    "REGISTRY",
+    "MetricsMiddleware",
+    "track_stage",
+    "record_llm_usage",
+    "record_cache",
+    "QUEUE_DEPTH",
+    "get_logger",
+    "RequestIdMiddleware",
+    "request_id_var",
+    "SessionBackend",
+    "CacheBackend",
+    "get_session_backend",
+    "get_cache_backend",
+    "PriorityScheduler",
+    "call_priority",
+    "current_priority",
+    "AdmissionController",
+    "RateBudget",
+    "CircuitBreaker",
+    "backoff_delay",
+    "is_retryable",
+]
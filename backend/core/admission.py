@@ -0,0 +1,127 @@
+"""
+Admission control for routes backed by slow upstream calls.
+Tracks admitted requests and a moving average of their duration, estimates
+how long a new request would queue before an upstream slot frees up, and
+rejects it with 503 + Retry-After when that exceeds the queue-time budget,
+so overload degrades into fast rejections instead of timeouts.
+
+Usage (as a route dependency):
+    generation_admission = AdmissionController("generation", get_openai_scheduler(), ...)
+
+    @router.post("/generate-email", dependencies=[Depends(generation_admission)])
+"""
+
+import os
+import math
+import time
+import random
+from typing import AsyncIterator, Optional
+from fastapi import HTTPException
+from dotenv import load_dotenv
+
+from .metrics import QUEUE_DEPTH, ADMISSION_REJECTIONS
+from .logger import get_logger
+from .scheduler import PriorityScheduler
+
+# Load environment variables
+load_dotenv()
+
+logger = get_logger(__name__)
+
+# Seconds a request may expect to queue before it is shed (0 disables admission control)
+ADMISSION_QUEUE_BUDGET = float(os.getenv("ADMISSION_QUEUE_BUDGET", "10"))
+# Hard cap on admitted requests per controller (0 = no cap)
+ADMISSION_MAX_INFLIGHT = int(os.getenv("ADMISSION_MAX_INFLIGHT", "0"))
+
+# Weight of the newest request in the moving average of request duration
+_DURATION_ALPHA = 0.2
+MAX_RETRY_AFTER = 120
+
+
+class AdmissionController:
+    """
+    Sheds requests whose expected queue time exceeds a budget.
+
+    A new request expects to wait for the requests admitted beyond the
+    upstream capacity (each holding a slot for about the average request
+    duration) and for calls already queued in the scheduler; the larger
+    estimate decides.
+
+    Args:
+        name: Label for metrics and logs
+        scheduler: Scheduler the requests' upstream calls run through
+        initial_duration_s: Duration assumed until requests have been measured
+        queue_budget_s: Maximum expected queue time (0 disables shedding)
+        max_inflight: Hard cap on admitted requests (0 = none)
+    """
+
+    def __init__(
+        self,
+        name: str,
+        scheduler: PriorityScheduler,
+        initial_duration_s: float,
+        queue_budget_s: float = ADMISSION_QUEUE_BUDGET,
+        max_inflight: int = ADMISSION_MAX_INFLIGHT
+    ):
+        self.name = name
+        self.scheduler = scheduler
+        self.queue_budget_s = queue_budget_s
+        self.max_inflight = max_inflight
+        self.duration_ewma = initial_duration_s
+        self.inflight = 0
+        self._measured = False
+
+    def estimated_wait(self) -> float:
+        """Seconds a request admitted now would expect to queue."""
+        capacity = max(self.scheduler.limits["interactive"], 1)
+        backlog = max(0, self.inflight + 1 - capacity)
+        return max(backlog / capacity * self.duration_ewma, self.scheduler.estimated_wait("interactive"))
+
+    def _retry_after(self) -> Optional[int]:
+        """Seconds the client should wait before retrying, or None to admit."""
+        if self.max_inflight and self.inflight >= self.max_inflight:
+            return max(1, math.ceil(self.duration_ewma))
+        if self.queue_budget_s <= 0:
+            return None
+        wait = self.estimated_wait()
+        if wait <= self.queue_budget_s:
+            return None
+        # Roughly when enough of the backlog has drained to fit the budget again,
+        # spread over one request duration so rejected clients do not retry in lockstep
+        retry_after = wait - self.queue_budget_s + random.uniform(0, self.duration_ewma)
+        return min(MAX_RETRY_AFTER, max(1, math.ceil(retry_after)))
+
+    def _finish(self, seconds: float):
+        self.inflight -= 1
+        QUEUE_DEPTH.dec(queue=f"admitted_{self.name}")
+        if self._measured:
+            self.duration_ewma += _DURATION_ALPHA * (seconds - self.duration_ewma)
+        else:
+            self.duration_ewma, self._measured = seconds, True
+
+    async def __call__(self) -> AsyncIterator[None]:
+        """
+        FastAPI dependency: admit the request or reject it.
+
+        Raises:
+            HTTPException: 503 with Retry-After if the request would queue too long
+        """
+        retry_after = self._retry_after()
+        if retry_after is not None:
+            ADMISSION_REJECTIONS.inc(controller=self.name)
+            logger.warning("Request shed", extra={
+                "controller": self.name, "inflight": self.inflight, "retry_after_s": retry_after
+            })
+            raise HTTPException(
+                503,
+                "Service is busy, please retry shortly",
+                headers={"Retry-After": str(retry_after)}
+            )
+
+        self.inflight += 1
+        QUEUE_DEPTH.inc(queue=f"admitted_{self.name}")
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._finish(time.perf_counter() - started)
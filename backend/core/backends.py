@@ -0,0 +1,500 @@
+"""
+Shared state backends for sessions and caches.
+
+- file:   in-process dict persisted to sessions.json (single worker, default)
+- sqlite: SQLite database in WAL mode, shared by all workers on one host
+- redis:  any Redis-protocol server (Redis, Valkey, KeyDB), shared across hosts
+
+Select with STATE_BACKEND; all values must be JSON-serializable.
+"""
+
+import os
+import json
+import time
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from typing import Any, Dict, Iterable, Iterator, Optional, Tuple
+from dotenv import load_dotenv
+
+from .logger import get_logger
+
+# Load environment variables
+load_dotenv()
+
+logger = get_logger(__name__)
+
+STATE_BACKEND = os.getenv("STATE_BACKEND", "file").lower()
+SESSIONS_FILE = os.getenv("SESSIONS_FILE", "sessions.json")
+STATE_DB_PATH = os.getenv("STATE_DB_PATH", "state.db")
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+REDIS_KEY_PREFIX = os.getenv("REDIS_KEY_PREFIX", "mailer:")
+
+
+# ==================================================================
+# INTERFACES
+# ==================================================================
+class SessionBackend(ABC):
+    """Storage for user sessions (session_id -> session dict)."""
+
+    def load(self):
+        """Warm up the backend (e.g. read persisted sessions). Safe to call repeatedly."""
+
+    @abstractmethod
+    def get(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """Get a session or None."""
+
+    @abstractmethod
+    def put(self, session_id: str, data: Dict[str, Any]):
+        """Create or replace a session."""
+
+    @abstractmethod
+    def delete(self, session_id: str) -> bool:
+        """Delete a session. Returns True if it existed."""
+
+    @abstractmethod
+    def find_by_email(self, email: str) -> Optional[Dict[str, Any]]:
+        """Find a session with a refresh token for this email."""
+
+    @abstractmethod
+    def items(self) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """Iterate over all (session_id, session) pairs."""
+
+    def put_many(self, sessions: Dict[str, Dict[str, Any]]):
+        """Create or replace several sessions at once."""
+        for session_id, data in sessions.items():
+            self.put(session_id, data)
+
+    def delete_many(self, session_ids: Iterable[str]) -> int:
+        """Delete several sessions at once. Returns how many existed."""
+        return sum(1 for session_id in session_ids if self.delete(session_id))
+
+
+class CacheBackend(ABC):
+    """Key-value cache with optional per-key TTL."""
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[Any]:
+        """Get a cached value or None if missing/expired."""
+
+    @abstractmethod
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        """Store a value, expiring after `ttl` seconds if given."""
+
+    @abstractmethod
+    def delete(self, key: str):
+        """Remove a key."""
+
+    @abstractmethod
+    def incr(self, key: str, amount: int = 1) -> int:
+        """Atomically increment an integer counter and return the new value."""
+
+
+# ==================================================================
+# FILE / IN-PROCESS BACKEND
+# ==================================================================
+class FileSessionBackend(SessionBackend):
+    """Sessions in a process-local dict, persisted to a JSON file on every change."""
+
+    def __init__(self, path: str = SESSIONS_FILE):
+        self.path = path
+        self._sessions: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.RLock()
+        self._loaded = False
+
+    def load(self):
+        with self._lock:
+            if self._loaded:
+                return
+            if os.path.exists(self.path):
+                try:
+                    with open(self.path, "r") as f:
+                        self._sessions.update(json.load(f))
+                    logger.info("Loaded sessions from disk", extra={"sessions": len(self._sessions)})
+                except Exception as e:
+                    logger.warning("Failed to load sessions", extra={"error": str(e)})
+            self._loaded = True
+
+    def _save(self):
+        # Write to a temp file and rename, so readers never see a partial file
+        try:
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(self._sessions, f, indent=2)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            logger.warning("Failed to save sessions", extra={"error": str(e)})
+
+    def get(self, session_id: str) -> Optional[Dict[str, Any]]:
+        self.load()
+        return self._sessions.get(session_id)
+
+    def put(self, session_id: str, data: Dict[str, Any]):
+        self.load()
+        with self._lock:
+            self._sessions[session_id] = data
+            self._save()
+
+    def delete(self, session_id: str) -> bool:
+        self.load()
+        with self._lock:
+            if session_id not in self._sessions:
+                return False
+            del self._sessions[session_id]
+            self._save()
+            return True
+
+    def find_by_email(self, email: str) -> Optional[Dict[str, Any]]:
+        self.load()
+        for data in list(self._sessions.values()):
+            if data.get("email") == email and data.get("token"):
+                return data
+        return None
+
+    def items(self) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        self.load()
+        return iter(list(self._sessions.items()))
+
+    def put_many(self, sessions: Dict[str, Dict[str, Any]]):
+        self.load()
+        with self._lock:
+            self._sessions.update(sessions)
+            self._save()
+
+    def delete_many(self, session_ids: Iterable[str]) -> int:
+        self.load()
+        with self._lock:
+            removed = sum(1 for session_id in session_ids if self._sessions.pop(session_id, None) is not None)
+            if removed:
+                self._save()
+            return removed
+
+
+class MemoryCacheBackend(CacheBackend):
+    """Process-local cache (not shared between workers)."""
+
+    # Expired entries are purged every N writes
+    SWEEP_EVERY = 256
+
+    def __init__(self):
+        self._data: Dict[str, Tuple[Optional[float], Any]] = {}
+        self._lock = threading.Lock()
+        self._writes = 0
+
+    def get(self, key: str) -> Optional[Any]:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at is not None and expires_at <= time.time():
+            self._data.pop(key, None)
+            return None
+        return value
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        self._data[key] = (time.time() + ttl if ttl else None, value)
+        self._writes += 1
+        if self._writes % self.SWEEP_EVERY == 0:
+            now = time.time()
+            for stale in [k for k, (expires_at, _) in list(self._data.items()) if expires_at and expires_at <= now]:
+                self._data.pop(stale, None)
+
+    def delete(self, key: str):
+        self._data.pop(key, None)
+
+    def incr(self, key: str, amount: int = 1) -> int:
+        with self._lock:
+            value = int(self.get(key) or 0) + amount
+            self._data[key] = (None, value)
+            return value
+
+
+# ==================================================================
+# SQLITE BACKEND (multi-process, single host)
+# ==================================================================
+class _SQLiteDatabase:
+    """One connection per thread to a WAL-mode SQLite database."""
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS sessions (
+        session_id TEXT PRIMARY KEY,
+        email TEXT,
+        data TEXT NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS sessions_email ON sessions(email);
+    CREATE TABLE IF NOT EXISTS cache (
+        key TEXT PRIMARY KEY,
+        value TEXT NOT NULL,
+        expires_at REAL
+    );
+    """
+
+    def __init__(self, path: str = STATE_DB_PATH):
+        self.path = path
+        self._local = threading.local()
+        with self.connection() as conn:
+            conn.executescript(self.SCHEMA)
+
+    def connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+
+class SQLiteSessionBackend(SessionBackend):
+    """Sessions in SQLite, visible to every worker process on the host."""
+
+    def __init__(self, db: _SQLiteDatabase):
+        self.db = db
+
+    def get(self, session_id: str) -> Optional[Dict[str, Any]]:
+        row = self.db.connection().execute(
+            "SELECT data FROM sessions WHERE session_id = ?", (session_id,)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put(self, session_id: str, data: Dict[str, Any]):
+        self.db.connection().execute(
+            "INSERT OR REPLACE INTO sessions (session_id, email, data) VALUES (?, ?, ?)",
+            (session_id, data.get("email"), json.dumps(data))
+        )
+
+    def delete(self, session_id: str) -> bool:
+        cursor = self.db.connection().execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+        return cursor.rowcount > 0
+
+    def find_by_email(self, email: str) -> Optional[Dict[str, Any]]:
+        for (raw,) in self.db.connection().execute("SELECT data FROM sessions WHERE email = ?", (email,)):
+            data = json.loads(raw)
+            if data.get("token"):
+                return data
+        return None
+
+    def items(self) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        rows = self.db.connection().execute("SELECT session_id, data FROM sessions").fetchall()
+        return ((session_id, json.loads(raw)) for session_id, raw in rows)
+
+    def put_many(self, sessions: Dict[str, Dict[str, Any]]):
+        conn = self.db.connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany(
+                "INSERT OR REPLACE INTO sessions (session_id, email, data) VALUES (?, ?, ?)",
+                [(session_id, data.get("email"), json.dumps(data)) for session_id, data in sessions.items()]
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def delete_many(self, session_ids: Iterable[str]) -> int:
+        conn = self.db.connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            cursor = conn.executemany(
+                "DELETE FROM sessions WHERE session_id = ?", [(session_id,) for session_id in session_ids]
+            )
+            conn.execute("COMMIT")
+            return cursor.rowcount
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+
+class SQLiteCacheBackend(CacheBackend):
+    """Cache in SQLite, shared by every worker process on the host."""
+
+    def __init__(self, db: _SQLiteDatabase):
+        self.db = db
+
+    def get(self, key: str) -> Optional[Any]:
+        row = self.db.connection().execute(
+            "SELECT value, expires_at FROM cache WHERE key = ?", (key,)
+        ).fetchone()
+        if not row:
+            return None
+        if row[1] is not None and row[1] <= time.time():
+            self.delete(key)
+            return None
+        return json.loads(row[0])
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        self.db.connection().execute(
+            "INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)",
+            (key, json.dumps(value), time.time() + ttl if ttl else None)
+        )
+
+    def delete(self, key: str):
+        self.db.connection().execute("DELETE FROM cache WHERE key = ?", (key,))
+
+    def incr(self, key: str, amount: int = 1) -> int:
+        conn = self.db.connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT value FROM cache WHERE key = ?", (key,)).fetchone()
+            value = (int(json.loads(row[0])) if row else 0) + amount
+            conn.execute(
+                "INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, NULL)",
+                (key, json.dumps(value))
+            )
+            conn.execute("COMMIT")
+            return value
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+
+# ==================================================================
+# REDIS BACKEND (multi-host)
+# ==================================================================
+class RedisSessionBackend(SessionBackend):
+    """
+    Sessions in Redis as JSON strings, plus a set of session IDs per email
+    so lookups by email do not scan the keyspace.
+    """
+
+    def __init__(self, client, prefix: str = REDIS_KEY_PREFIX):
+        self.client = client
+        self.prefix = prefix
+
+    def _key(self, session_id: str) -> str:
+        return f"{self.prefix}session:{session_id}"
+
+    def _email_key(self, email: str) -> str:
+        return f"{self.prefix}session_ids_by_email:{email}"
+
+    def get(self, session_id: str) -> Optional[Dict[str, Any]]:
+        raw = self.client.get(self._key(session_id))
+        return json.loads(raw) if raw else None
+
+    def put(self, session_id: str, data: Dict[str, Any]):
+        self.put_many({session_id: data})
+
+    def delete(self, session_id: str) -> bool:
+        return self.delete_many([session_id]) > 0
+
+    def find_by_email(self, email: str) -> Optional[Dict[str, Any]]:
+        email_key = self._email_key(email)
+        session_ids = [
+            session_id.decode() if isinstance(session_id, bytes) else session_id
+            for session_id in self.client.smembers(email_key)
+        ]
+        if not session_ids:
+            return None
+        raw_sessions = self.client.mget([self._key(session_id) for session_id in session_ids])
+        # Drop IDs of sessions removed without going through this backend
+        stale = [session_id for session_id, raw in zip(session_ids, raw_sessions) if not raw]
+        if stale:
+            self.client.srem(email_key, *stale)
+        sessions = [json.loads(raw) for raw in raw_sessions if raw]
+        sessions = [data for data in sessions if data.get("token")]
+        # The most recently used session is the least likely to have expired
+        return max(sessions, key=lambda data: data.get("last_used", 0), default=None)
+
+    def items(self) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        key_prefix = self._key("")
+        for key in self.client.scan_iter(match=f"{key_prefix}*", count=500):
+            key = key.decode() if isinstance(key, bytes) else key
+            raw = self.client.get(key)
+            if raw:
+                yield key[len(key_prefix):], json.loads(raw)
+
+    def put_many(self, sessions: Dict[str, Dict[str, Any]]):
+        pipe = self.client.pipeline()
+        for session_id, data in sessions.items():
+            pipe.set(self._key(session_id), json.dumps(data))
+            if data.get("email") and data.get("token"):
+                pipe.sadd(self._email_key(data["email"]), session_id)
+        pipe.execute()
+
+    def delete_many(self, session_ids: Iterable[str]) -> int:
+        session_ids = list(session_ids)
+        if not session_ids:
+            return 0
+        raw_sessions = self.client.mget([self._key(session_id) for session_id in session_ids])
+        existing = [(session_id, json.loads(raw)) for session_id, raw in zip(session_ids, raw_sessions) if raw]
+        if not existing:
+            return 0
+        pipe = self.client.pipeline()
+        pipe.delete(*[self._key(session_id) for session_id, _ in existing])
+        for session_id, data in existing:
+            if data.get("email"):
+                pipe.srem(self._email_key(data["email"]), session_id)
+        pipe.execute()
+        return len(existing)
+
+
+class RedisCacheBackend(CacheBackend):
+    """Cache in Redis with native key expiry."""
+
+    def __init__(self, client, prefix: str = REDIS_KEY_PREFIX):
+        self.client = client
+        self.prefix = f"{prefix}cache:"
+
+    def get(self, key: str) -> Optional[Any]:
+        raw = self.client.get(self.prefix + key)
+        return json.loads(raw) if raw is not None else None
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        self.client.set(self.prefix + key, json.dumps(value), px=int(ttl * 1000) if ttl else None)
+
+    def delete(self, key: str):
+        self.client.delete(self.prefix + key)
+
+    def incr(self, key: str, amount: int = 1) -> int:
+        return int(self.client.incrby(self.prefix + key, amount))
+
+
+def _redis_client():
+    """Create a Redis client (requires the optional `redis` package)."""
+    try:
+        import redis
+    except ImportError as e:
+        raise RuntimeError("STATE_BACKEND=redis requires the 'redis' package (pip install redis)") from e
+    return redis.Redis.from_url(REDIS_URL, socket_timeout=5.0, health_check_interval=30)
+
+
+# ==================================================================
+# FACTORY
+# ==================================================================
+_session_backend: Optional[SessionBackend] = None
+_cache_backend: Optional[CacheBackend] = None
+_factory_lock = threading.Lock()
+
+
+def _create_backends() -> Tuple[SessionBackend, CacheBackend]:
+    if STATE_BACKEND == "sqlite":
+        db = _SQLiteDatabase(STATE_DB_PATH)
+        return SQLiteSessionBackend(db), SQLiteCacheBackend(db)
+    if STATE_BACKEND == "redis":
+        client = _redis_client()
+        return RedisSessionBackend(client), RedisCacheBackend(client)
+    if STATE_BACKEND != "file":
+        logger.warning("Unknown STATE_BACKEND, using file", extra={"backend": STATE_BACKEND})
+    return FileSessionBackend(SESSIONS_FILE), MemoryCacheBackend()
+
+
+def _init_backends():
+    global _session_backend, _cache_backend
+    with _factory_lock:
+        if _session_backend is None:
+            _session_backend, _cache_backend = _create_backends()
+            logger.info("State backend initialized", extra={"backend": STATE_BACKEND})
+
+
+def get_session_backend() -> SessionBackend:
+    """Get the configured session backend (created on first use)."""
+    if _session_backend is None:
+        _init_backends()
+    return _session_backend
+
+
+def get_cache_backend() -> CacheBackend:
+    """Get the configured cache backend (created on first use)."""
+    if _cache_backend is None:
+        _init_backends()
+    return _cache_backend
@@ -0,0 +1,170 @@
+"""
+Structured, non-blocking logging.
+Log records are pushed onto an in-memory queue and written by a background
+listener thread, so request handlers never block on stdout.
+"""
+
+import os
+import sys
+import json
+import queue
+import random
+import logging
+import logging.handlers
+from contextvars import ContextVar
+from typing import Any, Dict, Optional
+from uuid import uuid4
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json").lower()  # "json" or "text"
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", "0.1"))
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+
+# Root of all application loggers (kept separate from uvicorn's loggers)
+ROOT_LOGGER_NAME = "mailer"
+
+# Request ID of the request currently being handled (set by RequestIdMiddleware)
+request_id_var: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+
+# Attributes present on every LogRecord - anything else came in through `extra`
+_STANDARD_ATTRS = set(logging.LogRecord("", 0, "", 0, "", (), None).__dict__) | {"message", "asctime"}
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+class _SafeExtraAdapter(logging.LoggerAdapter):
+    """Logger adapter that renames `extra` keys clashing with LogRecord attributes instead of raising."""
+
+    def process(self, msg, kwargs):
+        extra = kwargs.get("extra")
+        if extra and not _STANDARD_ATTRS.isdisjoint(extra):
+            # e.g. extra={"filename": ...} would raise KeyError inside the log call
+            kwargs["extra"] = {f"{key}_" if key in _STANDARD_ATTRS else key: value for key, value in extra.items()}
+        return msg, kwargs
+
+
+class RequestContextFilter(logging.Filter):
+    """Attach the current request ID and apply sampling to high-volume events."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        # Events logged with extra={"sample": True} are only kept at LOG_SAMPLE_RATE
+        if getattr(record, "sample", False) and random.random() >= LOG_SAMPLE_RATE:
+            return False
+        record.request_id = request_id_var.get()
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """Render records as single-line JSON objects."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry: Dict[str, Any] = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _STANDARD_ATTRS and key != "sample" and value is not None:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class _DropWhenFullQueueHandler(logging.handlers.QueueHandler):
+    """Queue handler that drops records instead of blocking when the queue is full."""
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            pass
+
+
+def setup_logging():
+    """Configure the application logger (idempotent)."""
+    global _listener
+    if _listener is not None:
+        return
+
+    stream_handler = logging.StreamHandler(sys.stdout)
+    if LOG_FORMAT == "json":
+        stream_handler.setFormatter(JsonFormatter())
+    else:
+        stream_handler.setFormatter(logging.Formatter(
+            "%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s"
+        ))
+
+    log_queue: "queue.Queue[logging.LogRecord]" = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    queue_handler = _DropWhenFullQueueHandler(log_queue)
+    queue_handler.addFilter(RequestContextFilter())
+
+    root = logging.getLogger(ROOT_LOGGER_NAME)
+    root.setLevel(LOG_LEVEL)
+    root.handlers = [queue_handler]
+    root.propagate = False
+
+    _listener = logging.handlers.QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+
+
+def shutdown_logging():
+    """Flush queued records and stop the listener thread (called on app shutdown)."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def get_logger(name: str) -> logging.LoggerAdapter:
+    """
+    Get an application logger.
+
+    Args:
+        name: Module name (usually __name__)
+
+    Returns:
+        Logger under the "mailer" namespace (a log call never fails a
+        request because of a reserved `extra` key)
+    """
+    setup_logging()
+    return _SafeExtraAdapter(logging.getLogger(f"{ROOT_LOGGER_NAME}.{name}"))
+
+
+class RequestIdMiddleware:
+    """
+    ASGI middleware assigning a request ID to every HTTP request.
+    Reuses an incoming X-Request-ID header and echoes the ID in the response.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = None
+        for key, value in scope.get("headers", []):
+            if key == b"x-request-id":
+                request_id = value.decode("latin-1")[:128]
+                break
+        request_id = request_id or uuid4().hex
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                message.setdefault("headers", [])
+                message["headers"] = list(message["headers"]) + [(b"x-request-id", request_id.encode("latin-1"))]
+            await send(message)
+
+        token = request_id_var.set(request_id)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            request_id_var.reset(token)
@@ -0,0 +1,374 @@
+"""
+Lightweight Prometheus-style metrics.
+Counters, gauges and histograms kept in process memory and rendered in the
+Prometheus text exposition format by the /metrics endpoint.
+"""
+
+import time
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+# Default latency buckets in seconds (LLM calls can take tens of seconds)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0)
+
+
+def _format_labels(labelnames: Sequence[str], values: Tuple[str, ...], extra: str = "") -> str:
+    """Render a label set as {a="x",b="y"}."""
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class _Metric:
+    """Base class holding one value per label combination."""
+
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple[str, ...], Any] = {}
+
+    def _key(self, labels: Dict[str, Any]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            lines.extend(self._render_value(key, value))
+        return lines
+
+    def _render_value(self, key: Tuple[str, ...], value: Any) -> List[str]:
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {value}"]
+
+
+class Counter(_Metric):
+    """Monotonically increasing value."""
+
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def get(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+
+class Gauge(_Metric):
+    """Value that can go up and down (queue depths, in-flight calls)."""
+
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def get(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+
+class Histogram(_Metric):
+    """Bucketed distribution of observed values (latencies)."""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # [per-bucket counts (+Inf last), sum, count]
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def time(self, **labels) -> Iterator[None]:
+        """Observe the duration of the wrapped block."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def _render_value(self, key: Tuple[str, ...], value: Any) -> List[str]:
+        counts, total, count = value
+        lines = []
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+            cumulative += bucket_count
+            le = "+Inf" if bound == float("inf") else repr(bound)
+            labels = _format_labels(self.labelnames, key, f'le="{le}"')
+            lines.append(f"{self.name}_bucket{labels} {cumulative}")
+        labels = _format_labels(self.labelnames, key)
+        lines.append(f"{self.name}_sum{labels} {total}")
+        lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    """Collection of metrics rendered together."""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def get(self, name: str) -> Optional[_Metric]:
+        return self._metrics.get(name)
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+# ==================================================================
+# APPLICATION METRICS
+# ==================================================================
+REQUEST_LATENCY = REGISTRY.register(Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency by route",
+    ["method", "route", "status"]
+))
+
+STAGE_LATENCY = REGISTRY.register(Histogram(
+    "stage_duration_seconds",
+    "Latency of internal processing stages",
+    ["stage"]
+))
+
+STAGE_ERRORS = REGISTRY.register(Counter(
+    "stage_errors_total",
+    "Failed internal processing stages",
+    ["stage"]
+))
+
+LLM_TOKENS = REGISTRY.register(Counter(
+    "llm_tokens_total",
+    "LLM tokens consumed by model and kind (prompt/completion; cached_prompt = prompt tokens served from the provider's prompt cache)",
+    ["model", "kind"]
+))
+
+CACHE_REQUESTS = REGISTRY.register(Counter(
+    "cache_requests_total",
+    "Cache lookups by cache and result (hit/miss)",
+    ["cache", "result"]
+))
+
+QUEUE_DEPTH = REGISTRY.register(Gauge(
+    "queue_depth",
+    "Work items waiting or running per queue",
+    ["queue"]
+))
+
+ROUTE_LATENCY = REGISTRY.register(Histogram(
+    "llm_route_duration_seconds",
+    "LLM call latency by routed task and model",
+    ["task", "model"]
+))
+
+ROUTE_TOKENS = REGISTRY.register(Counter(
+    "llm_route_tokens_total",
+    "LLM tokens by routed task, model and kind (prompt/cached_prompt/completion)",
+    ["task", "model", "kind"]
+))
+
+TEMPLATE_EDITS = REGISTRY.register(Counter(
+    "template_edits_total",
+    "Template edits by mode (patch/full) and outcome (applied/fallback/error)",
+    ["mode", "outcome"]
+))
+
+ACTIVE_SESSIONS = REGISTRY.register(Gauge(
+    "active_sessions",
+    "Unexpired user sessions seen by the last sweep"
+))
+
+SESSIONS_EXPIRED = REGISTRY.register(Counter(
+    "sessions_expired_total",
+    "Sessions evicted by expiry reason (absolute/idle)",
+    ["reason"]
+))
+
+SCHEDULER_WAIT = REGISTRY.register(Histogram(
+    "scheduler_queue_wait_seconds",
+    "Time upstream calls waited for a scheduler slot by priority class",
+    ["scheduler", "priority"]
+))
+
+ADMISSION_REJECTIONS = REGISTRY.register(Counter(
+    "admission_rejections_total",
+    "Requests shed with 503 by admission controller",
+    ["controller"]
+))
+
+LLM_RETRIES = REGISTRY.register(Counter(
+    "llm_retries_total",
+    "Retried upstream LLM/embedding calls by task and error",
+    ["task", "error"]
+))
+
+LLM_HEDGES = REGISTRY.register(Counter(
+    "llm_hedges_total",
+    "Hedged LLM calls by task and winner (primary/hedge)",
+    ["task", "winner"]
+))
+
+RATE_LIMIT_WAIT = REGISTRY.register(Histogram(
+    "llm_rate_limit_wait_seconds",
+    "Time calls waited for the local requests/tokens-per-minute budget",
+    ["model"]
+))
+
+CIRCUIT_STATE = REGISTRY.register(Gauge(
+    "circuit_breaker_state",
+    "Circuit breaker state (0 closed, 1 half-open, 2 open)",
+    ["breaker"]
+))
+
+OPTIONAL_STAGE_SKIPS = REGISTRY.register(Counter(
+    "optional_stage_skips_total",
+    "Optional stages that fell back to a default, by stage and reason",
+    ["stage", "reason"]
+))
+
+SEMANTIC_CACHE_SIMILARITY = REGISTRY.register(Histogram(
+    "semantic_cache_similarity",
+    "Similarity of the nearest semantic cache entry per lookup (tune the reuse threshold with it)",
+    ["cache"],
+    buckets=(0.5, 0.6, 0.7, 0.8, 0.85, 0.9, 0.92, 0.94, 0.96, 0.98, 0.99, 1.0)
+))
+
+VECTOR_INDEX_BYTES = REGISTRY.register(Gauge(
+    "vector_index_bytes",
+    "Memory held by local vector indexes by index and part (codes/full)",
+    ["index", "part"]
+))
+
+
+@contextmanager
+def track_stage(stage: str) -> Iterator[None]:
+    """
+    Time a processing stage and count its failures.
+
+    Usage:
+        with track_stage("embedding"):
+            ...
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        STAGE_ERRORS.inc(stage=stage)
+        raise
+    finally:
+        STAGE_LATENCY.observe(time.perf_counter() - start, stage=stage)
+
+
+def record_llm_usage(model: str, usage: Any):
+    """
+    Count tokens from an OpenAI response usage object.
+
+    Args:
+        model: Model name used for the call
+        usage: `response.usage` (may be None)
+    """
+    if usage is None:
+        return
+    prompt_tokens = getattr(usage, "prompt_tokens", 0) or 0
+    completion_tokens = getattr(usage, "completion_tokens", 0) or 0
+    cached_tokens = cached_prompt_tokens(usage)
+    if prompt_tokens:
+        LLM_TOKENS.inc(prompt_tokens, model=model, kind="prompt")
+    if cached_tokens:
+        LLM_TOKENS.inc(cached_tokens, model=model, kind="cached_prompt")
+    if completion_tokens:
+        LLM_TOKENS.inc(completion_tokens, model=model, kind="completion")
+
+
+def cached_prompt_tokens(usage: Any) -> int:
+    """Prompt tokens the provider served from its prompt cache (0 if not reported)."""
+    details = getattr(usage, "prompt_tokens_details", None)
+    if isinstance(details, dict):
+        return details.get("cached_tokens") or 0
+    return getattr(details, "cached_tokens", 0) or 0
+
+
+def record_cache(cache: str, hit: bool):
+    """Count a cache lookup (hit ratio = hits / (hits + misses))."""
+    CACHE_REQUESTS.inc(cache=cache, result="hit" if hit else "miss")
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware observing request latency per route template.
+    Uses the matched route path (e.g. /get-template/{template_id}) to keep label cardinality bounded.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+        start = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            route_path = getattr(route, "path", None) or "unmatched"
+            REQUEST_LATENCY.observe(
+                time.perf_counter() - start,
+                method=scope.get("method", ""),
+                route=route_path,
+                status=str(status_code)
+            )
@@ -0,0 +1,182 @@
+"""
+Building blocks for calling rate-limited, occasionally unhealthy upstreams:
+a local requests/tokens-per-minute budget, a circuit breaker, jittered
+exponential backoff and classification of retryable errors.
+"""
+
+import time
+import random
+import asyncio
+from collections import deque
+from typing import Deque, Dict, Optional, Tuple
+
+from .metrics import CIRCUIT_STATE
+from .scheduler import PRIORITIES, current_priority
+
+# HTTP statuses worth retrying (timeouts, conflicts, rate limits, server errors)
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+# Client exceptions without a status code that are worth retrying
+RETRYABLE_ERRORS = {"APITimeoutError", "APIConnectionError", "TimeoutException", "ConnectError"}
+
+
+def is_retryable(error: Exception) -> bool:
+    """True for timeouts, connection errors, 429s and 5xx responses."""
+    status = getattr(error, "status_code", None)
+    if status is not None:
+        return status in RETRYABLE_STATUS
+    return type(error).__name__ in RETRYABLE_ERRORS or isinstance(error, (TimeoutError, ConnectionError))
+
+
+def retry_after_hint(error: Exception) -> Optional[float]:
+    """Seconds from the Retry-After header of an error response, if any."""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    value = headers.get("retry-after")
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+def backoff_delay(attempt: int, base: float, cap: float) -> float:
+    """Full-jitter exponential backoff: uniform(0, min(cap, base * 2^attempt))."""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+class RateBudget:
+    """
+    Sliding one-minute budget of requests and tokens.
+
+    acquire() waits until a call fits under both limits (0 = unlimited), so
+    calls are delayed locally instead of being rejected with 429 upstream.
+    Waiting calls are served by priority class (see core.scheduler), FIFO
+    within a class, so background work never holds the budget ahead of
+    interactive requests.
+    """
+
+    WINDOW_S = 60.0
+
+    def __init__(self, rpm: int = 0, tpm: int = 0):
+        self.rpm = rpm
+        self.tpm = tpm
+        self._calls: Deque[Tuple[float, int]] = deque()
+        self._tokens = 0
+        self._waiters: Dict[str, Deque[object]] = {p: deque() for p in PRIORITIES}
+        self._condition = asyncio.Condition()
+
+    def _expire(self, now: float):
+        while self._calls and now - self._calls[0][0] >= self.WINDOW_S:
+            self._tokens -= self._calls.popleft()[1]
+
+    def _wait_time(self, tokens: int, now: float) -> float:
+        """Seconds until a call of `tokens` fits (0 if it fits now)."""
+        wait = 0.0
+        if self.rpm and len(self._calls) >= self.rpm:
+            wait = self._calls[len(self._calls) - self.rpm][0] + self.WINDOW_S - now
+        if self.tpm and self._tokens + tokens > self.tpm:
+            # Free the oldest calls until enough tokens are released
+            released = self._tokens + tokens - self.tpm
+            for started, used in self._calls:
+                released -= used
+                if released <= 0:
+                    wait = max(wait, started + self.WINDOW_S - now)
+                    break
+        return max(wait, 0.0)
+
+    def _next_waiter(self) -> Optional[object]:
+        for priority in PRIORITIES:
+            if self._waiters[priority]:
+                return self._waiters[priority][0]
+        return None
+
+    async def acquire(self, tokens: int, priority: Optional[str] = None) -> float:
+        """
+        Reserve one request and `tokens` tokens, waiting if the budget is spent.
+
+        Args:
+            tokens: Expected tokens of the call (prompt + max completion)
+            priority: Priority class (defaults to the one set by call_priority)
+
+        Returns:
+            Seconds spent waiting
+        """
+        if not (self.rpm or self.tpm):
+            return 0.0
+        if self.tpm:
+            tokens = min(tokens, self.tpm)
+        waiters = self._waiters[priority or current_priority()]
+        turn = object()
+        started = time.monotonic()
+        async with self._condition:
+            waiters.append(turn)
+            try:
+                while True:
+                    now = time.monotonic()
+                    self._expire(now)
+                    # Only the first waiter of the highest class may take the budget;
+                    # the others sleep until it is served
+                    wait = self._wait_time(tokens, now) if self._next_waiter() is turn else None
+                    if wait is not None and wait <= 0:
+                        self._calls.append((now, tokens))
+                        self._tokens += tokens
+                        return now - started
+                    try:
+                        await asyncio.wait_for(self._condition.wait(), wait)
+                    except asyncio.TimeoutError:
+                        pass
+            finally:
+                waiters.remove(turn)
+                self._condition.notify_all()
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker.
+
+    After `failure_threshold` consecutive failures the circuit opens for
+    `reset_timeout` seconds; then one trial call is allowed (half-open) and
+    its outcome closes or re-opens the circuit.
+    """
+
+    CLOSED, HALF_OPEN, OPEN = 0, 1, 2
+
+    def __init__(self, name: str, failure_threshold: int, reset_timeout: float):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.state = self.CLOSED
+        self._opened_at = 0.0
+        CIRCUIT_STATE.set(self.state, breaker=name)
+
+    def _set_state(self, state: int):
+        self.state = state
+        CIRCUIT_STATE.set(state, breaker=self.name)
+
+    def allow(self) -> bool:
+        """Whether a call may go ahead (moves open -> half-open after the timeout)."""
+        if self.state == self.CLOSED:
+            return True
+        now = time.monotonic()
+        if now - self._opened_at < self.reset_timeout:
+            return False
+        # Open long enough (or the last trial never reported back): let one trial through
+        self._opened_at = now
+        self._set_state(self.HALF_OPEN)
+        return True
+
+    @property
+    def is_open(self) -> bool:
+        """True while calls are being skipped."""
+        return self.state != self.CLOSED and time.monotonic() - self._opened_at < self.reset_timeout
+
+    def record_success(self):
+        self.failures = 0
+        if self.state != self.CLOSED:
+            self._set_state(self.CLOSED)
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            self._opened_at = time.monotonic()
+            self._set_state(self.OPEN)
@@ -0,0 +1,194 @@
+"""
+Priority scheduler for blocking upstream calls (LLM completions, embeddings).
+Calls run on a thread pool so they never block the event loop. Each call
+belongs to a priority class ("interactive" or "background") with its own
+concurrency cap; when a slot frees up, queued interactive calls always start
+before background ones. Queue wait time is recorded per class.
+
+Usage:
+    result = await scheduler.run(client.embeddings.create, model=..., input=...)
+
+    with call_priority("background"):
+        await generate_embedding(text)   # queued behind interactive work
+"""
+
+import time
+import asyncio
+import functools
+import threading
+import contextvars
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from .metrics import QUEUE_DEPTH, SCHEDULER_WAIT
+
+# Highest priority first
+PRIORITIES = ("interactive", "background")
+
+# Weight of the newest call in the moving average of call duration
+_LATENCY_ALPHA = 0.2
+
+_priority_var: contextvars.ContextVar[str] = contextvars.ContextVar("call_priority", default="interactive")
+
+
+@contextmanager
+def call_priority(priority: str) -> Iterator[None]:
+    """Run scheduled calls made inside the block with the given priority class."""
+    if priority not in PRIORITIES:
+        raise ValueError(f"Unknown priority '{priority}' (expected one of {', '.join(PRIORITIES)})")
+    token = _priority_var.set(priority)
+    try:
+        yield
+    finally:
+        _priority_var.reset(token)
+
+
+def current_priority() -> str:
+    """Priority class of calls made in the current context."""
+    return _priority_var.get()
+
+
+class PriorityScheduler:
+    """
+    Concurrency-limited executor with strict priority between classes.
+
+    Args:
+        name: Label for metrics (e.g. "openai")
+        max_concurrency: Calls running at once across all classes
+        limits: Per-class caps (classes not listed may use every slot)
+    """
+
+    def __init__(self, name: str, max_concurrency: int, limits: Optional[Dict[str, int]] = None):
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.limits = {p: min((limits or {}).get(p, max_concurrency), max_concurrency) for p in PRIORITIES}
+        self._running = {p: 0 for p in PRIORITIES}
+        self._waiters: Dict[str, List[Tuple[asyncio.Future, float]]] = {p: [] for p in PRIORITIES}
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._executor_lock = threading.Lock()
+        # Moving average of call duration (None until the first call finishes)
+        self.latency_ewma: Optional[float] = None
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            with self._executor_lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.max_concurrency, thread_name_prefix=self.name
+                    )
+        return self._executor
+
+    def shutdown(self):
+        """Stop the worker threads (called on app shutdown)."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def _can_start(self, priority: str) -> bool:
+        return (
+            sum(self._running.values()) < self.max_concurrency
+            and self._running[priority] < self.limits[priority]
+        )
+
+    def _start(self, priority: str, queued_at: float):
+        self._running[priority] += 1
+        SCHEDULER_WAIT.observe(time.perf_counter() - queued_at, scheduler=self.name, priority=priority)
+
+    def _wake(self):
+        # Hand free slots to waiters, highest class first; a class blocked only
+        # by its own cap does not hold back lower classes
+        for priority in PRIORITIES:
+            waiters = self._waiters[priority]
+            while waiters and self._can_start(priority):
+                future, queued_at = waiters.pop(0)
+                if not future.done():
+                    self._start(priority, queued_at)
+                    future.set_result(None)
+
+    async def _acquire(self, priority: str):
+        queued_at = time.perf_counter()
+        # Waiting callers could not start when they queued; keep FIFO within the class
+        if not self._waiters[priority] and self._can_start(priority):
+            self._start(priority, queued_at)
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        self._waiters[priority].append((future, queued_at))
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Slot was granted as the caller gave up: pass it on
+                self._release(priority)
+            else:
+                self._waiters[priority] = [w for w in self._waiters[priority] if w[0] is not future]
+            raise
+
+    def _release(self, priority: str):
+        self._running[priority] -= 1
+        self._wake()
+
+    async def run(self, fn: Callable[..., Any], *args, priority: Optional[str] = None, **kwargs) -> Any:
+        """
+        Run a blocking function on the scheduler's threads once a slot is free.
+
+        Args:
+            fn: Blocking function (e.g. client.chat.completions.create)
+            *args: Positional arguments for fn
+            priority: Priority class (defaults to the one set by call_priority)
+            **kwargs: Keyword arguments for fn
+
+        Returns:
+            Whatever fn returns
+        """
+        priority = priority or current_priority()
+        queue = f"{self.name}_{priority}"
+        QUEUE_DEPTH.inc(queue=queue)
+        try:
+            await self._acquire(priority)
+            try:
+                # Copy the context so log records keep the request ID
+                call = functools.partial(contextvars.copy_context().run, fn, *args, **kwargs)
+                future = asyncio.get_running_loop().run_in_executor(self._get_executor(), call)
+            except BaseException:
+                self._release(priority)
+                raise
+            # The slot is held until the thread finishes, even if the caller is
+            # cancelled first (the thread cannot be stopped)
+            future.add_done_callback(functools.partial(self._finish, priority, time.perf_counter()))
+            return await asyncio.shield(future)
+        finally:
+            QUEUE_DEPTH.dec(queue=queue)
+
+    def _finish(self, priority: str, started: float, future: asyncio.Future):
+        if not future.cancelled():
+            # Retrieve the error so an abandoned call does not log "never retrieved"
+            if future.exception() is None:
+                self._observe_latency(time.perf_counter() - started)
+        self._release(priority)
+
+    def _observe_latency(self, seconds: float):
+        if self.latency_ewma is None:
+            self.latency_ewma = seconds
+        else:
+            self.latency_ewma += _LATENCY_ALPHA * (seconds - self.latency_ewma)
+
+    def estimated_wait(self, priority: str = "interactive") -> float:
+        """
+        Rough seconds a new call of this class would wait for a slot.
+
+        Args:
+            priority: Priority class
+
+        Returns:
+            0 if it could start now, else queued calls ahead / slots * average call time
+        """
+        if not self._waiters[priority] and self._can_start(priority):
+            return 0.0
+        slots = max(self.limits[priority], 1)
+        return (len(self._waiters[priority]) + 1) / slots * (self.latency_ewma or 0.0)
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """Running and queued calls per class."""
+        return {p: {"running": self._running[p], "queued": len(self._waiters[p])} for p in PRIORITIES}
@@ -0,0 +1,64 @@
+"""
+Request coalescing ("single flight").
+Concurrent calls with the same key share one in-flight execution instead of
+each doing the same expensive work (e.g. a double-clicked generate button).
+"""
+
+import json
+import asyncio
+import hashlib
+from typing import Any, Awaitable, Callable, Dict, TypeVar
+
+from .metrics import record_cache
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """
+    Deduplicate concurrent async calls by key (per process).
+
+    Usage:
+        flight = SingleFlight("generate")
+        result = await flight.do(key, lambda: expensive_call(...))
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._inflight: Dict[str, asyncio.Task] = {}
+
+    @property
+    def inflight(self) -> int:
+        return len(self._inflight)
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[T]]) -> T:
+        """
+        Run `fn` unless a call with the same key is already running, in which
+        case wait for that call and return its result (or raise its error).
+
+        Args:
+            key: Deduplication key (see make_key)
+            fn: Zero-argument coroutine function doing the work
+
+        Returns:
+            Result of the shared call
+        """
+        task = self._inflight.get(key)
+        record_cache(f"singleflight_{self.name}", task is not None)
+        if task is None:
+            task = asyncio.create_task(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        # Shield the shared task: one caller disconnecting must not cancel it for the others
+        return await asyncio.shield(task)
+
+
+def make_key(*parts: Any) -> str:
+    """
+    Build a stable key from JSON-serializable request parts.
+
+    Returns:
+        Hex digest identifying the request
+    """
+    payload = json.dumps(parts, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
@@ -3,27 +3,66 @@ Model module for AI email generation, embeddings, and RAG functionality.
 """
 
 from .routes import router
-from .embeddings import generate_embedding, get_openai_client, openai_client
-from .rag_service import get_rag_context, get_supabase_client, supabase
+from .embeddings import generate_embedding, get_openai_client, get_openai_scheduler, is_openai_configured
+from .llm_client import UpstreamUnavailable, call_openai, get_openai_breaker, upstream_http_error
+from .rag_service import get_rag_context, get_supabase_client, is_supabase_configured, bump_corpus_version
+from .repository import TemplateRepository, ImageStorage, RepositoryTimeout, get_template_repository
+from .search_backend import TemplateSearchBackend, LocalTemplateIndex, get_search_backend
+from .semantic_cache import SemanticCache
+from .corpus_snapshot import CorpusSnapshot, export_snapshot, export_delta
+from .template_versions import DeltaError, make_delta, apply_delta
+from .rag_prefetch import RagPrefetcher, get_rag_prefetcher
 from .email_generator import (
     EMAIL_SYSTEM_PROMPT,
     generate_email_html,
-    img_to_base64,
+    generate_email_patch,
     extract_subject_from_html,
     clean_html_content
 )
+from .model_router import ModelRoute, route_for, chat_completion
+from .html_patcher import PatchError, apply_html_patch
+from .image_optimizer import optimize_image, prepare_vision_image
 
 __all__ = [
     "router",
     "generate_embedding",
     "get_openai_client",
-    "openai_client",
+    "get_openai_scheduler",
+    "is_openai_configured",
+    "UpstreamUnavailable",
+    "call_openai",
+    "get_openai_breaker",
+    "upstream_http_error",
     "get_rag_context",
     "get_supabase_client",
-    "supabase",
+    "is_supabase_configured",
+    "bump_corpus_version",
+    "TemplateRepository",
+    "ImageStorage",
+    "RepositoryTimeout",
+    "get_template_repository",
+    "TemplateSearchBackend",
+    "LocalTemplateIndex",
+    "get_search_backend",
+    "SemanticCache",
+    "CorpusSnapshot",
+    "export_snapshot",
+    "export_delta",
+    "DeltaError",
+    "make_delta",
+    "apply_delta",
+    "RagPrefetcher",
+    "get_rag_prefetcher",
     "EMAIL_SYSTEM_PROMPT",
     "generate_email_html",
-    "img_to_base64",
+    "generate_email_patch",
     "extract_subject_from_html",
     "clean_html_content",
+    "ModelRoute",
+    "route_for",
+    "chat_completion",
+    "PatchError",
+    "apply_html_patch",
+    "optimize_image",
+    "prepare_vision_image",
 ]
@@ -0,0 +1,413 @@
+"""
+Compact on-disk snapshot of the template corpus, for warm-starting the local
+search index (SEARCH_MODE=local) without paging every embedding out of
+Supabase as JSON.
+
+A snapshot directory holds one subdirectory per export and a CURRENT file
+naming the one in use; a new export is written next to the old one and
+CURRENT is swapped atomically, so a worker never loads a half-written
+snapshot. Each export holds:
+    manifest.json                   format, counts, code configurations, deltas
+    metadata.json.gz                columns: id, subject, description, category, visibility, created_at
+    embeddings.npy                  float32 unit vectors, one row per template (memory-mappable)
+    codes-<dims>-<quant>.npy        index codes for LOCAL_INDEX_DIMENSIONS/QUANTIZATION
+    scales-<dims>-int8.npy          per-vector scales of int8 codes
+    bodies.bin, bodies.offsets.npy  zlib-compressed HTML bodies and their byte offsets
+    delta-0001/, delta-0002/, ...   templates added since (same files) and removed IDs
+
+Workers memory-map the arrays, so loading takes milliseconds and the pages
+are shared between processes through the OS page cache.
+
+Usage (from backend/):
+    python -m model.corpus_snapshot export snapshots/templates           # full snapshot
+    python -m model.corpus_snapshot export snapshots/templates --delta   # changes since
+"""
+
+import os
+import gzip
+import json
+import zlib
+import shutil
+import asyncio
+import argparse
+from datetime import datetime, timezone
+from typing import Any, Dict, Hashable, Iterable, List, Optional, Sequence, Set, Tuple
+import numpy as np
+
+from core.logger import get_logger
+from .repository import get_template_repository
+from .search_backend import LOCAL_INDEX_DIMENSIONS, LOCAL_INDEX_QUANTIZATION, LOCAL_INDEX_PAGE_SIZE, _parse_embedding
+from .vector_index import VectorIndex, shorten
+
+logger = get_logger(__name__)
+
+SNAPSHOT_FORMAT = 1
+# File in the snapshot directory naming the export in use
+POINTER_FILE = "CURRENT"
+METADATA_COLUMNS = ("id", "subject", "description", "category", "visibility", "created_at")
+# Templates fetched per request when exporting added rows
+_FETCH_BATCH = 200
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def resolve_snapshot(path: str) -> str:
+    """Directory of the export in use (snapshot directories without CURRENT are read directly)."""
+    try:
+        with open(os.path.join(path, POINTER_FILE), encoding="utf-8") as f:
+            return os.path.join(path, f.read().strip())
+    except FileNotFoundError:
+        return path
+
+
+def _codes_name(dimensions: Optional[int], quantization: str) -> str:
+    return f"{dimensions or 'full'}-{quantization}"
+
+
+# ==================================================================
+# PARTS (base snapshot and deltas share one layout)
+# ==================================================================
+def _encode_rows(rows: Sequence[Dict[str, Any]], dimensions: Optional[int], quantization: str) -> Dict[str, Any]:
+    """Columnar arrays for a set of template rows."""
+    vectors = [_parse_embedding(row["embedding"]) for row in rows]
+    embeddings = shorten(vectors) if rows else np.zeros((0, 0), dtype=np.float32)
+    codes, scales = VectorIndex(dimensions, quantization).encode(embeddings) if rows else (np.zeros((0, 0)), None)
+
+    bodies = [zlib.compress((row.get("template_code") or "").encode()) for row in rows]
+    offsets = np.zeros(len(bodies) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(body) for body in bodies])
+
+    return {
+        "metadata": {column: [row.get(column) for row in rows] for column in METADATA_COLUMNS},
+        "embeddings": embeddings.astype(np.float32),
+        "codes": codes,
+        "scales": scales,
+        "bodies": b"".join(bodies),
+        "offsets": offsets,
+    }
+
+
+def _write_part(path: str, encoded: Dict[str, Any], dimensions: Optional[int], quantization: str):
+    os.makedirs(path, exist_ok=True)
+    with gzip.open(os.path.join(path, "metadata.json.gz"), "wt", encoding="utf-8") as f:
+        json.dump(encoded["metadata"], f, ensure_ascii=False)
+    np.save(os.path.join(path, "embeddings.npy"), encoded["embeddings"])
+    name = _codes_name(dimensions, quantization)
+    np.save(os.path.join(path, f"codes-{name}.npy"), encoded["codes"])
+    if encoded["scales"] is not None:
+        np.save(os.path.join(path, f"scales-{name}.npy"), encoded["scales"])
+    with open(os.path.join(path, "bodies.bin"), "wb") as f:
+        f.write(encoded["bodies"])
+    np.save(os.path.join(path, "bodies.offsets.npy"), encoded["offsets"])
+
+
+class _Part:
+    """Templates of one snapshot directory (base or delta), or built in memory from rows."""
+
+    def __init__(self, metadata: Dict[str, List[Any]], embeddings: np.ndarray, bodies: Any, offsets: np.ndarray,
+                 codes: Dict[str, Tuple[np.ndarray, Optional[np.ndarray]]]):
+        self.metadata = metadata
+        self.ids: List[str] = metadata["id"]
+        self.embeddings = embeddings
+        self.bodies = bodies
+        self.offsets = offsets
+        self.codes = codes
+
+    @classmethod
+    def load(cls, path: str) -> "_Part":
+        with gzip.open(os.path.join(path, "metadata.json.gz"), "rt", encoding="utf-8") as f:
+            metadata = json.load(f)
+        codes = {}
+        for filename in os.listdir(path):
+            if filename.startswith("codes-") and filename.endswith(".npy"):
+                name = filename[len("codes-"):-len(".npy")]
+                scales_path = os.path.join(path, f"scales-{name}.npy")
+                codes[name] = (
+                    np.load(os.path.join(path, filename), mmap_mode="r"),
+                    np.load(scales_path, mmap_mode="r") if os.path.exists(scales_path) else None,
+                )
+        bodies_path = os.path.join(path, "bodies.bin")
+        bodies = np.memmap(bodies_path, dtype=np.uint8, mode="r") if os.path.getsize(bodies_path) else b""
+        return cls(
+            metadata,
+            np.load(os.path.join(path, "embeddings.npy"), mmap_mode="r"),
+            bodies,
+            np.load(os.path.join(path, "bodies.offsets.npy")),
+            codes,
+        )
+
+    @classmethod
+    def from_rows(cls, rows: Sequence[Dict[str, Any]], dimensions: Optional[int], quantization: str) -> "_Part":
+        encoded = _encode_rows(rows, dimensions, quantization)
+        return cls(
+            encoded["metadata"], encoded["embeddings"], encoded["bodies"], encoded["offsets"],
+            {_codes_name(dimensions, quantization): (encoded["codes"], encoded["scales"])},
+        )
+
+    def index(self, dimensions: Optional[int], quantization: str) -> VectorIndex:
+        """Search index over this part (stored codes if they match the configuration)."""
+        stored = self.codes.get(_codes_name(dimensions, quantization))
+        if stored is not None:
+            return VectorIndex.from_codes(self.ids, stored[0], stored[1], dimensions, quantization)
+        logger.warning("Snapshot has no codes for this index configuration, encoding embeddings", extra={
+            "dimensions": dimensions, "quantization": quantization
+        })
+        index = VectorIndex(dimensions, quantization)
+        index.add_many(self.ids, self.embeddings)
+        return index
+
+    def body(self, position: int) -> str:
+        start, end = int(self.offsets[position]), int(self.offsets[position + 1])
+        return zlib.decompress(bytes(self.bodies[start:end])).decode()
+
+
+# ==================================================================
+# SNAPSHOT
+# ==================================================================
+class SnapshotIndex:
+    """
+    Search view over snapshot parts: the memory-mapped base, deltas and
+    in-memory changes, minus removed templates. Same search interface as
+    VectorIndex (candidates, memory_bytes, len).
+    """
+
+    def __init__(self, indexes: List[VectorIndex], removed: Set[str]):
+        self.indexes = indexes
+        self.removed = removed
+
+    def __len__(self) -> int:
+        return sum(len(index) for index in self.indexes) - len(self.removed)
+
+    def candidates(self, query: Sequence[float], n: int) -> List[Tuple[Hashable, float]]:
+        merged = []
+        for index in self.indexes:
+            merged.extend(
+                (key, score) for key, score in index.candidates(query, n + len(self.removed))
+                if key not in self.removed
+            )
+        merged.sort(key=lambda item: -item[1])
+        return merged[:n]
+
+    def memory_bytes(self) -> Dict[str, int]:
+        total = {"codes": 0, "full": 0}
+        for index in self.indexes:
+            for part, size in index.memory_bytes().items():
+                total[part] += size
+        return total
+
+
+class CorpusSnapshot:
+    """
+    A loaded snapshot: base part, delta parts and optional in-memory changes.
+
+    Args:
+        path: Snapshot directory
+    """
+
+    def __init__(self, path: str):
+        # Directory of the export in use
+        self.path = resolve_snapshot(path)
+        with open(os.path.join(self.path, "manifest.json"), encoding="utf-8") as f:
+            self.manifest = json.load(f)
+        if self.manifest.get("format") != SNAPSHOT_FORMAT:
+            raise ValueError(f"Unsupported snapshot format {self.manifest.get('format')}")
+
+        self.parts = [_Part.load(self.path)]
+        self.removed: Set[str] = set()
+        for delta in self.manifest.get("deltas", []):
+            self._apply(_Part.load(os.path.join(self.path, delta["name"])), delta.get("removed_ids", []))
+
+    def _apply(self, part: _Part, removed_ids: Iterable[str]):
+        self.removed.update(removed_ids)
+        self.removed.difference_update(part.ids)
+        self.parts.append(part)
+        self._positions = None
+
+    def _locate(self, template_id: str) -> Optional[Tuple[_Part, int]]:
+        if template_id in self.removed:
+            return None
+        if getattr(self, "_positions", None) is None:
+            # Later parts win (a template re-added in a delta)
+            self._positions = {tid: (part, i) for part in self.parts for i, tid in enumerate(part.ids)}
+        return self._positions.get(template_id)
+
+    def ids(self) -> Set[str]:
+        """IDs of the templates in the snapshot (after deltas)."""
+        return {tid for part in self.parts for tid in part.ids} - self.removed
+
+    def vector(self, template_id: str) -> Optional[np.ndarray]:
+        """Full-precision (unit) embedding of a template, or None."""
+        located = self._locate(template_id)
+        return None if located is None else located[0].embeddings[located[1]]
+
+    def row(self, template_id: str) -> Optional[Dict[str, Any]]:
+        """Template row (metadata and HTML) as stored in the snapshot, or None."""
+        located = self._locate(template_id)
+        if located is None:
+            return None
+        part, position = located
+        row = {column: part.metadata[column][position] for column in METADATA_COLUMNS}
+        row["template_code"] = part.body(position)
+        return row
+
+    def with_changes(self, added_rows: Sequence[Dict[str, Any]], removed_ids: Iterable[str],
+                     dimensions: Optional[int], quantization: str):
+        """Apply changes fetched from the database in memory (not written to disk)."""
+        self._apply(_Part.from_rows(added_rows, dimensions, quantization), removed_ids)
+
+    def index(self, dimensions: Optional[int], quantization: str) -> SnapshotIndex:
+        """Search index over all parts (the base codes stay memory-mapped)."""
+        return SnapshotIndex([part.index(dimensions, quantization) for part in self.parts], set(self.removed))
+
+
+# ==================================================================
+# EXPORT
+# ==================================================================
+async def _scan_ids() -> Set[str]:
+    repository = get_template_repository()
+    ids: Set[str] = set()
+    offset = 0
+    while True:
+        page = await repository.ids_page(offset, LOCAL_INDEX_PAGE_SIZE)
+        ids.update(page)
+        if len(page) < LOCAL_INDEX_PAGE_SIZE:
+            return ids
+        offset += LOCAL_INDEX_PAGE_SIZE
+
+
+async def fetch_changes(known: Set[str]) -> Tuple[List[Dict[str, Any]], Set[str]]:
+    """
+    Templates added to and removed from the database since a snapshot or
+    index was built (compares IDs only, then fetches the added rows).
+
+    Args:
+        known: IDs of the templates in the snapshot or index
+
+    Returns:
+        (added rows with HTML and embeddings, removed IDs)
+    """
+    current = await _scan_ids()
+    added_ids = sorted(current - known)
+    repository = get_template_repository()
+    rows: List[Dict[str, Any]] = []
+    for start in range(0, len(added_ids), _FETCH_BATCH):
+        rows.extend(await repository.get_many(added_ids[start:start + _FETCH_BATCH], with_embeddings=True))
+    return [row for row in rows if row.get("embedding")], known - current
+
+
+def _write_manifest(path: str, manifest: Dict[str, Any]):
+    tmp = os.path.join(path, "manifest.json.tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp, os.path.join(path, "manifest.json"))
+
+
+def _swap_pointer(path: str, name: str):
+    """Point CURRENT at a finished export and remove all but it and the previous one."""
+    previous = os.path.basename(resolve_snapshot(path))
+    tmp = os.path.join(path, f"{POINTER_FILE}.tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(name)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, os.path.join(path, POINTER_FILE))
+    # Workers still loading the previous export can finish; older ones are unused
+    for entry in os.listdir(path):
+        if entry.startswith("v-") and entry not in (name, previous):
+            shutil.rmtree(os.path.join(path, entry), ignore_errors=True)
+
+
+async def export_snapshot(
+    path: str,
+    dimensions: Optional[int] = LOCAL_INDEX_DIMENSIONS,
+    quantization: str = LOCAL_INDEX_QUANTIZATION
+) -> Dict[str, Any]:
+    """
+    Write a full snapshot of all templates with embeddings. The new export is
+    switched to atomically; workers that mapped the previous files keep reading them.
+
+    Args:
+        path: Snapshot directory
+        dimensions: Index dimensions to precompute codes for
+        quantization: Index quantization to precompute codes for
+
+    Returns:
+        The manifest
+    """
+    repository = get_template_repository()
+    rows: List[Dict[str, Any]] = []
+    offset = 0
+    while True:
+        page = await repository.export_page(offset, LOCAL_INDEX_PAGE_SIZE)
+        rows.extend(page)
+        if len(page) < LOCAL_INDEX_PAGE_SIZE:
+            break
+        offset += LOCAL_INDEX_PAGE_SIZE
+
+    encoded = await asyncio.to_thread(_encode_rows, rows, dimensions or None, quantization)
+    os.makedirs(path, exist_ok=True)
+    name = f"v-{datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S%f')}"
+    tmp = os.path.join(path, f"{name}.tmp")
+    shutil.rmtree(tmp, ignore_errors=True)
+    await asyncio.to_thread(_write_part, tmp, encoded, dimensions or None, quantization)
+    manifest = {
+        "format": SNAPSHOT_FORMAT,
+        "created_at": _now(),
+        "templates": len(rows),
+        "embedding_dimensions": int(encoded["embeddings"].shape[1]) if rows else 0,
+        "codes": {"dimensions": dimensions or None, "quantization": quantization},
+        "deltas": [],
+    }
+    _write_manifest(tmp, manifest)
+    os.replace(tmp, os.path.join(path, name))
+    _swap_pointer(path, name)
+    logger.info("Corpus snapshot written", extra={"path": path, "version": name, "templates": len(rows)})
+    return manifest
+
+
+async def export_delta(path: str) -> Dict[str, Any]:
+    """
+    Append a delta with the templates added and removed since the snapshot
+    (and its previous deltas).
+
+    Args:
+        path: Existing snapshot directory
+
+    Returns:
+        The delta's manifest entry
+    """
+    snapshot = CorpusSnapshot(path)
+    # The delta goes into the export in use; its manifest is replaced atomically
+    path = snapshot.path
+    added, removed = await fetch_changes(snapshot.ids())
+    codes = snapshot.manifest["codes"]
+    name = f"delta-{len(snapshot.manifest['deltas']) + 1:04d}"
+    encoded = await asyncio.to_thread(_encode_rows, added, codes["dimensions"], codes["quantization"])
+    tmp = os.path.join(path, f"{name}.tmp")
+    shutil.rmtree(tmp, ignore_errors=True)
+    await asyncio.to_thread(_write_part, tmp, encoded, codes["dimensions"], codes["quantization"])
+    os.replace(tmp, os.path.join(path, name))
+
+    entry = {"name": name, "created_at": _now(), "added": len(added), "removed_ids": sorted(removed)}
+    snapshot.manifest["deltas"].append(entry)
+    _write_manifest(path, snapshot.manifest)
+    logger.info("Corpus snapshot delta written", extra={"path": path, "added": len(added), "removed": len(removed)})
+    return entry
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the template corpus for warm-starting the local search index")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    export = subparsers.add_parser("export", help="Write a full snapshot, or a delta with --delta")
+    export.add_argument("path", help="Snapshot directory (LOCAL_INDEX_SNAPSHOT)")
+    export.add_argument("--delta", action="store_true", help="Append the changes since the snapshot")
+    args = parser.parse_args()
+
+    result = asyncio.run(export_delta(args.path) if args.delta else export_snapshot(args.path))
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,33 @@
 """
-AI email generation using OpenAI GPT-4o-mini.
+AI email generation (model and settings chosen by model_router).
 Handles HTML email template generation with proper formatting and validation.
 """
 
+import os
 import re
-import base64
 import json
 from typing import List, Optional, Dict, Any
 from fastapi import HTTPException, UploadFile
+from dotenv import load_dotenv
 
-from .embeddings import get_openai_client
+from core.metrics import track_stage, TEMPLATE_EDITS, OPTIONAL_STAGE_SKIPS
+from core.logger import get_logger
+from .llm_client import UpstreamUnavailable, upstream_http_error
+from .model_router import route_for, chat_completion
+from .image_optimizer import prepare_vision_image, VISION_IMAGE_DETAIL
+from .image_store import add_retina_srcset
+from .html_patcher import EMAIL_PATCH_SYSTEM_PROMPT, PatchError, parse_patch, apply_html_patch, format_changes
+
+# Load environment variables
+load_dotenv()
+
+logger = get_logger(__name__)
+
+# Edits of an existing template: "patch" (targeted replacements, falls back to full) or "full"
+EMAIL_EDIT_MODE = os.getenv("EMAIL_EDIT_MODE", "patch").lower()
+# Send a worked example after the system prompt. It shows the expected output format
+# and makes the static prompt prefix long enough (1024+ tokens) for provider prompt caching
+EMAIL_FEW_SHOT = os.getenv("EMAIL_FEW_SHOT", "true").lower() == "true"
 
 # System prompt for email HTML generation (STRICT - HTML ONLY)
 EMAIL_SYSTEM_PROMPT = """You are an expert HTML email template generator for production use.
@@ -76,20 +94,42 @@ CRITICAL OUTPUT RULES:
 3. STOP IMMEDIATELY after </html> tag
 4. NO explanations, NO suggestions after </html>"""
 
-
-def img_to_base64(file: UploadFile) -> str:
-    """
-    Convert uploaded file to base64 string.
-    
-    Args:
-        file: Uploaded file object
-        
-    Returns:
-        Base64 encoded string
-    """
-    content = file.file.read()
-    file.file.seek(0)  # Reset file pointer for potential re-use
-    return base64.b64encode(content).decode("utf-8")
+# Worked example sent after EMAIL_SYSTEM_PROMPT (request, then the expected response)
+EMAIL_FEW_SHOT_EXAMPLE = [
+    {"role": "user", "content": "Announcement email for the new dark mode in our mobile app"},
+    {"role": "assistant", "content": """<!-- SUBJECT: 🌙 Dark Mode Is Here! -->
+<!DOCTYPE html>
+<html>
+<head><meta charset="UTF-8"><meta name="viewport" content="width=device-width, initial-scale=1.0"><title>Dark Mode Is Here</title></head>
+<body style="margin:0;padding:0;background-color:#f4f4f7;font-family:Arial,Helvetica,sans-serif;">
+<table role="presentation" width="100%" cellpadding="0" cellspacing="0" border="0" style="background-color:#f4f4f7;">
+<tr><td align="center" style="padding:24px 12px;">
+<table role="presentation" width="100%" cellpadding="0" cellspacing="0" border="0" style="max-width:600px;background-color:#ffffff;border-radius:8px;">
+<tr><td align="center" style="background-color:#1f2937;padding:40px 24px;border-radius:8px 8px 0 0;">
+<img src="{{IMAGE_HERO}}" alt="Dark mode preview" width="552" style="display:block;width:100%;max-width:552px;height:auto;border:0;">
+<h1 style="margin:24px 0 8px;color:#ffffff;font-size:28px;line-height:34px;">🌙 Dark Mode Is Here</h1>
+<p style="margin:0;color:#d1d5db;font-size:16px;line-height:24px;">Easier on your eyes, day and night.</p>
+</td></tr>
+<tr><td style="padding:32px 24px;color:#374151;font-size:16px;line-height:24px;">
+<p style="margin:0 0 16px;">You asked, we listened! The latest version of our app comes with a <strong>fully redesigned dark theme</strong>.</p>
+<p style="margin:0 0 8px;">✨ Reduced glare in low light</p>
+<p style="margin:0 0 8px;">🔋 Longer battery life on OLED screens</p>
+<p style="margin:0 0 24px;">⚙️ Switches automatically with your system settings</p>
+<table role="presentation" cellpadding="0" cellspacing="0" border="0" align="center"><tr>
+<td align="center" style="background-color:#6366f1;border-radius:6px;">
+<a href="{{APP_LINK}}" style="display:inline-block;padding:14px 32px;color:#ffffff;font-size:16px;font-weight:bold;text-decoration:none;">Update the App</a>
+</td></tr></table>
+</td></tr>
+<tr><td align="center" style="background-color:#f9fafb;padding:20px 24px;color:#9ca3af;font-size:12px;line-height:18px;border-radius:0 0 8px 8px;">
+You are receiving this email because you use our app.<br>
+<a href="{{UNSUBSCRIBE_LINK}}" style="color:#9ca3af;text-decoration:underline;">Unsubscribe</a>
+</td></tr>
+</table>
+</td></tr>
+</table>
+</body>
+</html>"""},
+]
 
 
 def extract_subject_from_html(html_content: str) -> Optional[str]:
@@ -208,32 +248,140 @@ async def generate_subject_fallback(prompt: str) -> str:
     Returns:
         Generated subject line
     """
-    client = get_openai_client()
+    route = route_for("subject", prompt)
     
     try:
-        subject_response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {
-                    "role": "system",
-                    "content": "Generate a short, catchy email subject line (max 50 chars) for the given email description. Start with 1 emoji. Output ONLY the subject line, nothing else."
-                },
-                {
-                    "role": "user",
-                    "content": f"Email description: {prompt}"
-                }
-            ],
-            temperature=0.7,
-            max_tokens=60
-        )
+        with track_stage("subject_fallback"):
+            subject_response = await chat_completion(
+                route,
+                messages=[
+                    {
+                        "role": "system",
+                        "content": "Generate a short, catchy email subject line (max 50 chars) for the given email description. Start with 1 emoji. Output ONLY the subject line, nothing else."
+                    },
+                    {
+                        "role": "user",
+                        "content": f"Email description: {prompt}"
+                    }
+                ]
+            )
         subject_line = subject_response.choices[0].message.content.strip()
         # Clean up any quotes around it
         return subject_line.strip('"\'')
+    except UpstreamUnavailable:
+        OPTIONAL_STAGE_SKIPS.inc(stage="subject_fallback", reason="circuit_open")
+        return "📧 Your Email"
     except Exception as e:
-        print(f"Subject generation fallback failed: {e}")
+        OPTIONAL_STAGE_SKIPS.inc(stage="subject_fallback", reason="error")
+        logger.warning("Subject generation fallback failed", extra={"error": str(e)})
         return "📧 Your Email"
 
 
+def _history_messages(history: Optional[str]) -> List[Dict[str, Any]]:
+    """
+    Parse the JSON conversation history into chat messages.
+    Contents are stripped so resending the same conversation yields the same
+    bytes (and the provider can reuse its cached prompt prefix).
+    """
+    messages = []
+    if history:
+        try:
+            history_messages = json.loads(history)
+            for msg in history_messages:
+                role = msg.get("role", "user")
+                content = msg.get("content", "")
+                if isinstance(content, str):
+                    content = content.strip()
+                if role in ["user", "assistant"] and content:
+                    messages.append({"role": role, "content": content})
+        except json.JSONDecodeError:
+            logger.warning("Failed to parse history JSON")
+    return messages
+
+
+def _static_prefix() -> List[Dict[str, Any]]:
+    """Messages every generation starts with (byte-identical across requests)."""
+    messages = [{"role": "system", "content": EMAIL_SYSTEM_PROMPT}]
+    if EMAIL_FEW_SHOT:
+        messages.extend(EMAIL_FEW_SHOT_EXAMPLE)
+    return [dict(m) for m in messages]
+
+
+async def _user_message(text: str, images: List[UploadFile]) -> Dict[str, Any]:
+    """Build the current user message, attaching reference images if any."""
+    current_content = [{"type": "text", "text": text}]
+    
+    # Add images (resized to the model's detail level, cached by content hash)
+    for img in images:
+        if img.filename:
+            data_url = await prepare_vision_image(img)
+            current_content.append({
+                "type": "image_url",
+                "image_url": {"url": data_url, "detail": VISION_IMAGE_DETAIL}
+            })
+    
+    return {
+        "role": "user",
+        "content": current_content if len(current_content) > 1 else text
+    }
+
+
+async def generate_email_patch(
+    prompt: str,
+    current_html: str,
+    history: Optional[str] = None,
+    images: List[UploadFile] = []
+) -> Dict[str, Any]:
+    """
+    Edit an existing template with a JSON patch instead of regenerating it.
+    
+    Args:
+        prompt: Requested change
+        current_html: Current template HTML
+        history: JSON string of conversation history
+        images: List of uploaded images
+        
+    Returns:
+        Dictionary with success, html, subject, changes, model, and images_used
+        
+    Raises:
+        PatchError: If the model's patch cannot be applied (caller falls back to full regeneration)
+    """
+    route = route_for("edit_patch", current_html)
+    
+    messages = [{"role": "system", "content": EMAIL_PATCH_SYSTEM_PROMPT}]
+    messages.extend(_history_messages(history))
+    messages.append(await _user_message(
+        f"CURRENT TEMPLATE HTML:\n```html\n{current_html}\n```\n\nUSER REQUEST: {prompt}",
+        images
+    ))
+    
+    with track_stage("llm_patch"):
+        response = await chat_completion(route, messages, response_format={"type": "json_object"})
+    
+    choice = response.choices[0]
+    if choice.finish_reason == "length":
+        raise PatchError("Patch was truncated")
+    patch = parse_patch(choice.message.content)
+    
+    html_content = apply_html_patch(current_html, patch["edits"])
+    try:
+        html_content = clean_html_content(html_content)
+    except HTTPException as e:
+        raise PatchError(e.detail)
+    html_content = await add_retina_srcset(html_content)
+    
+    return {
+        "success": True,
+        "html": html_content,
+        "subject": patch["subject"] or extract_subject_from_html(current_html) or await generate_subject_fallback(prompt),
+        "changes": format_changes(patch["changes"]),
+        "model": route.model,
+        "rag_enabled": False,
+        "images_used": len([img for img in images if img.filename])
+    }
+
+
 async def generate_email_html(
     prompt: str,
     history: Optional[str] = None,
@@ -243,6 +391,9 @@ async def generate_email_html(
 ) -> Dict[str, Any]:
     """
     Generate email HTML using OpenAI GPT-4o-mini.
+    Edits of an existing template are tried as a patch first (EMAIL_EDIT_MODE)
+    and fall back to full regeneration if the patch cannot be applied
+    (upstream errors are raised, not retried as a full regeneration).
     
     Args:
         prompt: Email intent/description
@@ -257,65 +408,46 @@ async def generate_email_html(
     Raises:
         HTTPException: If generation fails
     """
-    client = get_openai_client()
+    if current_html and EMAIL_EDIT_MODE == "patch":
+        try:
+            result = await generate_email_patch(prompt, current_html, history, images)
+            TEMPLATE_EDITS.inc(mode="patch", outcome="applied")
+            return result
+        except PatchError as e:
+            # Unusable patch (parse, apply or validation failure): regenerate
+            TEMPLATE_EDITS.inc(mode="patch", outcome="fallback")
+            logger.info("Patch edit failed, regenerating full template", extra={"reason": str(e)})
+        except Exception as e:
+            # Upstream failures would fail the full regeneration as well
+            TEMPLATE_EDITS.inc(mode="patch", outcome="error")
+            logger.error("OpenAI API error", extra={"error": str(e)})
+            raise upstream_http_error(e, "edit email")
     
-    # Build enhanced system prompt with RAG context
-    enhanced_system_prompt = EMAIL_SYSTEM_PROMPT
+    # Static prefix first (system prompt, worked example), then what varies per
+    # conversation (history) and per request (RAG context, current message), so the
+    # provider's prompt cache can reuse the longest possible prefix
+    messages = _static_prefix()
+    messages.extend(_history_messages(history))
     if rag_context:
-        enhanced_system_prompt = f"""{EMAIL_SYSTEM_PROMPT}
-
-{rag_context}
-"""
-    
-    # Build messages list
-    messages = [{"role": "system", "content": enhanced_system_prompt}]
-    
-    # Parse and add conversation history
-    if history:
-        try:
-            history_messages = json.loads(history)
-            for msg in history_messages:
-                role = msg.get("role", "user")
-                content = msg.get("content", "")
-                if role in ["user", "assistant"] and content:
-                    messages.append({"role": role, "content": content})
-        except json.JSONDecodeError:
-            print("Warning: Failed to parse history JSON")
+        messages.append({"role": "system", "content": rag_context.strip()})
     
     # Build current message content
-    current_content = []
-    
     if current_html:
-        current_content.append({
-            "type": "text", 
-            "text": f"CURRENT TEMPLATE HTML:\n```html\n{current_html}\n```\n\nUSER REQUEST: {prompt}"
-        })
+        text = f"CURRENT TEMPLATE HTML:\n```html\n{current_html}\n```\n\nUSER REQUEST: {prompt}"
     else:
-        current_content.append({"type": "text", "text": prompt})
+        text = prompt
+    messages.append(await _user_message(text, images))
     
-    # Add images
-    for img in images:
-        if img.filename:
-            content_type = img.content_type or "image/png"
-            base64_data = img_to_base64(img)
-            current_content.append({
-                "type": "image_url",
-                "image_url": {"url": f"data:{content_type};base64,{base64_data}"}
-            })
-    
-    messages.append({
-        "role": "user",
-        "content": current_content if len(current_content) > 1 else current_content[0]["text"]
-    })
+    # Full regeneration of an existing template outputs about as much as the template itself
+    if current_html:
+        route = route_for("edit_full", current_html)
+    else:
+        route = route_for("generation", EMAIL_SYSTEM_PROMPT + rag_context + text)
     
     try:
         # Call OpenAI API
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=messages,
-            temperature=0.3,
-            max_tokens=4000
-        )
+        with track_stage("llm_completion"):
+            response = await chat_completion(route, messages)
         
         html_content = response.choices[0].message.content
         
@@ -328,18 +460,20 @@ async def generate_email_html(
             subject_line = await generate_subject_fallback(prompt)
         
         # Clean HTML
-        html_content = clean_html_content(html_content)
+        with track_stage("html_cleaning"):
+            html_content = clean_html_content(html_content)
+        html_content = await add_retina_srcset(html_content)
         
         return {
             "success": True,
             "html": html_content,
             "subject": subject_line,
             "changes": changes_summary,
-            "model": "gpt-4o-mini",
+            "model": route.model,
             "rag_enabled": bool(rag_context),
             "images_used": len([img for img in images if img.filename])
         }
         
     except Exception as e:
-        print(f"OpenAI API Error: {str(e)}")
-        raise HTTPException(500, f"Failed to generate email: {str(e)}")
+        logger.error("OpenAI API error", extra={"error": str(e)})
+        raise upstream_http_error(e, "generate email")
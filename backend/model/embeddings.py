@@ -3,65 +3,59 @@ OpenAI embedding generation for RAG search.
 """
 
 import os
-from typing import List
-from fastapi import HTTPException
-from openai import OpenAI
+from typing import List, Optional
 from dotenv import load_dotenv
 
+from core.metrics import track_stage, record_llm_usage
+from core.logger import get_logger
+# Client and scheduler live in llm_client; re-exported here for existing imports
+from .llm_client import (
+    call_openai,
+    get_openai_client,
+    get_openai_scheduler,
+    is_openai_configured,
+    upstream_http_error,
+)
+
 # Load environment variables
 load_dotenv()
 
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+logger = get_logger(__name__)
 
-# Initialize OpenAI client
-openai_client = None
-if OPENAI_API_KEY:
-    # Show first/last chars for debugging (hide the rest)
-    key_preview = f"{OPENAI_API_KEY[:12]}...{OPENAI_API_KEY[-4:]}" if len(OPENAI_API_KEY) > 16 else "KEY_TOO_SHORT"
-    print(f"🔑 OpenAI API Key loaded: {key_preview}")
-    openai_client = OpenAI(api_key=OPENAI_API_KEY)
-else:
-    print("❌ OPENAI_API_KEY not found in .env file!")
+# text-embedding-3 models support shortened outputs; EMBEDDING_DIMENSIONS must
+# match the vector column of email_templates (1536 in the default schema)
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "text-embedding-3-small")
+EMBEDDING_DIMENSIONS = int(os.getenv("EMBEDDING_DIMENSIONS", "1536"))
 
 
-def generate_embedding(text: str) -> List[float]:
+async def generate_embedding(text: str, dimensions: Optional[int] = None) -> List[float]:
     """
-    Generate embedding using OpenAI text-embedding-3-small.
-    
+    Generate embedding using OpenAI (text-embedding-3-small by default).
+
     Args:
         text: Text to generate embedding for
-        
+        dimensions: Output size (defaults to EMBEDDING_DIMENSIONS)
+
     Returns:
-        List of embedding values (1536 dimensions)
-        
+        List of embedding values (unit length)
+
     Raises:
-        HTTPException: If embedding generation fails
+        HTTPException: If embedding generation fails (503/504/502 for upstream failures)
     """
-    if not openai_client:
-        raise HTTPException(500, "OpenAI API key not configured")
-    
+    client = get_openai_client()
+
     try:
-        response = openai_client.embeddings.create(
-            model="text-embedding-3-small",
-            input=text,
-            dimensions=1536
-        )
+        with track_stage("embedding"):
+            response = await call_openai(
+                client.embeddings.create,
+                task="embedding",
+                est_tokens=len(text) // 4 + 1,
+                model=EMBEDDING_MODEL,
+                input=text,
+                dimensions=dimensions or EMBEDDING_DIMENSIONS
+            )
+        record_llm_usage(EMBEDDING_MODEL, response.usage)
         return response.data[0].embedding
     except Exception as e:
-        print(f"Embedding generation error: {str(e)}")
-        raise HTTPException(500, f"Failed to generate embedding: {str(e)}")
-
-
-def get_openai_client() -> OpenAI:
-    """
-    Get the initialized OpenAI client.
-    
-    Returns:
-        OpenAI client instance
-        
-    Raises:
-        HTTPException: If client not initialized
-    """
-    if not openai_client:
-        raise HTTPException(500, "OpenAI API key not configured. Please add OPENAI_API_KEY to your .env file.")
-    return openai_client
+        logger.error("Embedding generation error", extra={"error": str(e)})
+        raise upstream_http_error(e, "generate embedding")
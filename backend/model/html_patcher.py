@@ -0,0 +1,138 @@
+"""
+Patch-based template edits.
+Instead of regenerating the whole document, the model returns a small JSON
+patch (snippet replacements) which is applied to the current HTML and
+validated before it is returned.
+"""
+
+import re
+import json
+from typing import Any, Dict, List, Optional
+
+# System prompt for patch edits (STRICT - JSON ONLY)
+EMAIL_PATCH_SYSTEM_PROMPT = """You edit existing HTML email templates by returning a JSON patch.
+
+Respond with ONLY a JSON object in this exact format:
+{
+  "subject": "Short catchy subject line (max 50 chars, 1 emoji at the start)",
+  "changes": ["First change made", "Second change made"],
+  "edits": [
+    {"find": "exact snippet copied from the current HTML", "replace": "new snippet"}
+  ]
+}
+
+EDIT RULES (DO NOT BREAK):
+- "find" MUST be copied character-for-character from CURRENT TEMPLATE HTML
+- "find" MUST be unique in the template - include enough surrounding markup (e.g. the whole tag)
+- Set "all": true on an edit only to change EVERY occurrence of the snippet (e.g. all button colors)
+- Keep each snippet as small as possible - never copy the whole document
+- Edits are applied in order; later edits see the result of earlier ones
+- Keep table-based layout, inline CSS only, no <style> or <script> tags
+- Images: use URLs given by the user, otherwise placeholders like {{IMAGE_1}}
+
+If the request needs a redesign or rewriting most of the template, respond with:
+{"full_rewrite": true}"""
+
+
+class PatchError(ValueError):
+    """The model's patch could not be parsed, applied or validated."""
+
+
+# Tags whose open/close balance must not change when a patch is applied
+_STRUCTURAL_TAGS = ("html", "body", "table", "tr", "td", "a")
+
+
+def parse_patch(content: str) -> Dict[str, Any]:
+    """
+    Parse and validate the model's JSON patch.
+
+    Args:
+        content: Raw model output
+
+    Returns:
+        Patch dict with "edits" (list), "changes" (list) and optional "subject"
+
+    Raises:
+        PatchError: If the output is not a usable patch or asks for a full rewrite
+    """
+    try:
+        patch = json.loads(content)
+    except (TypeError, ValueError) as e:
+        raise PatchError(f"Patch is not valid JSON: {e}")
+    if not isinstance(patch, dict):
+        raise PatchError("Patch is not a JSON object")
+    if patch.get("full_rewrite"):
+        raise PatchError("Model requested a full rewrite")
+
+    edits = patch.get("edits")
+    if not isinstance(edits, list) or not edits:
+        raise PatchError("Patch contains no edits")
+    for edit in edits:
+        if not isinstance(edit, dict) or not isinstance(edit.get("find"), str) or not edit["find"]:
+            raise PatchError("Edit without a 'find' snippet")
+        if not isinstance(edit.get("replace"), str):
+            raise PatchError("Edit without a 'replace' snippet")
+
+    changes = patch.get("changes") or []
+    if isinstance(changes, str):
+        changes = [changes]
+    return {"edits": edits, "changes": [str(c) for c in changes], "subject": patch.get("subject") or None}
+
+
+def _find_spans(html: str, snippet: str) -> List[re.Match]:
+    """Locate a snippet exactly, falling back to a whitespace-insensitive match."""
+    matches = list(re.finditer(re.escape(snippet), html))
+    if not matches:
+        tokens = snippet.split()
+        if tokens:
+            pattern = r"\s+".join(re.escape(token) for token in tokens)
+            matches = list(re.finditer(pattern, html))
+    return matches
+
+
+def _tag_balance(html: str) -> Dict[str, int]:
+    lower = html.lower()
+    return {
+        tag: len(re.findall(rf"<{tag}[\s>]", lower)) - lower.count(f"</{tag}>")
+        for tag in _STRUCTURAL_TAGS
+    }
+
+
+def apply_html_patch(html: str, edits: List[Dict[str, Any]]) -> str:
+    """
+    Apply snippet replacements to the current HTML and validate the result.
+
+    Args:
+        html: Current template HTML
+        edits: List of {"find", "replace", "all"?} dicts
+
+    Returns:
+        Patched HTML
+
+    Raises:
+        PatchError: If a snippet is missing or ambiguous, or the result is broken
+    """
+    patched = html
+    for edit in edits:
+        matches = _find_spans(patched, edit["find"])
+        if not matches:
+            raise PatchError(f"Snippet not found: {edit['find'][:80]!r}")
+        if len(matches) > 1 and not edit.get("all"):
+            raise PatchError(f"Snippet is not unique ({len(matches)} matches): {edit['find'][:80]!r}")
+        # Replace from the end so earlier offsets stay valid
+        for match in reversed(matches):
+            patched = patched[:match.start()] + edit["replace"] + patched[match.end():]
+
+    if patched == html:
+        raise PatchError("Patch did not change the template")
+    if _tag_balance(patched) != _tag_balance(html):
+        raise PatchError("Patch changed the document structure (unbalanced tags)")
+    for tag in ("<script", "<style"):
+        if patched.lower().count(tag) > html.lower().count(tag):
+            raise PatchError(f"Patch introduced a {tag}> tag")
+    return patched
+
+
+def format_changes(changes: List[str]) -> Optional[str]:
+    """Render a change list like the CHANGES comment of full regeneration."""
+    return " ".join(f"• {change}" for change in changes) if changes else None
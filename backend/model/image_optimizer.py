@@ -0,0 +1,242 @@
+"""
+Image optimization for email assets and vision inputs.
+Downscales uploaded images to email width, strips metadata and re-encodes them
+in a process pool so the event loop is never blocked by Pillow.
+"""
+
+import os
+import base64
+import asyncio
+import hashlib
+from collections import OrderedDict
+from io import BytesIO
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from typing import Dict, Optional, Tuple
+from dotenv import load_dotenv
+from fastapi import UploadFile
+from PIL import Image, ImageOps
+
+from core.metrics import track_stage, record_cache, QUEUE_DEPTH
+from core.logger import get_logger
+
+# Load environment variables
+load_dotenv()
+
+logger = get_logger(__name__)
+
+EMAIL_IMAGE_WIDTH = int(os.getenv("EMAIL_IMAGE_WIDTH", "600"))
+IMAGE_JPEG_QUALITY = int(os.getenv("IMAGE_JPEG_QUALITY", "82"))
+IMAGE_OPTIMIZER_WORKERS = int(os.getenv("IMAGE_OPTIMIZER_WORKERS", "2"))
+
+# Vision inputs: "low" (512px, fixed token cost) or "high" (tiled at 768px short side)
+VISION_IMAGE_DETAIL = os.getenv("VISION_IMAGE_DETAIL", "high").lower()
+VISION_JPEG_QUALITY = int(os.getenv("VISION_JPEG_QUALITY", "85"))
+VISION_CACHE_SIZE = int(os.getenv("VISION_CACHE_SIZE", "64"))
+
+# Size limits the model applies before tiling: (max long side, max short side)
+VISION_DETAIL_LIMITS = {
+    "low": (512, 512),
+    "high": (2048, 768),
+}
+
+# Variant label -> width multiplier (2x for retina screens)
+VARIANT_SCALES = {"1x": 1, "2x": 2}
+
+# Process pool is created on first use and shut down with the app
+_executor: Optional[ProcessPoolExecutor] = None
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    """Get (or create) the shared image processing pool."""
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=IMAGE_OPTIMIZER_WORKERS)
+    return _executor
+
+
+def shutdown_image_optimizer():
+    """Shut down the image processing pool (called on app shutdown)."""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+def variant_filename(filename: str, label: str, ext: str) -> str:
+    """
+    Build the storage name of an optimized variant, stored next to the original.
+
+    Example: "abc.png" + "1x" + "jpg" -> "abc@1x.jpg"
+    """
+    stem = filename.rsplit(".", 1)[0]
+    return f"{stem}@{label}.{ext}"
+
+
+def is_variant_filename(filename: str) -> bool:
+    """Check if a storage name belongs to an optimized variant."""
+    stem = filename.rsplit(".", 1)[0]
+    return any(stem.endswith(f"@{label}") for label in VARIANT_SCALES)
+
+
+def _encode_variants(content: bytes, width: int, quality: int) -> Dict[str, Tuple[bytes, str, str]]:
+    """
+    Encode the email-width variants of an image. Runs inside a worker process.
+
+    Photos are re-encoded as progressive JPEG; images with transparency stay PNG
+    (WebP/AVIF are not supported by Outlook and several webmail clients).
+    Metadata (EXIF, ICC text chunks, comments) is dropped by re-encoding.
+
+    Returns:
+        Dict of variant label -> (bytes, extension, content type)
+    """
+    variants: Dict[str, Tuple[bytes, str, str]] = {}
+
+    with Image.open(BytesIO(content)) as img:
+        # Animated GIFs would lose their frames - keep the original only
+        if getattr(img, "is_animated", False):
+            return variants
+
+        img = ImageOps.exif_transpose(img)
+        has_alpha = img.mode in ("RGBA", "LA") or (img.mode == "P" and "transparency" in img.info)
+
+        for label, scale in VARIANT_SCALES.items():
+            target_width = width * scale
+
+            # Never upscale: a retina variant only makes sense for wide sources
+            if scale > 1 and img.width <= width:
+                continue
+
+            variant = img
+            if img.width > target_width:
+                target_height = max(1, round(img.height * target_width / img.width))
+                variant = img.resize((target_width, target_height), Image.LANCZOS)
+
+            buffer = BytesIO()
+            if has_alpha:
+                variant.convert("RGBA").save(buffer, "PNG", optimize=True)
+                ext, content_type = "png", "image/png"
+            else:
+                variant.convert("RGB").save(
+                    buffer, "JPEG", quality=quality, optimize=True, progressive=True
+                )
+                ext, content_type = "jpg", "image/jpeg"
+
+            data = buffer.getvalue()
+
+            # Skip variants that are not actually smaller than an unresized original
+            if variant is img and len(data) >= len(content):
+                continue
+
+            variants[label] = (data, ext, content_type)
+
+    return variants
+
+
+async def optimize_image(content: bytes) -> Dict[str, Tuple[bytes, str, str]]:
+    """
+    Produce optimized email variants of an uploaded image.
+
+    Args:
+        content: Raw image bytes as uploaded
+
+    Returns:
+        Dict of variant label ("1x", "2x") -> (bytes, extension, content type).
+        Empty if the image cannot (or should not) be optimized.
+    """
+    loop = asyncio.get_running_loop()
+    QUEUE_DEPTH.inc(queue="image_optimizer")
+    try:
+        with track_stage("image_optimization"):
+            return await loop.run_in_executor(
+                _get_executor(),
+                partial(_encode_variants, content, EMAIL_IMAGE_WIDTH, IMAGE_JPEG_QUALITY)
+            )
+    except Exception as e:
+        logger.warning("Image optimization failed, keeping original", extra={"error": str(e)})
+        return {}
+    finally:
+        QUEUE_DEPTH.dec(queue="image_optimizer")
+
+
+# ==================================================================
+# VISION INPUTS (LLM image content)
+# ==================================================================
+
+# Content hash -> encoded data URL (LRU, most recent last)
+_vision_cache: "OrderedDict[str, str]" = OrderedDict()
+
+
+def _encode_vision_image(content: bytes, max_long: int, max_short: int, quality: int) -> bytes:
+    """
+    Resize an image to the resolution the vision model actually uses and encode as JPEG.
+    Runs inside a worker process.
+    """
+    with Image.open(BytesIO(content)) as img:
+        img = ImageOps.exif_transpose(img)
+
+        # Scale so both the long and short side fit the model's limits
+        long_side, short_side = max(img.size), min(img.size)
+        scale = min(1.0, max_long / long_side, max_short / short_side)
+        if scale < 1.0:
+            size = (max(1, round(img.width * scale)), max(1, round(img.height * scale)))
+            img = img.resize(size, Image.LANCZOS)
+
+        # Flatten transparency onto white - the model does not need alpha
+        if img.mode in ("RGBA", "LA") or (img.mode == "P" and "transparency" in img.info):
+            rgba = img.convert("RGBA")
+            background = Image.new("RGB", rgba.size, (255, 255, 255))
+            background.paste(rgba, mask=rgba.getchannel("A"))
+            img = background
+
+        buffer = BytesIO()
+        img.convert("RGB").save(buffer, "JPEG", quality=quality, optimize=True)
+        return buffer.getvalue()
+
+
+async def prepare_vision_image(file: UploadFile, detail: str = VISION_IMAGE_DETAIL) -> str:
+    """
+    Convert an uploaded reference image into a compact data URL for the LLM.
+    Results are cached by content hash, so repeated edits with the same
+    reference images skip decoding and re-encoding.
+
+    Args:
+        file: Uploaded image file
+        detail: Vision detail level ("low" or "high")
+
+    Returns:
+        Data URL ("data:image/jpeg;base64,...")
+    """
+    content = await file.read()
+    await file.seek(0)  # Reset file pointer for potential re-use
+
+    key = f"{detail}:{hashlib.sha256(content).hexdigest()}"
+    cached = _vision_cache.get(key)
+    record_cache("vision_image", cached is not None)
+    if cached is not None:
+        _vision_cache.move_to_end(key)
+        return cached
+
+    max_long, max_short = VISION_DETAIL_LIMITS.get(detail, VISION_DETAIL_LIMITS["high"])
+    loop = asyncio.get_running_loop()
+    QUEUE_DEPTH.inc(queue="image_optimizer")
+    try:
+        with track_stage("vision_preprocessing"):
+            encoded = await loop.run_in_executor(
+                _get_executor(),
+                partial(_encode_vision_image, content, max_long, max_short, VISION_JPEG_QUALITY)
+            )
+        data_url = f"data:image/jpeg;base64,{base64.b64encode(encoded).decode('utf-8')}"
+    except Exception as e:
+        # Fall back to sending the image as uploaded (not cached: the failure may be transient)
+        logger.warning("Vision image preprocessing failed, sending original", extra={"error": str(e)})
+        content_type = file.content_type or "image/png"
+        return f"data:{content_type};base64,{base64.b64encode(content).decode('utf-8')}"
+    finally:
+        QUEUE_DEPTH.dec(queue="image_optimizer")
+
+    _vision_cache[key] = data_url
+    if len(_vision_cache) > VISION_CACHE_SIZE:
+        _vision_cache.popitem(last=False)
+
+    return data_url
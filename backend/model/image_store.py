@@ -0,0 +1,191 @@
+"""
+Image library backed by Supabase Storage.
+Builds public URLs locally and keeps a short-lived cache of the bucket listing.
+Generated templates showing a stored 1x variant also get its 2x variant
+as a srcset candidate for retina screens.
+"""
+
+import os
+import re
+from urllib.parse import quote, unquote
+from typing import Any, Dict, List, Optional, Tuple
+from dotenv import load_dotenv
+
+from core.metrics import record_cache
+from core.backends import get_cache_backend
+from core.logger import get_logger
+from .rag_service import SUPABASE_URL
+from .repository import ImageStorage
+from .image_optimizer import VARIANT_SCALES, variant_filename, is_variant_filename
+
+# Load environment variables
+load_dotenv()
+
+logger = get_logger(__name__)
+
+SUPABASE_BUCKET = os.getenv("SUPABASE_BUCKET", "email-images")
+IMAGE_LIST_CACHE_TTL = float(os.getenv("IMAGE_LIST_CACHE_TTL", "30"))
+
+# Page size used when walking the bucket (Storage API maximum is 1000)
+STORAGE_LIST_PAGE_SIZE = 1000
+
+_storage = ImageStorage(SUPABASE_BUCKET)
+
+# Cache keys embed a version that uploads/deletes bump, so every worker sees invalidations
+LISTING_VERSION_KEY = "image_listing:version"
+
+_IMG_TAG = re.compile(r"<img\b[^>]*>", re.IGNORECASE)
+_SRC_ATTR = re.compile(r"""\bsrc\s*=\s*(["'])(.*?)\1""", re.IGNORECASE)
+
+
+def get_public_url(filename: str) -> str:
+    """
+    Build the public URL of a stored image without a client round trip.
+
+    Args:
+        filename: Object path inside the bucket
+
+    Returns:
+        Public URL of the object
+    """
+    base_url = (SUPABASE_URL or "").rstrip("/")
+    return f"{base_url}/storage/v1/object/public/{SUPABASE_BUCKET}/{quote(filename, safe='/@')}"
+
+
+def get_image_storage() -> ImageStorage:
+    """Get the storage repository for the image bucket."""
+    return _storage
+
+
+def invalidate_image_cache():
+    """Drop cached listings (call after uploads and deletes)."""
+    get_cache_backend().incr(LISTING_VERSION_KEY)
+
+
+async def _fetch_images(prefix: str, limit: int, offset: int) -> Tuple[List[Dict[str, Any]], bool]:
+    """
+    Originals offset..offset + limit with their display URLs, newest first,
+    and whether more follow. Walks the bucket only as far as the requested
+    page: variants are uploaded right after their original, so newest-first
+    they are listed before it.
+    """
+    # One extra original tells whether another page follows
+    wanted = offset + limit + 1
+    page_size = min(STORAGE_LIST_PAGE_SIZE, wanted * (len(VARIANT_SCALES) + 1))
+    originals: List[Dict[str, Any]] = []
+    names = set()
+    storage_offset = 0
+    while len(originals) < wanted:
+        page = await _storage.list({
+            "limit": page_size,
+            "offset": storage_offset,
+            "sortBy": {"column": "created_at", "order": "desc"},
+            "search": prefix,
+        })
+        for f in page:
+            if not f.get("name"):
+                continue
+            names.add(f["name"])
+            # Optimized variants are listed through their original
+            if not is_variant_filename(f["name"]):
+                originals.append(f)
+        if len(page) < page_size:
+            break
+        storage_offset += page_size
+
+    images = []
+    for f in originals[offset:offset + limit]:
+        display_name = f["name"]
+        for ext in ("jpg", "png"):
+            if variant_filename(f["name"], "1x", ext) in names:
+                display_name = variant_filename(f["name"], "1x", ext)
+                break
+        images.append({
+            "name": f["name"],
+            "url": get_public_url(display_name),
+            "created_at": f.get("created_at")
+        })
+    return images, len(originals) > offset + limit
+
+
+async def list_images(prefix: str = "", limit: int = 100, offset: int = 0) -> Dict[str, Any]:
+    """
+    List uploaded images, one page at a time.
+
+    Args:
+        prefix: Only include images whose name starts with this prefix
+        limit: Page size
+        offset: Number of images to skip
+
+    Returns:
+        Dict with the page of images and pagination info
+    """
+    cache = get_cache_backend()
+    version = cache.get(LISTING_VERSION_KEY) or 0
+    key = f"image_listing:{version}:{prefix}:{offset}:{limit}"
+
+    listing = cache.get(key)
+    record_cache("image_listing", listing is not None)
+    if listing is None:
+        images, has_more = await _fetch_images(prefix, limit, offset)
+        listing = {"images": images, "has_more": has_more}
+        cache.set(key, listing, ttl=IMAGE_LIST_CACHE_TTL)
+
+    return {
+        "images": listing["images"],
+        "limit": limit,
+        "offset": offset,
+        "has_more": listing["has_more"]
+    }
+
+
+async def _retina_variant(name_1x: str) -> Optional[str]:
+    """Storage name of the 2x variant stored next to a 1x variant, or None (narrow sources have none)."""
+    stem, _, ext = name_1x.rpartition(".")
+    name_2x = variant_filename(f"{stem[:-len('@1x')]}.{ext}", "2x", ext)
+
+    cache = get_cache_backend()
+    version = cache.get(LISTING_VERSION_KEY) or 0
+    key = f"image_variant:{version}:{name_2x}"
+    exists = cache.get(key)
+    record_cache("image_variant", exists is not None)
+    if exists is None:
+        page = await _storage.list({"limit": 10, "offset": 0, "search": name_2x})
+        exists = any(f.get("name") == name_2x for f in page)
+        cache.set(key, exists, ttl=IMAGE_LIST_CACHE_TTL)
+    return name_2x if exists else None
+
+
+async def add_retina_srcset(html: str) -> str:
+    """
+    Add srcset="<2x variant> 2x" to <img> tags showing a stored 1x variant.
+    Clients supporting srcset (Apple Mail, iOS) load the sharper image on
+    retina screens; the others keep loading the 1x one.
+
+    Args:
+        html: Generated template HTML
+
+    Returns:
+        HTML with srcset added where a 2x variant exists
+    """
+    base_url = get_public_url("")
+    replacements = {}
+    for tag in set(_IMG_TAG.findall(html)):
+        src = _SRC_ATTR.search(tag)
+        if "srcset" in tag.lower() or not src or not src.group(2).startswith(base_url):
+            continue
+        name = unquote(src.group(2)[len(base_url):])
+        if not name.rsplit(".", 1)[0].endswith("@1x"):
+            continue
+        try:
+            name_2x = await _retina_variant(name)
+        except Exception as e:
+            # Optional: the template works with the 1x image alone
+            logger.warning("Retina variant lookup failed", extra={"image": name, "error": str(e)})
+            continue
+        if name_2x:
+            replacements[tag] = f'{tag[:src.end()]} srcset="{get_public_url(name_2x)} 2x"{tag[src.end():]}'
+
+    for tag, replacement in replacements.items():
+        html = html.replace(tag, replacement)
+    return html
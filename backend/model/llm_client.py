@@ -0,0 +1,248 @@
+"""
+Shared OpenAI client with scheduling, rate budgeting and failure handling.
+Every completion and embedding call goes through call_openai(), which:
+- waits locally for the per-model requests/tokens-per-minute budget instead
+  of running into 429s,
+- runs the call on the priority scheduler (off the event loop),
+- retries timeouts, 429s and 5xx responses with jittered backoff (honouring
+  Retry-After),
+- optionally hedges slow calls of cheap tasks with a second request,
+- feeds a circuit breaker; while it is open, optional stages (prompt
+  enhancement, subject fallback, metadata) are skipped immediately and
+  required calls are tried once, without retries.
+"""
+
+import os
+import json
+import asyncio
+import threading
+from typing import TYPE_CHECKING, Any, Callable, Dict, Optional
+from fastapi import HTTPException
+from dotenv import load_dotenv
+
+from core.metrics import LLM_RETRIES, LLM_HEDGES, RATE_LIMIT_WAIT
+from core.logger import get_logger
+from core.scheduler import PriorityScheduler
+from core.resilience import RateBudget, CircuitBreaker, backoff_delay, is_retryable, retry_after_hint
+
+if TYPE_CHECKING:
+    from openai import OpenAI
+
+# Load environment variables
+load_dotenv()
+
+logger = get_logger(__name__)
+
+OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+# Seconds before a single OpenAI request times out
+OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", "120"))
+
+# All OpenAI calls (completions and embeddings) share one scheduler: at most
+# OPENAI_MAX_CONCURRENCY in flight, background work (auto-save, backfills)
+# capped at OPENAI_CONCURRENCY_BACKGROUND and always queued behind interactive calls
+OPENAI_MAX_CONCURRENCY = int(os.getenv("OPENAI_MAX_CONCURRENCY", "16"))
+OPENAI_CONCURRENCY_INTERACTIVE = int(os.getenv("OPENAI_CONCURRENCY_INTERACTIVE", str(OPENAI_MAX_CONCURRENCY)))
+OPENAI_CONCURRENCY_BACKGROUND = int(os.getenv("OPENAI_CONCURRENCY_BACKGROUND", "2"))
+
+# Per-model budgets for this worker process (0 = unlimited); with several
+# workers set them to the account limits divided by the worker count.
+# OPENAI_RATE_LIMITS='{"gpt-4o": {"rpm": 500, "tpm": 30000}}' overrides single models.
+OPENAI_RPM_LIMIT = int(os.getenv("OPENAI_RPM_LIMIT", "0"))
+OPENAI_TPM_LIMIT = int(os.getenv("OPENAI_TPM_LIMIT", "0"))
+OPENAI_RATE_LIMITS: Dict[str, Dict[str, int]] = json.loads(os.getenv("OPENAI_RATE_LIMITS", "{}"))
+
+# Retries of timeouts / 429 / 5xx: attempts, backoff base and cap, and the
+# longest Retry-After worth waiting for (seconds)
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "2"))
+LLM_BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", "0.5"))
+LLM_BACKOFF_MAX = float(os.getenv("LLM_BACKOFF_MAX", "8"))
+LLM_RETRY_MAX_WAIT = float(os.getenv("LLM_RETRY_MAX_WAIT", "20"))
+
+# Hedging: if a call of a hedged task has not finished after LLM_HEDGE_AFTER
+# seconds, a second identical request is sent and the first answer wins (0 = off)
+LLM_HEDGE_AFTER = float(os.getenv("LLM_HEDGE_AFTER", "0"))
+
+# Consecutive upstream failures that open the circuit, and seconds it stays open
+LLM_BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", "5"))
+LLM_BREAKER_RESET = float(os.getenv("LLM_BREAKER_RESET", "30"))
+
+_openai_scheduler = PriorityScheduler("openai", OPENAI_MAX_CONCURRENCY, {
+    "interactive": OPENAI_CONCURRENCY_INTERACTIVE,
+    "background": OPENAI_CONCURRENCY_BACKGROUND,
+})
+_breaker = CircuitBreaker("openai", LLM_BREAKER_FAILURES, LLM_BREAKER_RESET)
+_budgets: Dict[str, RateBudget] = {}
+
+# OpenAI client is created on first use (importing openai is slow)
+_openai_client: Optional["OpenAI"] = None
+_openai_lock = threading.Lock()
+
+if not OPENAI_API_KEY:
+    logger.error("OPENAI_API_KEY not found in .env file")
+
+
+class UpstreamUnavailable(RuntimeError):
+    """An optional call was skipped because the OpenAI circuit is open."""
+
+
+def is_openai_configured() -> bool:
+    """Check if an OpenAI API key is configured (without creating the client)."""
+    return bool(OPENAI_API_KEY)
+
+
+def get_openai_client() -> "OpenAI":
+    """
+    Get the OpenAI client, creating it on first use (thread-safe).
+    Retries are handled by call_openai(), so the client's own are disabled.
+
+    Returns:
+        OpenAI client instance
+
+    Raises:
+        HTTPException: If the API key is not configured
+    """
+    global _openai_client
+    if _openai_client is None:
+        if not OPENAI_API_KEY:
+            raise HTTPException(500, "OpenAI API key not configured. Please add OPENAI_API_KEY to your .env file.")
+        with _openai_lock:
+            if _openai_client is None:
+                from openai import OpenAI
+
+                # Show first/last chars for debugging (hide the rest)
+                key_preview = f"{OPENAI_API_KEY[:12]}...{OPENAI_API_KEY[-4:]}" if len(OPENAI_API_KEY) > 16 else "KEY_TOO_SHORT"
+                logger.info("OpenAI client initialized", extra={"key_preview": key_preview})
+                _openai_client = OpenAI(api_key=OPENAI_API_KEY, max_retries=0, timeout=OPENAI_TIMEOUT)
+    return _openai_client
+
+
+def get_openai_scheduler() -> PriorityScheduler:
+    """Get the scheduler every OpenAI call runs through."""
+    return _openai_scheduler
+
+
+def get_openai_breaker() -> CircuitBreaker:
+    """Get the circuit breaker tracking OpenAI health."""
+    return _breaker
+
+
+def _budget(model: str) -> RateBudget:
+    if model not in _budgets:
+        limits = OPENAI_RATE_LIMITS.get(model, {})
+        _budgets[model] = RateBudget(limits.get("rpm", OPENAI_RPM_LIMIT), limits.get("tpm", OPENAI_TPM_LIMIT))
+    return _budgets[model]
+
+
+async def _hedged(task: str, model: str, est_tokens: int, call: Callable[[], Any]) -> Any:
+    """Run call(); if it is still running after LLM_HEDGE_AFTER, race a second one."""
+    primary = asyncio.ensure_future(call())
+    done, _ = await asyncio.wait({primary}, timeout=LLM_HEDGE_AFTER)
+    if done:
+        return primary.result()
+
+    await _budget(model).acquire(est_tokens)
+    hedge = asyncio.ensure_future(call())
+    names = {primary: "primary", hedge: "hedge"}
+    pending = {primary, hedge}
+    error: Optional[BaseException] = None
+    while pending:
+        done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        for finished in done:
+            if finished.exception() is None:
+                # The loser's request still completes upstream; its result is dropped
+                for other in pending:
+                    other.cancel()
+                LLM_HEDGES.inc(task=task, winner=names[finished])
+                return finished.result()
+            error = finished.exception()
+    raise error
+
+
+async def call_openai(
+    fn: Callable[..., Any],
+    task: str,
+    est_tokens: int,
+    optional: bool = False,
+    hedge: bool = False,
+    **kwargs
+) -> Any:
+    """
+    Run an OpenAI client call with budgeting, retries, hedging and circuit breaking.
+
+    Args:
+        fn: Client method (e.g. client.chat.completions.create)
+        task: Task label for metrics and logs (e.g. "generation", "embedding")
+        est_tokens: Expected tokens of the call (prompt + max completion)
+        optional: The caller has a fallback; skip the call while the circuit is open
+        hedge: Hedge the call if it is slow (when LLM_HEDGE_AFTER is set)
+        **kwargs: Arguments for fn (its "model" selects the rate budget)
+
+    Returns:
+        Whatever fn returns
+
+    Raises:
+        UpstreamUnavailable: If an optional call is skipped (circuit open)
+        Exception: The client's error once retries are exhausted or for non-retryable errors
+    """
+    if optional and not _breaker.allow():
+        raise UpstreamUnavailable(f"OpenAI unavailable, skipping {task}")
+
+    model = kwargs.get("model", "")
+
+    RATE_LIMIT_WAIT.observe(await _budget(model).acquire(est_tokens), model=model)
+    scheduler = get_openai_scheduler()
+
+    def call():
+        return scheduler.run(fn, **kwargs)
+
+    attempt = 0
+    while True:
+        try:
+            if hedge and LLM_HEDGE_AFTER > 0:
+                response = await _hedged(task, model, est_tokens, call)
+            else:
+                response = await call()
+            _breaker.record_success()
+            return response
+        except Exception as e:
+            if not is_retryable(e):
+                raise
+            _breaker.record_failure()
+            hint = retry_after_hint(e)
+            delay = hint if hint is not None else backoff_delay(attempt, LLM_BACKOFF_BASE, LLM_BACKOFF_MAX)
+            # Retrying into an open circuit only adds load to an unhealthy upstream
+            if attempt >= LLM_MAX_RETRIES or delay > LLM_RETRY_MAX_WAIT or _breaker.is_open:
+                raise
+            LLM_RETRIES.inc(task=task, error=type(e).__name__)
+            logger.warning("Retrying OpenAI call", extra={
+                "task": task, "model": model, "attempt": attempt + 1, "delay_s": round(delay, 2), "error": str(e)
+            })
+            await asyncio.sleep(delay)
+            attempt += 1
+            await _budget(model).acquire(est_tokens)
+
+
+def upstream_http_error(error: Exception, action: str) -> HTTPException:
+    """
+    Map an OpenAI call failure to the HTTP error returned to the client.
+
+    Args:
+        error: Exception raised by call_openai()
+        action: What failed, for the message (e.g. "generate email")
+
+    Returns:
+        HTTPException: 503 (+ Retry-After) for rate limits / overload / open
+        circuit, 504 for timeouts, 502 for other upstream errors, 500 otherwise
+    """
+    if isinstance(error, HTTPException):
+        return error
+    status = getattr(error, "status_code", None)
+    message = f"Failed to {action}: {str(error)}"
+    if isinstance(error, UpstreamUnavailable) or status in (429, 503):
+        retry_after = retry_after_hint(error) or (LLM_BREAKER_RESET if _breaker.is_open else 5)
+        return HTTPException(503, message, headers={"Retry-After": str(max(1, int(retry_after)))})
+    if type(error).__name__ in ("APITimeoutError", "TimeoutException") or isinstance(error, TimeoutError):
+        return HTTPException(504, message)
+    if status is not None or is_retryable(error):
+        return HTTPException(502, message)
+    return HTTPException(500, message)
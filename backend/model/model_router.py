@@ -0,0 +1,202 @@
+"""
+Adaptive model routing for LLM calls.
+Picks the model, max_tokens and temperature per task (subject, metadata,
+enhancement, generation, edits) from the input size and the configured
+latency and cost targets, and records per-route latency and token stats.
+Subject, metadata and enhancement calls are optional (the callers have
+fallbacks), so they are skipped while the OpenAI circuit is open.
+"""
+
+import os
+import json
+import time
+from typing import Any, Dict, List, NamedTuple, Optional
+from dotenv import load_dotenv
+
+from core.metrics import record_llm_usage, cached_prompt_tokens, ROUTE_LATENCY, ROUTE_TOKENS
+from core.logger import get_logger
+from .llm_client import call_openai, get_openai_client
+
+# Load environment variables
+load_dotenv()
+
+logger = get_logger(__name__)
+
+DEFAULT_MODEL = os.getenv("LLM_DEFAULT_MODEL", "gpt-4o-mini")
+
+# Rough per-model characteristics used to estimate latency and cost of a call.
+# cost: USD per 1M tokens; ttft_s: time to first token; tokens_per_s: output speed.
+# Override or extend with LLM_MODEL_PROFILES='{"my-model": {...}}'; fields left out
+# keep the model's built-in value (gpt-4o-mini's for models not listed here).
+MODEL_PROFILES: Dict[str, Dict[str, float]] = {
+    "gpt-4o-mini": {"input_cost": 0.15, "output_cost": 0.60, "ttft_s": 0.5, "tokens_per_s": 80},
+    "gpt-4.1-nano": {"input_cost": 0.10, "output_cost": 0.40, "ttft_s": 0.3, "tokens_per_s": 150},
+    "gpt-4.1-mini": {"input_cost": 0.40, "output_cost": 1.60, "ttft_s": 0.5, "tokens_per_s": 90},
+    "gpt-4o": {"input_cost": 2.50, "output_cost": 10.00, "ttft_s": 0.6, "tokens_per_s": 60},
+}
+MODEL_PROFILES.update({
+    model: {**MODEL_PROFILES.get(model, MODEL_PROFILES["gpt-4o-mini"]), **overrides}
+    for model, overrides in json.loads(os.getenv("LLM_MODEL_PROFILES", "{}")).items()
+})
+
+# Per-task settings. Expected output = output_base + output_ratio * input tokens;
+# max_tokens = expected output * 1.5, clamped to [min_tokens, max_tokens].
+# latency_s / cost_usd are per-call targets (override with LLM_LATENCY_TARGET_<TASK> / LLM_COST_TARGET_<TASK>).
+TASK_PROFILES: Dict[str, Dict[str, float]] = {
+    "subject": {
+        "temperature": 0.7, "output_base": 25, "output_ratio": 0.0,
+        "min_tokens": 40, "max_tokens": 60, "latency_s": 2.0, "cost_usd": 0.0005,
+    },
+    "metadata": {
+        "temperature": 0.3, "output_base": 60, "output_ratio": 0.0,
+        "min_tokens": 100, "max_tokens": 200, "latency_s": 5.0, "cost_usd": 0.002,
+    },
+    "enhancement": {
+        "temperature": 0.7, "output_base": 200, "output_ratio": 0.0,
+        "min_tokens": 200, "max_tokens": 300, "latency_s": 4.0, "cost_usd": 0.001,
+    },
+    "generation": {
+        "temperature": 0.3, "output_base": 2500, "output_ratio": 0.0,
+        "min_tokens": 4000, "max_tokens": 4000, "latency_s": 45.0, "cost_usd": 0.01,
+    },
+    # Patch edit: a few snippet replacements, grows slowly with template size
+    "edit_patch": {
+        "temperature": 0.2, "output_base": 150, "output_ratio": 0.05,
+        "min_tokens": 400, "max_tokens": float(os.getenv("EMAIL_PATCH_MAX_TOKENS", "1500")),
+        "latency_s": 8.0, "cost_usd": 0.002,
+    },
+    # Full regeneration of an existing template: output is about as long as the input HTML
+    "edit_full": {
+        "temperature": 0.3, "output_base": 300, "output_ratio": 0.8,
+        "min_tokens": 1500, "max_tokens": 4000, "latency_s": 45.0, "cost_usd": 0.01,
+    },
+}
+
+
+# Tasks whose callers fall back to a default when the call fails
+OPTIONAL_TASKS = {"subject", "metadata", "enhancement"}
+# Short tasks worth hedging when LLM_HEDGE_AFTER is set
+HEDGE_TASKS = {t.strip() for t in os.getenv("LLM_HEDGE_TASKS", "subject,enhancement,metadata").split(",") if t.strip()}
+
+
+class ModelRoute(NamedTuple):
+    """Settings chosen for one LLM call."""
+    task: str
+    model: str
+    max_tokens: int
+    temperature: float
+    est_input_tokens: int
+    est_output_tokens: int
+    est_latency_s: float
+    est_cost_usd: float
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about 4 characters per token)."""
+    return max(1, len(text) // 4)
+
+
+def _candidates(task: str) -> List[str]:
+    """Models allowed for a task, best first (LLM_MODELS_<TASK>=model-a,model-b)."""
+    configured = os.getenv(f"LLM_MODELS_{task.upper()}", "")
+    models = [m.strip() for m in configured.split(",") if m.strip()]
+    return models or [DEFAULT_MODEL]
+
+
+def _target(task: str, name: str, default: float) -> float:
+    return float(os.getenv(f"LLM_{name.upper()}_TARGET_{task.upper()}", str(default)))
+
+
+def _estimate(model: str, input_tokens: int, output_tokens: int):
+    profile = MODEL_PROFILES.get(model, MODEL_PROFILES["gpt-4o-mini"])
+    latency = profile["ttft_s"] + output_tokens / profile["tokens_per_s"]
+    cost = (input_tokens * profile["input_cost"] + output_tokens * profile["output_cost"]) / 1_000_000
+    return latency, cost
+
+
+def route_for(task: str, input_text: str = "", input_tokens: Optional[int] = None) -> ModelRoute:
+    """
+    Choose model and generation settings for a task.
+    The first candidate model whose estimated latency and cost meet the
+    task's targets wins; if none does, the fastest candidate is used.
+
+    Args:
+        task: One of TASK_PROFILES (subject, metadata, enhancement, generation, edit_patch, edit_full)
+        input_text: Prompt text the size estimate is based on
+        input_tokens: Known input token count (overrides the estimate from input_text)
+
+    Returns:
+        ModelRoute with the chosen settings
+    """
+    profile = TASK_PROFILES[task]
+    tokens_in = input_tokens if input_tokens is not None else estimate_tokens(input_text)
+    expected_out = int(profile["output_base"] + profile["output_ratio"] * tokens_in)
+    max_tokens = int(min(profile["max_tokens"], max(profile["min_tokens"], expected_out * 1.5)))
+    expected_out = min(expected_out, max_tokens)
+
+    latency_target = _target(task, "latency", profile["latency_s"])
+    cost_target = _target(task, "cost", profile["cost_usd"])
+
+    chosen = None
+    estimates = []
+    for model in _candidates(task):
+        latency, cost = _estimate(model, tokens_in, expected_out)
+        estimates.append((model, latency, cost))
+        if latency <= latency_target and cost <= cost_target:
+            chosen = estimates[-1]
+            break
+    if chosen is None:
+        chosen = min(estimates, key=lambda e: e[1])
+    model, latency, cost = chosen
+
+    return ModelRoute(
+        task=task,
+        model=model,
+        max_tokens=max_tokens,
+        temperature=profile["temperature"],
+        est_input_tokens=tokens_in,
+        est_output_tokens=expected_out,
+        est_latency_s=round(latency, 3),
+        est_cost_usd=cost,
+    )
+
+
+async def chat_completion(route: ModelRoute, messages: List[Dict[str, Any]], **kwargs) -> Any:
+    """
+    Run a chat completion with the route's settings and record its stats.
+    The call goes through call_openai() (rate budget, scheduler with the
+    caller's priority class, retries, hedging and the circuit breaker).
+
+    Args:
+        route: Settings from route_for()
+        messages: Chat messages
+        **kwargs: Extra arguments for chat.completions.create (e.g. response_format)
+
+    Returns:
+        OpenAI chat completion response
+
+    Raises:
+        UpstreamUnavailable: If an optional task is skipped (circuit open)
+    """
+    client = get_openai_client()
+    start = time.perf_counter()
+    response = await call_openai(
+        client.chat.completions.create,
+        task=route.task,
+        est_tokens=route.est_input_tokens + route.max_tokens,
+        optional=route.task in OPTIONAL_TASKS,
+        hedge=route.task in HEDGE_TASKS,
+        model=route.model,
+        messages=messages,
+        temperature=route.temperature,
+        max_tokens=route.max_tokens,
+        **kwargs
+    )
+    ROUTE_LATENCY.observe(time.perf_counter() - start, task=route.task, model=route.model)
+    record_llm_usage(route.model, response.usage)
+    if response.usage is not None:
+        ROUTE_TOKENS.inc(response.usage.prompt_tokens or 0, task=route.task, model=route.model, kind="prompt")
+        ROUTE_TOKENS.inc(cached_prompt_tokens(response.usage), task=route.task, model=route.model, kind="cached_prompt")
+        ROUTE_TOKENS.inc(response.usage.completion_tokens or 0, task=route.task, model=route.model, kind="completion")
+    logger.debug("LLM call routed", extra={"route": route._asdict()})
+    return response
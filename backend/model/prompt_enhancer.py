@@ -1,9 +1,39 @@
 """
 Prompt Enhancer Module.
 Uses OpenAI to rewrite and improve user prompts for better RAG search and email generation.
+Enhancements are kept in a semantic cache, so repeated and paraphrased prompts
+reuse an earlier enhancement (one embedding call) instead of a chat completion.
 """
 
-from .embeddings import get_openai_client
+import os
+from dotenv import load_dotenv
+
+from core.metrics import track_stage, OPTIONAL_STAGE_SKIPS
+from core.logger import get_logger
+from .embeddings import generate_embedding
+from .llm_client import UpstreamUnavailable, get_openai_breaker
+from .model_router import route_for, chat_completion
+from .semantic_cache import SemanticCache
+
+# Load environment variables
+load_dotenv()
+
+logger = get_logger(__name__)
+
+# Enhancement cache: entries kept (0 disables), seconds they stay valid, minimum cosine
+# similarity of the raw prompts to reuse an enhancement, and embedding dimensions used
+ENHANCEMENT_CACHE_SIZE = int(os.getenv("ENHANCEMENT_CACHE_SIZE", "1000"))
+ENHANCEMENT_CACHE_TTL = float(os.getenv("ENHANCEMENT_CACHE_TTL", "86400"))
+ENHANCEMENT_CACHE_THRESHOLD = float(os.getenv("ENHANCEMENT_CACHE_THRESHOLD", "0.95"))
+ENHANCEMENT_CACHE_DIMENSIONS = int(os.getenv("ENHANCEMENT_CACHE_DIMENSIONS", "256"))
+
+_enhancement_cache = SemanticCache(
+    "prompt_enhancement",
+    ENHANCEMENT_CACHE_THRESHOLD,
+    ENHANCEMENT_CACHE_SIZE,
+    ENHANCEMENT_CACHE_TTL,
+    ENHANCEMENT_CACHE_DIMENSIONS
+)
 
 SYSTEM_PROMPT = """You are an expert prompt engineer and email marketing strategist.
 Your goal is to rewrite the user's raw email request into a detailed, structured, and high-quality prompt for an AI email generator.
@@ -24,9 +54,16 @@ Input: "marketing email for shoes"
 Output: "Create a vibrant marketing email for a summer shoe sale. Target audience is young adults. Tone should be energetic and stylish. Include a clear hero section with a 'Shop Now' call-to-action, a grid showcasing top selling sneakers and sandals, and a 'Free Shipping' banner in the footer."
 """
 
+
+def get_enhancement_cache() -> SemanticCache:
+    """Get the semantic cache of prompt enhancements."""
+    return _enhancement_cache
+
+
 async def enhance_user_prompt(raw_prompt: str) -> str:
     """
     Enhance a raw user prompt using OpenAI.
+    A cached enhancement of the same or a similar prompt is reused if there is one.
     
     Args:
         raw_prompt: The original user input (e.g., "marketing email")
@@ -34,23 +71,46 @@ async def enhance_user_prompt(raw_prompt: str) -> str:
     Returns:
         A detailed, structured prompt optimized for generation and search.
     """
-    client = get_openai_client()
+    source = " ".join(raw_prompt.lower().split())
+    hit = _enhancement_cache.get_exact(source)
+    if hit is not None:
+        return hit.value
+
+    # Skip the lookup while OpenAI is unhealthy (the enhancement would be skipped too)
+    embedding = None
+    if _enhancement_cache.enabled and not get_openai_breaker().is_open:
+        try:
+            embedding = await generate_embedding(source, dimensions=ENHANCEMENT_CACHE_DIMENSIONS)
+            hit = _enhancement_cache.lookup(embedding)
+        except Exception as e:
+            logger.warning("Enhancement cache lookup failed", extra={"error": str(e)})
+        if hit is not None:
+            logger.debug("Reusing cached enhancement", extra={"similarity": round(hit.similarity, 4)})
+            return hit.value
+
+    route = route_for("enhancement", raw_prompt)
     
     try:
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
+        with track_stage("prompt_enhancement"):
+            response = await chat_completion(route, [
                 {"role": "system", "content": SYSTEM_PROMPT},
                 {"role": "user", "content": raw_prompt}
-            ],
-            temperature=0.7,
-            max_tokens=300
-        )
+            ])
         
         enhanced_prompt = response.choices[0].message.content.strip()
-        print(f"✨ Enhanced Prompt:\nFROM: {raw_prompt}\nTO: {enhanced_prompt}")
+        logger.info(
+            "Prompt enhanced",
+            extra={"raw_chars": len(raw_prompt), "enhanced_chars": len(enhanced_prompt)}
+        )
+        logger.debug("Enhanced prompt", extra={"raw_prompt": raw_prompt, "enhanced_prompt": enhanced_prompt})
+        if embedding is not None and enhanced_prompt:
+            _enhancement_cache.store(source, embedding, enhanced_prompt)
         return enhanced_prompt
         
+    except UpstreamUnavailable:
+        OPTIONAL_STAGE_SKIPS.inc(stage="prompt_enhancement", reason="circuit_open")
+        return raw_prompt
     except Exception as e:
-        print(f"⚠️ Prompt enhancement failed: {e}")
+        OPTIONAL_STAGE_SKIPS.inc(stage="prompt_enhancement", reason="error")
+        logger.warning("Prompt enhancement failed, using original prompt", extra={"error": str(e)})
         return raw_prompt  # Fallback to original prompt
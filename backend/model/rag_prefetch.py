@@ -0,0 +1,211 @@
+"""
+Speculative RAG prefetch.
+While the user is still typing a brief, the frontend sends the (debounced)
+draft to /prefetch-rag. The draft is enhanced and its RAG context retrieved
+in the background, which also fills the enhancement and RAG context caches,
+and the result is kept in one slot per generator session. When
+/generate-email-rag arrives with the same prompt and draft ID it takes the
+slot's result (waiting for it if the prefetch is still running) instead of
+doing the enhancement and retrieval again.
+
+Prefetches only use idle OpenAI capacity: they are skipped while interactive
+calls are queueing or the circuit breaker is open, and each client may start
+at most RAG_PREFETCH_PER_MINUTE of them.
+"""
+
+import os
+import time
+import asyncio
+from collections import OrderedDict, deque
+from typing import Deque, NamedTuple, Optional, Tuple
+from dotenv import load_dotenv
+
+from core.metrics import record_cache
+from core.logger import get_logger
+from .llm_client import get_openai_breaker, get_openai_scheduler
+from .prompt_enhancer import enhance_user_prompt
+from .rag_service import get_rag_context
+
+# Load environment variables
+load_dotenv()
+
+logger = get_logger(__name__)
+
+# Sessions with a result slot (0 disables prefetching), seconds a result stays
+# usable, and shortest draft worth prefetching
+RAG_PREFETCH_MAX_SLOTS = int(os.getenv("RAG_PREFETCH_MAX_SLOTS", "1000"))
+RAG_PREFETCH_TTL = float(os.getenv("RAG_PREFETCH_TTL", "120"))
+RAG_PREFETCH_MIN_CHARS = int(os.getenv("RAG_PREFETCH_MIN_CHARS", "12"))
+# Prefetches a client (IP address) may start per minute (0 = no cap)
+RAG_PREFETCH_PER_MINUTE = int(os.getenv("RAG_PREFETCH_PER_MINUTE", "20"))
+
+_CLIENT_WINDOW_S = 60.0
+
+
+def _normalize(prompt: str) -> str:
+    return " ".join(prompt.split())
+
+
+class _Slot(NamedTuple):
+    prompt: str
+    task: "asyncio.Task[Tuple[str, str]]"
+    expires_at: float
+
+
+class RagPrefetcher:
+    """
+    One speculative (enhanced prompt, RAG context) result per draft ID.
+
+    Args:
+        max_slots: Draft IDs tracked at once, least recently used dropped first (0 disables)
+        ttl_s: Seconds a prefetched result stays usable
+        min_chars: Drafts shorter than this are not prefetched
+        per_minute: Prefetches one client may start per minute (0 = no cap)
+    """
+
+    def __init__(
+        self,
+        max_slots: int = RAG_PREFETCH_MAX_SLOTS,
+        ttl_s: float = RAG_PREFETCH_TTL,
+        min_chars: int = RAG_PREFETCH_MIN_CHARS,
+        per_minute: int = RAG_PREFETCH_PER_MINUTE
+    ):
+        self.max_slots = max_slots
+        self.ttl_s = ttl_s
+        self.min_chars = min_chars
+        self.per_minute = per_minute
+        self._slots: "OrderedDict[str, _Slot]" = OrderedDict()
+        # Start times of recent prefetches per client, least recently active dropped first
+        self._starts: "OrderedDict[str, Deque[float]]" = OrderedDict()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_slots > 0
+
+    def _drop(self, draft_id: str):
+        slot = self._slots.pop(draft_id, None)
+        if slot is not None and not slot.task.done():
+            slot.task.cancel()
+
+    async def _warm(self, prompt: str) -> Tuple[str, str]:
+        enhanced_prompt = await enhance_user_prompt(prompt)
+        return enhanced_prompt, await get_rag_context(enhanced_prompt)
+
+    @staticmethod
+    def _log_failure(task: asyncio.Task):
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning("RAG prefetch failed", extra={"error": str(task.exception())})
+
+    def retry_after(self, client: str) -> float:
+        """
+        Seconds until the client may start another prefetch.
+
+        Args:
+            client: Client address
+
+        Returns:
+            0 if it is under its per-minute cap
+        """
+        starts = self._starts.get(client)
+        if not self.per_minute or starts is None:
+            return 0.0
+        now = time.monotonic()
+        while starts and now - starts[0] >= _CLIENT_WINDOW_S:
+            starts.popleft()
+        if len(starts) < self.per_minute:
+            return 0.0
+        return starts[0] + _CLIENT_WINDOW_S - now
+
+    def _count_start(self, client: str):
+        starts = self._starts.pop(client, None) or deque()
+        starts.append(time.monotonic())
+        self._starts[client] = starts
+        while len(self._starts) > max(self.max_slots, 1):
+            self._starts.popitem(last=False)
+
+    def prefetch(self, draft_id: str, prompt: str, client: str = "") -> str:
+        """
+        Start warming the result for a draft (replacing the slot's previous draft).
+
+        Args:
+            draft_id: Client-generated ID of the generator session
+            prompt: Current draft of the brief
+            client: Client address (see retry_after)
+
+        Returns:
+            "started", "pending" or "ready" (same draft already prefetched),
+            or "skipped" (disabled, draft too short, OpenAI busy or client over its cap)
+        """
+        prompt = _normalize(prompt)
+        if not self.enabled or len(prompt) < self.min_chars:
+            return "skipped"
+
+        slot = self._slots.get(draft_id)
+        if slot is not None and slot.prompt == prompt and slot.expires_at > time.monotonic():
+            self._slots.move_to_end(draft_id)
+            return "ready" if slot.task.done() else "pending"
+
+        if get_openai_breaker().is_open or get_openai_scheduler().estimated_wait("interactive") > 0:
+            return "skipped"
+        if self.retry_after(client) > 0:
+            return "skipped"
+
+        self._count_start(client)
+        self._drop(draft_id)
+        while len(self._slots) >= self.max_slots:
+            self._drop(next(iter(self._slots)))
+        task = asyncio.create_task(self._warm(prompt))
+        task.add_done_callback(self._log_failure)
+        self._slots[draft_id] = _Slot(prompt, task, time.monotonic() + self.ttl_s)
+        return "started"
+
+    async def take(self, draft_id: Optional[str], prompt: str) -> Optional[Tuple[str, str]]:
+        """
+        Use the prefetched result for this exact prompt, waiting if it is still running.
+
+        Args:
+            draft_id: Draft ID sent with the generation request (None: no prefetch)
+            prompt: Final prompt of the generation request
+
+        Returns:
+            (enhanced prompt, RAG context), or None if there is no usable prefetch
+        """
+        if not draft_id or not self.enabled:
+            return None
+        slot = self._slots.get(draft_id)
+        usable = slot is not None and slot.prompt == _normalize(prompt) and slot.expires_at > time.monotonic()
+        record_cache("rag_prefetch", usable)
+        if not usable:
+            return None
+
+        self._slots.pop(draft_id, None)
+        try:
+            # Shielded: a disconnecting client must not cancel the work for its retry
+            return await asyncio.shield(slot.task)
+        except asyncio.CancelledError:
+            if slot.task.cancelled():
+                return None
+            raise
+        except Exception:
+            return None
+
+    def discard(self, draft_id: Optional[str], prompt: str):
+        """
+        Drop a draft's prefetch for this prompt without using it (a duplicate
+        request was served by another one's generation).
+
+        Args:
+            draft_id: Draft ID sent with the generation request
+            prompt: Final prompt of the generation request
+        """
+        slot = self._slots.get(draft_id) if draft_id else None
+        if slot is not None and slot.prompt == _normalize(prompt):
+            self._drop(draft_id)
+
+
+_prefetcher = RagPrefetcher()
+
+
+def get_rag_prefetcher() -> RagPrefetcher:
+    """Get the process-wide RAG prefetcher."""
+    return _prefetcher
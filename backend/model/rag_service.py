@@ -1,39 +1,86 @@
 """
 RAG (Retrieval Augmented Generation) service for email templates.
 Handles searching and retrieving similar templates from Supabase.
+Retrieved contexts are cached by normalized query and corpus version; every
+write to the template corpus bumps the version, so cached contexts are never
+served after the templates they were built from changed.
 """
 
 import os
-from typing import List, Optional
+import hashlib
+import threading
+from typing import TYPE_CHECKING, List, Optional
 from dotenv import load_dotenv
-from supabase import create_client, Client
 
+from core.metrics import record_cache
+from core.backends import get_cache_backend
+from core.logger import get_logger
 from .embeddings import generate_embedding
+from .search_backend import get_search_backend
+
+if TYPE_CHECKING:
+    from supabase import Client
 
 # Load environment variables
 load_dotenv()
 
+logger = get_logger(__name__)
+
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_KEY")
+# Seconds a retrieved RAG context stays cached (0 disables the cache); writes through
+# this app invalidate it immediately, the TTL bounds staleness after direct SQL edits
+RAG_CACHE_TTL = float(os.getenv("RAG_CACHE_TTL", "3600"))
+
+# Cache keys embed a version that template writes bump, so every worker sees invalidations
+CORPUS_VERSION_KEY = "template_corpus:version"
+
+# Supabase client is created on first use (importing supabase is slow)
+_supabase_client: Optional["Client"] = None
+_supabase_lock = threading.Lock()
+
+if not (SUPABASE_URL and SUPABASE_KEY):
+    logger.warning("Supabase not configured, RAG features will be disabled")
+
+
+def is_supabase_configured() -> bool:
+    """Check if Supabase credentials are configured (without creating the client)."""
+    return bool(SUPABASE_URL and SUPABASE_KEY)
 
-# Initialize Supabase client
-supabase: Optional[Client] = None
-if SUPABASE_URL and SUPABASE_KEY:
-    supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
-    print(f"✅ Supabase connected for RAG")
-else:
-    print("⚠️ Supabase not configured. RAG features will be disabled.")
 
+def get_corpus_version() -> int:
+    """Current version of the template corpus (bumped by every write)."""
+    return get_cache_backend().get(CORPUS_VERSION_KEY) or 0
 
-def get_supabase_client() -> Optional[Client]:
-    """Get the initialized Supabase client."""
-    return supabase
+
+def bump_corpus_version() -> int:
+    """Invalidate cached RAG contexts (call after saving, deleting or re-embedding templates)."""
+    return get_cache_backend().incr(CORPUS_VERSION_KEY)
+
+
+def _rag_cache_key(prompt: str, max_templates: int, version: int) -> str:
+    normalized = " ".join(prompt.lower().split())
+    digest = hashlib.sha256(f"{max_templates}:{normalized}".encode()).hexdigest()
+    return f"rag_context:{version}:{digest}"
+
+
+def get_supabase_client() -> Optional["Client"]:
+    """Get the Supabase client, creating it on first use (thread-safe). None if not configured."""
+    global _supabase_client
+    if _supabase_client is None and is_supabase_configured():
+        with _supabase_lock:
+            if _supabase_client is None:
+                from supabase import create_client
+                
+                _supabase_client = create_client(SUPABASE_URL, SUPABASE_KEY)
+                logger.info("Supabase connected for RAG")
+    return _supabase_client
 
 
 async def get_rag_context(prompt: str, max_templates: int = 3) -> str:
     """
     Get RAG context by searching for similar templates.
-    Returns formatted context string for the AI prompt.
+    Returns formatted context string for the AI prompt (cached per query and corpus version).
     
     Args:
         prompt: User's email generation prompt
@@ -42,33 +89,28 @@ async def get_rag_context(prompt: str, max_templates: int = 3) -> str:
     Returns:
         Formatted context string with similar templates
     """
-    if not supabase:
+    if not is_supabase_configured():
         return ""
     
+    cache = get_cache_backend()
+    key = _rag_cache_key(prompt, max_templates, get_corpus_version()) if RAG_CACHE_TTL > 0 else None
+    if key is not None:
+        cached = cache.get(key)
+        record_cache("rag_context", cached is not None)
+        if cached is not None:
+            logger.debug("RAG context from cache", extra={"template_ids": cached["template_ids"]})
+            return cached["context"]
+    
     try:
         # Generate query embedding
-        query_embedding = generate_embedding(prompt)
-        
-        # Try hybrid search first
-        try:
-            result = supabase.rpc("hybrid_search_templates", {
-                "query_text": prompt,
-                "query_embedding": query_embedding,
-                "match_count": max_templates,
-                "full_text_weight": 1.0,
-                "semantic_weight": 1.0,
-                "rrf_k": 60
-            }).execute()
-        except Exception:
-            # Fallback to semantic search if hybrid function not available
-            result = supabase.rpc("semantic_search_templates", {
-                "query_embedding": query_embedding,
-                "match_count": max_templates
-            }).execute()
+        query_embedding = await generate_embedding(prompt)
         
-        templates = result.data if result.data else []
+        # Hybrid search if the database has it, else semantic (capability is cached)
+        templates, _ = await get_search_backend().search(prompt, query_embedding, max_templates, stage="rag_rpc")
         
         if not templates:
+            if key is not None:
+                cache.set(key, {"template_ids": [], "context": ""}, ttl=RAG_CACHE_TTL)
             return ""
         
         # Format context for AI
@@ -86,9 +128,9 @@ HTML Code:
         
         context = "\n".join(context_parts)
         
-        print(f"📚 RAG Context: Found {len(templates)} similar templates")
+        logger.info("RAG context retrieved", extra={"templates": len(templates)})
         
-        return f"""
+        rag_context = f"""
 === REFERENCE TEMPLATES (Use these as style/structure guides) ===
 The following are similar high-quality email templates from our database.
 Use them as inspiration for layout, structure, and design patterns.
@@ -96,7 +138,10 @@ Do NOT copy them exactly - create a NEW template based on the user's request.
 {context}
 === END REFERENCE TEMPLATES ===
 """
+        if key is not None:
+            cache.set(key, {"template_ids": [tpl.get("id") for tpl in templates], "context": rag_context}, ttl=RAG_CACHE_TTL)
+        return rag_context
     
     except Exception as e:
-        print(f"⚠️ RAG context error (non-fatal): {str(e)}")
+        logger.warning("RAG context error (non-fatal)", extra={"error": str(e)})
         return ""
@@ -0,0 +1,387 @@
+"""
+Async data access for Supabase (email_templates table, RPCs and Storage).
+The supabase client is synchronous, so every call runs on a bounded thread
+pool with a per-operation timeout and never blocks the event loop. All
+calls share one client (and its HTTP connection pool).
+
+Template reads return full HTML: rows stored as deltas against a base
+(see template_versions.py) are rebuilt before they are returned.
+"""
+
+import os
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+from dotenv import load_dotenv
+
+from core.metrics import track_stage, QUEUE_DEPTH
+from core.logger import get_logger
+from . import rag_service
+from .template_versions import (
+    TEMPLATE_VERSIONING, TEMPLATE_DELTA_MAX_CHAIN, DeltaError, apply_delta, get_materialized_cache, make_delta,
+    worth_delta
+)
+
+# Load environment variables
+load_dotenv()
+
+logger = get_logger(__name__)
+
+SUPABASE_MAX_WORKERS = int(os.getenv("SUPABASE_MAX_WORKERS", "8"))
+SUPABASE_TIMEOUT = float(os.getenv("SUPABASE_TIMEOUT", "10"))
+SUPABASE_STORAGE_TIMEOUT = float(os.getenv("SUPABASE_STORAGE_TIMEOUT", "30"))
+
+TEMPLATES_TABLE = "email_templates"
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+class RepositoryTimeout(TimeoutError):
+    """A Supabase operation did not finish within its timeout."""
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    """Create the Supabase thread pool on first use."""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=SUPABASE_MAX_WORKERS, thread_name_prefix="supabase")
+    return _executor
+
+
+def shutdown_repository():
+    """Stop the Supabase thread pool (called on app shutdown)."""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+def _client():
+    supabase = rag_service.get_supabase_client()
+    if not supabase:
+        raise RuntimeError("Supabase not configured")
+    return supabase
+
+
+async def run_supabase(operation: str, fn: Callable[[], Any], timeout: float = SUPABASE_TIMEOUT) -> Any:
+    """
+    Run a blocking Supabase call on the thread pool.
+
+    Args:
+        operation: Stage name for metrics and errors (e.g. "templates_list")
+        fn: Zero-argument function doing the call
+        timeout: Seconds before giving up
+
+    Returns:
+        Whatever fn returns
+
+    Raises:
+        RepositoryTimeout: If the call takes longer than timeout
+    """
+    loop = asyncio.get_running_loop()
+    QUEUE_DEPTH.inc(queue="supabase")
+    try:
+        with track_stage(operation):
+            return await asyncio.wait_for(loop.run_in_executor(_get_executor(), fn), timeout)
+    except asyncio.TimeoutError:
+        # The worker thread finishes in the background; the caller stops waiting
+        logger.warning("Supabase operation timed out", extra={"operation": operation, "timeout_s": timeout})
+        raise RepositoryTimeout(f"Supabase {operation} timed out after {timeout:g}s")
+    finally:
+        QUEUE_DEPTH.dec(queue="supabase")
+
+
+# ==================================================================
+# EMAIL TEMPLATES
+# ==================================================================
+class TemplateRepository:
+    """CRUD and search RPCs for the email_templates table."""
+
+    async def insert(self, data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Insert a template and return the stored row."""
+        result = await run_supabase(
+            "templates_insert",
+            lambda: _client().table(TEMPLATES_TABLE).insert(data).execute()
+        )
+        return result.data[0] if result.data else None
+
+    async def insert_version(self, data: Dict[str, Any], parent_id: Optional[str]) -> Optional[Dict[str, Any]]:
+        """
+        Insert a template as the next version of parent_id. Its HTML is
+        stored as a delta against the parent's HTML when that is small
+        enough and the parent's delta chain is shorter than
+        TEMPLATE_DELTA_MAX_CHAIN, else in full.
+
+        Args:
+            data: Template row with the full template_code
+            parent_id: Template this one was derived from (None starts a new lineage)
+
+        Returns:
+            The stored row (with the full template_code)
+        """
+        parent = await self._version_info(parent_id) if TEMPLATE_VERSIONING and parent_id else None
+        if parent is None:
+            return await self.insert(data)
+
+        html = data["template_code"]
+        depth = parent.get("delta_depth") or 0
+        data = {
+            **data,
+            "lineage_id": parent.get("lineage_id") or parent["id"],
+            "parent_id": parent["id"],
+            "version": (parent.get("version") or 1) + 1,
+        }
+        parent_html = await self.template_html(parent["id"]) if depth < TEMPLATE_DELTA_MAX_CHAIN else None
+        if parent_html is not None:
+            delta = await asyncio.to_thread(make_delta, parent_html, html)
+            if worth_delta(delta, html):
+                data.update(template_code=None, template_delta=delta, base_id=parent["id"], delta_depth=depth + 1)
+
+        row = await self.insert(data)
+        if not row:
+            return row
+        if data.get("base_id") and await self._version_info(parent["id"]) is None:
+            # The parent was deleted while this version was saved (after its dependents were rebased)
+            await self._store_in_full(row["id"], html)
+        row["template_code"] = html
+        get_materialized_cache().put(row["id"], html)
+        return row
+
+    async def _version_info(self, template_id: str) -> Optional[Dict[str, Any]]:
+        result = await run_supabase("templates_version_info", lambda: _client().table(TEMPLATES_TABLE).select(
+            "id, lineage_id, version, delta_depth"
+        ).eq("id", template_id).limit(1).execute())
+        return result.data[0] if result.data else None
+
+    async def latest_by_subject(self, subject: str, created_by: str) -> Optional[str]:
+        """ID of the newest template with exactly this subject sent by the same user (the parent for a resend)."""
+        result = await run_supabase("templates_latest_by_subject", lambda: _client().table(TEMPLATES_TABLE).select(
+            "id"
+        ).eq("subject", subject).eq("created_by", created_by).order("created_at", desc=True).limit(1).execute())
+        return result.data[0]["id"] if result.data else None
+
+    async def versions(self, template_id: str) -> List[Dict[str, Any]]:
+        """All versions in a template's lineage (without HTML), oldest first."""
+        info = await self._version_info(template_id)
+        if info is None:
+            return []
+        lineage_id = info.get("lineage_id") or info["id"]
+        columns = "id, subject, parent_id, version, base_id, created_at"
+        root, rest = await asyncio.gather(
+            run_supabase("templates_versions", lambda: _client().table(TEMPLATES_TABLE).select(
+                columns
+            ).eq("id", lineage_id).execute()),
+            run_supabase("templates_versions", lambda: _client().table(TEMPLATES_TABLE).select(
+                columns
+            ).eq("lineage_id", lineage_id).execute()),
+        )
+        rows = (root.data or []) + (rest.data or [])
+        return sorted(rows, key=lambda row: (row.get("version") or 1, str(row.get("created_at") or "")))
+
+    async def template_html(self, template_id: str) -> Optional[str]:
+        """Full HTML of one template (rebuilt if stored as a delta)."""
+        html = get_materialized_cache().get(template_id)
+        if html is not None:
+            return html
+        result = await run_supabase("templates_html", lambda: _client().table(TEMPLATES_TABLE).select(
+            "id, template_code"
+        ).eq("id", template_id).limit(1).execute())
+        if not result.data:
+            return None
+        return (await self._materialize(result.data))[0]["template_code"]
+
+    async def _materialize(self, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Fill in template_code of rows stored as deltas (in place)."""
+        pending = [row for row in rows if "template_code" in row and row["template_code"] is None and row.get("id")]
+        if not pending:
+            return rows
+        cache = get_materialized_cache()
+        html: Dict[str, str] = {row["id"]: row["template_code"] for row in rows if row.get("template_code")}
+        deltas: Dict[str, Dict[str, Any]] = {}
+
+        # Walk up the delta chains: one query per level for the versions not cached
+        wanted = {row["id"] for row in pending}
+        for _ in range(TEMPLATE_DELTA_MAX_CHAIN + 1):
+            for template_id in list(wanted):
+                cached = cache.get(template_id)
+                if cached is not None:
+                    html[template_id] = cached
+            wanted = [template_id for template_id in wanted if template_id not in html and template_id not in deltas]
+            if not wanted:
+                break
+            result = await run_supabase("templates_deltas", lambda: _client().table(TEMPLATES_TABLE).select(
+                "id, template_code, base_id, template_delta"
+            ).in_("id", wanted).execute())
+            wanted = set()
+            for row in result.data or []:
+                if row.get("template_code") is not None:
+                    html[row["id"]] = row["template_code"]
+                    cache.put(row["id"], row["template_code"])
+                elif row.get("base_id") and row.get("template_delta"):
+                    deltas[row["id"]] = row
+                    if row["base_id"] not in html:
+                        wanted.add(row["base_id"])
+
+        def resolve(template_id: str) -> Optional[str]:
+            chain = []
+            while template_id not in html:
+                if template_id not in deltas or len(chain) > TEMPLATE_DELTA_MAX_CHAIN:
+                    logger.error("Template delta chain is broken", extra={"template_id": template_id})
+                    return None
+                chain.append(template_id)
+                template_id = deltas[template_id]["base_id"]
+            for version_id in reversed(chain):
+                try:
+                    html[version_id] = apply_delta(html[template_id], deltas[version_id]["template_delta"])
+                except DeltaError as e:
+                    logger.error("Template delta does not apply", extra={"template_id": version_id, "error": str(e)})
+                    return None
+                cache.put(version_id, html[version_id])
+                template_id = version_id
+            return html[template_id]
+
+        for row in pending:
+            row["template_code"] = resolve(row["id"])
+        return rows
+
+    async def _store_in_full(self, template_id: str, html: str):
+        values = {"template_code": html, "template_delta": None, "base_id": None, "delta_depth": 0}
+        await run_supabase("templates_rebase", lambda: _client().table(TEMPLATES_TABLE).update(
+            values
+        ).eq("id", template_id).execute())
+
+    async def _rebase_dependents(self, template_id: str, base_html: str):
+        """Store the versions diffed against a template in full (it is being deleted)."""
+        result = await run_supabase("templates_dependents", lambda: _client().table(TEMPLATES_TABLE).select(
+            "id, template_delta"
+        ).eq("base_id", template_id).execute())
+        for row in result.data or []:
+            try:
+                html = apply_delta(base_html, row["template_delta"])
+            except DeltaError as e:
+                logger.error("Template delta does not apply", extra={"template_id": row["id"], "error": str(e)})
+                continue
+            await self._store_in_full(row["id"], html)
+        if result.data:
+            logger.info("Template versions stored in full", extra={"template_id": template_id, "count": len(result.data)})
+
+    async def list(self, limit: int = 50) -> List[Dict[str, Any]]:
+        """Newest templates first."""
+        result = await run_supabase("templates_list", lambda: _client().table(TEMPLATES_TABLE).select(
+            "id, subject, description, template_code, category, visibility, created_at"
+        ).order("created_at", desc=True).limit(limit).execute())
+        return await self._materialize(result.data or [])
+
+    async def get(self, template_id: str) -> Optional[Dict[str, Any]]:
+        """Get one template by ID."""
+        result = await run_supabase("templates_get", lambda: _client().table(TEMPLATES_TABLE).select(
+            "id, subject, description, template_code, created_at"
+        ).eq("id", template_id).single().execute())
+        if result.data:
+            await self._materialize([result.data])
+        return result.data
+
+    async def delete(self, template_id: str):
+        """Delete a template by ID (versions stored against it are rebased first)."""
+        base_html = await self.template_html(template_id) if TEMPLATE_VERSIONING else None
+        if base_html is not None:
+            await self._rebase_dependents(template_id, base_html)
+        get_materialized_cache().discard(template_id)
+        await run_supabase(
+            "templates_delete",
+            lambda: _client().table(TEMPLATES_TABLE).delete().eq("id", template_id).execute()
+        )
+        if base_html is not None:
+            # Versions saved against it between the rebase and the delete
+            await self._rebase_dependents(template_id, base_html)
+
+    async def without_embeddings(self) -> List[Dict[str, Any]]:
+        """Templates that still need an embedding."""
+        result = await run_supabase("templates_without_embeddings", lambda: _client().table(TEMPLATES_TABLE).select(
+            "id, subject, description"
+        ).is_("embedding", "null").execute())
+        return result.data or []
+
+    async def update_embedding(self, template_id: str, embedding: List[float]):
+        """Store a template's embedding."""
+        await run_supabase("templates_update", lambda: _client().table(TEMPLATES_TABLE).update({
+            "embedding": embedding
+        }).eq("id", template_id).execute())
+
+    async def get_many(self, template_ids: List[str], with_embeddings: bool = False) -> List[Dict[str, Any]]:
+        """Get several templates by ID (in no particular order)."""
+        columns = "id, subject, description, template_code, category, visibility, created_at"
+        if with_embeddings:
+            columns += ", embedding"
+        result = await run_supabase("templates_get_many", lambda: _client().table(TEMPLATES_TABLE).select(
+            columns
+        ).in_("id", template_ids).execute())
+        return await self._materialize(result.data or [])
+
+    async def embeddings_page(self, offset: int, limit: int) -> List[Dict[str, Any]]:
+        """One page of (id, embedding) rows, for building a local index."""
+        result = await run_supabase("templates_embeddings", lambda: _client().table(TEMPLATES_TABLE).select(
+            "id, embedding"
+        ).not_.is_("embedding", "null").order("id").range(offset, offset + limit - 1).execute())
+        return result.data or []
+
+    async def ids_page(self, offset: int, limit: int) -> List[str]:
+        """One page of IDs of templates with embeddings (searchable templates)."""
+        result = await run_supabase("templates_ids", lambda: _client().table(TEMPLATES_TABLE).select(
+            "id"
+        ).not_.is_("embedding", "null").order("id").range(offset, offset + limit - 1).execute())
+        return [row["id"] for row in result.data or []]
+
+    async def export_page(self, offset: int, limit: int) -> List[Dict[str, Any]]:
+        """One page of complete rows (with HTML and embeddings), for corpus snapshots."""
+        result = await run_supabase("templates_export", lambda: _client().table(TEMPLATES_TABLE).select(
+            "id, subject, description, template_code, category, visibility, created_at, embedding"
+        ).not_.is_("embedding", "null").order("id").range(offset, offset + limit - 1).execute(),
+            timeout=SUPABASE_STORAGE_TIMEOUT)
+        return await self._materialize(result.data or [])
+
+    async def rpc(self, function: str, params: Dict[str, Any], operation: str = "rpc") -> List[Dict[str, Any]]:
+        """Call a database function (e.g. a search RPC) and return its rows."""
+        result = await run_supabase(operation, lambda: _client().rpc(function, params).execute())
+        return await self._materialize(result.data or [])
+
+
+# ==================================================================
+# STORAGE
+# ==================================================================
+class ImageStorage:
+    """Object operations on one Supabase Storage bucket."""
+
+    def __init__(self, bucket: str):
+        self.bucket = bucket
+
+    def _bucket(self):
+        return _client().storage.from_(self.bucket)
+
+    async def upload(self, path: str, content: bytes, content_type: str):
+        """Upload an object."""
+        await run_supabase(
+            "storage_upload",
+            lambda: self._bucket().upload(path=path, file=content, file_options={"content-type": content_type}),
+            timeout=SUPABASE_STORAGE_TIMEOUT
+        )
+
+    async def list(self, options: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """List one page of objects at the bucket root."""
+        return await run_supabase("storage_list", lambda: self._bucket().list("", options))
+
+    async def remove(self, paths: List[str]):
+        """Delete objects (missing paths are ignored)."""
+        await run_supabase("storage_remove", lambda: self._bucket().remove(paths))
+
+
+_templates = TemplateRepository()
+
+
+def get_template_repository() -> TemplateRepository:
+    """Get the shared template repository."""
+    return _templates
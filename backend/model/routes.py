@@ -2,31 +2,87 @@
 API routes for AI email generation, RAG templates, and image management.
 """
 
-import os
+import json
+import math
 import uuid
-from typing import List, Optional
-from fastapi import APIRouter, HTTPException, Form, UploadFile, File
+import asyncio
+import hashlib
+from io import BytesIO
+from typing import Any, Dict, List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Form, UploadFile, File, Query, Request
 from dotenv import load_dotenv
 
-from .embeddings import generate_embedding, get_openai_client
-from .rag_service import get_supabase_client, get_rag_context
+from core.logger import get_logger
+from core.singleflight import SingleFlight, make_key
+from core.scheduler import call_priority
+from core.admission import AdmissionController
+from .embeddings import generate_embedding, get_openai_client, get_openai_scheduler
+from .rag_service import is_supabase_configured, get_rag_context, bump_corpus_version
+from .repository import get_template_repository, RepositoryTimeout
+from .search_backend import get_search_backend
 from .email_generator import generate_email_html
 from .prompt_enhancer import enhance_user_prompt
+from .rag_prefetch import get_rag_prefetcher
+from .image_optimizer import optimize_image, variant_filename, VARIANT_SCALES
+from .image_store import get_image_storage, get_public_url, list_images as list_bucket_images, invalidate_image_cache
 from schema.email import EmailGenerationResponse
 from schema.template import TemplateListResponse
 
 load_dotenv()
 
-SUPABASE_BUCKET = os.getenv("SUPABASE_BUCKET", "email-images")
+logger = get_logger(__name__)
 
 router = APIRouter()
 
+# Identical /generate-email-rag requests running at the same time share one generation
+_generation_flight = SingleFlight("generate_email_rag")
+
+# Requests that would queue longer than ADMISSION_QUEUE_BUDGET for OpenAI capacity get a 503
+_generation_admission = AdmissionController("generation", get_openai_scheduler(), initial_duration_s=15.0)
+_search_admission = AdmissionController("search", get_openai_scheduler(), initial_duration_s=1.0)
+
+
+async def _generation_key(
+    prompt: str,
+    history: Optional[str],
+    current_html: Optional[str],
+    use_rag: bool,
+    images: List[UploadFile]
+) -> str:
+    """Key identifying a generation request after normalizing insignificant differences."""
+    # Whitespace-only differences in the prompt and JSON formatting of history do not change the result
+    normalized_history = history
+    if history:
+        try:
+            normalized_history = json.loads(history)
+        except ValueError:
+            pass
+    image_hashes = []
+    for img in images:
+        content = await img.read()
+        await img.seek(0)
+        image_hashes.append(hashlib.sha256(content).hexdigest())
+    return make_key(" ".join(prompt.split()), normalized_history, current_html or "", use_rag, image_hashes)
+
+
+async def _buffer_images(images: List[UploadFile]) -> List[UploadFile]:
+    """
+    In-memory copies of uploaded images. A shared generation can outlive the
+    request that started it (other callers wait for it), and the request's
+    own upload files are closed when it ends.
+    """
+    buffered = []
+    for img in images:
+        content = await img.read()
+        buffered.append(UploadFile(BytesIO(content), size=len(content), filename=img.filename, headers=img.headers))
+    return buffered
+
 
 # ==================================================================
 # 📧 EMAIL GENERATION ENDPOINTS
 # ==================================================================
 
-@router.post("/generate-email", response_model=EmailGenerationResponse)
+@router.post("/generate-email", response_model=EmailGenerationResponse, dependencies=[Depends(_generation_admission)])
 async def generate_email(
     prompt: str = Form(..., description="Email intent/description"),
     history: Optional[str] = Form(None, description="JSON array of conversation history"),
@@ -52,12 +108,13 @@ async def generate_email(
     return result
 
 
-@router.post("/generate-email-rag", response_model=EmailGenerationResponse)
+@router.post("/generate-email-rag", response_model=EmailGenerationResponse, dependencies=[Depends(_generation_admission)])
 async def generate_email_rag(
     prompt: str = Form(..., description="Email intent/description"),
     history: Optional[str] = Form(None, description="JSON array of conversation history"),
     current_html: Optional[str] = Form(None, description="Current template HTML for modifications"),
     use_rag: bool = Form(True, description="Enable RAG context from similar templates"),
+    draft_id: Optional[str] = Form(None, description="Draft ID used with /prefetch-rag"),
     images: List[UploadFile] = File(default=[])
 ):
     """
@@ -67,28 +124,69 @@ async def generate_email_rag(
     # Validate image count
     if len(images) > 4:
         raise HTTPException(400, "Maximum 4 images allowed")
+    images = await _buffer_images(images)
     
+    async def run_generation():
+        # Enhancement and retrieval may already be done by /prefetch-rag for this exact prompt
+        prefetched = await get_rag_prefetcher().take(draft_id, prompt) if not current_html else None
+
+        # ENHANCE PROMPT: Rewrite user prompt for better search and generation
+        enhanced_prompt = prompt
+        if prefetched:
+            enhanced_prompt = prefetched[0]
+        elif not current_html: # Only enhance for new generation, not edits
+            enhanced_prompt = await enhance_user_prompt(prompt)
+
+        # Get RAG context if enabled
+        rag_context = ""
+        if use_rag and not current_html:  # Don't use RAG when modifying existing template
+            # Use ENHANCED prompt for RAG search (better keywords = better results)
+            rag_context = prefetched[1] if prefetched else await get_rag_context(enhanced_prompt)
+        
+        return await generate_email_html(
+            prompt=enhanced_prompt, # Use ENHANCED prompt for generation
+            history=history,
+            current_html=current_html,
+            images=images,
+            rag_context=rag_context
+        )
     
-    # ENHANCE PROMPT: Rewrite user prompt for better search and generation
-    enhanced_prompt = prompt
-    if not current_html: # Only enhance for new generation, not edits
-        enhanced_prompt = await enhance_user_prompt(prompt)
-
-    # Get RAG context if enabled
-    rag_context = ""
-    if use_rag and not current_html:  # Don't use RAG when modifying existing template
-        # Use ENHANCED prompt for RAG search (better keywords = better results)
-        rag_context = await get_rag_context(enhanced_prompt)
-    
-    result = await generate_email_html(
-        prompt=enhanced_prompt, # Use ENHANCED prompt for generation
-        history=history,
-        current_html=current_html,
-        images=images,
-        rag_context=rag_context
-    )
+    # Duplicate requests (double clicks, client retries) wait for the in-flight generation
+    key = await _generation_key(prompt, history, current_html, use_rag, images)
+    try:
+        return await _generation_flight.do(key, run_generation)
+    finally:
+        # Only the leader takes its prefetch; a follower's would linger until its TTL
+        get_rag_prefetcher().discard(draft_id, prompt)
+
+
+@router.post("/prefetch-rag", status_code=202)
+async def prefetch_rag(
+    request: Request,
+    prompt: str = Form(..., description="Current draft of the email brief"),
+    draft_id: str = Form(..., description="Client-generated ID of the generator session")
+):
+    """
+    Warm the prompt enhancement and RAG context for a draft in the background.
+    Call it debounced while the user types; /generate-email-rag with the same
+    prompt and draft_id then skips enhancement and retrieval.
+    Each client may start RAG_PREFETCH_PER_MINUTE prefetches (429 beyond that).
+    """
+    if not is_supabase_configured():
+        return {"success": True, "status": "skipped"}
     
-    return result
+    prefetcher = get_rag_prefetcher()
+    client = request.client.host if request.client else ""
+    retry_after = prefetcher.retry_after(client)
+    if retry_after > 0:
+        raise HTTPException(
+            429,
+            "Too many prefetches, please slow down",
+            headers={"Retry-After": str(math.ceil(retry_after))}
+        )
+    status = prefetcher.prefetch(draft_id, prompt, client)
+    logger.debug("RAG prefetch", extra={"status": status})
+    return {"success": True, "status": status}
 
 
 # ==================================================================
@@ -101,46 +199,53 @@ async def save_template(
     description: str = Form(..., description="Template description"),
     template_code: str = Form(..., description="HTML template code"),
     category: str = Form("general", description="Template category"),
-    visibility: str = Form("public", description="Template visibility (public/private)")
-    
+    visibility: str = Form("public", description="Template visibility (public/private)"),
+    parent_id: Optional[str] = Form(None, description="Template this one is a new version of")
 ):
     """
     Save an email template with auto-generated embedding for RAG search.
+    With parent_id (and TEMPLATE_VERSIONING on), it is stored as the next
+    version of that template, as a delta when the HTML is similar.
     """
-    supabase = get_supabase_client()
-    if not supabase:
+    if not is_supabase_configured():
         raise HTTPException(500, "Supabase not configured")
     
     try:
         # Generate embedding from subject + description
         combined_text = f"{subject} {description}"
-        embedding = generate_embedding(combined_text)
+        embedding = await generate_embedding(combined_text)
         
         # Insert into Supabase
-        result = supabase.table("email_templates").insert({
+        row = await get_template_repository().insert_version({
             "subject": subject,
             "description": description,
             "template_code": template_code,
             "category": category,
             "visibility": visibility,
             "embedding": embedding
-        }).execute()
+        }, parent_id)
+        bump_corpus_version()
         
-        print(f"✅ Template saved: {subject}")
+        logger.debug("Template saved", extra={"template_id": row["id"] if row else None})
         
         return {
             "success": True,
             "message": "Template saved successfully",
-            "id": result.data[0]["id"] if result.data else None,
+            "id": row["id"] if row else None,
+            "version": (row.get("version") or 1) if row else None,
             "subject": subject
         }
         
+    except HTTPException:
+        raise
+    except RepositoryTimeout as e:
+        raise HTTPException(504, str(e))
     except Exception as e:
-        print(f"❌ Save template error: {str(e)}")
+        logger.error("Save template error", extra={"error": str(e)})
         raise HTTPException(500, f"Failed to save template: {str(e)}")
 
 
-@router.post("/search-templates", response_model=TemplateListResponse)
+@router.post("/search-templates", response_model=TemplateListResponse, dependencies=[Depends(_search_admission)])
 async def search_templates(
     query: str = Form(..., description="Search query"),
     limit: int = Form(5, description="Number of results to return"),
@@ -149,45 +254,32 @@ async def search_templates(
     """
     Search for similar email templates using hybrid search (keyword + semantic).
     """
-    supabase = get_supabase_client()
-    if not supabase:
+    if not is_supabase_configured():
         raise HTTPException(500, "Supabase not configured")
     
     try:
         # Generate query embedding
-        query_embedding = generate_embedding(query)
-        
-        if use_hybrid:
-            # Use hybrid search function (keyword + semantic with RRF)
-            result = supabase.rpc("hybrid_search_templates", {
-                "query_text": query,
-                "query_embedding": query_embedding,
-                "match_count": limit,
-                "full_text_weight": 1.0,
-                "semantic_weight": 1.0,
-                "rrf_k": 60
-            }).execute()
-        else:
-            # Use semantic-only search
-            result = supabase.rpc("semantic_search_templates", {
-                "query_embedding": query_embedding,
-                "match_count": limit
-            }).execute()
-        
-        templates = result.data if result.data else []
-        
-        print(f"🔍 Found {len(templates)} templates for query: '{query}'")
+        query_embedding = await generate_embedding(query)
+        
+        # Falls back to semantic search when hybrid is not available in this database
+        templates, search_type = await get_search_backend().search(query, query_embedding, limit, prefer_hybrid=use_hybrid)
+        
+        logger.info("Template search", extra={"results": len(templates), "search_type": search_type})
         
         return {
             "success": True,
             "query": query,
-            "search_type": "hybrid" if use_hybrid else "semantic",
+            "search_type": search_type,
             "count": len(templates),
             "templates": templates
         }
         
+    except HTTPException:
+        raise
+    except RepositoryTimeout as e:
+        raise HTTPException(504, str(e))
     except Exception as e:
-        print(f"❌ Search error: {str(e)}")
+        logger.error("Search error", extra={"error": str(e)})
         raise HTTPException(500, f"Failed to search templates: {str(e)}")
 
 
@@ -196,16 +288,11 @@ async def list_templates(limit: int = 50):
     """
     List all saved email templates.
     """
-    supabase = get_supabase_client()
-    if not supabase:
+    if not is_supabase_configured():
         raise HTTPException(500, "Supabase not configured")
     
     try:
-        result = supabase.table("email_templates").select(
-            "id, subject, description, template_code, category, visibility, created_at"
-        ).order("created_at", desc=True).limit(limit).execute()
-        
-        templates = result.data if result.data else []
+        templates = await get_template_repository().list(limit)
         
         return {
             "success": True,
@@ -213,6 +300,8 @@ async def list_templates(limit: int = 50):
             "templates": templates
         }
         
+    except RepositoryTimeout as e:
+        raise HTTPException(504, str(e))
     except Exception as e:
         raise HTTPException(500, f"Failed to list templates: {str(e)}")
 
@@ -222,42 +311,72 @@ async def get_template(template_id: str):
     """
     Get a specific template by ID.
     """
-    supabase = get_supabase_client()
-    if not supabase:
+    if not is_supabase_configured():
         raise HTTPException(500, "Supabase not configured")
     
     try:
-        result = supabase.table("email_templates").select(
-            "id, subject, description, template_code, created_at"
-        ).eq("id", template_id).single().execute()
+        template = await get_template_repository().get(template_id)
         
-        if not result.data:
+        if not template:
             raise HTTPException(404, "Template not found")
         
         return {
             "success": True,
-            "template": result.data
+            "template": template
         }
         
+    except HTTPException:
+        raise
+    except RepositoryTimeout as e:
+        raise HTTPException(504, str(e))
     except Exception as e:
         raise HTTPException(500, f"Failed to get template: {str(e)}")
 
 
+@router.get("/template-versions/{template_id}")
+async def get_template_versions(template_id: str):
+    """
+    List the versions in a template's lineage (without HTML), oldest first.
+    """
+    if not is_supabase_configured():
+        raise HTTPException(500, "Supabase not configured")
+    
+    try:
+        versions = await get_template_repository().versions(template_id)
+        
+        if not versions:
+            raise HTTPException(404, "Template not found")
+        
+        return {
+            "success": True,
+            "count": len(versions),
+            "versions": [
+                {**row, "stored_as": "delta" if row.get("base_id") else "full"}
+                for row in versions
+            ]
+        }
+        
+    except HTTPException:
+        raise
+    except RepositoryTimeout as e:
+        raise HTTPException(504, str(e))
+    except Exception as e:
+        raise HTTPException(500, f"Failed to get template versions: {str(e)}")
+
+
 @router.delete("/delete-template/{template_id}")
 async def delete_template(template_id: str):
     """
     Delete a template by ID.
     """
-    supabase = get_supabase_client()
-    if not supabase:
+    if not is_supabase_configured():
         raise HTTPException(500, "Supabase not configured")
     
     try:
-        result = supabase.table("email_templates").delete().eq(
-            "id", template_id
-        ).execute()
+        await get_template_repository().delete(template_id)
+        bump_corpus_version()
         
-        print(f"🗑️ Template deleted: {template_id}")
+        logger.info("Template deleted", extra={"template_id": template_id})
         
         return {
             "success": True,
@@ -265,6 +384,8 @@ async def delete_template(template_id: str):
             "id": template_id
         }
         
+    except RepositoryTimeout as e:
+        raise HTTPException(504, str(e))
     except Exception as e:
         raise HTTPException(500, f"Failed to delete template: {str(e)}")
 
@@ -275,17 +396,13 @@ async def generate_embeddings_for_templates():
     Generate embeddings for all templates that don't have embeddings yet.
     Use this after inserting templates via SQL.
     """
-    supabase = get_supabase_client()
-    if not supabase:
+    if not is_supabase_configured():
         raise HTTPException(500, "Supabase not configured")
     
+    repository = get_template_repository()
     try:
         # Get templates without embeddings
-        result = supabase.table("email_templates").select(
-            "id, subject, description"
-        ).is_("embedding", "null").execute()
-        
-        templates = result.data if result.data else []
+        templates = await repository.without_embeddings()
         
         if not templates:
             return {
@@ -294,23 +411,29 @@ async def generate_embeddings_for_templates():
                 "updated": 0
             }
         
-        updated_count = 0
-        for tpl in templates:
+        async def backfill(tpl: Dict[str, Any]) -> bool:
             try:
                 # Generate embedding
                 combined_text = f"{tpl['subject']} {tpl['description']}"
-                embedding = generate_embedding(combined_text)
+                embedding = await generate_embedding(combined_text)
                 
                 # Update template with embedding
-                supabase.table("email_templates").update({
-                    "embedding": embedding
-                }).eq("id", tpl["id"]).execute()
+                await repository.update_embedding(tpl["id"], embedding)
                 
-                updated_count += 1
-                print(f"✅ Generated embedding for: {tpl['subject']}")
+                logger.info("Generated embedding", extra={"template_id": tpl["id"], "sample": True})
+                return True
                 
             except Exception as e:
-                print(f"⚠️ Failed to generate embedding for {tpl['id']}: {str(e)}")
+                logger.warning("Failed to generate embedding", extra={"template_id": tpl["id"], "error": str(e)})
+                return False
+        
+        # Background priority: the OpenAI scheduler runs a few of these at a
+        # time and lets interactive requests go first
+        with call_priority("background"):
+            results = await asyncio.gather(*(backfill(tpl) for tpl in templates))
+        updated_count = sum(results)
+        if updated_count:
+            bump_corpus_version()
         
         return {
             "success": True,
@@ -319,8 +442,12 @@ async def generate_embeddings_for_templates():
             "total_without_embeddings": len(templates)
         }
         
+    except HTTPException:
+        raise
+    except RepositoryTimeout as e:
+        raise HTTPException(504, str(e))
     except Exception as e:
-        print(f"❌ Generate embeddings error: {str(e)}")
+        logger.error("Generate embeddings error", extra={"error": str(e)})
         raise HTTPException(500, f"Failed to generate embeddings: {str(e)}")
 
 
@@ -334,8 +461,7 @@ async def upload_image(file: UploadFile = File(...)):
     Upload an image to Supabase Storage and return the public URL.
     This URL can be used in email templates.
     """
-    supabase = get_supabase_client()
-    if not supabase:
+    if not is_supabase_configured():
         raise HTTPException(
             500, 
             "Supabase not configured. Please add SUPABASE_URL and SUPABASE_KEY to your .env file."
@@ -359,53 +485,65 @@ async def upload_image(file: UploadFile = File(...)):
         if file_size_mb > 2:
             raise HTTPException(400, f"File too large ({file_size_mb:.1f}MB). Maximum size is 2MB for faster uploads.")
         
-        print(f"📤 Uploading {filename} ({file_size_mb:.2f}MB)...")
+        logger.debug("Uploading image", extra={"image": filename, "size_mb": round(file_size_mb, 2)})
         
-        # Upload to Supabase Storage
-        result = supabase.storage.from_(SUPABASE_BUCKET).upload(
-            path=filename,
-            file=content,
-            file_options={"content-type": file.content_type}
-        )
+        storage = get_image_storage()
         
-        # Get public URL
-        public_url = supabase.storage.from_(SUPABASE_BUCKET).get_public_url(filename)
+        # Upload original to Supabase Storage
+        await storage.upload(filename, content, file.content_type)
+        original_url = get_public_url(filename)
         
-        print(f"✅ Image uploaded: {filename} -> {public_url}")
+        # Optimize for email (downscale, strip metadata, re-encode) and store variants next to the original
+        variants = {}
+        for label, (data, variant_ext, content_type) in (await optimize_image(content)).items():
+            variant_name = variant_filename(filename, label, variant_ext)
+            await storage.upload(variant_name, data, content_type)
+            variants[label] = {
+                "filename": variant_name,
+                "url": get_public_url(variant_name),
+                "size": len(data)
+            }
+        
+        invalidate_image_cache()
+        
+        # Templates should reference the optimized image when available
+        public_url = variants["1x"]["url"] if "1x" in variants else original_url
+        
+        logger.info("Image uploaded", extra={"image": filename, "variants": len(variants)})
         
         return {
             "success": True,
             "url": public_url,
-            "filename": filename
+            "url_2x": variants["2x"]["url"] if "2x" in variants else None,
+            "original_url": original_url,
+            "filename": filename,
+            "variants": variants
         }
         
+    except HTTPException:
+        raise
+    except RepositoryTimeout as e:
+        raise HTTPException(504, str(e))
     except Exception as e:
-        print(f"❌ Upload failed: {str(e)}")
+        logger.error("Image upload failed", extra={"error": str(e)})
         raise HTTPException(500, f"Failed to upload image: {str(e)}")
 
 
 @router.get("/list-images")
-async def list_images():
-    """List all uploaded images from Supabase Storage"""
-    supabase = get_supabase_client()
-    if not supabase:
+async def list_images(
+    limit: int = Query(100, ge=1, le=1000, description="Number of images per page"),
+    offset: int = Query(0, ge=0, description="Number of images to skip"),
+    prefix: str = Query("", description="Only list images whose name starts with this prefix")
+):
+    """List uploaded images from Supabase Storage (paginated, cached briefly)"""
+    if not is_supabase_configured():
         raise HTTPException(500, "Supabase not configured")
     
     try:
-        files = supabase.storage.from_(SUPABASE_BUCKET).list()
-        
-        images = []
-        for f in files:
-            if f.get("name"):
-                url = supabase.storage.from_(SUPABASE_BUCKET).get_public_url(f["name"])
-                images.append({
-                    "name": f["name"],
-                    "url": url,
-                    "created_at": f.get("created_at")
-                })
-        
-        return {"images": images}
+        return await list_bucket_images(prefix=prefix, limit=limit, offset=offset)
         
+    except RepositoryTimeout as e:
+        raise HTTPException(504, str(e))
     except Exception as e:
         raise HTTPException(500, f"Failed to list images: {str(e)}")
 
@@ -413,15 +551,23 @@ async def list_images():
 @router.delete("/delete-image/{filename}")
 async def delete_image(filename: str):
     """Delete an image from Supabase Storage"""
-    supabase = get_supabase_client()
-    if not supabase:
+    if not is_supabase_configured():
         raise HTTPException(500, "Supabase not configured")
     
     try:
-        result = supabase.storage.from_(SUPABASE_BUCKET).remove([filename])
-        print(f"🗑️ Image deleted: {filename}")
+        # Remove the original together with any optimized variants
+        paths = [filename] + [
+            variant_filename(filename, label, ext)
+            for label in VARIANT_SCALES
+            for ext in ("jpg", "png")
+        ]
+        await get_image_storage().remove(paths)
+        invalidate_image_cache()
+        logger.info("Image deleted", extra={"image": filename})
         return {"success": True, "deleted": filename}
         
+    except RepositoryTimeout as e:
+        raise HTTPException(504, str(e))
     except Exception as e:
-        print(f"❌ Delete failed: {str(e)}")
+        logger.error("Image delete failed", extra={"image": filename, "error": str(e)})
         raise HTTPException(500, f"Failed to delete image: {str(e)}")
@@ -0,0 +1,390 @@
+"""
+Template search backend.
+Decides once whether the database provides hybrid_search_templates
+(keyword + semantic) or only semantic_search_templates, caches the answer
+(shared between workers through the cache backend) and re-probes
+periodically, so no request pays for a failed RPC round trip.
+
+With SEARCH_MODE=local, searches run against an in-process index of
+shortened, quantized embeddings instead, and only the best candidates are
+fetched (and re-ranked with their full-precision embeddings). The index
+can warm-start from a memory-mapped corpus snapshot (LOCAL_INDEX_SNAPSHOT,
+see model/corpus_snapshot.py) and then only catches up with the changes.
+Template writes through this app bump the corpus version, which makes the
+index refresh before its next search.
+"""
+
+import os
+import json
+import time
+import asyncio
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+from dotenv import load_dotenv
+
+from core.metrics import VECTOR_INDEX_BYTES
+from core.logger import get_logger
+from core.backends import get_cache_backend
+from .repository import get_template_repository
+
+# Load environment variables
+load_dotenv()
+
+logger = get_logger(__name__)
+
+# Seconds before the detected search capability is checked again
+SEARCH_REPROBE_INTERVAL = float(os.getenv("SEARCH_REPROBE_INTERVAL", "600"))
+
+# "rpc" (database search functions) or "local" (in-process quantized index)
+SEARCH_MODE = os.getenv("SEARCH_MODE", "rpc")
+
+# Local index: dimensions kept per vector, code type (float32/int8/binary),
+# candidates re-ranked per result with full embeddings (0 = no re-ranking)
+# and seconds before the index is rebuilt from the database (in the background)
+LOCAL_INDEX_DIMENSIONS = int(os.getenv("LOCAL_INDEX_DIMENSIONS", "256"))
+LOCAL_INDEX_QUANTIZATION = os.getenv("LOCAL_INDEX_QUANTIZATION", "int8")
+LOCAL_INDEX_RERANK = int(os.getenv("LOCAL_INDEX_RERANK", "4"))
+LOCAL_INDEX_REFRESH_INTERVAL = float(os.getenv("LOCAL_INDEX_REFRESH_INTERVAL", "300"))
+LOCAL_INDEX_PAGE_SIZE = 1000
+# Corpus snapshot directory to warm-start the local index from (optional)
+LOCAL_INDEX_SNAPSHOT = os.getenv("LOCAL_INDEX_SNAPSHOT", "")
+
+HYBRID_RPC = "hybrid_search_templates"
+SEMANTIC_RPC = "semantic_search_templates"
+
+# PostgREST / Postgres error codes for a function that does not exist
+_MISSING_FUNCTION_CODES = {"PGRST202", "42883"}
+
+
+def _is_missing_function(error: Exception) -> bool:
+    code = getattr(error, "code", None)
+    if code is None and error.args and isinstance(error.args[0], dict):
+        code = error.args[0].get("code")
+    return code in _MISSING_FUNCTION_CODES or "Could not find the function" in str(error)
+
+
+def _parse_embedding(value: Any) -> List[float]:
+    # PostgREST returns pgvector columns as "[0.1,0.2,...]" strings
+    return json.loads(value) if isinstance(value, str) else value
+
+
+class LocalTemplateIndex:
+    """
+    In-process template search over shortened, quantized embeddings.
+
+    The index holds only template IDs and codes (LOCAL_INDEX_DIMENSIONS
+    values per template as int8 or sign bits). A search scans the codes,
+    fetches the best limit * LOCAL_INDEX_RERANK rows with their embeddings
+    and re-ranks them at full precision.
+
+    With a snapshot, the first build maps the snapshot's codes and
+    embeddings and applies the templates added or removed since; later
+    refreshes only fetch those changes instead of every embedding, and
+    re-ranking uses the snapshot's embeddings. Template writes are caught
+    up the same way (IDs compared, only added templates fetched) without
+    the snapshot, until the next periodic rebuild.
+    """
+
+    def __init__(
+        self,
+        dimensions: int = LOCAL_INDEX_DIMENSIONS,
+        quantization: str = LOCAL_INDEX_QUANTIZATION,
+        rerank_factor: int = LOCAL_INDEX_RERANK,
+        refresh_interval: float = LOCAL_INDEX_REFRESH_INTERVAL,
+        snapshot_path: str = LOCAL_INDEX_SNAPSHOT
+    ):
+        self.dimensions = dimensions or None
+        self.quantization = quantization
+        self.rerank_factor = rerank_factor
+        self.refresh_interval = refresh_interval
+        self.snapshot_path = snapshot_path
+        self._snapshot = None
+        self._index = None
+        self._built_at = 0.0
+        # Corpus version (bumped by template writes) the index was built at
+        self._version: Optional[int] = None
+        self._refresh_task: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()
+
+    async def _build_from_snapshot(self):
+        from .corpus_snapshot import CorpusSnapshot, fetch_changes
+
+        started = time.perf_counter()
+        if self._snapshot is None:
+            self._snapshot = await asyncio.to_thread(CorpusSnapshot, self.snapshot_path)
+        added, removed = await fetch_changes(self._snapshot.ids())
+        if added or removed:
+            await asyncio.to_thread(self._snapshot.with_changes, added, removed, self.dimensions, self.quantization)
+        index = await asyncio.to_thread(self._snapshot.index, self.dimensions, self.quantization)
+        logger.info("Local template index loaded from snapshot", extra={
+            "path": self.snapshot_path, "templates": len(index), "added": len(added), "removed": len(removed),
+            "seconds": round(time.perf_counter() - started, 3)
+        })
+        return index
+
+    async def _build(self):
+        from .vector_index import VectorIndex
+
+        if self.snapshot_path:
+            try:
+                index = await self._build_from_snapshot()
+                for part, size in index.memory_bytes().items():
+                    VECTOR_INDEX_BYTES.set(size, index="templates", part=part)
+                return index
+            except (OSError, ValueError) as e:
+                # Reloaded from disk on the next build (e.g. after a new export)
+                logger.warning("Corpus snapshot unusable, building the index from the database", extra={
+                    "path": self.snapshot_path, "error": str(e)
+                })
+                self._snapshot = None
+
+        index = VectorIndex(self.dimensions, self.quantization)
+        repository = get_template_repository()
+        offset = 0
+        while True:
+            rows = await repository.embeddings_page(offset, LOCAL_INDEX_PAGE_SIZE)
+            if rows:
+                await asyncio.to_thread(
+                    index.add_many,
+                    [row["id"] for row in rows],
+                    [_parse_embedding(row["embedding"]) for row in rows]
+                )
+            if len(rows) < LOCAL_INDEX_PAGE_SIZE:
+                break
+            offset += LOCAL_INDEX_PAGE_SIZE
+
+        for part, size in index.memory_bytes().items():
+            VECTOR_INDEX_BYTES.set(size, index="templates", part=part)
+        logger.info("Local template index built", extra={
+            "templates": len(index), "dimensions": self.dimensions,
+            "quantization": self.quantization, "bytes": index.memory_bytes()["codes"]
+        })
+        return index
+
+    async def _rebuild(self):
+        from .rag_service import get_corpus_version
+
+        # Read before building: a write during the build triggers another one
+        version = get_corpus_version()
+        index = await self._build()
+        self._index, self._built_at, self._version = index, time.monotonic(), version
+
+    async def _catch_up(self):
+        """
+        Apply the template writes since the last build: compares IDs and
+        fetches only the added templates (the periodic refresh compacts).
+        """
+        from .rag_service import get_corpus_version
+        from .corpus_snapshot import SnapshotIndex, fetch_changes
+        from .vector_index import VectorIndex
+
+        version = get_corpus_version()
+        if self._snapshot is not None:
+            # Snapshot builds already only fetch the changes since the snapshot
+            index = await self._build()
+        else:
+            started = time.perf_counter()
+            index = self._index
+            parts, removed = (index.indexes, index.removed) if isinstance(index, SnapshotIndex) else ([index], set())
+            added, gone = await fetch_changes({key for part in parts for key in part.keys} - removed)
+            if added:
+                delta = VectorIndex(self.dimensions, self.quantization)
+                await asyncio.to_thread(
+                    delta.add_many,
+                    [row["id"] for row in added],
+                    [_parse_embedding(row["embedding"]) for row in added]
+                )
+                parts = parts + [delta]
+            index = SnapshotIndex(list(parts), removed | gone)
+            for part, size in index.memory_bytes().items():
+                VECTOR_INDEX_BYTES.set(size, index="templates", part=part)
+            logger.info("Local template index caught up", extra={
+                "templates": len(index), "added": len(added), "removed": len(gone),
+                "seconds": round(time.perf_counter() - started, 3)
+            })
+        self._index, self._version = index, version
+
+    async def refresh(self):
+        """Rebuild the index now (searches keep using the previous one until it is swapped in)."""
+        async with self._lock:
+            await self._rebuild()
+
+    async def _refresh_in_background(self):
+        try:
+            await self.refresh()
+        except Exception as e:
+            # Keep serving the previous index; try again after another interval
+            self._built_at = time.monotonic()
+            logger.warning("Local template index refresh failed", extra={"error": str(e)})
+
+    async def get_index(self):
+        """
+        Current index. Built when missing and caught up with the changes
+        when older than the latest template write (corpus version bump), so
+        RAG contexts cached under the new version never come from the old
+        corpus; rebuilt in the background once older than refresh_interval.
+        """
+        from .rag_service import get_corpus_version
+
+        if self._index is None or self._version != get_corpus_version():
+            async with self._lock:
+                # Another search may have built it while this one waited
+                if self._index is None:
+                    await self._rebuild()
+                elif self._version != get_corpus_version():
+                    await self._catch_up()
+        elif time.monotonic() - self._built_at >= self.refresh_interval and (
+            self._refresh_task is None or self._refresh_task.done()
+        ):
+            self._refresh_task = asyncio.create_task(self._refresh_in_background())
+        return self._index
+
+    async def search(self, query_embedding: List[float], limit: int) -> List[Dict[str, Any]]:
+        """
+        Most similar templates, best first, each with a "similarity" score.
+
+        Args:
+            query_embedding: Full query embedding
+            limit: Maximum number of results
+
+        Returns:
+            Template rows (without embeddings)
+        """
+        from .vector_index import rerank
+
+        index = await self.get_index()
+        candidates = index.candidates(query_embedding, limit * max(self.rerank_factor, 1))
+        if not candidates:
+            return []
+
+        snapshot = self._snapshot
+        rows = await get_template_repository().get_many(
+            [key for key, _ in candidates], with_embeddings=self.rerank_factor > 0 and snapshot is None
+        )
+        by_id = {row["id"]: row for row in rows}
+        if self.rerank_factor > 0 and snapshot is not None:
+            vectors = [(key, snapshot.vector(key)) for key in by_id]
+            ranked = rerank(query_embedding, [(key, vector) for key, vector in vectors if vector is not None], limit)
+        elif self.rerank_factor > 0:
+            ranked = rerank(query_embedding, [
+                (row["id"], _parse_embedding(row["embedding"])) for row in rows if row.get("embedding")
+            ], limit)
+        else:
+            ranked = [(key, score) for key, score in candidates if key in by_id]
+
+        results = []
+        for key, score in ranked:
+            row = {k: v for k, v in by_id[key].items() if k != "embedding"}
+            row["similarity"] = score
+            results.append(row)
+        return results
+
+
+class TemplateSearchBackend:
+    """
+    Runs template searches against the best available RPC.
+
+    The first search (and the first one after SEARCH_REPROBE_INTERVAL) tries
+    hybrid search; a missing-function error marks hybrid as unavailable
+    until the next probe. All other searches go straight to the right RPC.
+    """
+
+    CAPABILITY_KEY = "search:hybrid_available"
+
+    def __init__(self, reprobe_interval: float = SEARCH_REPROBE_INTERVAL, mode: str = SEARCH_MODE):
+        self.reprobe_interval = reprobe_interval
+        self.local_index = LocalTemplateIndex() if mode == "local" else None
+        self._hybrid_available: Optional[bool] = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def _set_capability(self, available: bool):
+        with self._lock:
+            changed = self._hybrid_available != available
+            self._hybrid_available = available
+            self._checked_at = time.monotonic()
+        get_cache_backend().set(self.CAPABILITY_KEY, available, ttl=self.reprobe_interval)
+        if changed:
+            logger.info("Search capability detected", extra={"hybrid_available": available})
+
+    def hybrid_available(self) -> Optional[bool]:
+        """Cached capability: True/False, or None if it should be (re-)probed."""
+        if self._hybrid_available is not None and time.monotonic() - self._checked_at < self.reprobe_interval:
+            return self._hybrid_available
+        # Another worker may have probed recently
+        shared = get_cache_backend().get(self.CAPABILITY_KEY)
+        if shared is not None:
+            with self._lock:
+                self._hybrid_available = bool(shared)
+                self._checked_at = time.monotonic()
+            return self._hybrid_available
+        return None
+
+    async def search(
+        self,
+        query: str,
+        query_embedding: List[float],
+        limit: int,
+        prefer_hybrid: bool = True,
+        stage: str = "search_rpc"
+    ) -> Tuple[List[Dict[str, Any]], str]:
+        """
+        Search templates with hybrid search when available, else semantic search
+        (or with the local index in SEARCH_MODE=local).
+
+        Args:
+            query: Search text (used by hybrid search)
+            query_embedding: Query embedding
+            limit: Maximum number of results
+            prefer_hybrid: Use hybrid search if the database supports it
+            stage: Operation label for latency metrics
+
+        Returns:
+            (templates, search_type) where search_type is "hybrid", "semantic" or "local"
+
+        Raises:
+            RuntimeError: If Supabase is not configured
+            RepositoryTimeout: If the RPC times out
+        """
+        if self.local_index is not None:
+            return await self.local_index.search(query_embedding, limit), "local"
+
+        repository = get_template_repository()
+        hybrid_available = self.hybrid_available() if prefer_hybrid else False
+        if hybrid_available is not False:
+            try:
+                templates = await repository.rpc(HYBRID_RPC, {
+                    "query_text": query,
+                    "query_embedding": query_embedding,
+                    "match_count": limit,
+                    "full_text_weight": 1.0,
+                    "semantic_weight": 1.0,
+                    "rrf_k": 60
+                }, operation=stage)
+                if hybrid_available is None:
+                    self._set_capability(True)
+                return templates, "hybrid"
+            except Exception as e:
+                if not _is_missing_function(e):
+                    raise
+                self._set_capability(False)
+
+        templates = await repository.rpc(SEMANTIC_RPC, {
+            "query_embedding": query_embedding,
+            "match_count": limit
+        }, operation=stage)
+        return templates, "semantic"
+
+
+_search_backend: Optional[TemplateSearchBackend] = None
+_search_backend_lock = threading.Lock()
+
+
+def get_search_backend() -> TemplateSearchBackend:
+    """Get the shared template search backend."""
+    global _search_backend
+    if _search_backend is None:
+        with _search_backend_lock:
+            if _search_backend is None:
+                _search_backend = TemplateSearchBackend()
+    return _search_backend
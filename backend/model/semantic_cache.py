@@ -0,0 +1,162 @@
+"""
+Semantic cache: reuses a stored result when a new input's embedding is close
+enough to one seen before (e.g. paraphrased prompts).
+Entries live in process memory with LRU and TTL eviction; lookups scan a
+float32 VectorIndex of shortened embeddings, which is rebuilt lazily after
+evictions (the cache is small, so a rebuild is cheap).
+"""
+
+import time
+import itertools
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, NamedTuple, Optional, Sequence
+
+from core.metrics import record_cache, SEMANTIC_CACHE_SIMILARITY
+from .vector_index import VectorIndex, shorten
+
+# Nearest entries checked per lookup (the best one may be expired)
+_LOOKUP_CANDIDATES = 4
+
+
+class SemanticHit(NamedTuple):
+    """A reused cache entry."""
+    value: Any
+    similarity: float
+    source: str
+
+
+class _Entry(NamedTuple):
+    vector: Any
+    value: Any
+    source: str
+    expires_at: float
+
+
+class SemanticCache:
+    """
+    Nearest-neighbour cache keyed by embeddings.
+
+    Args:
+        name: Label for metrics ("cache" label of cache_requests_total)
+        threshold: Minimum cosine similarity to reuse an entry
+        max_entries: LRU capacity (0 disables the cache)
+        ttl_s: Seconds an entry stays valid
+        dimensions: Dimensions of the embeddings passed in (shorter is cheaper)
+    """
+
+    def __init__(self, name: str, threshold: float, max_entries: int, ttl_s: float, dimensions: Optional[int] = None):
+        self.name = name
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl_s = ttl_s
+        self.dimensions = dimensions
+        self._entries: "OrderedDict[int, _Entry]" = OrderedDict()
+        self._exact: Dict[str, int] = {}
+        self._ids = itertools.count()
+        self._index = VectorIndex(dimensions, quantization="float32")
+        self._stale = False
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _rebuild(self):
+        self._index = VectorIndex(self.dimensions, quantization="float32")
+        self._index.add_many(list(self._entries), [entry.vector for entry in self._entries.values()])
+        self._stale = False
+
+    def _drop(self, entry_id: int):
+        entry = self._entries.pop(entry_id, None)
+        if entry is not None:
+            if self._exact.get(entry.source) == entry_id:
+                del self._exact[entry.source]
+            self._stale = True
+
+    def _valid(self, entry_id: int, now: float) -> Optional[_Entry]:
+        entry = self._entries.get(entry_id)
+        if entry is None:
+            return None
+        if entry.expires_at <= now:
+            self._drop(entry_id)
+            return None
+        self._entries.move_to_end(entry_id)
+        return entry
+
+    def get_exact(self, source: str) -> Optional[SemanticHit]:
+        """
+        Look up an entry stored for exactly this (normalized) input, without an embedding.
+
+        Args:
+            source: Normalized input text
+
+        Returns:
+            SemanticHit or None
+        """
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry_id = self._exact.get(source)
+            entry = self._valid(entry_id, time.monotonic()) if entry_id is not None else None
+        if entry is None:
+            return None
+        record_cache(self.name, True)
+        return SemanticHit(entry.value, 1.0, entry.source)
+
+    def lookup(self, embedding: Sequence[float]) -> Optional[SemanticHit]:
+        """
+        Find the closest valid entry above the similarity threshold.
+
+        Args:
+            embedding: Embedding of the new input
+
+        Returns:
+            SemanticHit or None (a miss)
+        """
+        if not self.enabled:
+            return None
+        with self._lock:
+            if self._stale:
+                self._rebuild()
+            now = time.monotonic()
+            hit = None
+            best = None
+            for entry_id, similarity in self._index.candidates(embedding, _LOOKUP_CANDIDATES):
+                entry = self._valid(entry_id, now)
+                if entry is None:
+                    continue
+                best = similarity if best is None else best
+                if similarity >= self.threshold:
+                    hit = SemanticHit(entry.value, similarity, entry.source)
+                break
+        if best is not None:
+            SEMANTIC_CACHE_SIMILARITY.observe(best, cache=self.name)
+        record_cache(self.name, hit is not None)
+        return hit
+
+    def store(self, source: str, embedding: Sequence[float], value: Any):
+        """
+        Add an entry (evicting the least recently used one when full).
+
+        Args:
+            source: Normalized input text (also used for exact-match lookups)
+            embedding: Embedding of the input
+            value: Result to reuse
+        """
+        if not self.enabled:
+            return
+        vector = shorten(embedding, self.dimensions)
+        with self._lock:
+            if source in self._exact:
+                self._drop(self._exact[source])
+            while len(self._entries) >= self.max_entries:
+                self._drop(next(iter(self._entries)))
+            entry_id = next(self._ids)
+            self._entries[entry_id] = _Entry(vector, value, source, time.monotonic() + self.ttl_s)
+            self._exact[source] = entry_id
+            if not self._stale:
+                self._index.add(entry_id, vector)
@@ -2,12 +2,19 @@
 Manager for handling automatic template saving and metadata generation.
 """
 
-from typing import Dict, Any, Optional
-from fastapi import BackgroundTasks
-from openai import OpenAI
+from typing import Dict
 
-from .embeddings import generate_embedding, get_openai_client
-from .rag_service import get_supabase_client
+from core.metrics import track_stage, OPTIONAL_STAGE_SKIPS
+from core.logger import get_logger
+from core.scheduler import call_priority
+from .embeddings import generate_embedding
+from .llm_client import UpstreamUnavailable
+from .model_router import route_for, chat_completion
+from .rag_service import is_supabase_configured, bump_corpus_version
+from .repository import get_template_repository
+from .template_versions import TEMPLATE_VERSIONING
+
+logger = get_logger(__name__)
 
 async def generate_metadata(subject: str, html_content: str) -> Dict[str, str]:
     """
@@ -20,8 +27,6 @@ async def generate_metadata(subject: str, html_content: str) -> Dict[str, str]:
     Returns:
         Dict containing 'description' and 'category'
     """
-    client = get_openai_client()
-    
     # Truncate HTML to avoid token limits if necessary, though 4o-mini has 128k context
     # Taking first 10k chars should be enough for context
     html_preview = html_content[:10000]
@@ -37,26 +42,31 @@ async def generate_metadata(subject: str, html_content: str) -> Dict[str, str]:
     - category: One suitable category from [Marketing, Newsletter, Transactional, Personal, Business, Onboarding, Event, Other]
     """
     
+    route = route_for("metadata", prompt)
+    
     try:
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": "You are a helpful assistant that analyzes emails. Output JSON only."},
-                {"role": "user", "content": prompt}
-            ],
-            response_format={"type": "json_object"},
-            temperature=0.3
-        )
+        with track_stage("metadata_generation"):
+            response = await chat_completion(
+                route,
+                [
+                    {"role": "system", "content": "You are a helpful assistant that analyzes emails. Output JSON only."},
+                    {"role": "user", "content": prompt}
+                ],
+                response_format={"type": "json_object"}
+            )
         
         content = response.choices[0].message.content
         import json
         return json.loads(content)
+    except UpstreamUnavailable:
+        OPTIONAL_STAGE_SKIPS.inc(stage="metadata_generation", reason="circuit_open")
     except Exception as e:
-        print(f"⚠️ Metadata generation failed: {e}")
-        return {
-            "description": f"Auto-saved template for: {subject}",
-            "category": "General"
-        }
+        OPTIONAL_STAGE_SKIPS.inc(stage="metadata_generation", reason="error")
+        logger.warning("Metadata generation failed", extra={"error": str(e)})
+    return {
+        "description": f"Auto-saved template for: {subject}",
+        "category": "General"
+    }
 
 async def auto_save_template_from_email(
     subject: str, 
@@ -67,42 +77,50 @@ async def auto_save_template_from_email(
     Background task to auto-save a sent email as a template.
     Generates embeddings and metadata automatically.
     """
-    print(f"🔄 Auto-saving template for: {subject}")
+    logger.debug("Auto-saving template")
     
-    supabase = get_supabase_client()
-    if not supabase:
-        print("❌ Supabase not configured, skipping auto-save")
+    if not is_supabase_configured():
+        logger.warning("Supabase not configured, skipping auto-save")
         return
 
-    try:
-        # 1. Generate Metadata (Description & Category)
-        metadata = await generate_metadata(subject, html_content)
-        description = metadata.get("description", f"Template for {subject}")
-        category = metadata.get("category", "General")
-        
-        # 2. Generate Embedding
-        # Combine subject, description, and category for better semantic search
-        combined_text = f"{subject} {description} {category}"
-        embedding = generate_embedding(combined_text)
-        
-        # 3. Save to Supabase
-        # Note: 'visibility' is set to 'public' by default as per requirements
-        # We might want to add 'created_by' if the schema supports it, but sticking to known schema for now
-        data = {
-            "subject": subject,
-            "description": description,
-            "template_code": html_content,
-            "category": category,
-            "visibility": "public",
-            "embedding": embedding
-        }
-        
-        result = supabase.table("email_templates").insert(data).execute()
-        
-        if result.data:
-            print(f"✅ Template auto-saved successfully: {result.data[0].get('id')}")
-        else:
-            print("⚠️ Template save returned no data")
+    # Runs behind interactive generations for OpenAI capacity
+    with call_priority("background"):
+        try:
+            # 1. Generate Metadata (Description & Category)
+            metadata = await generate_metadata(subject, html_content)
+            description = metadata.get("description", f"Template for {subject}")
+            category = metadata.get("category", "General")
             
-    except Exception as e:
-        print(f"❌ Failed to auto-save template: {str(e)}")
+            # 2. Generate Embedding
+            # Combine subject, description, and category for better semantic search
+            combined_text = f"{subject} {description} {category}"
+            embedding = await generate_embedding(combined_text)
+            
+            # 3. Save to Supabase
+            # Note: 'visibility' is set to 'public' by default as per requirements
+            data = {
+                "subject": subject,
+                "description": description,
+                "template_code": html_content,
+                "category": category,
+                "visibility": "public",
+                "embedding": embedding
+            }
+            
+            # A user's resends of the same subject are versions of their previous one (stored as deltas);
+            # created_by comes with the versioning columns
+            repository = get_template_repository()
+            parent_id = None
+            if TEMPLATE_VERSIONING and user_email:
+                data["created_by"] = user_email
+                parent_id = await repository.latest_by_subject(subject, user_email)
+            row = await repository.insert_version(data, parent_id)
+            bump_corpus_version()
+            
+            if row:
+                logger.debug("Template auto-saved", extra={"template_id": row.get("id")})
+            else:
+                logger.warning("Template auto-save returned no data")
+            
+        except Exception as e:
+            logger.error("Failed to auto-save template", extra={"error": str(e)})
@@ -0,0 +1,159 @@
+"""
+Delta storage for template versions.
+A template saved as a new version of an existing one (an edit, or a resend
+of an email with the same subject) stores its HTML as a diff against its
+parent's HTML instead of a full copy. Every TEMPLATE_DELTA_MAX_CHAIN
+versions (or when a diff is not much smaller than the HTML) a version is
+stored in full again, so a read applies at most that many deltas. Rebuilt
+HTML is kept in a bounded LRU cache; rows never change after insert, so
+entries stay valid (and a new version's parent is usually still cached).
+
+Deltas are JSON: {"v": 1, "n": parent token count, "sha": HTML digest,
+"ops": [[start, end, replacement], ...]} where start/end index the parent's
+tokens (tags, split at attribute and style declaration boundaries, and the
+text between them).
+"""
+
+import os
+import re
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+from difflib import SequenceMatcher
+from typing import List, Optional
+from dotenv import load_dotenv
+
+from core.metrics import record_cache
+
+# Load environment variables
+load_dotenv()
+
+# Store new versions as deltas (needs the lineage columns, see README)
+TEMPLATE_VERSIONING = os.getenv("TEMPLATE_VERSIONING", "false").lower() == "true"
+# A version whose delta is larger than this share of its HTML is stored in full
+TEMPLATE_DELTA_MAX_RATIO = float(os.getenv("TEMPLATE_DELTA_MAX_RATIO", "0.5"))
+# Deltas applied at most to rebuild a version (the next one is stored in full)
+TEMPLATE_DELTA_MAX_CHAIN = int(os.getenv("TEMPLATE_DELTA_MAX_CHAIN", "10"))
+# Materialized template HTML kept in memory (entries)
+TEMPLATE_CACHE_SIZE = int(os.getenv("TEMPLATE_CACHE_SIZE", "256"))
+
+DELTA_FORMAT = 1
+
+# Split around tags and after attribute quotes and style declarations, so an
+# edited colour or link replaces a few tokens rather than a whole tag
+_TOKEN = re.compile(r"(?=<)|(?<=>)|(?<=[;\"])(?=.)")
+
+
+class DeltaError(ValueError):
+    """A delta does not apply to the given parent HTML (wrong parent or corrupted data)."""
+
+
+def _tokens(html: str) -> List[str]:
+    return [token for token in _TOKEN.split(html) if token]
+
+
+def _digest(html: str) -> str:
+    return hashlib.sha256(html.encode()).hexdigest()[:16]
+
+
+def make_delta(base: str, html: str) -> str:
+    """
+    Encode html as changes to base.
+
+    Args:
+        base: Full HTML of the parent version
+        html: Full HTML of the new version
+
+    Returns:
+        JSON delta (apply with apply_delta)
+    """
+    a, b = _tokens(base), _tokens(html)
+    ops = [
+        [i1, i2, "".join(b[j1:j2])]
+        for tag, i1, i2, j1, j2 in SequenceMatcher(None, a, b, autojunk=False).get_opcodes()
+        if tag != "equal"
+    ]
+    return json.dumps({"v": DELTA_FORMAT, "n": len(a), "sha": _digest(html), "ops": ops}, separators=(",", ":"))
+
+
+def apply_delta(base: str, delta: str) -> str:
+    """
+    Rebuild a version's HTML from its parent's HTML and its delta.
+
+    Args:
+        base: Full HTML of the parent version
+        delta: JSON delta from make_delta
+
+    Returns:
+        Full HTML of the version
+
+    Raises:
+        DeltaError: If the delta does not belong to this parent
+    """
+    data = json.loads(delta)
+    tokens = _tokens(base)
+    if data.get("v") != DELTA_FORMAT or data.get("n") != len(tokens):
+        raise DeltaError("Template delta does not match its parent")
+    parts = []
+    position = 0
+    for start, end, replacement in data["ops"]:
+        parts.extend(tokens[position:start])
+        parts.append(replacement)
+        position = end
+    parts.extend(tokens[position:])
+    html = "".join(parts)
+    if _digest(html) != data.get("sha"):
+        raise DeltaError("Rebuilt template does not match its checksum")
+    return html
+
+
+def worth_delta(delta: str, html: str) -> bool:
+    """Whether storing the delta saves enough over storing the full HTML."""
+    return len(delta) <= TEMPLATE_DELTA_MAX_RATIO * len(html)
+
+
+# ==================================================================
+# MATERIALIZED HTML CACHE
+# ==================================================================
+class MaterializedCache:
+    """
+    LRU of full template HTML by template ID.
+
+    Args:
+        max_entries: Capacity (0 disables the cache)
+    """
+
+    def __init__(self, max_entries: int = TEMPLATE_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, template_id: str) -> Optional[str]:
+        with self._lock:
+            html = self._entries.get(template_id)
+            if html is not None:
+                self._entries.move_to_end(template_id)
+        record_cache("template_html", html is not None)
+        return html
+
+    def put(self, template_id: str, html: str):
+        if self.max_entries <= 0 or html is None:
+            return
+        with self._lock:
+            self._entries[template_id] = html
+            self._entries.move_to_end(template_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def discard(self, template_id: str):
+        with self._lock:
+            self._entries.pop(template_id, None)
+
+
+_cache = MaterializedCache()
+
+
+def get_materialized_cache() -> MaterializedCache:
+    """Get the shared cache of materialized template HTML."""
+    return _cache
@@ -0,0 +1,227 @@
+"""
+In-process vector index with reduced-dimension and quantized storage.
+Vectors are shortened to the index dimension (text-embedding-3 embeddings
+stay meaningful when truncated and re-normalized) and stored as float32,
+int8 (per-vector scale) or binary (sign bits) codes. Searches scan the
+codes and can re-rank the best candidates with full-precision vectors.
+"""
+
+from typing import Any, Dict, Hashable, List, Optional, Sequence, Tuple
+import numpy as np
+
+QUANTIZATIONS = ("float32", "int8", "binary")
+
+# Rows per block when scanning int8 codes
+_SCAN_BLOCK = 4096
+
+# Number of set bits for every byte value (Hamming distance on packed sign bits)
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint16)
+
+
+def shorten(vectors: Any, dimensions: Optional[int] = None) -> np.ndarray:
+    """
+    Truncate embeddings to their first `dimensions` values and re-normalize.
+
+    Args:
+        vectors: One vector or a 2D array of vectors
+        dimensions: Target size (None keeps the full size)
+
+    Returns:
+        float32 array of unit vectors
+    """
+    array = np.asarray(vectors, dtype=np.float32)
+    if dimensions:
+        array = array[..., :dimensions]
+    norms = np.linalg.norm(array, axis=-1, keepdims=True)
+    return array / np.where(norms == 0, 1.0, norms)
+
+
+def rerank(
+    query: Sequence[float],
+    candidates: Sequence[Tuple[Hashable, Sequence[float]]],
+    k: int
+) -> List[Tuple[Hashable, float]]:
+    """
+    Order candidates by exact cosine similarity to the query.
+
+    Args:
+        query: Full-precision query embedding
+        candidates: (key, full-precision embedding) pairs
+        k: Number of results to keep
+
+    Returns:
+        Top-k (key, similarity) pairs, best first
+    """
+    if not candidates:
+        return []
+    keys = [key for key, _ in candidates]
+    scores = shorten([vector for _, vector in candidates]) @ shorten(query)
+    order = np.argsort(-scores)[:k]
+    return [(keys[i], float(scores[i])) for i in order]
+
+
+class VectorIndex:
+    """
+    Append-only cosine-similarity index over quantized, shortened vectors.
+
+    Args:
+        dimensions: Dimensions kept per vector (None keeps all)
+        quantization: "float32", "int8" or "binary"
+        keep_full: Also keep full-precision vectors in memory for re-ranking
+    """
+
+    def __init__(self, dimensions: Optional[int] = None, quantization: str = "int8", keep_full: bool = False):
+        if quantization not in QUANTIZATIONS:
+            raise ValueError(f"Unknown quantization '{quantization}' (expected one of {', '.join(QUANTIZATIONS)})")
+        self.dimensions = dimensions
+        self.quantization = quantization
+        self.keep_full = keep_full
+        self.keys: List[Hashable] = []
+        self._codes: Optional[np.ndarray] = None
+        self._scales: Optional[np.ndarray] = None
+        self._full: Optional[np.ndarray] = None
+
+    @classmethod
+    def from_codes(
+        cls,
+        keys: Sequence[Hashable],
+        codes: np.ndarray,
+        scales: Optional[np.ndarray] = None,
+        dimensions: Optional[int] = None,
+        quantization: str = "int8"
+    ) -> "VectorIndex":
+        """
+        Wrap precomputed codes (from encode(), e.g. memory-mapped from a
+        corpus snapshot) without copying them.
+
+        Args:
+            keys: One key per row of codes
+            codes: Codes as returned by encode()
+            scales: Per-vector scales (int8 only)
+            dimensions: Dimensions the codes were built with
+            quantization: Quantization the codes were built with
+
+        Returns:
+            VectorIndex over the given arrays
+        """
+        index = cls(dimensions, quantization)
+        index.keys = list(keys)
+        if len(index.keys):
+            index._codes, index._scales = codes, scales
+        return index
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def encode(self, vectors: Any) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+        """
+        Shorten and quantize full embeddings as add_many() stores them.
+
+        Returns:
+            (codes, scales); scales is None except for int8
+        """
+        return self._encode(shorten(np.asarray(vectors, dtype=np.float32), self.dimensions))
+
+    def _encode(self, vectors: np.ndarray) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+        if self.quantization == "float32":
+            return vectors, None
+        if self.quantization == "binary":
+            return np.packbits(vectors > 0, axis=1), None
+        scales = np.abs(vectors).max(axis=1)
+        scales[scales == 0] = 1.0
+        codes = np.rint(vectors / scales[:, None] * 127).astype(np.int8)
+        return codes, (scales / 127).astype(np.float32)
+
+    def add_many(self, keys: Sequence[Hashable], vectors: Any):
+        """
+        Add vectors (full embeddings; they are shortened and quantized here).
+
+        Args:
+            keys: One key per vector (e.g. template IDs)
+            vectors: 2D array-like of embeddings
+        """
+        if len(keys) == 0:
+            return
+        full = np.asarray(vectors, dtype=np.float32)
+        if full.ndim != 2 or full.shape[0] != len(keys):
+            raise ValueError("vectors must be a 2D array with one row per key")
+        codes, scales = self._encode(shorten(full, self.dimensions))
+
+        self.keys.extend(keys)
+        self._codes = codes if self._codes is None else np.concatenate([self._codes, codes])
+        if scales is not None:
+            self._scales = scales if self._scales is None else np.concatenate([self._scales, scales])
+        if self.keep_full:
+            full = shorten(full)
+            self._full = full if self._full is None else np.concatenate([self._full, full])
+
+    def add(self, key: Hashable, vector: Sequence[float]):
+        """Add one vector."""
+        self.add_many([key], [vector])
+
+    def _scores(self, query: np.ndarray) -> np.ndarray:
+        if self.quantization == "binary":
+            # Similarity from Hamming distance: 1 (identical signs) .. -1 (opposite)
+            bits = np.packbits(query > 0)
+            distance = _POPCOUNT[np.bitwise_xor(self._codes, bits)].sum(axis=1)
+            return 1.0 - 2.0 * distance / query.shape[0]
+        if self.quantization == "int8":
+            # Widen in blocks: BLAS float32 products beat numpy's integer matmul
+            scores = np.empty(len(self._codes), dtype=np.float32)
+            for start in range(0, len(self._codes), _SCAN_BLOCK):
+                block = self._codes[start:start + _SCAN_BLOCK]
+                scores[start:start + len(block)] = block.astype(np.float32) @ query
+            return scores * self._scales
+        return self._codes @ query
+
+    def _top(self, query: Sequence[float], n: int) -> Tuple[np.ndarray, np.ndarray]:
+        scores = self._scores(shorten(query, self.dimensions))
+        n = min(n, len(self.keys))
+        top = np.argpartition(-scores, n - 1)[:n]
+        top = top[np.argsort(-scores[top])]
+        return top, scores[top]
+
+    def candidates(self, query: Sequence[float], n: int) -> List[Tuple[Hashable, float]]:
+        """
+        Approximate top-n by scanning the quantized codes.
+
+        Args:
+            query: Full query embedding
+            n: Number of candidates
+
+        Returns:
+            (key, approximate similarity) pairs, best first
+        """
+        if not self.keys or n <= 0:
+            return []
+        top, scores = self._top(query, n)
+        return [(self.keys[i], float(score)) for i, score in zip(top, scores)]
+
+    def search(self, query: Sequence[float], k: int, rerank_factor: int = 4) -> List[Tuple[Hashable, float]]:
+        """
+        Top-k search; with keep_full, the best k * rerank_factor candidates
+        are re-ranked with full-precision vectors.
+
+        Args:
+            query: Full query embedding
+            k: Number of results
+            rerank_factor: Candidate multiplier for re-ranking (0 disables it)
+
+        Returns:
+            (key, similarity) pairs, best first
+        """
+        if not (self.keep_full and rerank_factor):
+            return self.candidates(query, k)
+        if not self.keys or k <= 0:
+            return []
+
+        top, _ = self._top(query, k * rerank_factor)
+        exact = self._full[top] @ shorten(query)
+        order = np.argsort(-exact)[:k]
+        return [(self.keys[top[i]], float(exact[i])) for i in order]
+
+    def memory_bytes(self) -> Dict[str, int]:
+        """Bytes held by the index arrays (codes and, with keep_full, full vectors)."""
+        codes = 0 if self._codes is None else self._codes.nbytes
+        codes += 0 if self._scales is None else self._scales.nbytes
+        return {"codes": codes, "full": 0 if self._full is None else self._full.nbytes}
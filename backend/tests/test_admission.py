@@ -0,0 +1,61 @@
+"""Admission control: shedding with 503 + Retry-After as a route dependency."""
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+
+from core.admission import AdmissionController
+from core.scheduler import PriorityScheduler
+
+UPSTREAM_SECONDS = 0.5
+
+
+def make_app():
+    # One upstream slot: a second admitted request queues for one call duration,
+    # a third would queue for two, which exceeds the budget
+    scheduler = PriorityScheduler("tests", max_concurrency=1)
+    admission = AdmissionController(
+        "tests", scheduler, initial_duration_s=UPSTREAM_SECONDS, queue_budget_s=0.6, max_inflight=0
+    )
+    app = FastAPI()
+
+    @app.post("/generate", dependencies=[Depends(admission)])
+    async def generate():
+        await scheduler.run(time.sleep, UPSTREAM_SECONDS)
+        return {"ok": True}
+
+    return app, admission, scheduler
+
+
+def test_sheds_over_budget_and_admits_after_drain():
+    app, admission, scheduler = make_app()
+    try:
+        with TestClient(app) as client:
+            with ThreadPoolExecutor(max_workers=4) as pool:
+                responses = list(pool.map(lambda _: client.post("/generate"), range(4)))
+
+            statuses = sorted(response.status_code for response in responses)
+            assert statuses == [200, 200, 503, 503]
+            for response in responses:
+                if response.status_code == 503:
+                    assert int(response.headers["Retry-After"]) >= 1
+
+            # The backlog has drained: the next request is admitted again
+            assert admission.inflight == 0
+            assert client.post("/generate").status_code == 200
+    finally:
+        scheduler.shutdown()
+
+
+def test_disabled_budget_admits_everything():
+    app, admission, scheduler = make_app()
+    admission.queue_budget_s = 0
+    try:
+        with TestClient(app) as client:
+            with ThreadPoolExecutor(max_workers=3) as pool:
+                responses = list(pool.map(lambda _: client.post("/generate"), range(3)))
+        assert [response.status_code for response in responses] == [200, 200, 200]
+    finally:
+        scheduler.shutdown()
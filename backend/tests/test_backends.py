@@ -0,0 +1,76 @@
+"""State backends: SQLite (temp file) and Redis (against the benchmark stand-in)."""
+
+import time
+import asyncio
+import threading
+
+import pytest
+
+from benchmarks.stubs import RedisStub
+from core.backends import (
+    RedisCacheBackend, RedisSessionBackend, SQLiteCacheBackend, SQLiteSessionBackend, _SQLiteDatabase
+)
+
+
+@pytest.fixture
+def redis_client():
+    # Optional dependency (STATE_BACKEND=redis)
+    redis = pytest.importorskip("redis")
+    stub = RedisStub()
+    loop = asyncio.new_event_loop()
+    server = loop.run_until_complete(asyncio.start_server(stub.handle, "127.0.0.1", 0))
+    port = server.sockets[0].getsockname()[1]
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    client = redis.Redis(port=port)
+    yield client
+
+    async def shutdown():
+        server.close()
+        for task in asyncio.all_tasks() - {asyncio.current_task()}:
+            task.cancel()
+
+    client.close()
+    asyncio.run_coroutine_threadsafe(shutdown(), loop).result()
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join()
+    loop.close()
+
+
+@pytest.fixture(params=["sqlite", "redis"])
+def backends(request, tmp_path):
+    if request.param == "sqlite":
+        db = _SQLiteDatabase(str(tmp_path / "state.db"))
+        return SQLiteSessionBackend(db), SQLiteCacheBackend(db)
+    client = request.getfixturevalue("redis_client")
+    return RedisSessionBackend(client), RedisCacheBackend(client)
+
+
+def test_cache_ttl_expiry(backends):
+    _, cache = backends
+    cache.set("short", {"value": 1}, ttl=0.05)
+    cache.set("kept", [1, 2])
+    assert cache.get("short") == {"value": 1}
+    time.sleep(0.1)
+    assert cache.get("short") is None and cache.get("kept") == [1, 2]
+    assert cache.incr("counter") == 1 and cache.incr("counter", 2) == 3
+    cache.delete("kept")
+    assert cache.get("kept") is None
+
+
+def test_session_delete_and_find_by_email(backends):
+    sessions, _ = backends
+    sessions.put("laptop", {"email": "a@example.com", "token": "t1", "created_at": 1, "last_used": 1})
+    sessions.put("phone", {"email": "a@example.com", "token": "t2", "created_at": 2, "last_used": 2})
+    sessions.put("other", {"email": "b@example.com", "token": "t3", "created_at": 3, "last_used": 3})
+    assert sessions.get("phone")["token"] == "t2"
+    assert sessions.find_by_email("a@example.com")["token"] in ("t1", "t2")
+
+    # Signing out on one device keeps the other session findable
+    assert sessions.delete("phone") and not sessions.delete("phone")
+    assert sessions.get("phone") is None
+    assert sessions.find_by_email("a@example.com")["token"] == "t1"
+
+    assert sessions.delete_many(["laptop", "missing"]) == 1
+    assert sessions.find_by_email("a@example.com") is None
+    assert dict(sessions.items()) == {"other": sessions.get("other")}
@@ -0,0 +1,123 @@
+"""Corpus snapshots and the local index: atomic export swaps, recovery and refreshes."""
+
+import os
+import random
+import asyncio
+
+import model.corpus_snapshot as corpus_snapshot
+import model.rag_service as rag_service
+import model.search_backend as search_backend
+from model.corpus_snapshot import POINTER_FILE, CorpusSnapshot, export_snapshot
+from model.search_backend import LocalTemplateIndex
+
+
+class FakeRepository:
+    """In-memory stand-in for the templates table."""
+
+    def __init__(self, templates: int):
+        rng = random.Random(templates)
+        self.rows = [{
+            "id": f"t{i:04d}", "subject": f"Template {i}", "description": "", "category": "Other",
+            "visibility": "public", "created_at": "2026-01-01T00:00:00Z",
+            "template_code": f"<html><body>{i}</body></html>",
+            "embedding": [rng.gauss(0, 1) for _ in range(32)],
+        } for i in range(templates)]
+
+    async def export_page(self, offset, limit):
+        return self.rows[offset:offset + limit]
+
+    async def embeddings_page(self, offset, limit):
+        return [{"id": row["id"], "embedding": row["embedding"]} for row in self.rows[offset:offset + limit]]
+
+    async def ids_page(self, offset, limit):
+        return [row["id"] for row in self.rows[offset:offset + limit]]
+
+    async def get_many(self, template_ids, with_embeddings=False):
+        wanted = set(template_ids)
+        return [dict(row) for row in self.rows if row["id"] in wanted]
+
+
+def _use(monkeypatch, repository):
+    monkeypatch.setattr(corpus_snapshot, "get_template_repository", lambda: repository)
+    monkeypatch.setattr(search_backend, "get_template_repository", lambda: repository)
+
+
+def test_export_swaps_pointer_and_keeps_previous(tmp_path, monkeypatch):
+    path = str(tmp_path / "snapshot")
+    _use(monkeypatch, FakeRepository(5))
+    asyncio.run(export_snapshot(path, dimensions=16))
+    first = CorpusSnapshot(path)
+
+    _use(monkeypatch, FakeRepository(8))
+    asyncio.run(export_snapshot(path, dimensions=16))
+    assert len(CorpusSnapshot(path).ids()) == 8
+    # A worker that loaded the previous export keeps reading it
+    assert len(first.ids()) == 5 and first.row("t0001")["template_code"] == "<html><body>1</body></html>"
+
+    asyncio.run(export_snapshot(path, dimensions=16))
+    versions = sorted(entry for entry in os.listdir(path) if entry.startswith("v-"))
+    assert len(versions) == 2
+    with open(os.path.join(path, POINTER_FILE)) as f:
+        assert f.read() == versions[-1]
+    assert not [entry for entry in os.listdir(path) if entry.endswith(".tmp")]
+
+
+def test_unusable_snapshot_is_retried_on_the_next_build(tmp_path, monkeypatch):
+    path = str(tmp_path / "snapshot")
+    repository = FakeRepository(6)
+    _use(monkeypatch, repository)
+    index = LocalTemplateIndex(dimensions=16, quantization="int8", refresh_interval=0, snapshot_path=path)
+
+    async def scenario():
+        # Not exported yet: falls back to the database
+        assert len(await index.get_index()) == 6
+        assert index._snapshot is None and index.snapshot_path == path
+
+        await export_snapshot(path, dimensions=16)
+        await index.refresh()
+        assert len(await index.get_index()) == 6
+        assert index._snapshot is not None
+
+    asyncio.run(scenario())
+
+
+def test_periodic_refresh_runs_in_the_background(monkeypatch):
+    repository = FakeRepository(4)
+    _use(monkeypatch, repository)
+    index = LocalTemplateIndex(dimensions=16, quantization="int8", refresh_interval=0, snapshot_path="")
+
+    async def scenario():
+        first = await index.get_index()
+        repository.rows.extend(FakeRepository(6).rows[4:])
+        # Due for a refresh: the previous index is served while it runs
+        assert await index.get_index() is first
+        await index._refresh_task
+        assert len(index._index) == 6
+
+    asyncio.run(scenario())
+
+
+def test_template_writes_are_caught_up_without_a_rebuild(monkeypatch):
+    repository = FakeRepository(6)
+    _use(monkeypatch, repository)
+    version = [1]
+    monkeypatch.setattr(rag_service, "get_corpus_version", lambda: version[0])
+    index = LocalTemplateIndex(dimensions=16, quantization="int8", refresh_interval=3600, snapshot_path="")
+
+    async def scenario():
+        assert len(await index.get_index()) == 6
+
+        async def no_rebuild(offset, limit):
+            raise AssertionError("full rebuild on a corpus version bump")
+
+        repository.embeddings_page = no_rebuild
+        added = FakeRepository(8).rows[6:]
+        repository.rows = repository.rows[1:] + added
+        version[0] += 1
+        caught_up = await index.get_index()
+        assert len(caught_up) == 7 and index._version == 2
+        # The removed template is gone; an added one is found
+        ranked = [key for key, _ in caught_up.candidates(added[0]["embedding"], 7)]
+        assert "t0000" not in ranked and ranked[0] == "t0006"
+
+    asyncio.run(scenario())
@@ -0,0 +1,47 @@
+"""Patch edits: only unusable patches fall back to full regeneration."""
+
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from fastapi import HTTPException
+
+import model.email_generator as email_generator
+from model.llm_client import UpstreamUnavailable
+
+CURRENT_HTML = "<html><body><table><tr><td>Spring sale</td></tr></table></body></html>"
+FULL_HTML = "<!-- SUBJECT: 🌸 Sale -->\n<html><body><table><tr><td>Summer sale</td></tr></table></body></html>"
+
+
+def _response(content: str):
+    return SimpleNamespace(choices=[SimpleNamespace(finish_reason="stop", message=SimpleNamespace(content=content))])
+
+
+def _stub_completions(monkeypatch, patch_outcome):
+    calls = []
+
+    async def chat_completion(route, messages, **kwargs):
+        calls.append(route)
+        if "response_format" in kwargs:
+            if isinstance(patch_outcome, Exception):
+                raise patch_outcome
+            return _response(patch_outcome)
+        return _response(FULL_HTML)
+
+    monkeypatch.setattr(email_generator, "EMAIL_EDIT_MODE", "patch")
+    monkeypatch.setattr(email_generator, "chat_completion", chat_completion)
+    return calls
+
+
+def test_unusable_patch_falls_back_to_full_regeneration(monkeypatch):
+    calls = _stub_completions(monkeypatch, "not json")
+    result = asyncio.run(email_generator.generate_email_html("Make it a summer sale", current_html=CURRENT_HTML))
+    assert len(calls) == 2 and "Summer sale" in result["html"]
+
+
+def test_upstream_error_is_not_retried_as_full_regeneration(monkeypatch):
+    calls = _stub_completions(monkeypatch, UpstreamUnavailable("circuit open"))
+    with pytest.raises(HTTPException) as raised:
+        asyncio.run(email_generator.generate_email_html("Make it a summer sale", current_html=CURRENT_HTML))
+    assert raised.value.status_code == 503 and "Retry-After" in raised.value.headers
+    assert len(calls) == 1
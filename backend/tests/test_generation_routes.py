@@ -0,0 +1,108 @@
+"""/generate-email-rag: identical concurrent requests share one generation (and its reference images)."""
+
+import json
+import asyncio
+from types import SimpleNamespace
+
+import httpx
+from fastapi import FastAPI
+
+import model.email_generator as email_generator
+import model.routes as routes
+
+GENERATED_HTML = "<!-- SUBJECT: 🌸 Sale -->\n<html><body><table><tr><td>Spring sale</td></tr></table></body></html>"
+
+
+def make_app(monkeypatch):
+    calls = []
+
+    async def enhance_user_prompt(prompt):
+        calls.append("enhance")
+        return prompt
+
+    async def chat_completion(route, messages, **kwargs):
+        calls.append("generate")
+        await asyncio.sleep(0.2)
+        message = SimpleNamespace(content=GENERATED_HTML)
+        return SimpleNamespace(choices=[SimpleNamespace(finish_reason="stop", message=message)])
+
+    async def prepare_vision_image(file):
+        # Followers' generations read the leader's images
+        content = await file.read()
+        await file.seek(0)
+        assert content
+        return f"data:image/png;base64,{content.hex()}"
+
+    monkeypatch.setattr(routes, "enhance_user_prompt", enhance_user_prompt)
+    monkeypatch.setattr(email_generator, "chat_completion", chat_completion)
+    monkeypatch.setattr(email_generator, "prepare_vision_image", prepare_vision_image)
+    app = FastAPI()
+    app.include_router(routes.router)
+    return app, calls
+
+
+def _generate(client, history=None, image=b"reference"):
+    data = {"prompt": "Spring sale for running shoes", "use_rag": "false"}
+    if history is not None:
+        data["history"] = history
+    return client.post("/generate-email-rag", data=data, files=[("images", ("ref.png", image, "image/png"))])
+
+
+def test_identical_requests_share_one_llm_call(monkeypatch):
+    app, calls = make_app(monkeypatch)
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            history = json.dumps([{"role": "user", "content": "hi"}])
+            # JSON formatting of the history does not matter
+            responses = await asyncio.gather(*(
+                _generate(client, history if i % 2 else json.dumps(json.loads(history), indent=2)) for i in range(5)
+            ))
+            assert [response.status_code for response in responses] == [200] * 5
+            assert calls == ["enhance", "generate"]
+            assert len({response.json()["html"] for response in responses}) == 1
+
+    asyncio.run(scenario())
+
+
+def test_different_images_or_history_do_not_share(monkeypatch):
+    app, calls = make_app(monkeypatch)
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            responses = await asyncio.gather(
+                _generate(client),
+                _generate(client, image=b"another reference"),
+                _generate(client, history=json.dumps([{"role": "user", "content": "hi"}])),
+            )
+            assert [response.status_code for response in responses] == [200] * 3
+            assert calls.count("generate") == 3
+
+    asyncio.run(scenario())
+
+
+def test_follower_outlives_the_leaders_request(monkeypatch):
+    app, calls = make_app(monkeypatch)
+    enhance = routes.enhance_user_prompt
+
+    async def slow_enhance(prompt):
+        await asyncio.sleep(0.2)
+        return await enhance(prompt)
+
+    monkeypatch.setattr(routes, "enhance_user_prompt", slow_enhance)
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            leader = asyncio.create_task(_generate(client))
+            await asyncio.sleep(0.05)
+            follower = asyncio.create_task(_generate(client))
+            await asyncio.sleep(0.05)
+            # The leader disconnects (its upload files are closed) before the images are read
+            leader.cancel()
+            response = await follower
+            assert response.status_code == 200 and calls == ["enhance", "generate"]
+
+    asyncio.run(scenario())
@@ -0,0 +1,38 @@
+"""Vision inputs: cache of preprocessed reference images."""
+
+import asyncio
+from io import BytesIO
+
+from fastapi import UploadFile
+from PIL import Image
+
+from model import image_optimizer
+from model.image_optimizer import prepare_vision_image, shutdown_image_optimizer
+
+
+def _upload(content: bytes, content_type: str) -> UploadFile:
+    return UploadFile(BytesIO(content), filename="reference", headers={"content-type": content_type})
+
+
+def _png() -> bytes:
+    buffer = BytesIO()
+    Image.new("RGB", (1600, 900), (79, 70, 229)).save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+def test_fallback_is_not_cached_but_result_is():
+    image_optimizer._vision_cache.clear()
+
+    async def scenario():
+        broken = await prepare_vision_image(_upload(b"not an image", "image/png"))
+        assert broken.startswith("data:image/png;base64,")
+        assert not image_optimizer._vision_cache
+
+        encoded = await prepare_vision_image(_upload(_png(), "image/png"))
+        assert encoded.startswith("data:image/jpeg;base64,")
+        assert list(image_optimizer._vision_cache.values()) == [encoded]
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        shutdown_image_optimizer()
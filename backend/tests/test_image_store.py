@@ -0,0 +1,62 @@
+"""Image library: listing pages walk the bucket only as far as needed; templates get retina variants."""
+
+import asyncio
+
+import model.image_store as image_store
+from core.backends import MemoryCacheBackend
+
+
+class FakeBucket:
+    """Bucket listing newest first: each upload's variants are newer than its original."""
+
+    def __init__(self, uploads: int):
+        self.objects = []
+        for i in reversed(range(uploads)):
+            self.objects += [{"name": f"img{i:03d}@2x.jpg"}, {"name": f"img{i:03d}@1x.jpg"}, {"name": f"img{i:03d}.png"}]
+        self.listed = 0
+
+    async def list(self, options):
+        matching = [f for f in self.objects if f["name"].startswith(options.get("search", ""))]
+        page = matching[options["offset"]:options["offset"] + options["limit"]]
+        self.listed += len(page)
+        return page
+
+
+def test_page_stops_early_and_uses_1x_variants(monkeypatch):
+    bucket = FakeBucket(500)
+    monkeypatch.setattr(image_store, "_storage", bucket)
+    cache = MemoryCacheBackend()
+    monkeypatch.setattr(image_store, "get_cache_backend", lambda: cache)
+
+    first = asyncio.run(image_store.list_images(limit=10))
+    assert [image["name"] for image in first["images"]] == [f"img{i:03d}.png" for i in range(499, 489, -1)]
+    assert first["images"][0]["url"].endswith("/img499@1x.jpg")
+    assert first["has_more"] and bucket.listed < 100
+
+    # Served from the listing cache
+    listed = bucket.listed
+    assert asyncio.run(image_store.list_images(limit=10)) == first and bucket.listed == listed
+
+    last = asyncio.run(image_store.list_images(limit=100, offset=450))
+    assert len(last["images"]) == 50 and not last["has_more"]
+
+
+def test_generated_images_get_their_2x_variant(monkeypatch):
+    bucket = FakeBucket(2)
+    # A narrow source: no 2x variant
+    bucket.objects = [f for f in bucket.objects if f["name"] != "img001@2x.jpg"]
+    monkeypatch.setattr(image_store, "_storage", bucket)
+    cache = MemoryCacheBackend()
+    monkeypatch.setattr(image_store, "get_cache_backend", lambda: cache)
+
+    url = image_store.get_public_url
+    html = (
+        f'<img src="{url("img000@1x.jpg")}" width="600" alt="Hero">'
+        f'<img src="{url("img001@1x.jpg")}" width="600">'
+        f'<img src="https://example.com/logo@1x.png" width="120">'
+    )
+    result = asyncio.run(image_store.add_retina_srcset(html))
+    assert f'<img src="{url("img000@1x.jpg")}" srcset="{url("img000@2x.jpg")} 2x" width="600" alt="Hero">' in result
+    assert result.count("srcset") == 1
+    # Already wired: left alone
+    assert asyncio.run(image_store.add_retina_srcset(result)) == result
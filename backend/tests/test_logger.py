@@ -0,0 +1,42 @@
+"""Structured logging: reserved LogRecord names passed in `extra`."""
+
+import json
+import logging
+
+from core.logger import JsonFormatter, get_logger
+
+
+class Capture(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+def test_reserved_extra_key_does_not_raise():
+    logger = get_logger("tests.logger")
+    logger.setLevel(logging.DEBUG)
+    # "filename" is a LogRecord attribute; the stdlib raises KeyError for it
+    logger.info("Image uploaded", extra={"filename": "hero.png", "variants": 2})
+
+
+def test_reserved_extra_key_is_renamed():
+    logger = get_logger("tests.logger")
+    logger.setLevel(logging.DEBUG)
+    capture = Capture()
+    logger.logger.addHandler(capture)
+    try:
+        logger.info("Image uploaded", extra={"filename": "hero.png", "module": "images", "variants": 2})
+    finally:
+        logger.logger.removeHandler(capture)
+
+    record, = capture.records
+    entry = json.loads(JsonFormatter().format(record))
+    assert entry["filename_"] == "hero.png"
+    assert entry["module_"] == "images"
+    assert entry["variants"] == 2
+    assert record.filename.endswith(".py")
+    # Loggers obtained directly from the stdlib are left alone
+    assert type(logging.getLogger(logger.name)) is logging.Logger
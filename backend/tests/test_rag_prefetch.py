@@ -0,0 +1,46 @@
+"""RAG prefetch: per-client cap and slots of requests served by another generation."""
+
+import asyncio
+
+from model.rag_prefetch import RagPrefetcher
+
+DRAFT = "spring sale email for our running shoes customers"
+
+
+def make_prefetcher(**kwargs) -> RagPrefetcher:
+    prefetcher = RagPrefetcher(max_slots=10, ttl_s=60, min_chars=5, **kwargs)
+
+    async def warm(prompt):
+        return f"enhanced {prompt}", "context"
+
+    prefetcher._warm = warm
+    return prefetcher
+
+
+def test_client_cap_skips_and_reports_retry_after():
+    prefetcher = make_prefetcher(per_minute=2)
+
+    async def scenario():
+        statuses = [prefetcher.prefetch(f"draft-{i}", f"{DRAFT} {i}", "10.0.0.1") for i in range(3)]
+        assert statuses == ["started", "started", "skipped"]
+        assert 0 < prefetcher.retry_after("10.0.0.1") <= 60
+        # Other clients have their own budget; repeating a started draft is free
+        assert prefetcher.retry_after("10.0.0.2") == 0
+        assert prefetcher.prefetch("draft-9", DRAFT, "10.0.0.2") == "started"
+        assert prefetcher.prefetch("draft-0", f"{DRAFT} 0", "10.0.0.1") in ("pending", "ready")
+
+    asyncio.run(scenario())
+
+
+def test_discard_drops_unused_slot():
+    prefetcher = make_prefetcher(per_minute=0)
+
+    async def scenario():
+        assert prefetcher.prefetch("draft-1", DRAFT) == "started"
+        # A different prompt (the user kept typing) is kept
+        prefetcher.discard("draft-1", DRAFT + " with a discount code")
+        assert prefetcher.prefetch("draft-1", DRAFT) in ("pending", "ready")
+        prefetcher.discard("draft-1", DRAFT)
+        assert await prefetcher.take("draft-1", DRAFT) is None
+
+    asyncio.run(scenario())
@@ -0,0 +1,48 @@
+"""Rate budget: waiting calls are served by priority class."""
+
+import asyncio
+
+from core.resilience import RateBudget
+from core.scheduler import call_priority
+
+
+def test_interactive_waiters_served_before_background():
+    budget = RateBudget(rpm=1)
+    budget.WINDOW_S = 0.1
+    order = []
+
+    async def call(name: str, priority: str):
+        with call_priority(priority):
+            await budget.acquire(10)
+        order.append(name)
+
+    async def scenario():
+        await budget.acquire(10)
+        backfill = [asyncio.create_task(call(f"background-{i}", "background")) for i in range(3)]
+        await asyncio.sleep(0.01)
+        # Arrives after the backfill queued, but must not wait behind it
+        interactive = asyncio.create_task(call("interactive", "interactive"))
+        await asyncio.wait_for(asyncio.gather(*backfill, interactive), timeout=2)
+
+    asyncio.run(scenario())
+    assert order == ["interactive", "background-0", "background-1", "background-2"]
+
+
+def test_cancelled_waiter_does_not_block_the_queue():
+    budget = RateBudget(rpm=1)
+    budget.WINDOW_S = 0.1
+
+    async def scenario():
+        await budget.acquire(10)
+        first = asyncio.create_task(budget.acquire(10))
+        second = asyncio.create_task(budget.acquire(10))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        waited = await asyncio.wait_for(second, timeout=2)
+        assert 0 < waited < 0.5
+
+    asyncio.run(scenario())
+
+
+def test_unlimited_budget_never_waits():
+    assert asyncio.run(RateBudget().acquire(10_000)) == 0.0
@@ -0,0 +1,50 @@
+"""Priority scheduler: slots of cancelled calls."""
+
+import time
+import asyncio
+import threading
+
+from core.scheduler import PriorityScheduler
+
+
+def test_cancelled_call_keeps_slot_until_thread_finishes():
+    scheduler = PriorityScheduler("tests", max_concurrency=1)
+    release = threading.Event()
+
+    async def scenario():
+        call = asyncio.create_task(scheduler.run(release.wait, 5))
+        await asyncio.sleep(0.05)
+        call.cancel()
+        await asyncio.sleep(0.05)
+        # The thread is still running: the slot must not be handed out
+        assert scheduler.stats()["interactive"]["running"] == 1
+        second = asyncio.create_task(scheduler.run(time.sleep, 0))
+        await asyncio.sleep(0.05)
+        assert not second.done()
+
+        release.set()
+        await asyncio.wait_for(second, timeout=2)
+        assert scheduler.stats()["interactive"]["running"] == 0
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        release.set()
+        scheduler.shutdown()
+
+
+def test_failed_call_releases_slot():
+    scheduler = PriorityScheduler("tests", max_concurrency=1)
+
+    def fail():
+        raise RuntimeError("upstream down")
+
+    async def scenario():
+        try:
+            await scheduler.run(fail)
+        except RuntimeError:
+            pass
+        assert scheduler.stats()["interactive"]["running"] == 0
+
+    asyncio.run(scenario())
+    scheduler.shutdown()
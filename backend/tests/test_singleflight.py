@@ -0,0 +1,72 @@
+"""Request coalescing: concurrent calls with the same key share one execution."""
+
+import asyncio
+
+from core.singleflight import SingleFlight, make_key
+
+
+class CountingStub:
+    """Slow upstream call that counts how often it actually runs."""
+
+    def __init__(self, error: Exception = None):
+        self.calls = 0
+        self.error = error
+
+    async def __call__(self, value: str) -> str:
+        self.calls += 1
+        await asyncio.sleep(0.05)
+        if self.error is not None:
+            raise self.error
+        return f"result:{value}"
+
+
+def test_same_key_runs_once():
+    flight = SingleFlight("tests")
+    stub = CountingStub()
+    key = make_key("generate", "shoes")
+
+    async def scenario():
+        return await asyncio.gather(*(flight.do(key, lambda: stub("shoes")) for _ in range(10)))
+
+    results = asyncio.run(scenario())
+    assert stub.calls == 1
+    assert results == ["result:shoes"] * 10
+    assert flight.inflight == 0
+
+
+def test_different_keys_run_separately():
+    flight = SingleFlight("tests")
+    stub = CountingStub()
+
+    async def scenario():
+        return await asyncio.gather(
+            flight.do(make_key("generate", "shoes"), lambda: stub("shoes")),
+            flight.do(make_key("generate", "shoes"), lambda: stub("shoes")),
+            flight.do(make_key("generate", "coffee"), lambda: stub("coffee")),
+        )
+
+    results = asyncio.run(scenario())
+    assert stub.calls == 2
+    assert results == ["result:shoes", "result:shoes", "result:coffee"]
+
+
+def test_leader_error_reaches_every_waiter():
+    flight = SingleFlight("tests")
+    stub = CountingStub(error=RuntimeError("upstream down"))
+    key = make_key("generate", "shoes")
+
+    async def scenario():
+        return await asyncio.gather(
+            *(flight.do(key, lambda: stub("shoes")) for _ in range(5)), return_exceptions=True
+        )
+
+    results = asyncio.run(scenario())
+    assert stub.calls == 1
+    assert len(results) == 5
+    assert all(isinstance(result, RuntimeError) and str(result) == "upstream down" for result in results)
+    assert flight.inflight == 0
+
+
+def test_key_ignores_dict_order():
+    assert make_key("a", {"x": 1, "y": 2}) == make_key("a", {"y": 2, "x": 1})
+    assert make_key("a", "b") != make_key("b", "a")
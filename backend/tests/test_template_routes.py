@@ -0,0 +1,97 @@
+"""Template routes: upstream failures keep their status mapping; slow database calls stay off the event loop."""
+
+import time
+import asyncio
+import importlib
+
+import httpx
+from cryptography.fernet import Fernet
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import model.embeddings as embeddings
+import model.rag_service as rag_service
+import model.routes as routes
+from model.llm_client import get_openai_breaker
+
+
+class RateLimited(Exception):
+    """What the OpenAI client raises for a 429 (status code and response headers)."""
+
+    status_code = 429
+
+    def __init__(self, retry_after: str):
+        super().__init__("Rate limit reached")
+        self.response = type("Response", (), {"headers": {"retry-after": retry_after}})()
+
+
+class RateLimitedClient:
+    def __init__(self):
+        self.calls = 0
+        self.embeddings = self
+
+    def create(self, **kwargs):
+        self.calls += 1
+        raise RateLimited("30")
+
+
+def make_client(monkeypatch) -> TestClient:
+    monkeypatch.setattr(routes, "is_supabase_configured", lambda: True)
+    app = FastAPI()
+    app.include_router(routes.router)
+    return TestClient(app)
+
+
+def test_upstream_rate_limit_returns_503_with_retry_after(monkeypatch):
+    upstream = RateLimitedClient()
+    monkeypatch.setattr(embeddings, "get_openai_client", lambda: upstream)
+    client = make_client(monkeypatch)
+    try:
+        for path, form in (
+            ("/search-templates", {"query": "spring sale", "limit": "3"}),
+            ("/save-template", {"subject": "Sale", "description": "Spring sale", "template_code": "<html></html>"}),
+        ):
+            response = client.post(path, data=form)
+            assert response.status_code == 503, path
+            assert response.headers["Retry-After"] == "30"
+        # A Retry-After beyond LLM_RETRY_MAX_WAIT is not waited for
+        assert upstream.calls == 2
+    finally:
+        get_openai_breaker().record_success()
+
+
+class SlowQuery:
+    """Supabase query builder whose execute() blocks like a slow network call."""
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self
+
+    def execute(self):
+        time.sleep(0.5)
+        return type("Result", (), {"data": []})()
+
+
+def test_health_responds_while_slow_listings_are_in_flight(monkeypatch):
+    monkeypatch.setenv("SESSION_SECRET", "test")
+    monkeypatch.setenv("GOOGLE_CLIENT_ID", "test")
+    monkeypatch.setenv("GOOGLE_CLIENT_SECRET", "test")
+    monkeypatch.setenv("FERNET_KEY", Fernet.generate_key().decode())
+    app = importlib.import_module("app").app
+    monkeypatch.setattr(routes, "is_supabase_configured", lambda: True)
+    monkeypatch.setattr(rag_service, "get_supabase_client", lambda: SlowQuery())
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            listings = [asyncio.create_task(client.get("/list-templates")) for _ in range(4)]
+            await asyncio.sleep(0.05)
+            started = time.perf_counter()
+            health = await client.get("/health")
+            elapsed = time.perf_counter() - started
+            assert health.status_code == 200
+            assert not any(listing.done() for listing in listings)
+            assert all(response.status_code == 200 for response in await asyncio.gather(*listings))
+        return elapsed
+
+    # The listings block worker threads, not the event loop
+    assert asyncio.run(scenario()) < 0.25
@@ -30,6 +30,9 @@ import { EmailTemplate, GmailConnection, Message, ChatSession, TemplateCheckpoin
 import { saveChatSession, loadChatSession, clearChatSession, saveCheckpoint } from '../utils/chatStorage';
 import { API_URL } from '../config/api';
 
+// Images fetched per gallery page (the backend caps a page at 1000)
+const IMAGE_PAGE_SIZE = 100;
+
 interface AIGeneratorV2Props {
     onGenerateTemplate: (template: EmailTemplate) => void;
     onBack: () => void;
@@ -88,6 +91,7 @@ export function AIGeneratorV2({ onGenerateTemplate, onBack, gmailConnection }: A
 
     // Image Gallery State
     const [uploadedImages, setUploadedImages] = useState<UploadedImage[]>([]);
+    const [hasMoreImages, setHasMoreImages] = useState(false);
     const [isGalleryOpen, setIsGalleryOpen] = useState(false);
     const [isUploading, setIsUploading] = useState(false);
     const [copiedUrl, setCopiedUrl] = useState<string | null>(null);
@@ -154,12 +158,15 @@ export function AIGeneratorV2({ onGenerateTemplate, onBack, gmailConnection }: A
         fetchImages();
     }, []);
 
-    const fetchImages = async () => {
+    // The listing is paginated: the first page loads on mount, later ones on demand
+    const fetchImages = async (offset = 0) => {
         try {
-            const response = await fetch(`${API_URL}/list-images`);
+            const response = await fetch(`${API_URL}/list-images?limit=${IMAGE_PAGE_SIZE}&offset=${offset}`);
             if (response.ok) {
                 const data = await response.json();
-                setUploadedImages(data.images || []);
+                const images = data.images || [];
+                setUploadedImages(prev => offset === 0 ? images : [...prev, ...images]);
+                setHasMoreImages(Boolean(data.has_more));
             }
         } catch (error) {
             console.error('Failed to fetch images:', error);
@@ -2439,6 +2446,7 @@ export function AIGeneratorV2({ onGenerateTemplate, onBack, gmailConnection }: A
                                     {/* Image Grid */}
                                     <div style={{ padding: '20px' }}>
                                         {uploadedImages.length > 0 ? (
+                                            <>
                                             <div style={{
                                                 display: 'grid',
                                                 gridTemplateColumns: 'repeat(3, 1fr)',
@@ -2531,6 +2539,25 @@ export function AIGeneratorV2({ onGenerateTemplate, onBack, gmailConnection }: A
                                                     </div>
                                                 ))}
                                             </div>
+                                            {hasMoreImages && (
+                                                <button
+                                                    onClick={() => fetchImages(uploadedImages.length)}
+                                                    style={{
+                                                        display: 'block',
+                                                        margin: '16px auto 0',
+                                                        padding: '10px 20px',
+                                                        backgroundColor: '#27272a',
+                                                        border: 'none',
+                                                        borderRadius: '8px',
+                                                        color: '#e4e4e7',
+                                                        fontSize: '14px',
+                                                        cursor: 'pointer',
+                                                    }}
+                                                >
+                                                    Load more
+                                                </button>
+                                            )}
+                                            </>
                                         ) : (
                                             <div style={{
                                                 display: 'flex',